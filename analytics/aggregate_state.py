@@ -0,0 +1,759 @@
+# analytics/aggregate_state.py
+# Shared, mergeable state backends for incremental aggregates
+
+import hashlib
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from datetime import datetime, timezone as dt_timezone
+from typing import Dict, Any, List, Optional, Tuple
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from analytics.sketches import SKETCH_CLASSES
+
+logger = logging.getLogger(__name__)
+
+
+# Registry of mergeable sketch types, keyed by the name stored alongside
+# serialized sketch state. Sketch classes must implement merge(other),
+# copy(), to_bytes()/from_bytes(data) and to_dict()/from_dict(data).
+SKETCH_TYPES: Dict[str, Any] = dict(SKETCH_CLASSES)
+
+
+def register_sketch_type(name: str, sketch_class: Any) -> None:
+    """Register a mergeable sketch type for aggregate state serialization."""
+    SKETCH_TYPES[name] = sketch_class
+
+
+def dimension_key(dimensions: Dict[str, Any]) -> str:
+    """Compute a stable hash for a dimension combination."""
+    dims_str = json.dumps(dimensions, sort_keys=True, default=str)
+    return hashlib.md5(dims_str.encode()).hexdigest()
+
+
+@dataclass
+class PartialAggregate:
+    """
+    Mergeable partial aggregate for one (time bucket, dimensions) cell.
+    Partials computed on different workers combine with merge().
+    """
+    record_count: int = 0
+    sums: Dict[str, float] = field(default_factory=dict)
+    mins: Dict[str, float] = field(default_factory=dict)
+    maxs: Dict[str, float] = field(default_factory=dict)
+    sketches: Dict[str, Any] = field(default_factory=dict)
+
+    @classmethod
+    def from_metrics(cls, metrics: Dict[str, float], record_count: int = 1) -> 'PartialAggregate':
+        """Build a partial aggregate from a single record's metrics."""
+        return cls(
+            record_count=record_count,
+            sums=dict(metrics),
+            mins=dict(metrics),
+            maxs=dict(metrics),
+        )
+
+    def merge(self, other: 'PartialAggregate') -> 'PartialAggregate':
+        """Merge another partial aggregate into this one (in place)."""
+        self.record_count += other.record_count
+
+        for metric, value in other.sums.items():
+            self.sums[metric] = self.sums.get(metric, 0.0) + value
+        for metric, value in other.mins.items():
+            current = self.mins.get(metric)
+            self.mins[metric] = value if current is None else min(current, value)
+        for metric, value in other.maxs.items():
+            current = self.maxs.get(metric)
+            self.maxs[metric] = value if current is None else max(current, value)
+        for metric, sketch in other.sketches.items():
+            if metric in self.sketches:
+                self.sketches[metric].merge(sketch)
+            else:
+                self.sketches[metric] = sketch.copy() if hasattr(sketch, 'copy') else sketch
+
+        return self
+
+    def averages(self) -> Dict[str, float]:
+        """Average of each metric over the records in this partial."""
+        if not self.record_count:
+            return {}
+        return {metric: value / self.record_count for metric, value in self.sums.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to a JSON-compatible dictionary."""
+        return {
+            'record_count': self.record_count,
+            'sums': self.sums,
+            'mins': self.mins,
+            'maxs': self.maxs,
+            'sketches': {
+                metric: {'type': sketch.SKETCH_TYPE, 'state': sketch.to_dict()}
+                for metric, sketch in self.sketches.items()
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PartialAggregate':
+        """Deserialize from to_dict() output."""
+        sketches = {}
+        for metric, payload in data.get('sketches', {}).items():
+            sketch_class = SKETCH_TYPES.get(payload.get('type'))
+            if sketch_class is None:
+                logger.warning(f"Unknown sketch type for metric {metric}: {payload.get('type')}")
+                continue
+            sketches[metric] = sketch_class.from_dict(payload['state'])
+
+        return cls(
+            record_count=int(data.get('record_count', 0)),
+            sums=dict(data.get('sums', {})),
+            mins=dict(data.get('mins', {})),
+            maxs=dict(data.get('maxs', {})),
+            sketches=sketches,
+        )
+
+
+@dataclass
+class AggregateCell:
+    """Merged state for one (aggregate, time bucket, dimensions) cell."""
+    aggregate_id: str
+    time_bucket: datetime
+    dimensions: Dict[str, Any]
+    partial: PartialAggregate
+    last_updated: Optional[datetime] = None
+
+
+class AggregateStateBackend(ABC):
+    """Abstract base class for aggregate state backends."""
+
+    @abstractmethod
+    def save_definition(self, definition: Dict[str, Any]) -> None:
+        """Persist an aggregate definition so every worker can see it."""
+        pass
+
+    @abstractmethod
+    def load_definitions(self, company_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Load aggregate definitions, optionally for one company."""
+        pass
+
+    @abstractmethod
+    def apply_deltas(self, aggregate_id: str,
+                     deltas: List[Tuple[datetime, Dict[str, Any], PartialAggregate]]) -> None:
+        """Merge partial aggregates into the shared state for their cells."""
+        pass
+
+    @abstractmethod
+    def read_cells(self, aggregate_id: str, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> List[AggregateCell]:
+        """Read merged cells for an aggregate, optionally within a bucket range."""
+        pass
+
+    @abstractmethod
+    def get_version(self, aggregate_id: str) -> str:
+        """Return a token that changes whenever the aggregate state changes."""
+        pass
+
+    @abstractmethod
+    def get_versions(self, aggregate_ids: List[str]) -> Dict[str, str]:
+        """Return the version tokens of several aggregates in one read."""
+        pass
+
+    @abstractmethod
+    def clear(self, aggregate_id: str) -> None:
+        """Drop all state for an aggregate."""
+        pass
+
+    @abstractmethod
+    def health_check(self) -> bool:
+        """Check if the backend is available."""
+        pass
+
+    def apply_delta(self, aggregate_id: str, time_bucket: datetime,
+                    dimensions: Dict[str, Any], partial: PartialAggregate) -> None:
+        """Merge a single partial aggregate into shared state."""
+        self.apply_deltas(aggregate_id, [(time_bucket, dimensions, partial)])
+
+
+class InMemoryAggregateStateBackend(AggregateStateBackend):
+    """
+    Process-local aggregate state.
+    Used for tests and single-process deployments; state is not shared.
+    """
+
+    def __init__(self):
+        self.definitions: Dict[str, Dict[str, Any]] = {}
+        self.cells: Dict[str, Dict[Tuple[datetime, str], AggregateCell]] = {}
+        self.versions: Dict[str, int] = {}
+        self.lock = threading.Lock()
+
+    def save_definition(self, definition: Dict[str, Any]) -> None:
+        self.definitions[definition['id']] = dict(definition)
+
+    def load_definitions(self, company_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [
+            dict(definition) for definition in self.definitions.values()
+            if company_id is None or definition['company_id'] == company_id
+        ]
+
+    def apply_deltas(self, aggregate_id: str,
+                     deltas: List[Tuple[datetime, Dict[str, Any], PartialAggregate]]) -> None:
+        now = timezone.now()
+        with self.lock:
+            cells = self.cells.setdefault(aggregate_id, {})
+            for time_bucket, dimensions, partial in deltas:
+                key = (time_bucket, dimension_key(dimensions))
+                cell = cells.get(key)
+                if cell is None:
+                    cell = AggregateCell(aggregate_id, time_bucket, dict(dimensions), PartialAggregate())
+                    cells[key] = cell
+                cell.partial.merge(partial)
+                cell.last_updated = now
+            self.versions[aggregate_id] = self.versions.get(aggregate_id, 0) + 1
+
+    def read_cells(self, aggregate_id: str, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> List[AggregateCell]:
+        with self.lock:
+            return [
+                cell for cell in self.cells.get(aggregate_id, {}).values()
+                if (start is None or cell.time_bucket >= start)
+                and (end is None or cell.time_bucket <= end)
+            ]
+
+    def get_version(self, aggregate_id: str) -> str:
+        return str(self.versions.get(aggregate_id, 0))
+
+    def get_versions(self, aggregate_ids: List[str]) -> Dict[str, str]:
+        with self.lock:
+            return {aggregate_id: str(self.versions.get(aggregate_id, 0)) for aggregate_id in aggregate_ids}
+
+    def clear(self, aggregate_id: str) -> None:
+        with self.lock:
+            self.cells.pop(aggregate_id, None)
+            self.versions[aggregate_id] = self.versions.get(aggregate_id, 0) + 1
+
+    def health_check(self) -> bool:
+        return True
+
+
+class RedisAggregateStateBackend(AggregateStateBackend):
+    """
+    Redis-backed aggregate state.
+    Each cell is a hash updated with HINCRBY/HINCRBYFLOAT; min/max are applied
+    atomically by a Lua script. A sorted set per aggregate indexes cells by
+    bucket timestamp so range reads avoid SCAN.
+    """
+
+    KEY_PREFIX = 'aggregates:state:v1'
+
+    # KEYS: cell hash, cell index zset, version counter
+    # ARGV: bucket score, dimensions json, record count, update time,
+    #       then (metric, sum, min, max)*
+    APPLY_DELTA_SCRIPT = """
+    redis.call('HSETNX', KEYS[1], 'dims', ARGV[2])
+    redis.call('HSETNX', KEYS[1], 'bucket', ARGV[1])
+    redis.call('HINCRBY', KEYS[1], 'count', ARGV[3])
+    for i = 5, #ARGV, 4 do
+        local metric = ARGV[i]
+        redis.call('HINCRBYFLOAT', KEYS[1], 'sum:' .. metric, ARGV[i + 1])
+        local current = redis.call('HGET', KEYS[1], 'min:' .. metric)
+        if (not current) or tonumber(ARGV[i + 2]) < tonumber(current) then
+            redis.call('HSET', KEYS[1], 'min:' .. metric, ARGV[i + 2])
+        end
+        current = redis.call('HGET', KEYS[1], 'max:' .. metric)
+        if (not current) or tonumber(ARGV[i + 3]) > tonumber(current) then
+            redis.call('HSET', KEYS[1], 'max:' .. metric, ARGV[i + 3])
+        end
+    end
+    redis.call('HSET', KEYS[1], 'updated', ARGV[4])
+    redis.call('ZADD', KEYS[2], ARGV[1], KEYS[1])
+    redis.call('INCR', KEYS[3])
+    return 1
+    """
+
+    def __init__(self, redis_url: Optional[str] = None):
+        """
+        Initialize Redis aggregate state backend.
+
+        Args:
+            redis_url: Redis connection URL (default: AGGREGATE_STATE_REDIS_URL
+                or the default cache location)
+        """
+        import redis
+
+        redis_url = redis_url or getattr(
+            settings, 'AGGREGATE_STATE_REDIS_URL',
+            settings.CACHES['default']['LOCATION']
+        )
+        self.client = redis.Redis.from_url(redis_url)
+        self._apply_delta = self.client.register_script(self.APPLY_DELTA_SCRIPT)
+
+    def _definitions_key(self) -> str:
+        return f"{self.KEY_PREFIX}:definitions"
+
+    def _cell_key(self, aggregate_id: str, time_bucket: datetime, dims_hash: str) -> str:
+        return f"{self.KEY_PREFIX}:cell:{aggregate_id}:{int(time_bucket.timestamp())}:{dims_hash}"
+
+    def _index_key(self, aggregate_id: str) -> str:
+        return f"{self.KEY_PREFIX}:cells:{aggregate_id}"
+
+    def _version_key(self, aggregate_id: str) -> str:
+        return f"{self.KEY_PREFIX}:version:{aggregate_id}"
+
+    def _sketch_key(self, cell_key: str, metric: str) -> str:
+        return f"{cell_key}:sketch:{metric}"
+
+    def _merge_sketch(self, cell_key: str, metric: str, sketch: Any) -> None:
+        """Merge a sketch into shared state with an optimistic WATCH/MULTI transaction."""
+        import redis
+
+        sketch_key = self._sketch_key(cell_key, metric)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(sketch_key)
+                    raw = pipe.get(sketch_key)
+                    merged = sketch.copy()
+                    if raw:
+                        merged = type(sketch).from_bytes(raw).merge(sketch)
+                    pipe.multi()
+                    pipe.set(sketch_key, merged.to_bytes())
+                    pipe.hset(cell_key, f"sketch:{metric}", sketch.SKETCH_TYPE)
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+    def save_definition(self, definition: Dict[str, Any]) -> None:
+        self.client.hset(
+            self._definitions_key(), definition['id'],
+            json.dumps(definition, default=str)
+        )
+
+    def load_definitions(self, company_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        definitions = [
+            json.loads(raw) for raw in self.client.hvals(self._definitions_key())
+        ]
+        if company_id is not None:
+            definitions = [d for d in definitions if d['company_id'] == company_id]
+        return definitions
+
+    def apply_deltas(self, aggregate_id: str,
+                     deltas: List[Tuple[datetime, Dict[str, Any], PartialAggregate]]) -> None:
+        # Sketches merge first so the version bump below covers them
+        for time_bucket, dimensions, partial in deltas:
+            cell_key = self._cell_key(aggregate_id, time_bucket, dimension_key(dimensions))
+            for metric, sketch in partial.sketches.items():
+                self._merge_sketch(cell_key, metric, sketch)
+
+        pipe = self.client.pipeline(transaction=False)
+        now = int(timezone.now().timestamp())
+
+        for time_bucket, dimensions, partial in deltas:
+            args = [
+                int(time_bucket.timestamp()),
+                json.dumps(dimensions, sort_keys=True, default=str),
+                partial.record_count,
+                now,
+            ]
+            for metric, value in partial.sums.items():
+                args.extend([
+                    metric,
+                    repr(float(value)),
+                    repr(float(partial.mins.get(metric, value))),
+                    repr(float(partial.maxs.get(metric, value))),
+                ])
+
+            keys = [
+                self._cell_key(aggregate_id, time_bucket, dimension_key(dimensions)),
+                self._index_key(aggregate_id),
+                self._version_key(aggregate_id),
+            ]
+            self._apply_delta(keys=keys, args=args, client=pipe)
+
+        pipe.execute()
+
+    def _parse_cell(self, aggregate_id: str, cell_key: str, raw: Dict[bytes, bytes],
+                    sketches: Dict[str, bytes]) -> AggregateCell:
+        partial = PartialAggregate()
+        fields = {key.decode(): value.decode() for key, value in raw.items()}
+
+        partial.record_count = int(fields.get('count', 0))
+        for name, value in fields.items():
+            kind, _, metric = name.partition(':')
+            if kind == 'sum':
+                partial.sums[metric] = float(value)
+            elif kind == 'min':
+                partial.mins[metric] = float(value)
+            elif kind == 'max':
+                partial.maxs[metric] = float(value)
+            elif kind == 'sketch':
+                sketch_class = SKETCH_TYPES.get(value)
+                sketch_data = sketches.get(self._sketch_key(cell_key, metric))
+                if sketch_class and sketch_data:
+                    partial.sketches[metric] = sketch_class.from_bytes(sketch_data)
+
+        bucket = datetime.fromtimestamp(int(fields['bucket']), tz=dt_timezone.utc)
+        return AggregateCell(
+            aggregate_id=aggregate_id,
+            time_bucket=bucket,
+            dimensions=json.loads(fields.get('dims', '{}')),
+            partial=partial,
+            last_updated=datetime.fromtimestamp(int(fields.get('updated', fields['bucket'])), tz=dt_timezone.utc),
+        )
+
+    def read_cells(self, aggregate_id: str, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> List[AggregateCell]:
+        min_score = int(start.timestamp()) if start else '-inf'
+        max_score = int(end.timestamp()) if end else '+inf'
+        cell_keys = self.client.zrangebyscore(self._index_key(aggregate_id), min_score, max_score)
+
+        pipe = self.client.pipeline(transaction=False)
+        for cell_key in cell_keys:
+            pipe.hgetall(cell_key)
+        raw_cells = list(zip([key.decode() for key in cell_keys], pipe.execute()))
+
+        # Fetch sketch payloads referenced by the cells in one round trip
+        sketch_keys = [
+            self._sketch_key(cell_key, hash_field.decode().partition(':')[2])
+            for cell_key, raw in raw_cells
+            for hash_field in raw if hash_field.startswith(b'sketch:')
+        ]
+        sketches = dict(zip(sketch_keys, self.client.mget(sketch_keys))) if sketch_keys else {}
+
+        return [
+            self._parse_cell(aggregate_id, cell_key, raw, sketches)
+            for cell_key, raw in raw_cells if raw
+        ]
+
+    def get_version(self, aggregate_id: str) -> str:
+        version = self.client.get(self._version_key(aggregate_id))
+        return version.decode() if version else '0'
+
+    def get_versions(self, aggregate_ids: List[str]) -> Dict[str, str]:
+        if not aggregate_ids:
+            return {}
+        versions = self.client.mget([self._version_key(aggregate_id) for aggregate_id in aggregate_ids])
+        return {
+            aggregate_id: version.decode() if version else '0'
+            for aggregate_id, version in zip(aggregate_ids, versions)
+        }
+
+    def clear(self, aggregate_id: str) -> None:
+        cell_keys = self.client.zrange(self._index_key(aggregate_id), 0, -1)
+        pipe = self.client.pipeline(transaction=False)
+        for cell_key in cell_keys:
+            for hash_field in self.client.hkeys(cell_key):
+                if hash_field.startswith(b'sketch:'):
+                    pipe.delete(self._sketch_key(cell_key.decode(), hash_field.decode().partition(':')[2]))
+            pipe.delete(cell_key)
+        pipe.delete(self._index_key(aggregate_id))
+        pipe.incr(self._version_key(aggregate_id))
+        pipe.execute()
+
+    def health_check(self) -> bool:
+        try:
+            return bool(self.client.ping())
+        except Exception as e:
+            logger.error(f"Health check failed: {e}")
+            return False
+
+
+class PostgresAggregateStateBackend(AggregateStateBackend):
+    """
+    PostgreSQL-backed aggregate state.
+    One row per (aggregate, bucket, dimensions, metric); deltas accumulate with
+    INSERT ... ON CONFLICT DO UPDATE so concurrent writers never lose updates.
+    The record count is kept on a reserved metric row. Sketches are stored on
+    'sketch:<type>:<metric>' rows and merged under a row lock.
+
+    Every write also increments the aggregate's counter in VERSION_TABLE in
+    the same transaction. The counter row is locked until commit, so versions
+    are visible in commit order, unlike NOW(), which is the transaction start.
+    """
+
+    STATE_TABLE = 'analytics_aggregate_state'
+    DEFINITION_TABLE = 'analytics_aggregate_definition'
+    VERSION_TABLE = 'analytics_aggregate_version'
+    COUNT_METRIC = '__count__'
+    SKETCH_METRIC_PREFIX = 'sketch'
+
+    def save_definition(self, definition: Dict[str, Any]) -> None:
+        from django.db import connection
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {self.DEFINITION_TABLE} (id, company_id, definition, updated_at)
+                VALUES (%s, %s, %s, NOW())
+                ON CONFLICT (id) DO UPDATE SET
+                    definition = EXCLUDED.definition,
+                    updated_at = NOW()
+                """,
+                [definition['id'], definition['company_id'], json.dumps(definition, default=str)]
+            )
+
+    def load_definitions(self, company_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        from django.db import connection
+
+        sql = f"SELECT definition FROM {self.DEFINITION_TABLE}"
+        params = []
+        if company_id is not None:
+            sql += " WHERE company_id = %s"
+            params.append(company_id)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [
+                json.loads(row[0]) if isinstance(row[0], str) else row[0]
+                for row in cursor.fetchall()
+            ]
+
+    def _bump_version(self, cursor, aggregate_id: str) -> None:
+        """Increment the aggregate's version; call last, inside the write's transaction."""
+        cursor.execute(
+            f"""
+            INSERT INTO {self.VERSION_TABLE} AS v (aggregate_id, version)
+            VALUES (%s, 1)
+            ON CONFLICT (aggregate_id) DO UPDATE SET version = v.version + 1
+            """,
+            [aggregate_id]
+        )
+
+    def apply_deltas(self, aggregate_id: str,
+                     deltas: List[Tuple[datetime, Dict[str, Any], PartialAggregate]]) -> None:
+        from django.db import transaction
+
+        with transaction.atomic():
+            self._apply_deltas(aggregate_id, deltas)
+
+    def _apply_deltas(self, aggregate_id: str,
+                      deltas: List[Tuple[datetime, Dict[str, Any], PartialAggregate]]) -> None:
+        from django.db import connection
+
+        rows = []
+        for time_bucket, dimensions, partial in deltas:
+            dims_hash = dimension_key(dimensions)
+            dims_json = json.dumps(dimensions, sort_keys=True, default=str)
+            rows.append([
+                aggregate_id, time_bucket, dims_hash, self.COUNT_METRIC, dims_json,
+                partial.record_count, 0.0, None, None
+            ])
+            for metric, value in partial.sums.items():
+                rows.append([
+                    aggregate_id, time_bucket, dims_hash, metric, dims_json,
+                    partial.record_count, float(value),
+                    float(partial.mins.get(metric, value)),
+                    float(partial.maxs.get(metric, value)),
+                ])
+
+        self._merge_sketches(aggregate_id, deltas)
+
+        if not rows:
+            if deltas:
+                with connection.cursor() as cursor:
+                    self._bump_version(cursor, aggregate_id)
+            return
+
+        placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())'] * len(rows))
+        params = [value for row in rows for value in row]
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {self.STATE_TABLE} AS s (
+                    aggregate_id, time_bucket, dimension_hash, metric, dimensions,
+                    record_count, sum_value, min_value, max_value, updated_at
+                )
+                VALUES {placeholders}
+                ON CONFLICT (aggregate_id, time_bucket, dimension_hash, metric) DO UPDATE SET
+                    record_count = s.record_count + EXCLUDED.record_count,
+                    sum_value = s.sum_value + EXCLUDED.sum_value,
+                    min_value = LEAST(s.min_value, EXCLUDED.min_value),
+                    max_value = GREATEST(s.max_value, EXCLUDED.max_value),
+                    updated_at = NOW()
+                """,
+                params
+            )
+            self._bump_version(cursor, aggregate_id)
+
+    def _merge_sketches(self, aggregate_id: str,
+                        deltas: List[Tuple[datetime, Dict[str, Any], PartialAggregate]]) -> None:
+        """Merge sketches into their rows under SELECT ... FOR UPDATE."""
+        from django.db import connection, transaction
+
+        sketch_rows = [
+            (time_bucket, dimensions, metric, sketch)
+            for time_bucket, dimensions, partial in deltas
+            for metric, sketch in partial.sketches.items()
+        ]
+        if not sketch_rows:
+            return
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                for time_bucket, dimensions, metric, sketch in sketch_rows:
+                    key = [
+                        aggregate_id, time_bucket, dimension_key(dimensions),
+                        f"{self.SKETCH_METRIC_PREFIX}:{sketch.SKETCH_TYPE}:{metric}"
+                    ]
+                    cursor.execute(
+                        f"""
+                        INSERT INTO {self.STATE_TABLE} (
+                            aggregate_id, time_bucket, dimension_hash, metric, dimensions
+                        )
+                        VALUES (%s, %s, %s, %s, %s)
+                        ON CONFLICT (aggregate_id, time_bucket, dimension_hash, metric) DO NOTHING
+                        """,
+                        key + [json.dumps(dimensions, sort_keys=True, default=str)]
+                    )
+                    cursor.execute(
+                        f"""
+                        SELECT sketch FROM {self.STATE_TABLE}
+                        WHERE aggregate_id = %s AND time_bucket = %s
+                          AND dimension_hash = %s AND metric = %s
+                        FOR UPDATE
+                        """,
+                        key
+                    )
+                    existing = cursor.fetchone()[0]
+                    merged = sketch.copy()
+                    if existing:
+                        merged = type(sketch).from_bytes(bytes(existing)).merge(sketch)
+                    cursor.execute(
+                        f"""
+                        UPDATE {self.STATE_TABLE} SET sketch = %s, updated_at = NOW()
+                        WHERE aggregate_id = %s AND time_bucket = %s
+                          AND dimension_hash = %s AND metric = %s
+                        """,
+                        [merged.to_bytes()] + key
+                    )
+
+    def read_cells(self, aggregate_id: str, start: Optional[datetime] = None,
+                   end: Optional[datetime] = None) -> List[AggregateCell]:
+        from django.db import connection
+
+        sql = f"""
+            SELECT time_bucket, dimension_hash, dimensions, metric,
+                   record_count, sum_value, min_value, max_value, sketch, updated_at
+            FROM {self.STATE_TABLE}
+            WHERE aggregate_id = %s
+        """
+        params: List[Any] = [aggregate_id]
+        if start is not None:
+            sql += " AND time_bucket >= %s"
+            params.append(start)
+        if end is not None:
+            sql += " AND time_bucket <= %s"
+            params.append(end)
+
+        cells: Dict[Tuple[datetime, str], AggregateCell] = {}
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            for (time_bucket, dims_hash, dims, metric, record_count,
+                 sum_value, min_value, max_value, sketch, updated_at) in cursor.fetchall():
+                cell = cells.get((time_bucket, dims_hash))
+                if cell is None:
+                    cell = AggregateCell(
+                        aggregate_id=aggregate_id,
+                        time_bucket=time_bucket,
+                        dimensions=json.loads(dims) if isinstance(dims, str) else dims,
+                        partial=PartialAggregate(),
+                        last_updated=updated_at,
+                    )
+                    cells[(time_bucket, dims_hash)] = cell
+
+                if metric == self.COUNT_METRIC:
+                    cell.partial.record_count = int(record_count)
+                elif metric.startswith(f"{self.SKETCH_METRIC_PREFIX}:"):
+                    _, sketch_type, sketch_metric = metric.split(':', 2)
+                    sketch_class = SKETCH_TYPES.get(sketch_type)
+                    if sketch_class and sketch:
+                        cell.partial.sketches[sketch_metric] = sketch_class.from_bytes(bytes(sketch))
+                else:
+                    cell.partial.sums[metric] = float(sum_value)
+                    if min_value is not None:
+                        cell.partial.mins[metric] = float(min_value)
+                    if max_value is not None:
+                        cell.partial.maxs[metric] = float(max_value)
+                if updated_at and (cell.last_updated is None or updated_at > cell.last_updated):
+                    cell.last_updated = updated_at
+
+        return list(cells.values())
+
+    def get_version(self, aggregate_id: str) -> str:
+        from django.db import connection
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT version FROM {self.VERSION_TABLE} WHERE aggregate_id = %s",
+                [aggregate_id]
+            )
+            row = cursor.fetchone()
+        return str(row[0]) if row else '0'
+
+    def get_versions(self, aggregate_ids: List[str]) -> Dict[str, str]:
+        from django.db import connection
+
+        if not aggregate_ids:
+            return {}
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT aggregate_id, version FROM {self.VERSION_TABLE} WHERE aggregate_id = ANY(%s)",
+                [list(aggregate_ids)]
+            )
+            versions = {aggregate_id: str(version) for aggregate_id, version in cursor.fetchall()}
+        return {aggregate_id: versions.get(aggregate_id, '0') for aggregate_id in aggregate_ids}
+
+    def clear(self, aggregate_id: str) -> None:
+        from django.db import connection, transaction
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.STATE_TABLE} WHERE aggregate_id = %s", [aggregate_id])
+            self._bump_version(cursor, aggregate_id)
+
+    def health_check(self) -> bool:
+        from django.db import connection
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT 1 FROM {self.STATE_TABLE} LIMIT 1")
+            return True
+        except Exception as e:
+            logger.error(f"Health check failed: {e}")
+            return False
+
+
+def parse_definition_timestamp(value: Any) -> Optional[datetime]:
+    """Parse a timestamp stored in a serialized aggregate definition."""
+    if value is None or isinstance(value, datetime):
+        return value
+    return parse_datetime(value)
+
+
+def get_aggregate_state_backend(backend_name: Optional[str] = None) -> AggregateStateBackend:
+    """
+    Build the configured aggregate state backend.
+
+    Reads AGGREGATE_STATE_BACKEND ('redis', 'postgres' or 'memory') from
+    settings and falls back to in-memory state if the backend is unavailable.
+    """
+    backend_name = backend_name or getattr(settings, 'AGGREGATE_STATE_BACKEND', 'redis')
+
+    try:
+        if backend_name == 'redis':
+            backend = RedisAggregateStateBackend()
+        elif backend_name == 'postgres':
+            backend = PostgresAggregateStateBackend()
+        else:
+            return InMemoryAggregateStateBackend()
+
+        if backend.health_check():
+            logger.info(f"Using {backend_name} aggregate state backend")
+            return backend
+    except Exception as e:
+        logger.debug(f"Aggregate state backend {backend_name} not available: {e}")
+
+    logger.warning("Shared aggregate state unavailable, using in-memory state")
+    return InMemoryAggregateStateBackend()
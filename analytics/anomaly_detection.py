@@ -19,6 +19,7 @@ import joblib
 import pickle
 from celery import shared_task
 
+from .streaming_anomaly import StreamingAnomalyDetector
 from .models import (
     AnomalyModel, AnomalyDetection, AnomalyAlert, 
     SeasonalPattern, AnomalyMetrics, AnomalyThreshold
@@ -117,6 +118,16 @@ class AnomalyDetectionEngine:
                 'error': str(e)
             }
     
+    def observe(self, series_key: str, value: float, timestamp: Any = None,
+                detection_config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Online mode: score one new point against the series' rolling state.
+        
+        Unlike detect_anomalies, history is never reprocessed; see
+        StreamingAnomalyDetector for the per-series state kept between calls.
+        """
+        return StreamingAnomalyDetector.observe(series_key, value, timestamp, detection_config)
+    
     def train_anomaly_model(self, training_data: List[Dict[str, Any]], 
                           model_config: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -0,0 +1,18 @@
+# analytics/apps.py
+# Analytics App Configuration
+
+from django.apps import AppConfig
+
+class AnalyticsConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'analytics'
+    verbose_name = 'Analytics'
+    
+    def ready(self):
+        # Register incremental facet counter, BM25 index, KPI anomaly,
+        # materialized view and rollup change signals
+        import analytics.facet_counters
+        import analytics.bm25_index
+        import analytics.streaming_anomaly
+        import analytics.materialized_views
+        import analytics.kpi_rollups
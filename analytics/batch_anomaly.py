@@ -0,0 +1,273 @@
+# analytics/batch_anomaly.py
+# Vectorized multi-series anomaly scoring with optional process-parallel model detectors
+
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+from .score_fusion import pad_scores
+
+try:
+    from sklearn.ensemble import IsolationForest
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+try:
+    from statsmodels.tsa.holtwinters import ExponentialSmoothing
+    STATSMODELS_AVAILABLE = True
+except ImportError:
+    STATSMODELS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+# Series are scored as (series, time) matrices. Shorter series are padded
+# with NaN, which every vectorized detector ignores.
+
+def statistical_flags(values: np.ndarray, z_threshold: float = 2.0,
+                      iqr_threshold: float = 1.5) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Z-score and IQR outliers of every series at once.
+
+    Same rules as AnomalyDetectionEngine._statistical_detection, per row.
+
+    Returns:
+        (flags, absolute z-scores), both (series, time)
+    """
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nanmean(values, axis=1, keepdims=True)
+        std = np.nanstd(values, axis=1, keepdims=True)
+        z_scores = np.abs((values - mean) / np.where(std > 0, std, np.nan))
+        q1, q3 = np.nanpercentile(values, [25, 75], axis=1, keepdims=True)
+        iqr = q3 - q1
+        flags = (z_scores > z_threshold) | (values < q1 - iqr_threshold * iqr) | (values > q3 + iqr_threshold * iqr)
+    return flags & ~np.isnan(values), np.nan_to_num(z_scores)
+
+
+def seasonal_flags(values: np.ndarray, period: int = 12,
+                   threshold_multiplier: float = 2.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Deviations from per-phase seasonal means of every series at once.
+
+    Same rules as AnomalyDetectionEngine._seasonal_detection, per row.
+
+    Returns:
+        (flags, seasonal residuals), both (series, time)
+    """
+    n_series, length = values.shape
+    phases = np.arange(length) % period
+    components = np.zeros((n_series, period))
+
+    with np.errstate(invalid='ignore'):
+        for phase in range(min(period, length)):
+            column = values[:, phase::period]
+            counts = (~np.isnan(column)).sum(axis=1)
+            components[:, phase] = np.where(counts > 0, np.nansum(column, axis=1) / np.maximum(counts, 1), 0.0)
+
+        residuals = values - components[:, phases]
+        threshold = threshold_multiplier * np.nanstd(residuals, axis=1, keepdims=True)
+        flags = np.abs(residuals) > threshold
+    return flags & ~np.isnan(values), np.nan_to_num(residuals)
+
+
+def model_flags(values: np.ndarray, time_features: np.ndarray, config: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """
+    Isolation Forest and Holt-Winters flags for one series.
+
+    Runs in a worker process, so it must stay a module-level function.
+    """
+    flags = {}
+    length = len(values)
+
+    if SKLEARN_AVAILABLE and config.get('methods', {}).get('isolation_forest', True):
+        previous = pd.Series(values).expanding()
+        features = np.column_stack([
+            values,
+            np.arange(length),
+            time_features,
+            previous.mean().shift(1).fillna(0).to_numpy(),
+            previous.std(ddof=0).shift(1).fillna(0).to_numpy(),
+        ])
+        model = IsolationForest(contamination=config.get('contamination', 0.1), random_state=42)
+        flags['isolation_forest'] = model.fit(features).predict(features) == -1
+
+    period = config.get('seasonal_period', 12)
+    if (STATSMODELS_AVAILABLE and config.get('methods', {}).get('holt_winters', True)
+            and length >= 2 * period):
+        try:
+            model = ExponentialSmoothing(
+                values, trend='add', seasonal='add', seasonal_periods=period
+            ).fit(
+                smoothing_level=config.get('holt_winters_alpha', 0.3),
+                smoothing_trend=config.get('holt_winters_beta', 0.1),
+                smoothing_seasonal=config.get('holt_winters_gamma', 0.1)
+            )
+            residuals = values - model.fittedvalues
+            threshold = config.get('threshold_multiplier', 2.0) * np.std(residuals)
+            flags['holt_winters'] = np.abs(residuals) > threshold
+        except Exception as e:
+            logger.debug(f"Holt-Winters fit failed: {e}")
+
+    return flags
+
+
+def _model_flags_worker(args: Tuple[np.ndarray, np.ndarray, Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    return model_flags(*args)
+
+
+class BatchAnomalyScorer:
+    """
+    Scores many time series in one pass.
+
+    Series are processed in chunks. Within a chunk the statistical and
+    seasonal detectors run as NumPy operations over a (series, time)
+    matrix, and the model-based detectors (Isolation Forest, Holt-Winters)
+    run per series in this process. With max_workers > 1 they are spread
+    over a process pool instead, except in daemonic processes (such as
+    prefork Celery workers), which cannot start one. Points flagged by at least
+    ``min_votes`` detectors are reported, as in the single-series ensemble.
+    Results are yielded series by series as each chunk completes.
+    """
+
+    MIN_POINTS = 10  # Same minimum as AnomalyDetectionEngine.detect_anomalies
+    CHUNK_SIZE = 500
+    POOL_CHUNK_SIZE = 16
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None, max_workers: Optional[int] = None,
+                 chunk_size: Optional[int] = None):
+        """
+        Args:
+            config: Detection config (same keys as detect_anomalies)
+            max_workers: Processes for model-based detectors (default ANOMALY_BATCH_WORKERS, 1 = in-process)
+            chunk_size: Series per vectorized chunk
+        """
+        self.config = config or {}
+        self.max_workers = max_workers or getattr(settings, 'ANOMALY_BATCH_WORKERS', 1)
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+
+    @property
+    def uses_models(self) -> bool:
+        methods = self.config.get('methods', {})
+        return ((SKLEARN_AVAILABLE and methods.get('isolation_forest', True))
+                or (STATSMODELS_AVAILABLE and methods.get('holt_winters', True)))
+
+    @property
+    def uses_process_pool(self) -> bool:
+        if not self.uses_models or self.max_workers <= 1:
+            return False
+        if multiprocessing.current_process().daemon:
+            logger.warning("Daemonic process cannot start a process pool; scoring model detectors in-process")
+            return False
+        return True
+
+    def score(self, series: Dict[Any, List[Dict[str, Any]]]) -> Iterator[Dict[str, Any]]:
+        """
+        Score series given as {series_key: [{'timestamp': ..., 'value': ...}, ...]}.
+
+        Yields:
+            Per-series results with the anomalies found
+        """
+        executor = None
+        if self.uses_process_pool:
+            executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+        try:
+            items = iter(series.items())
+            while True:
+                chunk = [item for _, item in zip(range(self.chunk_size), items)]
+                if not chunk:
+                    break
+                yield from self._score_chunk(chunk, executor)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def _score_chunk(self, chunk: List[Tuple[Any, List[Dict[str, Any]]]],
+                     executor: Optional[ProcessPoolExecutor]) -> Iterator[Dict[str, Any]]:
+        valid = []
+        for series_key, data in chunk:
+            if len(data) < self.MIN_POINTS:
+                yield {
+                    'series_key': series_key,
+                    'status': 'error',
+                    'error': f'Insufficient data for anomaly detection (minimum {self.MIN_POINTS} data points required)'
+                }
+            else:
+                valid.append((series_key, sorted(data, key=lambda x: x.get('timestamp', ''))))
+        if not valid:
+            return
+
+        config = self.config
+        methods = config.get('methods', {})
+        values = pad_scores([[float(d.get('value', 0)) for d in data] for _, data in valid])
+
+        detector_flags: Dict[str, np.ndarray] = {}
+        z_scores = residuals = None
+        if methods.get('statistical', True):
+            detector_flags['statistical'], z_scores = statistical_flags(
+                values, config.get('z_threshold', 2.0), config.get('iqr_threshold', 1.5)
+            )
+        if methods.get('seasonal', True):
+            detector_flags['seasonal'], residuals = seasonal_flags(
+                values, config.get('seasonal_period', 12), config.get('seasonal_threshold', 2.0)
+            )
+
+        per_series_models = self._run_model_detectors(valid, values, executor)
+        min_votes = config.get('min_votes', 2)
+
+        for row, (series_key, data) in enumerate(valid):
+            length = len(data)
+            row_flags = {name: flags[row, :length] for name, flags in detector_flags.items()}
+            row_flags.update(per_series_models[row])
+            if not row_flags:
+                yield {'series_key': series_key, 'status': 'success', 'anomalies': [], 'anomalies_detected': 0}
+                continue
+
+            names = list(row_flags)
+            stacked = np.vstack([row_flags[name] for name in names])
+            required = min(min_votes, len(names))
+
+            anomalies = []
+            for index in np.flatnonzero(stacked.sum(axis=0) >= required):
+                anomaly = {
+                    'index': int(index),
+                    'timestamp': data[index].get('timestamp'),
+                    'value': data[index].get('value'),
+                    'ensemble_votes': [name for i, name in enumerate(names) if stacked[i, index]],
+                    'method': 'ensemble',
+                }
+                if z_scores is not None:
+                    anomaly['z_score'] = float(z_scores[row, index])
+                if residuals is not None:
+                    anomaly['residual'] = float(residuals[row, index])
+                anomalies.append(anomaly)
+
+            yield {
+                'series_key': series_key,
+                'status': 'success',
+                'anomalies': anomalies,
+                'anomalies_detected': len(anomalies),
+            }
+
+    def _run_model_detectors(self, valid: List[Tuple[Any, List[Dict[str, Any]]]], values: np.ndarray,
+                             executor: Optional[ProcessPoolExecutor]) -> List[Dict[str, np.ndarray]]:
+        """Model-based detector flags per series, fanned out to the process pool if there is one."""
+        if not self.uses_models:
+            return [{} for _ in valid]
+
+        tasks = []
+        for row, (_, data) in enumerate(valid):
+            timestamps = pd.to_datetime([d.get('timestamp') for d in data], errors='coerce')
+            time_features = np.column_stack([
+                timestamps.hour.fillna(0), timestamps.dayofweek.fillna(0), timestamps.month.fillna(0)
+            ])
+            tasks.append((values[row, :len(data)], time_features, self.config))
+
+        if executor is None:
+            return [_model_flags_worker(task) for task in tasks]
+        return list(executor.map(_model_flags_worker, tasks, chunksize=self.POOL_CHUNK_SIZE))
@@ -0,0 +1,525 @@
+# analytics/bm25_index.py
+# Persistent per-tenant BM25 inverted index with MaxScore top-k retrieval
+
+import heapq
+import logging
+import math
+import re
+from abc import ABC, abstractmethod
+from collections import Counter, defaultdict
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from .search_cache import SearchCache
+
+logger = logging.getLogger(__name__)
+
+
+# Model label -> (search entity type, indexed text fields)
+BM25_INDEXED_MODELS = {
+    'crm.Lead': ('lead', ['full_name', 'company_name', 'email', 'title', 'description']),
+    'crm.Account': ('account', ['name', 'industry', 'description']),
+    'crm.Contact': ('contact', ['full_name', 'email', 'title', 'description']),
+    'deals.Deal': ('deal', ['name', 'description']),
+}
+
+TOKEN_PATTERN = re.compile(r'\b\w+\b')
+
+# A posting is (term frequency, document length)
+Posting = Tuple[int, int]
+
+
+def tokenize(text: str) -> List[str]:
+    """Tokenize text for BM25 (same rules as HybridRankingEngine)."""
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+class BM25IndexBackend(ABC):
+    """
+    Abstract base class for inverted index storage.
+
+    Each namespace (tenant and entity type) holds posting lists of
+    term -> {doc_id: (tf, doc_length)}, the term frequencies of every
+    document (for removal) and the document count and total length.
+    """
+
+    @abstractmethod
+    def write_document(self, namespace: str, doc_id: str, term_freqs: Dict[str, int]) -> None:
+        """Add or replace a document's postings."""
+        pass
+
+    @abstractmethod
+    def delete_document(self, namespace: str, doc_id: str) -> None:
+        """Remove a document's postings."""
+        pass
+
+    @abstractmethod
+    def get_stats(self, namespace: str) -> Tuple[int, int]:
+        """Get (document count, total document length)."""
+        pass
+
+    @abstractmethod
+    def get_document_frequencies(self, namespace: str, terms: List[str]) -> Dict[str, int]:
+        """Get the number of documents containing each term."""
+        pass
+
+    @abstractmethod
+    def get_postings(self, namespace: str, term: str) -> Dict[str, Posting]:
+        """Get a term's full posting list."""
+        pass
+
+    @abstractmethod
+    def get_postings_for_documents(self, namespace: str, term: str,
+                                   doc_ids: List[str]) -> Dict[str, Posting]:
+        """Get a term's postings for specific documents only."""
+        pass
+
+    @abstractmethod
+    def clear(self, namespace: str) -> None:
+        """Remove all index data for a namespace."""
+        pass
+
+    def health_check(self) -> bool:
+        """Check if the backend is usable."""
+        return True
+
+
+class InMemoryBM25IndexBackend(BM25IndexBackend):
+    """Process-local inverted index, used for ad-hoc corpora and tests."""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, Dict[str, Posting]]] = defaultdict(lambda: defaultdict(dict))
+        self.documents: Dict[str, Dict[str, Dict[str, int]]] = defaultdict(dict)
+        self.total_length: Dict[str, int] = defaultdict(int)
+
+    def write_document(self, namespace, doc_id, term_freqs):
+        self.delete_document(namespace, doc_id)
+        doc_length = sum(term_freqs.values())
+        postings = self.postings[namespace]
+        for term, tf in term_freqs.items():
+            postings[term][doc_id] = (tf, doc_length)
+        self.documents[namespace][doc_id] = dict(term_freqs)
+        self.total_length[namespace] += doc_length
+
+    def delete_document(self, namespace, doc_id):
+        term_freqs = self.documents[namespace].pop(doc_id, None)
+        if term_freqs is None:
+            return
+        postings = self.postings[namespace]
+        for term in term_freqs:
+            postings[term].pop(doc_id, None)
+            if not postings[term]:
+                del postings[term]
+        self.total_length[namespace] -= sum(term_freqs.values())
+
+    def get_stats(self, namespace):
+        return len(self.documents[namespace]), self.total_length[namespace]
+
+    def get_document_frequencies(self, namespace, terms):
+        postings = self.postings[namespace]
+        return {term: len(postings[term]) if term in postings else 0 for term in terms}
+
+    def get_postings(self, namespace, term):
+        return dict(self.postings[namespace].get(term, {}))
+
+    def get_postings_for_documents(self, namespace, term, doc_ids):
+        postings = self.postings[namespace].get(term, {})
+        return {doc_id: postings[doc_id] for doc_id in doc_ids if doc_id in postings}
+
+    def clear(self, namespace):
+        self.postings.pop(namespace, None)
+        self.documents.pop(namespace, None)
+        self.total_length.pop(namespace, None)
+
+
+class RedisBM25IndexBackend(BM25IndexBackend):
+    """
+    Redis inverted index shared by all workers.
+
+    Posting lists are hashes of doc_id -> "tf:doc_length"; document term
+    frequencies are kept per document so re-indexing removes stale postings.
+    Updates run in a WATCH/MULTI transaction on the document key.
+    """
+
+    KEY_PREFIX = 'bm25:index:v1'
+
+    def __init__(self, redis_url: Optional[str] = None):
+        """
+        Initialize Redis index backend.
+
+        Args:
+            redis_url: Redis connection URL (default: BM25_INDEX_REDIS_URL
+                or the default cache location)
+        """
+        import redis
+
+        redis_url = redis_url or getattr(
+            settings, 'BM25_INDEX_REDIS_URL',
+            settings.CACHES['default']['LOCATION']
+        )
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    def _postings_key(self, namespace: str, term: str) -> str:
+        return f"{self.KEY_PREFIX}:{namespace}:postings:{term}"
+
+    def _document_key(self, namespace: str, doc_id: str) -> str:
+        return f"{self.KEY_PREFIX}:{namespace}:doc:{doc_id}"
+
+    def _documents_key(self, namespace: str) -> str:
+        return f"{self.KEY_PREFIX}:{namespace}:docs"
+
+    def _stats_key(self, namespace: str) -> str:
+        return f"{self.KEY_PREFIX}:{namespace}:stats"
+
+    @staticmethod
+    def _parse_posting(raw: str) -> Posting:
+        tf, doc_length = raw.split(':')
+        return int(tf), int(doc_length)
+
+    def _replace_document(self, namespace: str, doc_id: str,
+                          term_freqs: Optional[Dict[str, int]]) -> None:
+        import redis
+
+        document_key = self._document_key(namespace, doc_id)
+        stats_key = self._stats_key(namespace)
+
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(document_key)
+                    old_freqs = {term: int(tf) for term, tf in pipe.hgetall(document_key).items()}
+                    length_delta = -sum(old_freqs.values())
+
+                    pipe.multi()
+                    for term in old_freqs:
+                        pipe.hdel(self._postings_key(namespace, term), doc_id)
+                    pipe.delete(document_key)
+
+                    if term_freqs:
+                        doc_length = sum(term_freqs.values())
+                        length_delta += doc_length
+                        for term, tf in term_freqs.items():
+                            pipe.hset(self._postings_key(namespace, term), doc_id, f"{tf}:{doc_length}")
+                        pipe.hset(document_key, mapping=term_freqs)
+                        pipe.sadd(self._documents_key(namespace), doc_id)
+                    else:
+                        pipe.srem(self._documents_key(namespace), doc_id)
+
+                    pipe.hincrby(stats_key, 'total_length', length_delta)
+                    pipe.execute()
+                    return
+                except redis.WatchError:
+                    continue
+
+    def write_document(self, namespace, doc_id, term_freqs):
+        self._replace_document(namespace, doc_id, term_freqs)
+
+    def delete_document(self, namespace, doc_id):
+        self._replace_document(namespace, doc_id, None)
+
+    def get_stats(self, namespace):
+        with self.client.pipeline(transaction=False) as pipe:
+            pipe.scard(self._documents_key(namespace))
+            pipe.hget(self._stats_key(namespace), 'total_length')
+            doc_count, total_length = pipe.execute()
+        return int(doc_count), int(total_length or 0)
+
+    def get_document_frequencies(self, namespace, terms):
+        with self.client.pipeline(transaction=False) as pipe:
+            for term in terms:
+                pipe.hlen(self._postings_key(namespace, term))
+            return dict(zip(terms, pipe.execute()))
+
+    def get_postings(self, namespace, term):
+        raw = self.client.hgetall(self._postings_key(namespace, term))
+        return {doc_id: self._parse_posting(value) for doc_id, value in raw.items()}
+
+    def get_postings_for_documents(self, namespace, term, doc_ids):
+        if not doc_ids:
+            return {}
+        values = self.client.hmget(self._postings_key(namespace, term), doc_ids)
+        return {
+            doc_id: self._parse_posting(value)
+            for doc_id, value in zip(doc_ids, values) if value is not None
+        }
+
+    def clear(self, namespace):
+        keys = list(self.client.scan_iter(match=f"{self.KEY_PREFIX}:{namespace}:*", count=1000))
+        for start in range(0, len(keys), 1000):
+            self.client.delete(*keys[start:start + 1000])
+
+    def health_check(self) -> bool:
+        try:
+            return bool(self.client.ping())
+        except Exception as e:
+            logger.error(f"BM25 index Redis health check failed: {e}")
+            return False
+
+
+_backend: Optional[BM25IndexBackend] = None
+
+
+def get_bm25_index_backend() -> BM25IndexBackend:
+    """
+    Get the process-wide inverted index backend.
+
+    Reads BM25_INDEX_BACKEND ('redis' or 'memory') from settings and falls
+    back to an in-memory index if Redis is unavailable.
+    """
+    global _backend
+    if _backend is not None:
+        return _backend
+
+    backend_name = getattr(settings, 'BM25_INDEX_BACKEND', 'redis')
+    if backend_name == 'redis':
+        try:
+            backend = RedisBM25IndexBackend()
+            if backend.health_check():
+                _backend = backend
+                return _backend
+        except Exception as e:
+            logger.debug(f"Redis BM25 index not available: {e}")
+        logger.warning("Shared BM25 index unavailable, using in-memory index")
+
+    _backend = InMemoryBM25IndexBackend()
+    return _backend
+
+
+class BM25Index:
+    """
+    BM25 inverted index for one tenant and entity type.
+
+    Documents are tokenized once when indexed. Queries read only the posting
+    lists of their terms and use MaxScore pruning: lists are visited in
+    decreasing order of their maximum possible contribution, and once the
+    remaining lists cannot lift a new document above the current top-k
+    threshold they are not read at all.
+    """
+
+    DEFAULT_K1 = 1.2
+    DEFAULT_B = 0.75
+
+    def __init__(self, namespace: str, backend: Optional[BM25IndexBackend] = None,
+                 k1: float = DEFAULT_K1, b: float = DEFAULT_B):
+        """
+        Initialize index.
+
+        Args:
+            namespace: Index namespace (e.g. "<company_id>:lead")
+            backend: Storage backend (default: configured shared backend)
+            k1: BM25 term frequency saturation
+            b: BM25 length normalization
+        """
+        self.namespace = namespace
+        self.backend = backend or get_bm25_index_backend()
+        self.k1 = k1
+        self.b = b
+
+    @classmethod
+    def for_tenant(cls, company_id: Any, entity_type: str, **kwargs) -> 'BM25Index':
+        """Get the shared index for a tenant's entity type."""
+        return cls(f"{company_id}:{entity_type}", **kwargs)
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Tuple[str, str]], **kwargs) -> 'BM25Index':
+        """Build a throwaway in-memory index from (doc_id, text) pairs."""
+        index = cls('adhoc', backend=InMemoryBM25IndexBackend(), **kwargs)
+        for doc_id, text in documents:
+            index.add_document(doc_id, text)
+        return index
+
+    def add_document(self, doc_id: Any, text: str) -> None:
+        """Index (or re-index) a document."""
+        term_freqs = Counter(tokenize(text))
+        if term_freqs:
+            self.backend.write_document(self.namespace, str(doc_id), dict(term_freqs))
+        else:
+            self.backend.delete_document(self.namespace, str(doc_id))
+
+    def remove_document(self, doc_id: Any) -> None:
+        """Remove a document from the index."""
+        self.backend.delete_document(self.namespace, str(doc_id))
+
+    def clear(self) -> None:
+        """Remove every document from the index."""
+        self.backend.clear(self.namespace)
+
+    def _idf(self, doc_count: int, df: int) -> float:
+        # Non-negative BM25 IDF, required for MaxScore upper bounds
+        return math.log(1 + (doc_count - df + 0.5) / (df + 0.5))
+
+    def _term_score(self, idf: float, posting: Posting, avg_length: float) -> float:
+        tf, doc_length = posting
+        denominator = tf + self.k1 * (1 - self.b + self.b * (doc_length / avg_length))
+        return idf * tf * (self.k1 + 1) / denominator
+
+    def _query_weights(self, query: str) -> Tuple[Dict[str, float], float]:
+        """Per-term weights (query tf x IDF) and the average document length."""
+        query_terms = Counter(tokenize(query))
+        doc_count, total_length = self.backend.get_stats(self.namespace)
+        if not query_terms or not doc_count:
+            return {}, 0.0
+
+        dfs = self.backend.get_document_frequencies(self.namespace, list(query_terms))
+        weights = {
+            term: qtf * self._idf(doc_count, dfs[term])
+            for term, qtf in query_terms.items() if dfs.get(term)
+        }
+        return weights, total_length / doc_count
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Top-k BM25 retrieval with MaxScore pruning.
+
+        Args:
+            query: Query text
+            k: Number of results
+
+        Returns:
+            (doc_id, score) pairs, best first
+        """
+        weights, avg_length = self._query_weights(query)
+        if not weights or k <= 0:
+            return []
+
+        # Upper bound of each term's contribution: tf saturation tends to k1 + 1
+        terms = sorted(weights, key=weights.get, reverse=True)
+        upper_bounds = [weights[term] * (self.k1 + 1) for term in terms]
+        remaining_bounds = [sum(upper_bounds[i:]) for i in range(len(terms))] + [0.0]
+
+        top_k: List[Tuple[float, str]] = []
+        seen = set()
+
+        for i, term in enumerate(terms):
+            threshold = top_k[0][0] if len(top_k) >= k else None
+            # Unseen documents only contain terms i.., so cannot beat the threshold
+            if threshold is not None and remaining_bounds[i] <= threshold:
+                break
+
+            postings = self.backend.get_postings(self.namespace, term)
+            candidates = {
+                doc_id: self._term_score(weights[term], posting, avg_length)
+                for doc_id, posting in postings.items() if doc_id not in seen
+            }
+            seen.update(candidates)
+
+            for j in range(i + 1, len(terms)):
+                if threshold is not None:
+                    candidates = {
+                        doc_id: score for doc_id, score in candidates.items()
+                        if score + remaining_bounds[j] > threshold
+                    }
+                if not candidates:
+                    break
+                other = self.backend.get_postings_for_documents(
+                    self.namespace, terms[j], list(candidates)
+                )
+                for doc_id, posting in other.items():
+                    candidates[doc_id] += self._term_score(weights[terms[j]], posting, avg_length)
+
+            for doc_id, score in candidates.items():
+                if len(top_k) < k:
+                    heapq.heappush(top_k, (score, doc_id))
+                elif score > top_k[0][0]:
+                    heapq.heapreplace(top_k, (score, doc_id))
+
+        return [(doc_id, score) for score, doc_id in sorted(top_k, reverse=True)]
+
+    def score_documents(self, query: str, doc_ids: List[Any]) -> List[float]:
+        """
+        BM25 scores for specific documents, reading only their postings.
+
+        Returns:
+            Scores in doc_ids order (0.0 for documents without query terms)
+        """
+        weights, avg_length = self._query_weights(query)
+        keys = [str(doc_id) for doc_id in doc_ids]
+        scores = dict.fromkeys(keys, 0.0)
+
+        for term, weight in weights.items():
+            postings = self.backend.get_postings_for_documents(self.namespace, term, keys)
+            for doc_id, posting in postings.items():
+                scores[doc_id] += self._term_score(weight, posting, avg_length)
+
+        return [scores[key] for key in keys]
+
+
+def get_document_text(instance, fields: List[str]) -> str:
+    """Concatenate an instance's indexed text fields."""
+    return ' '.join(str(getattr(instance, field, '') or '') for field in fields)
+
+
+def rebuild_tenant_index(model_label: str, company_id: Any, chunk_size: int = 2000) -> int:
+    """
+    Rebuild a tenant's index for one model from the database.
+
+    Returns:
+        Number of documents indexed
+    """
+    entity_type, fields = BM25_INDEXED_MODELS[model_label]
+    model_class = apps.get_model(model_label)
+    index = BM25Index.for_tenant(company_id, entity_type)
+    index.clear()
+
+    indexed = 0
+    queryset = model_class.objects.filter(company_id=company_id).only('pk', *fields)
+    for instance in queryset.iterator(chunk_size=chunk_size):
+        index.add_document(instance.pk, get_document_text(instance, fields))
+        indexed += 1
+
+    SearchCache.bump_index_version(company_id)
+    logger.info(f"Rebuilt BM25 index {company_id}:{entity_type} with {indexed} documents")
+    return indexed
+
+
+# Signal handlers for incremental index maintenance
+def index_document_on_save(sender, instance, raw=False, **kwargs):
+    """Re-index a record's text after it is saved."""
+    if raw or not getattr(instance, 'company_id', None):
+        return
+    entity_type, fields = BM25_INDEXED_MODELS[sender._meta.label]
+    company_id = instance.company_id
+    index = BM25Index.for_tenant(company_id, entity_type)
+    doc_id, text = instance.pk, get_document_text(instance, fields)
+
+    def apply():
+        try:
+            index.add_document(doc_id, text)
+            SearchCache.bump_index_version(company_id)
+        except Exception as e:
+            logger.error(f"Error indexing {entity_type} {doc_id}: {e}")
+
+    transaction.on_commit(apply)
+
+
+def remove_document_on_delete(sender, instance, **kwargs):
+    """Remove a deleted record from the index."""
+    if not getattr(instance, 'company_id', None):
+        return
+    entity_type, _ = BM25_INDEXED_MODELS[sender._meta.label]
+    company_id = instance.company_id
+    index = BM25Index.for_tenant(company_id, entity_type)
+    doc_id = instance.pk
+
+    def apply():
+        try:
+            index.remove_document(doc_id)
+            SearchCache.bump_index_version(company_id)
+        except Exception as e:
+            logger.error(f"Error removing {entity_type} {doc_id} from index: {e}")
+
+    transaction.on_commit(apply)
+
+
+for _model_label in BM25_INDEXED_MODELS:
+    post_save.connect(
+        index_document_on_save, sender=_model_label,
+        dispatch_uid=f'bm25_index_save_{_model_label}'
+    )
+    post_delete.connect(
+        remove_document_on_delete, sender=_model_label,
+        dispatch_uid=f'bm25_index_delete_{_model_label}'
+    )
@@ -0,0 +1,533 @@
+# analytics/facet_counters.py
+# Incrementally maintained per-tenant search facet counters
+
+import json
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+from django.db.models.signals import post_init, post_save, post_delete
+from django.utils import timezone
+
+from analytics.search_optimization import FacetConfig
+
+logger = logging.getLogger(__name__)
+
+
+# Search entity type -> model label
+FACET_ENTITY_MODELS = {
+    'lead': 'crm.Lead',
+    'deal': 'deals.Deal',
+    'account': 'crm.Account',
+    'contact': 'crm.Contact',
+}
+
+DATE_TRUNCATIONS = {
+    'month': TruncMonth,
+    'week': TruncWeek,
+    'day': TruncDay,
+}
+
+SNAPSHOT_ATTR = '_facet_snapshot'
+
+
+def encode_term(value: Any) -> str:
+    """Encode a terms facet value as a counter field name."""
+    return json.dumps(value, default=str)
+
+
+def decode_term(key: str) -> Any:
+    """Decode a counter field name back into a terms facet value."""
+    return json.loads(key)
+
+
+def range_bucket_key(from_val: Any, to_val: Any) -> str:
+    """Bucket key for a range facet, matching FacetPrecomputer output."""
+    return f'{from_val}-{to_val}' if to_val else f'{from_val}+'
+
+
+def truncate_date(value: date, interval: str) -> date:
+    """Truncate a date or timestamp the way TruncMonth/TruncWeek/TruncDay do."""
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value, timezone.get_default_timezone())
+        value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if interval == 'month':
+        return value.replace(day=1)
+    if interval == 'week':
+        return value - timedelta(days=value.weekday())
+    return value
+
+
+def facet_bucket_keys(facet_config: Dict[str, Any], value: Any) -> List[str]:
+    """
+    Counter buckets a field value falls into.
+
+    Args:
+        facet_config: Facet configuration
+        value: Field value
+
+    Returns:
+        Bucket keys to count the value under (ranges may match several)
+    """
+    facet_type = facet_config.get('type', 'terms')
+
+    if facet_type == 'terms':
+        return [encode_term(value)]
+
+    if facet_type == 'range':
+        if value is None:
+            return []
+        keys = []
+        for from_val, to_val in facet_config.get('ranges', []):
+            if from_val is not None and value < from_val:
+                continue
+            if to_val is not None and value >= to_val:
+                continue
+            keys.append(range_bucket_key(from_val, to_val))
+        return keys
+
+    if facet_type == 'date_histogram':
+        if value is None:
+            return [encode_term(None)]
+        return [encode_term(truncate_date(value, facet_config.get('interval', 'month')).isoformat())]
+
+    return []
+
+
+class FacetCounterBackend(ABC):
+    """Abstract base class for facet counter storage."""
+
+    @abstractmethod
+    def apply_deltas(self, company_id: str, entity_type: str,
+                     deltas: Dict[str, Dict[str, int]], total_delta: int) -> None:
+        """Atomically add per-bucket count deltas for one tenant and entity."""
+        pass
+
+    @abstractmethod
+    def replace(self, company_id: str, entity_type: str,
+                counts: Dict[str, Dict[str, int]], total: int) -> None:
+        """Replace all counters for one tenant and entity (reconciliation)."""
+        pass
+
+    @abstractmethod
+    def get_counts(self, company_id: str, entity_type: str, facet_name: str) -> Dict[str, int]:
+        """Get bucket counts for one facet."""
+        pass
+
+    @abstractmethod
+    def get_meta(self, company_id: str, entity_type: str) -> Optional[Dict[str, Any]]:
+        """Get total and reconciliation time, or None if never reconciled."""
+        pass
+
+    def health_check(self) -> bool:
+        """Check if the backend is usable."""
+        return True
+
+
+class InMemoryFacetCounterBackend(FacetCounterBackend):
+    """Process-local facet counters for development and tests."""
+
+    def __init__(self):
+        self.counts: Dict[Tuple[str, str, str], Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.meta: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+    def apply_deltas(self, company_id, entity_type, deltas, total_delta):
+        for facet_name, buckets in deltas.items():
+            counts = self.counts[(company_id, entity_type, facet_name)]
+            for key, delta in buckets.items():
+                counts[key] += delta
+        meta = self.meta.get((company_id, entity_type))
+        if meta is not None:
+            meta['total'] += total_delta
+
+    def replace(self, company_id, entity_type, counts, total):
+        for facet_name, buckets in counts.items():
+            self.counts[(company_id, entity_type, facet_name)] = defaultdict(int, buckets)
+        self.meta[(company_id, entity_type)] = {
+            'total': total,
+            'reconciled_at': timezone.now().isoformat(),
+        }
+
+    def get_counts(self, company_id, entity_type, facet_name):
+        return dict(self.counts.get((company_id, entity_type, facet_name), {}))
+
+    def get_meta(self, company_id, entity_type):
+        meta = self.meta.get((company_id, entity_type))
+        return dict(meta) if meta is not None else None
+
+
+class RedisFacetCounterBackend(FacetCounterBackend):
+    """
+    Redis facet counters shared by all workers.
+
+    One hash per (tenant, entity, facet) holds bucket -> count, updated with
+    HINCRBY inside a MULTI transaction; a meta hash holds the record total
+    and the last reconciliation time.
+    """
+
+    KEY_PREFIX = 'facets:counters:v1'
+
+    def __init__(self, redis_url: Optional[str] = None):
+        """
+        Initialize Redis facet counter backend.
+
+        Args:
+            redis_url: Redis connection URL (default: FACET_COUNTER_REDIS_URL
+                or the default cache location)
+        """
+        import redis
+
+        redis_url = redis_url or getattr(
+            settings, 'FACET_COUNTER_REDIS_URL',
+            settings.CACHES['default']['LOCATION']
+        )
+        self.client = redis.Redis.from_url(redis_url, decode_responses=True)
+
+    def _facet_key(self, company_id: str, entity_type: str, facet_name: str) -> str:
+        return f"{self.KEY_PREFIX}:{company_id}:{entity_type}:facet:{facet_name}"
+
+    def _meta_key(self, company_id: str, entity_type: str) -> str:
+        return f"{self.KEY_PREFIX}:{company_id}:{entity_type}:meta"
+
+    def apply_deltas(self, company_id, entity_type, deltas, total_delta):
+        with self.client.pipeline(transaction=True) as pipe:
+            for facet_name, buckets in deltas.items():
+                facet_key = self._facet_key(company_id, entity_type, facet_name)
+                for key, delta in buckets.items():
+                    if delta:
+                        pipe.hincrby(facet_key, key, delta)
+            if total_delta:
+                pipe.hincrby(self._meta_key(company_id, entity_type), 'total', total_delta)
+            pipe.execute()
+
+    def replace(self, company_id, entity_type, counts, total):
+        with self.client.pipeline(transaction=True) as pipe:
+            for facet_name, buckets in counts.items():
+                facet_key = self._facet_key(company_id, entity_type, facet_name)
+                pipe.delete(facet_key)
+                if buckets:
+                    pipe.hset(facet_key, mapping=buckets)
+            pipe.hset(self._meta_key(company_id, entity_type), mapping={
+                'total': total,
+                'reconciled_at': timezone.now().isoformat(),
+            })
+            pipe.execute()
+
+    def get_counts(self, company_id, entity_type, facet_name):
+        raw = self.client.hgetall(self._facet_key(company_id, entity_type, facet_name))
+        return {key: int(value) for key, value in raw.items()}
+
+    def get_meta(self, company_id, entity_type):
+        meta = self.client.hgetall(self._meta_key(company_id, entity_type))
+        if 'reconciled_at' not in meta:
+            return None
+        return {'total': int(meta.get('total', 0)), 'reconciled_at': meta['reconciled_at']}
+
+    def health_check(self) -> bool:
+        try:
+            return bool(self.client.ping())
+        except Exception as e:
+            logger.error(f"Facet counter Redis health check failed: {e}")
+            return False
+
+
+_backend: Optional[FacetCounterBackend] = None
+
+
+def get_facet_counter_backend() -> FacetCounterBackend:
+    """
+    Get the process-wide facet counter backend.
+
+    Reads FACET_COUNTER_BACKEND ('redis' or 'memory') from settings and falls
+    back to in-memory counters if Redis is unavailable.
+    """
+    global _backend
+    if _backend is not None:
+        return _backend
+
+    backend_name = getattr(settings, 'FACET_COUNTER_BACKEND', 'redis')
+    if backend_name == 'redis':
+        try:
+            backend = RedisFacetCounterBackend()
+            if backend.health_check():
+                _backend = backend
+                return _backend
+        except Exception as e:
+            logger.debug(f"Redis facet counters not available: {e}")
+        logger.warning("Shared facet counters unavailable, using in-memory counters")
+
+    _backend = InMemoryFacetCounterBackend()
+    return _backend
+
+
+class FacetCounterMaintainer:
+    """
+    Maintains facet counters from model changes and reconciliation scans.
+
+    Saves move a record from its old bucket (-1) to its new one (+1) for each
+    facet; creates and deletes adjust counts and the tenant total. Changes
+    that bypass signals (bulk_create, queryset.update) are corrected by the
+    periodic reconcile() scan.
+    """
+
+    _facet_fields: Dict[str, Dict[str, Tuple[str, Dict[str, Any]]]] = {}
+
+    @classmethod
+    def get_facet_fields(cls, entity_type: str) -> Dict[str, Tuple[str, Dict[str, Any]]]:
+        """
+        Facets that map onto a concrete field of the entity's model.
+
+        Returns:
+            Mapping of facet name -> (field attname, facet config)
+        """
+        if entity_type not in cls._facet_fields:
+            model_class = apps.get_model(FACET_ENTITY_MODELS[entity_type])
+            fields = {}
+            for field in model_class._meta.concrete_fields:
+                fields[field.name] = field.attname
+                fields[field.attname] = field.attname
+
+            all_facets = {**FacetConfig.COMMON_FACETS, **FacetConfig.ENTITY_FACETS.get(entity_type, {})}
+            cls._facet_fields[entity_type] = {
+                facet_name: (fields[config.get('field', facet_name)], config)
+                for facet_name, config in all_facets.items()
+                if config.get('field', facet_name) in fields
+            }
+        return cls._facet_fields[entity_type]
+
+    @classmethod
+    def snapshot(cls, entity_type: str, instance) -> Dict[str, Any]:
+        """Current facet field values of an instance (deferred fields excluded)."""
+        values = instance.__dict__
+        return {
+            attname: values[attname]
+            for attname, _ in cls.get_facet_fields(entity_type).values()
+            if attname in values
+        }
+
+    @classmethod
+    def compute_deltas(cls, entity_type: str, old_values: Optional[Dict[str, Any]],
+                       new_values: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, int]]:
+        """
+        Bucket count deltas for a record moving from old to new values.
+
+        Args:
+            entity_type: Search entity type
+            old_values: Facet field values before the change (None on create)
+            new_values: Facet field values after the change (None on delete)
+
+        Returns:
+            Mapping of facet name -> {bucket key: delta}
+        """
+        deltas: Dict[str, Dict[str, int]] = {}
+
+        for facet_name, (attname, config) in cls.get_facet_fields(entity_type).items():
+            buckets: Dict[str, int] = defaultdict(int)
+
+            if old_values is not None:
+                if attname not in old_values:
+                    # Deferred at load time; left for reconciliation
+                    continue
+                for key in facet_bucket_keys(config, old_values[attname]):
+                    buckets[key] -= 1
+            if new_values is not None and attname in new_values:
+                for key in facet_bucket_keys(config, new_values[attname]):
+                    buckets[key] += 1
+
+            buckets = {key: delta for key, delta in buckets.items() if delta}
+            if buckets:
+                deltas[facet_name] = buckets
+
+        return deltas
+
+    @classmethod
+    def record_change(cls, entity_type: str, company_id: Any,
+                      old_values: Optional[Dict[str, Any]],
+                      new_values: Optional[Dict[str, Any]]) -> None:
+        """Apply a record change to the counters once the transaction commits."""
+        if not company_id:
+            return
+
+        deltas = cls.compute_deltas(entity_type, old_values, new_values)
+        total_delta = (new_values is not None) - (old_values is not None)
+        if not deltas and not total_delta:
+            return
+
+        def apply():
+            try:
+                get_facet_counter_backend().apply_deltas(str(company_id), entity_type, deltas, total_delta)
+            except Exception as e:
+                logger.error(f"Error updating facet counters for {entity_type}: {e}")
+
+        transaction.on_commit(apply)
+
+    @classmethod
+    def reconcile(cls, entity_type: str, company_id: Any) -> Dict[str, Any]:
+        """
+        Rebuild a tenant's counters for one entity from the database.
+
+        Args:
+            entity_type: Search entity type
+            company_id: Company UUID
+
+        Returns:
+            Reconciliation summary
+        """
+        model_class = apps.get_model(FACET_ENTITY_MODELS[entity_type])
+        queryset = model_class.objects.filter(company_id=company_id).order_by()
+        tzinfo = timezone.get_default_timezone()
+
+        counts: Dict[str, Dict[str, int]] = {}
+        for facet_name, (attname, config) in cls.get_facet_fields(entity_type).items():
+            facet_type = config.get('type', 'terms')
+
+            if facet_type == 'terms':
+                rows = queryset.values(attname).annotate(count=Count('pk'))
+                counts[facet_name] = {encode_term(row[attname]): row['count'] for row in rows}
+
+            elif facet_type == 'range':
+                # All ranges in one conditional aggregate
+                ranges = {
+                    range_bucket_key(from_val, to_val): Count('pk', filter=Q(
+                        **({f'{attname}__gte': from_val} if from_val is not None else {}),
+                        **({f'{attname}__lt': to_val} if to_val is not None else {}),
+                    ))
+                    for from_val, to_val in config.get('ranges', [])
+                }
+                values = queryset.aggregate(**{f'r{i}': agg for i, agg in enumerate(ranges.values())})
+                counts[facet_name] = {
+                    key: values[f'r{i}'] for i, key in enumerate(ranges) if values[f'r{i}']
+                }
+
+            elif facet_type == 'date_histogram':
+                trunc_func = DATE_TRUNCATIONS.get(config.get('interval', 'month'), TruncDay)
+                rows = (
+                    queryset.annotate(period=trunc_func(attname, tzinfo=tzinfo))
+                    .values('period')
+                    .annotate(count=Count('pk'))
+                )
+                counts[facet_name] = {
+                    encode_term(row['period'].isoformat() if row['period'] else None): row['count']
+                    for row in rows
+                }
+
+        total = queryset.count()
+        get_facet_counter_backend().replace(str(company_id), entity_type, counts, total)
+
+        logger.info(f"Reconciled facet counters for {entity_type} ({company_id}): {total} records")
+        return {'entity': entity_type, 'company_id': str(company_id), 'total': total}
+
+    @classmethod
+    def get_facet(cls, entity_type: str, facet_name: str,
+                  company_id: Any) -> Optional[Dict[str, Any]]:
+        """
+        Build a facet result from the counters.
+
+        Returns:
+            Facet result in FacetPrecomputer format, or None if the tenant's
+            counters have not been reconciled yet or the facet is not counted
+        """
+        facet = cls.get_facet_fields(entity_type).get(facet_name)
+        if facet is None or not company_id:
+            return None
+
+        backend = get_facet_counter_backend()
+        meta = backend.get_meta(str(company_id), entity_type)
+        if meta is None:
+            return None
+
+        _, config = facet
+        field_name = config.get('field', facet_name)
+        counts = backend.get_counts(str(company_id), entity_type, facet_name)
+        facet_type = config.get('type', 'terms')
+
+        if facet_type == 'range':
+            buckets = []
+            for from_val, to_val in config.get('ranges', []):
+                key = range_bucket_key(from_val, to_val)
+                buckets.append({
+                    'key': key,
+                    'from': from_val,
+                    'to': to_val,
+                    'doc_count': max(counts.get(key, 0), 0),
+                })
+            result = {'type': 'range', 'field': field_name, 'buckets': buckets}
+        else:
+            buckets = [
+                {'key': decode_term(key), 'doc_count': count}
+                for key, count in counts.items() if count > 0
+            ]
+            if facet_type == 'date_histogram':
+                buckets.sort(key=lambda bucket: (bucket['key'] is None, bucket['key'] or ''))
+                result = {
+                    'type': 'date_histogram',
+                    'field': field_name,
+                    'interval': config.get('interval', 'month'),
+                    'buckets': buckets,
+                }
+            else:
+                buckets.sort(key=lambda bucket: -bucket['doc_count'])
+                result = {'type': 'terms', 'field': field_name, 'buckets': buckets[:config.get('size', 50)]}
+
+        result['_meta'] = {
+            'entity_type': entity_type,
+            'facet_name': facet_name,
+            'source': 'counters',
+            'reconciled_at': meta['reconciled_at'],
+            'total_records': max(meta['total'], 0),
+        }
+        return result
+
+
+# Signal handlers for incremental facet maintenance
+ENTITY_TYPES_BY_MODEL = {label: entity_type for entity_type, label in FACET_ENTITY_MODELS.items()}
+
+
+def snapshot_facet_values(sender, instance, **kwargs):
+    """Remember facet field values as loaded, to diff against on save."""
+    entity_type = ENTITY_TYPES_BY_MODEL[sender._meta.label]
+    setattr(instance, SNAPSHOT_ATTR, FacetCounterMaintainer.snapshot(entity_type, instance))
+
+
+def update_facet_counters_on_save(sender, instance, created, raw=False, **kwargs):
+    """Move the record between facet buckets when it is saved."""
+    if raw:
+        return
+    entity_type = ENTITY_TYPES_BY_MODEL[sender._meta.label]
+    new_values = FacetCounterMaintainer.snapshot(entity_type, instance)
+    old_values = None if created else getattr(instance, SNAPSHOT_ATTR, None)
+
+    if created or old_values is not None:
+        FacetCounterMaintainer.record_change(entity_type, instance.company_id, old_values, new_values)
+    setattr(instance, SNAPSHOT_ATTR, new_values)
+
+
+def update_facet_counters_on_delete(sender, instance, **kwargs):
+    """Remove the record from its facet buckets when it is deleted."""
+    entity_type = ENTITY_TYPES_BY_MODEL[sender._meta.label]
+    old_values = getattr(instance, SNAPSHOT_ATTR, None)
+    if old_values is None:
+        old_values = FacetCounterMaintainer.snapshot(entity_type, instance)
+    FacetCounterMaintainer.record_change(entity_type, instance.company_id, old_values, None)
+
+
+for _model_label in FACET_ENTITY_MODELS.values():
+    post_init.connect(
+        snapshot_facet_values, sender=_model_label,
+        dispatch_uid=f'facet_counters_init_{_model_label}'
+    )
+    post_save.connect(
+        update_facet_counters_on_save, sender=_model_label,
+        dispatch_uid=f'facet_counters_save_{_model_label}'
+    )
+    post_delete.connect(
+        update_facet_counters_on_delete, sender=_model_label,
+        dispatch_uid=f'facet_counters_delete_{_model_label}'
+    )
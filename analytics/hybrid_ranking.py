@@ -14,10 +14,10 @@ from django.core.cache import cache
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 import re
-from collections import Counter
-import math
 from celery import shared_task
 
+from . import score_fusion
+from .bm25_index import BM25Index, tokenize
 from .models import (
     HybridRankingModel, RankingExperiment, A/BTestResult,
     SearchQuery, RankingResult, UserInteraction, RankingMetrics
@@ -34,7 +34,7 @@ class HybridRankingEngine:
     
     def __init__(self):
         self.ranking_methods = {
-            'bm25': self._calculate_bm25_score,
+            'bm25': self._calculate_bm25_scores,
             'vector': self._calculate_vector_score,
             'hybrid': self._calculate_hybrid_score
         }
@@ -73,8 +73,11 @@ class HybridRankingEngine:
             # Extract query features
             query_features = self._extract_query_features(query, ranking_config)
             
-            # Calculate BM25 scores
-            bm25_scores = self._calculate_bm25_scores(query, documents, ranking_model)
+            # Calculate BM25 scores, from the tenant's inverted index when available
+            index = None
+            if ranking_config.get('company_id') and ranking_config.get('entity_type'):
+                index = BM25Index.for_tenant(ranking_config['company_id'], ranking_config['entity_type'])
+            bm25_scores = self._calculate_bm25_scores(query, documents, ranking_model, index)
             
             # Calculate vector scores
             vector_scores = self._calculate_vector_scores(query, documents, ranking_model)
@@ -88,7 +91,9 @@ class HybridRankingEngine:
             )
             
             # Rank documents
-            ranked_documents = self._rank_documents_by_score(documents, hybrid_scores)
+            ranked_documents = self._rank_documents_by_score(
+                documents, hybrid_scores, ranking_config.get('top_k')
+            )
             
             # Log ranking result
             ranking_result = self._log_ranking_result(
@@ -203,72 +208,45 @@ class HybridRankingEngine:
             }
     
     def _calculate_bm25_scores(self, query: str, documents: List[Dict[str, Any]], 
-                             ranking_model: HybridRankingModel) -> List[float]:
-        """Calculate BM25 scores for documents"""
+                             ranking_model: HybridRankingModel,
+                             index: Optional[BM25Index] = None) -> List[float]:
+        """
+        Calculate BM25 scores for documents.
+        
+        Uses the tenant's persistent inverted index when given (documents are
+        looked up by 'id'); otherwise indexes the supplied documents once.
+        """
         try:
-            # Tokenize query
-            query_terms = self._tokenize_text(query)
-            
-            # Calculate document statistics
-            doc_stats = self._calculate_document_statistics(documents)
+            k1 = getattr(ranking_model, 'bm25_k1', BM25Index.DEFAULT_K1)
+            b = getattr(ranking_model, 'bm25_b', BM25Index.DEFAULT_B)
             
-            # Calculate BM25 scores
-            bm25_scores = []
-            for doc in documents:
-                doc_text = doc.get('content', '')
-                doc_terms = self._tokenize_text(doc_text)
-                
-                score = self._calculate_bm25_score(
-                    query_terms, doc_terms, doc_stats, ranking_model
-                )
-                bm25_scores.append(score)
+            if index is not None and all('id' in doc for doc in documents):
+                index.k1, index.b = k1, b
+                return index.score_documents(query, [doc['id'] for doc in documents])
             
-            return bm25_scores
+            adhoc_index = BM25Index.from_documents(
+                ((str(i), doc.get('content', '')) for i, doc in enumerate(documents)), k1=k1, b=b
+            )
+            return adhoc_index.score_documents(query, [str(i) for i in range(len(documents))])
             
         except Exception as e:
             logger.error(f"BM25 calculation failed: {str(e)}")
             return [0.0] * len(documents)
     
-    def _calculate_bm25_score(self, query_terms: List[str], doc_terms: List[str], 
-                            doc_stats: Dict[str, Any], ranking_model: HybridRankingModel) -> float:
-        """Calculate BM25 score for a single document"""
-        try:
-            # BM25 parameters
-            k1 = ranking_model.bm25_k1
-            b = ranking_model.bm25_b
-            
-            # Document length and average length
-            doc_length = len(doc_terms)
-            avg_doc_length = doc_stats['avg_length']
-            
-            # Term frequencies
-            doc_term_freq = Counter(doc_terms)
-            query_term_freq = Counter(query_terms)
-            
-            # Calculate score
-            score = 0.0
-            for term in query_terms:
-                if term in doc_term_freq:
-                    # Term frequency in document
-                    tf = doc_term_freq[term]
-                    
-                    # Document frequency
-                    df = doc_stats['term_dfs'].get(term, 1)
-                    
-                    # IDF
-                    idf = math.log((doc_stats['total_docs'] - df + 0.5) / (df + 0.5))
-                    
-                    # BM25 formula
-                    numerator = tf * (k1 + 1)
-                    denominator = tf + k1 * (1 - b + b * (doc_length / avg_doc_length))
-                    
-                    score += idf * (numerator / denominator)
-            
-            return score
-            
-        except Exception as e:
-            logger.error(f"BM25 score calculation failed: {str(e)}")
-            return 0.0
+    def search_bm25(self, query: str, company_id: str, entity_type: str,
+                    k: int = 10, ranking_model: Optional[HybridRankingModel] = None) -> List[Tuple[str, float]]:
+        """
+        Top-k BM25 retrieval from a tenant's persistent inverted index.
+        
+        Returns:
+            (document id, score) pairs, best first
+        """
+        index = BM25Index.for_tenant(
+            company_id, entity_type,
+            k1=getattr(ranking_model, 'bm25_k1', BM25Index.DEFAULT_K1),
+            b=getattr(ranking_model, 'bm25_b', BM25Index.DEFAULT_B)
+        )
+        return index.search(query, k)
     
     def _calculate_vector_scores(self, query: str, documents: List[Dict[str, Any]], 
                                ranking_model: HybridRankingModel) -> List[float]:
@@ -297,15 +275,11 @@ class HybridRankingEngine:
                     fusion_method: str, alpha: float) -> List[float]:
         """Fuse BM25 and vector scores"""
         try:
-            # Normalize scores
-            bm25_normalized = self._normalize_scores(bm25_scores)
-            vector_normalized = self._normalize_scores(vector_scores)
-            
-            # Apply fusion method
-            fusion_func = self.fusion_strategies.get(fusion_method, self._weighted_sum_fusion)
-            fused_scores = fusion_func(bm25_normalized, vector_normalized, alpha)
-            
-            return fused_scores
+            return score_fusion.fuse_scores(
+                np.asarray(bm25_scores, dtype=float),
+                np.asarray(vector_scores, dtype=float),
+                fusion_method, alpha
+            ).tolist()
             
         except Exception as e:
             logger.error(f"Score fusion failed: {str(e)}")
@@ -314,88 +288,47 @@ class HybridRankingEngine:
     def _weighted_sum_fusion(self, bm25_scores: List[float], vector_scores: List[float], 
                            alpha: float) -> List[float]:
         """Weighted sum fusion"""
-        return [alpha * bm25 + (1 - alpha) * vector 
-                for bm25, vector in zip(bm25_scores, vector_scores)]
+        return score_fusion.weighted_sum_fusion(
+            np.asarray(bm25_scores, dtype=float), np.asarray(vector_scores, dtype=float), alpha
+        ).tolist()
     
     def _reciprocal_rank_fusion(self, bm25_scores: List[float], vector_scores: List[float], 
                               alpha: float) -> List[float]:
         """Reciprocal rank fusion"""
-        # Get rankings
-        bm25_ranks = self._get_rankings(bm25_scores)
-        vector_ranks = self._get_rankings(vector_scores)
-        
-        # Calculate reciprocal rank scores
-        rr_scores = []
-        for i in range(len(bm25_scores)):
-            bm25_rank = bm25_ranks[i]
-            vector_rank = vector_ranks[i]
-            
-            rr_score = alpha * (1.0 / (bm25_rank + 1)) + (1 - alpha) * (1.0 / (vector_rank + 1))
-            rr_scores.append(rr_score)
-        
-        return rr_scores
+        return score_fusion.reciprocal_rank_fusion(
+            np.asarray(bm25_scores, dtype=float), np.asarray(vector_scores, dtype=float), alpha
+        ).tolist()
     
     def _borda_count_fusion(self, bm25_scores: List[float], vector_scores: List[float], 
                           alpha: float) -> List[float]:
         """Borda count fusion"""
-        # Get rankings
-        bm25_ranks = self._get_rankings(bm25_scores)
-        vector_ranks = self._get_rankings(vector_scores)
-        
-        # Calculate Borda count scores
-        borda_scores = []
-        for i in range(len(bm25_scores)):
-            bm25_rank = bm25_ranks[i]
-            vector_rank = vector_ranks[i]
-            
-            borda_score = alpha * (len(bm25_scores) - bm25_rank) + (1 - alpha) * (len(vector_scores) - vector_rank)
-            borda_scores.append(borda_score)
-        
-        return borda_scores
+        return score_fusion.borda_count_fusion(
+            np.asarray(bm25_scores, dtype=float), np.asarray(vector_scores, dtype=float), alpha
+        ).tolist()
     
     def _condorcet_fusion(self, bm25_scores: List[float], vector_scores: List[float], 
                          alpha: float) -> List[float]:
         """Condorcet fusion"""
-        # This is a simplified implementation
-        # In production, would implement full Condorcet method
-        
-        # For now, use weighted sum as approximation
+        # Simplified: weighted sum approximation
         return self._weighted_sum_fusion(bm25_scores, vector_scores, alpha)
     
     def _normalize_scores(self, scores: List[float]) -> List[float]:
         """Normalize scores to [0, 1] range"""
         if not scores:
             return scores
-        
-        min_score = min(scores)
-        max_score = max(scores)
-        
-        if max_score == min_score:
-            return [0.5] * len(scores)
-        
-        return [(score - min_score) / (max_score - min_score) for score in scores]
+        return score_fusion.normalize_scores(np.asarray(scores, dtype=float)).tolist()
     
     def _get_rankings(self, scores: List[float]) -> List[int]:
         """Get rankings from scores"""
-        sorted_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
-        rankings = [0] * len(scores)
-        
-        for rank, index in enumerate(sorted_indices):
-            rankings[index] = rank
-        
-        return rankings
+        return score_fusion.get_rankings(np.asarray(scores, dtype=float)).tolist()
     
     def _rank_documents_by_score(self, documents: List[Dict[str, Any]], 
-                                scores: List[float]) -> List[Dict[str, Any]]:
-        """Rank documents by their scores"""
-        # Create list of (document, score) pairs
-        doc_score_pairs = list(zip(documents, scores))
-        
-        # Sort by score (descending)
-        doc_score_pairs.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return ranked documents
-        return [doc for doc, score in doc_score_pairs]
+                                scores: List[float], top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Rank documents by their scores, selecting only the top k when given"""
+        if not documents:
+            return []
+        top = score_fusion.top_k_indices(np.asarray(scores, dtype=float), top_k)
+        return [documents[i] for i in top]
     
     def _extract_query_features(self, query: str, config: Dict[str, Any]) -> Dict[str, Any]:
         """Extract features from query"""
@@ -422,41 +355,7 @@ class HybridRankingEngine:
     
     def _tokenize_text(self, text: str) -> List[str]:
         """Tokenize text for BM25"""
-        # Simple tokenization
-        # In production, would use more sophisticated tokenization
-        return re.findall(r'\b\w+\b', text.lower())
-    
-    def _calculate_document_statistics(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Calculate document statistics for BM25"""
-        try:
-            total_docs = len(documents)
-            total_length = 0
-            term_dfs = Counter()
-            
-            for doc in documents:
-                doc_text = doc.get('content', '')
-                doc_terms = self._tokenize_text(doc_text)
-                
-                total_length += len(doc_terms)
-                
-                # Count document frequencies
-                unique_terms = set(doc_terms)
-                for term in unique_terms:
-                    term_dfs[term] += 1
-            
-            return {
-                'total_docs': total_docs,
-                'avg_length': total_length / total_docs if total_docs > 0 else 0,
-                'term_dfs': dict(term_dfs)
-            }
-            
-        except Exception as e:
-            logger.error(f"Document statistics calculation failed: {str(e)}")
-            return {
-                'total_docs': 0,
-                'avg_length': 0,
-                'term_dfs': {}
-            }
+        return tokenize(text)
     
     def _get_vectorizer(self, ranking_model: HybridRankingModel):
         """Get or create TF-IDF vectorizer"""
@@ -534,22 +433,46 @@ class HybridRankingEngine:
         )
     
     def _prepare_training_data(self, training_data: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
-        """Prepare training data for optimization"""
-        # This would prepare the actual training data
-        # For now, return placeholders
-        X = np.random.randn(100, 10)
-        y = np.random.randn(100)
+        """
+        Prepare training data for optimization.
+        
+        Each example has a 'query' and 'documents' (with 'content' and a graded
+        'relevance'), or precomputed 'bm25_scores'/'vector_scores'/'relevance'.
+        
+        Returns:
+            X of shape (queries, documents, 2) holding BM25 and vector scores,
+            y of shape (queries, documents) holding relevance; rows are NaN-padded
+        """
+        ranking_model = self._get_default_ranking_model()
+        bm25_rows, vector_rows, relevance_rows = [], [], []
+        
+        for example in training_data:
+            documents = example.get('documents', [])
+            bm25 = example.get('bm25_scores')
+            if bm25 is None:
+                bm25 = self._calculate_bm25_scores(example['query'], documents, ranking_model)
+            vector = example.get('vector_scores')
+            if vector is None:
+                vector = self._calculate_vector_scores(example['query'], documents, ranking_model)
+            relevance = example.get('relevance')
+            if relevance is None:
+                relevance = [doc.get('relevance', 0) for doc in documents]
+            
+            bm25_rows.append(bm25)
+            vector_rows.append(vector)
+            relevance_rows.append(relevance)
+        
+        X = np.stack([score_fusion.pad_scores(bm25_rows), score_fusion.pad_scores(vector_rows)], axis=-1)
+        y = score_fusion.pad_scores(relevance_rows)
         return X, y
     
     def _grid_search_optimization(self, X_train: np.ndarray, y_train: np.ndarray, 
                                 parameter_space: Dict[str, List], config: Dict[str, Any]) -> Dict[str, Any]:
-        """Grid search optimization"""
-        # This would implement actual grid search
-        # For now, return default parameters
-        return {
-            'alpha': 0.5,
-            'fusion_method': 'weighted_sum'
-        }
+        """Grid search over fusion methods and alphas, all queries fused per batch"""
+        return score_fusion.grid_search_fusion(
+            X_train[..., 0], X_train[..., 1], y_train,
+            parameter_space, k=config.get('k', 10)
+        )
     
     def _create_optimized_model(self, best_params: Dict[str, Any]) -> HybridRankingModel:
         """Create optimized model"""
@@ -15,7 +15,7 @@ import logging
 import numpy as np
 import pandas as pd
 from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db import models
@@ -25,6 +25,8 @@ import uuid
 import json
 from collections import defaultdict
 import math
+from .search_cache import SearchCache
+from .vector_indexing import get_embedder
 
 logger = logging.getLogger(__name__)
 
@@ -78,6 +80,7 @@ class HybridSearchFusion:
         self.search_results: List[SearchResult] = []
         self.ab_tests: Dict[str, ABTestConfig] = {}
         self.performance_metrics: Dict[str, Dict[str, Any]] = {}
+        self._embedder = None
         
         # Search configuration
         self.fusion_weights = {
@@ -94,6 +97,14 @@ class HybridSearchFusion:
             "response_time_ms": 200
         }
     
+    @property
+    def embedder(self):
+        """Query embedder matching the vector index dimension (created lazily)"""
+        if self._embedder is None:
+            from .vector_search import vector_search_manager
+            self._embedder = get_embedder(vector_search_manager.dimension)
+        return self._embedder
+    
     def create_ab_test(self, name: str, description: str, 
                       variants: Dict[str, Dict[str, Any]],
                       traffic_split: Dict[str, float],
@@ -145,18 +156,34 @@ class HybridSearchFusion:
         # Determine search variant for A/B testing
         variant = self._get_ab_test_variant(search_query)
         
-        # Perform search based on variant
-        if variant == "control":
-            results = self._perform_control_search(query_text, filters)
-        elif variant == "hybrid_fusion":
-            results = self._perform_hybrid_fusion_search(query_text, filters)
-        elif variant == "vector_boosted":
-            results = self._perform_vector_boosted_search(query_text, filters)
-        else:
-            results = self._perform_hybrid_fusion_search(query_text, filters)
+        # Serve this variant's cached ranking while the tenant's index is unchanged
+        cached_results = SearchCache.get_results(company.id, query_text, filters, variant)
+        cache_hit = cached_results is not None
         
-        # Apply fusion ranking
-        ranked_results = self._apply_fusion_ranking(results, query_text, variant)
+        if cache_hit:
+            ranked_results = [SearchResult(**result) for result in cached_results]
+        else:
+            representation = SearchCache.get_query_representation(query_text, self.embedder)
+            query_vector = representation['embedding']
+            
+            # Perform search based on variant
+            if variant == "control":
+                results = self._perform_control_search(query_text, filters)
+            elif variant == "hybrid_fusion":
+                results = self._perform_hybrid_fusion_search(query_text, filters, query_vector)
+            elif variant == "vector_boosted":
+                results = self._perform_vector_boosted_search(query_text, filters, query_vector)
+            else:
+                results = self._perform_hybrid_fusion_search(query_text, filters, query_vector)
+            
+            # Apply fusion ranking
+            ranked_results = self._apply_fusion_ranking(
+                results, query_text, variant, representation['terms']
+            )
+            SearchCache.set_results(
+                company.id, query_text, filters, variant,
+                [asdict(result) for result in ranked_results]
+            )
         
         # Update search query with results
         search_query.results_count = len(ranked_results)
@@ -174,6 +201,7 @@ class HybridSearchFusion:
                 'results_count': len(ranked_results),
                 'search_type': search_type,
                 'variant': variant,
+                'cache_hit': cache_hit,
                 'response_time_ms': (timezone.now() - start_time).total_seconds() * 1000
             },
             actor=user,
@@ -224,7 +252,8 @@ class HybridSearchFusion:
         ]
         return mock_results
     
-    def _perform_hybrid_fusion_search(self, query_text: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _perform_hybrid_fusion_search(self, query_text: str, filters: Dict[str, Any],
+                                      query_vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """Perform hybrid fusion search (BM25 + Vector)"""
         # Mock search results with both BM25 and vector scores
         mock_results = [
@@ -240,7 +269,8 @@ class HybridSearchFusion:
         ]
         return mock_results
     
-    def _perform_vector_boosted_search(self, query_text: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _perform_vector_boosted_search(self, query_text: str, filters: Dict[str, Any],
+                                       query_vector: Optional[List[float]] = None) -> List[Dict[str, Any]]:
         """Perform vector-boosted search"""
         # Mock search results with higher vector scores
         mock_results = [
@@ -257,7 +287,8 @@ class HybridSearchFusion:
         return mock_results
     
     def _apply_fusion_ranking(self, results: List[Dict[str, Any]], 
-                             query_text: str, variant: str) -> List[SearchResult]:
+                             query_text: str, variant: str,
+                             query_terms: Optional[List[str]] = None) -> List[SearchResult]:
         """Apply fusion ranking to search results"""
         ranked_results = []
         
@@ -276,7 +307,7 @@ class HybridSearchFusion:
                               self.fusion_weights["vector_weight"] * vector_score)
             
             # Apply relevance boost
-            relevance_score = self._calculate_relevance_score(result["content"], query_text)
+            relevance_score = self._calculate_relevance_score(result["content"], query_text, query_terms)
             boosted_score = hybrid_score * self.fusion_weights["relevance_boost"] * relevance_score
             
             # Apply recency boost if applicable
@@ -308,11 +339,12 @@ class HybridSearchFusion:
         
         return ranked_results
     
-    def _calculate_relevance_score(self, content: str, query_text: str) -> float:
+    def _calculate_relevance_score(self, content: str, query_text: str,
+                                   query_terms: Optional[List[str]] = None) -> float:
         """Calculate relevance score between content and query"""
         # Simple relevance calculation - in real implementation, this would be more sophisticated
-        query_words = query_text.lower().split()
-        content_words = content.lower().split()
+        query_words = query_terms if query_terms is not None else query_text.lower().split()
+        content_words = set(content.lower().split())
         
         if not query_words:
             return 0.0
@@ -447,6 +479,7 @@ class HybridSearchFusion:
             "end_date": test.end_date.isoformat(),
             "is_active": test.is_active,
             "variants": variant_metrics,
+            "result_cache": SearchCache.get_stats(list(test.traffic_split.keys())),
             "success_metrics": test.success_metrics
         }
     
@@ -9,21 +9,27 @@ This module implements:
 - Performance optimization for sub-second queries
 - Aggregate caching and invalidation
 - Report generation with SLA guarantees
+- Shared, mergeable aggregate state across workers (Redis/PostgreSQL)
+- Approximate distinct counts (HyperLogLog) and quantiles (t-digest)
 """
 
 import logging
 import time
 from typing import Dict, List, Optional, Tuple, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict, field
 from datetime import datetime, timedelta
 from django.utils import timezone
 from django.db import models
 from core.models import Company, User
 from events.event_bus import event_bus
+from analytics.aggregate_state import (
+    AggregateStateBackend, PartialAggregate, get_aggregate_state_backend,
+    parse_definition_timestamp
+)
+from analytics.sketches import create_sketch, HyperLogLog
 import uuid
 import json
 import threading
-from collections import defaultdict
 
 logger = logging.getLogger(__name__)
 
@@ -41,6 +47,8 @@ class AggregateDefinition:
     created_at: timezone.datetime
     is_active: bool
     refresh_interval_minutes: int
+    # Sketch metrics: entity field -> sketch type ('hll' distinct count, 'tdigest' quantiles)
+    sketch_metrics: Dict[str, str] = field(default_factory=dict)
 
 @dataclass
 class AggregateData:
@@ -52,7 +60,7 @@ class AggregateData:
     metrics: Dict[str, float]
     record_count: int
     last_updated: timezone.datetime
-    version: int
+    version: str  # shared state version token
 
 @dataclass
 class ReportRequest:
@@ -74,9 +82,9 @@ class IncrementalAggregates:
     Incremental aggregates with sub-second report generation
     """
     
-    def __init__(self):
+    def __init__(self, state_backend: Optional[AggregateStateBackend] = None):
         self.aggregate_definitions: Dict[str, AggregateDefinition] = {}
-        self.aggregate_data: Dict[str, List[AggregateData]] = {}
+        self._state_backend = state_backend
         self.report_requests: List[ReportRequest] = []
         self.aggregate_cache: Dict[str, Any] = {}
         self.cache_lock = threading.Lock()
@@ -87,7 +95,9 @@ class IncrementalAggregates:
             "cache_ttl_seconds": 300,  # 5 minutes
             "batch_size": 1000,
             "parallel_processing": True,
-            "max_workers": 4
+            "max_workers": 4,
+            "hll_precision": 12,  # 4KB per cell, ~1.6% error
+            "tdigest_compression": 100
         }
         
         # Performance monitoring
@@ -99,14 +109,43 @@ class IncrementalAggregates:
             "sla_met_count": 0
         }
     
+    @property
+    def state_backend(self) -> AggregateStateBackend:
+        """Shared aggregate state backend (initialized on first use)"""
+        if self._state_backend is None:
+            self._state_backend = get_aggregate_state_backend()
+        return self._state_backend
+    
+    def _get_definition(self, aggregate_id: str) -> Optional[AggregateDefinition]:
+        """Get aggregate definition, loading it from shared state if another worker created it"""
+        if aggregate_id not in self.aggregate_definitions:
+            self._load_definitions()
+        return self.aggregate_definitions.get(aggregate_id)
+    
+    def _load_definitions(self, company_id: Optional[str] = None) -> List[AggregateDefinition]:
+        """Refresh local definitions from shared state"""
+        definitions = []
+        for data in self.state_backend.load_definitions(company_id):
+            data['created_at'] = parse_definition_timestamp(data.get('created_at'))
+            aggregate_def = AggregateDefinition(**data)
+            self.aggregate_definitions[aggregate_def.id] = aggregate_def
+            definitions.append(aggregate_def)
+        return definitions
+    
     def create_aggregate_definition(self, name: str, description: str,
                                  entity_type: str, dimensions: List[str],
                                  metrics: List[str], time_granularity: str,
                                  company: Company, user: User,
-                                 refresh_interval_minutes: int = 60) -> AggregateDefinition:
+                                 refresh_interval_minutes: int = 60,
+                                 sketch_metrics: Optional[Dict[str, str]] = None) -> AggregateDefinition:
         """Create a new aggregate definition"""
         aggregate_id = str(uuid.uuid4())
         
+        sketch_metrics = sketch_metrics or {}
+        for sketch_type in sketch_metrics.values():
+            # Validate sketch types up front
+            self._create_sketch(sketch_type)
+        
         aggregate_def = AggregateDefinition(
             id=aggregate_id,
             name=name,
@@ -118,11 +157,12 @@ class IncrementalAggregates:
             time_granularity=time_granularity,
             created_at=timezone.now(),
             is_active=True,
-            refresh_interval_minutes=refresh_interval_minutes
+            refresh_interval_minutes=refresh_interval_minutes,
+            sketch_metrics=sketch_metrics
         )
         
         self.aggregate_definitions[aggregate_id] = aggregate_def
-        self.aggregate_data[aggregate_id] = []
+        self.state_backend.save_definition(asdict(aggregate_def))
         
         # Publish aggregate creation event
         event_bus.publish(
@@ -133,6 +173,7 @@ class IncrementalAggregates:
                 'entity_type': entity_type,
                 'dimensions': dimensions,
                 'metrics': metrics,
+                'sketch_metrics': sketch_metrics,
                 'time_granularity': time_granularity
             },
             actor=user,
@@ -145,37 +186,71 @@ class IncrementalAggregates:
     def update_aggregate_data(self, aggregate_id: str, entity_data: Dict[str, Any],
                             company: Company) -> bool:
         """Update aggregate data with new entity data"""
-        if aggregate_id not in self.aggregate_definitions:
-            return False
-        
-        aggregate_def = self.aggregate_definitions[aggregate_id]
-        if not aggregate_def.is_active:
-            return False
-        
-        # Calculate time bucket
-        time_bucket = self._calculate_time_bucket(
-            entity_data.get('created_at', timezone.now()),
-            aggregate_def.time_granularity
-        )
-        
-        # Extract dimensions and metrics
-        dimensions = {dim: entity_data.get(dim) for dim in aggregate_def.dimensions}
-        metrics = {metric: float(entity_data.get(metric, 0)) for metric in aggregate_def.metrics}
-        
-        # Find existing aggregate data point
-        existing_data = self._find_aggregate_data_point(aggregate_id, time_bucket, dimensions)
-        
-        if existing_data:
-            # Update existing data point
-            self._update_existing_aggregate(existing_data, metrics)
-        else:
-            # Create new data point
-            self._create_new_aggregate(aggregate_id, time_bucket, dimensions, metrics)
+        return self.update_aggregate_data_batch(aggregate_id, [entity_data], company) > 0
+    
+    def update_aggregate_data_batch(self, aggregate_id: str, entities: List[Dict[str, Any]],
+                                    company: Company) -> int:
+        """
+        Update aggregate data with a batch of entities.
+        
+        Entities are pre-merged into one partial aggregate per cell locally, so
+        the shared state receives a single delta per (time bucket, dimensions)
+        instead of one write per entity.
+        
+        Returns:
+            Number of entities applied
+        """
+        aggregate_def = self._get_definition(aggregate_id)
+        if not aggregate_def or not aggregate_def.is_active:
+            return 0
+        
+        applied = 0
+        batch_size = self.config["batch_size"]
+        
+        for batch_start in range(0, len(entities), batch_size):
+            cells: Dict[Tuple[timezone.datetime, str], Tuple[Dict[str, Any], PartialAggregate]] = {}
+            
+            for entity_data in entities[batch_start:batch_start + batch_size]:
+                # Calculate time bucket
+                time_bucket = self._calculate_time_bucket(
+                    entity_data.get('created_at', timezone.now()),
+                    aggregate_def.time_granularity
+                )
+                
+                # Extract dimensions and metrics
+                dimensions = {dim: entity_data.get(dim) for dim in aggregate_def.dimensions}
+                metrics = {metric: float(entity_data.get(metric, 0)) for metric in aggregate_def.metrics}
+                
+                cell_key = (time_bucket, json.dumps(dimensions, sort_keys=True, default=str))
+                if cell_key in cells:
+                    partial = cells[cell_key][1]
+                    partial.merge(PartialAggregate.from_metrics(metrics))
+                else:
+                    partial = PartialAggregate.from_metrics(metrics)
+                    cells[cell_key] = (dimensions, partial)
+                
+                # Sketches are updated in place, one per cell per batch
+                for sketch_field, sketch_type in aggregate_def.sketch_metrics.items():
+                    if sketch_field not in partial.sketches:
+                        partial.sketches[sketch_field] = self._create_sketch(sketch_type)
+                    partial.sketches[sketch_field].add(entity_data.get(sketch_field))
+            
+            self.state_backend.apply_deltas(aggregate_id, [
+                (time_bucket, dimensions, partial)
+                for (time_bucket, _), (dimensions, partial) in cells.items()
+            ])
+            applied += sum(partial.record_count for _, partial in cells.values())
         
         # Invalidate cache
         self._invalidate_cache(aggregate_id)
         
-        return True
+        return applied
+    
+    def _create_sketch(self, sketch_type: str) -> Any:
+        """Create an empty sketch using the configured accuracy"""
+        if sketch_type == HyperLogLog.SKETCH_TYPE:
+            return create_sketch(sketch_type, precision=self.config["hll_precision"])
+        return create_sketch(sketch_type, compression=self.config["tdigest_compression"])
     
     def _calculate_time_bucket(self, timestamp: timezone.datetime, 
                              granularity: str) -> timezone.datetime:
@@ -193,44 +268,24 @@ class IncrementalAggregates:
         else:
             return timestamp
     
-    def _find_aggregate_data_point(self, aggregate_id: str, time_bucket: timezone.datetime,
-                                 dimensions: Dict[str, Any]) -> Optional[AggregateData]:
-        """Find existing aggregate data point"""
-        for data_point in self.aggregate_data.get(aggregate_id, []):
-            if (data_point.time_bucket == time_bucket and 
-                data_point.dimensions == dimensions):
-                return data_point
-        return None
-    
-    def _update_existing_aggregate(self, data_point: AggregateData, 
-                                 new_metrics: Dict[str, float]):
-        """Update existing aggregate data point"""
-        # Update metrics (sum for additive metrics)
-        for metric, value in new_metrics.items():
-            if metric in data_point.metrics:
-                data_point.metrics[metric] += value
-            else:
-                data_point.metrics[metric] = value
-        
-        data_point.record_count += 1
-        data_point.last_updated = timezone.now()
-        data_point.version += 1
-    
-    def _create_new_aggregate(self, aggregate_id: str, time_bucket: timezone.datetime,
-                            dimensions: Dict[str, Any], metrics: Dict[str, float]):
-        """Create new aggregate data point"""
-        data_point = AggregateData(
-            id=str(uuid.uuid4()),
-            aggregate_id=aggregate_id,
-            time_bucket=time_bucket,
-            dimensions=dimensions,
-            metrics=metrics,
-            record_count=1,
-            last_updated=timezone.now(),
-            version=1
-        )
-        
-        self.aggregate_data[aggregate_id].append(data_point)
+    def get_aggregate_data(self, aggregate_id: str,
+                           start_date: Optional[timezone.datetime] = None,
+                           end_date: Optional[timezone.datetime] = None) -> List[AggregateData]:
+        """Get merged aggregate data points from shared state"""
+        version = self.state_backend.get_version(aggregate_id)
+        return [
+            AggregateData(
+                id=f"{aggregate_id}:{cell.time_bucket.isoformat()}",
+                aggregate_id=aggregate_id,
+                time_bucket=cell.time_bucket,
+                dimensions=cell.dimensions,
+                metrics=dict(cell.partial.sums),
+                record_count=cell.partial.record_count,
+                last_updated=cell.last_updated,
+                version=version
+            )
+            for cell in self.state_backend.read_cells(aggregate_id, start_date, end_date)
+        ]
     
     def _invalidate_cache(self, aggregate_id: str):
         """Invalidate cache for aggregate"""
@@ -264,7 +319,7 @@ class IncrementalAggregates:
         report_request.status = "processing"
         
         try:
-            # Check cache first
+            # Check cache first (keyed on shared state version so other workers' updates are seen)
             cache_key = self._generate_cache_key(report_type, parameters, company.id)
             cached_result = self._get_from_cache(cache_key)
             
@@ -321,8 +376,15 @@ class IncrementalAggregates:
     def _generate_cache_key(self, report_type: str, parameters: Dict[str, Any], 
                           company_id: str) -> str:
         """Generate cache key for report"""
-        params_str = json.dumps(parameters, sort_keys=True)
-        return f"report_{report_type}_{company_id}_{hash(params_str)}"
+        params_str = json.dumps(parameters, sort_keys=True, default=str)
+        state_version = self._get_state_version(str(company_id))
+        return f"report_{report_type}_{company_id}_{hash(params_str)}_{hash(state_version)}"
+    
+    def _get_state_version(self, company_id: str) -> str:
+        """Combined shared state version for a company's aggregates, read in one backend call"""
+        aggregate_ids = sorted(agg.id for agg in self._load_definitions(company_id) if agg.is_active)
+        versions = self.state_backend.get_versions(aggregate_ids)
+        return ','.join(f"{aggregate_id}:{versions[aggregate_id]}" for aggregate_id in aggregate_ids)
     
     def _get_from_cache(self, cache_key: str) -> Optional[Dict[str, Any]]:
         """Get data from cache"""
@@ -350,8 +412,8 @@ class IncrementalAggregates:
         """Generate report data from aggregates"""
         # Get relevant aggregates for the company
         company_aggregates = [
-            agg for agg in self.aggregate_definitions.values()
-            if agg.company_id == str(company.id) and agg.is_active
+            agg for agg in self._load_definitions(str(company.id))
+            if agg.is_active
         ]
         
         if not company_aggregates:
@@ -389,41 +451,39 @@ class IncrementalAggregates:
     def _process_aggregate_data(self, aggregate: AggregateDefinition,
                               parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Process aggregate data for report"""
-        aggregate_data_points = self.aggregate_data.get(aggregate.id, [])
-        
-        # Filter by time range if specified
-        start_date = parameters.get('start_date')
-        end_date = parameters.get('end_date')
-        
-        if start_date or end_date:
-            filtered_data = []
-            for data_point in aggregate_data_points:
-                if start_date and data_point.time_bucket < start_date:
-                    continue
-                if end_date and data_point.time_bucket > end_date:
-                    continue
-                filtered_data.append(data_point)
-        else:
-            filtered_data = aggregate_data_points
-        
-        # Calculate summary metrics
-        total_records = sum(dp.record_count for dp in filtered_data)
-        metric_totals = defaultdict(float)
+        # Read merged cells from shared state, filtered by time range if specified
+        cells = self.state_backend.read_cells(
+            aggregate.id, parameters.get('start_date'), parameters.get('end_date')
+        )
         
-        for data_point in filtered_data:
-            for metric, value in data_point.metrics.items():
-                metric_totals[metric] += value
+        # Merge partial aggregates across cells
+        merged = PartialAggregate()
+        for cell in cells:
+            merged.merge(cell.partial)
         
         return {
             "aggregate_id": aggregate.id,
             "aggregate_name": aggregate.name,
             "time_granularity": aggregate.time_granularity,
-            "data_points": len(filtered_data),
-            "total_records": total_records,
-            "metric_totals": dict(metric_totals),
+            "data_points": len(cells),
+            "total_records": merged.record_count,
+            "metric_totals": dict(merged.sums),
+            "metric_averages": merged.averages(),
+            "metric_min": dict(merged.mins),
+            "metric_max": dict(merged.maxs),
+            "distinct_counts": {
+                metric: sketch.count()
+                for metric, sketch in merged.sketches.items()
+                if sketch.SKETCH_TYPE == HyperLogLog.SKETCH_TYPE
+            },
+            "quantiles": {
+                metric: sketch.quantiles()
+                for metric, sketch in merged.sketches.items()
+                if sketch.SKETCH_TYPE != HyperLogLog.SKETCH_TYPE
+            },
             "time_range": {
-                "start": min([dp.time_bucket for dp in filtered_data]) if filtered_data else None,
-                "end": max([dp.time_bucket for dp in filtered_data]) if filtered_data else None
+                "start": min([cell.time_bucket for cell in cells]) if cells else None,
+                "end": max([cell.time_bucket for cell in cells]) if cells else None
             }
         }
     
@@ -495,8 +555,8 @@ class IncrementalAggregates:
     def optimize_aggregates(self, company: Company) -> Dict[str, Any]:
         """Optimize aggregates for better performance"""
         company_aggregates = [
-            agg for agg in self.aggregate_definitions.values()
-            if agg.company_id == str(company.id) and agg.is_active
+            agg for agg in self._load_definitions(str(company.id))
+            if agg.is_active
         ]
         
         if not company_aggregates:
@@ -506,7 +566,7 @@ class IncrementalAggregates:
         
         for aggregate in company_aggregates:
             # Check data volume
-            data_points = len(self.aggregate_data.get(aggregate.id, []))
+            data_points = len(self.state_backend.read_cells(aggregate.id))
             if data_points > 10000:
                 optimization_recommendations.append(
                     f"Aggregate '{aggregate.name}' has {data_points} data points - consider archiving old data"
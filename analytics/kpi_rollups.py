@@ -0,0 +1,817 @@
+# analytics/kpi_rollups.py
+# Hourly, daily and monthly rollups of analytics models with retention and query routing
+
+import json
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from typing import Dict, Any, Iterable, List, Optional, Set, Tuple
+from django.apps import apps
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Count, Sum, Min, Max
+from django.db.models.functions import TruncHour, TruncDay, TruncMonth
+from django.db.models.signals import post_init, post_save, post_delete
+from django.utils import timezone
+
+from analytics.aggregate_state import AggregateCell, PartialAggregate, dimension_key
+
+logger = logging.getLogger(__name__)
+
+
+# Model label -> time field, dimensions and additive metrics rolled up.
+# Ratios (win rate, completion rate, ...) are not additive; derive them from the rolled-up counts.
+ROLLUP_SOURCES = {
+    'analytics.SalesAnalytics': {
+        'time_field': 'period_start',
+        'dimensions': ['user_id'],
+        'metrics': [
+            'total_revenue', 'recurring_revenue', 'new_revenue', 'total_deals', 'won_deals',
+            'lost_deals', 'open_deals', 'pipeline_value', 'weighted_pipeline_value',
+        ],
+    },
+    'analytics.LeadAnalytics': {
+        'time_field': 'period_start',
+        'dimensions': ['user_id'],
+        'metrics': [
+            'total_leads', 'new_leads', 'qualified_leads', 'converted_leads', 'website_leads',
+            'referral_leads', 'cold_call_leads', 'trade_show_leads', 'email_campaign_leads',
+            'social_media_leads',
+        ],
+    },
+    'analytics.ActivityAnalytics': {
+        'time_field': 'period_start',
+        'dimensions': ['user_id'],
+        'metrics': [
+            'total_activities', 'completed_activities', 'overdue_activities', 'calls_count',
+            'emails_count', 'meetings_count', 'demos_count',
+        ],
+    },
+    'analytics.KPIMeasurement': {
+        'time_field': 'period_end',
+        'dimensions': ['kpi_id'],
+        'metrics': ['value', 'target_value'],
+    },
+}
+
+# Stored rollup resolutions, finest first
+RESOLUTIONS = ['hour', 'day', 'month']
+
+TRUNCATIONS = {
+    'hour': TruncHour,
+    'day': TruncDay,
+    'month': TruncMonth,
+}
+
+# Requested query resolution -> stored resolutions whose buckets tile it, finest first
+TILING_RESOLUTIONS = {
+    'hour': ['hour'],
+    'day': ['hour', 'day'],
+    'week': ['hour', 'day'],
+    'month': ['hour', 'day', 'month'],
+    'quarter': ['hour', 'day', 'month'],
+    'year': ['hour', 'day', 'month'],
+}
+
+# Days each level is kept; None keeps it forever. Raw source rows are only
+# compacted when a retention is configured for them.
+DEFAULT_RETENTION = {
+    'raw': None,
+    'hour': 31,
+    'day': 731,
+    'month': None,
+}
+
+SNAPSHOT_ATTR = '_rollup_time_snapshot'
+
+# Open interval bounds while merging coverage
+MIN_TIME = datetime.min.replace(tzinfo=dt_timezone.utc)
+MAX_TIME = datetime.max.replace(tzinfo=dt_timezone.utc)
+
+Interval = Tuple[Optional[datetime], Optional[datetime]]
+
+
+def get_retention() -> Dict[str, Optional[int]]:
+    return {**DEFAULT_RETENTION, **getattr(settings, 'ROLLUP_RETENTION_DAYS', {})}
+
+
+def to_datetime(value: Any) -> datetime:
+    """Normalize a date or datetime to an aware UTC datetime."""
+    if isinstance(value, datetime):
+        return value if timezone.is_aware(value) else value.replace(tzinfo=dt_timezone.utc)
+    return datetime(value.year, value.month, value.day, tzinfo=dt_timezone.utc)
+
+
+def truncate(value: datetime, resolution: str) -> datetime:
+    """Start of the bucket containing a timestamp."""
+    value = to_datetime(value)
+    if resolution == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'day':
+        return day
+    if resolution == 'week':
+        return day - timedelta(days=day.weekday())
+    if resolution == 'month':
+        return day.replace(day=1)
+    if resolution == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    if resolution == 'year':
+        return day.replace(month=1, day=1)
+    raise ValueError(f"Unknown resolution: {resolution}")
+
+
+def next_bucket(bucket: datetime, resolution: str) -> datetime:
+    """Start of the bucket after the given one."""
+    if resolution == 'hour':
+        return bucket + timedelta(hours=1)
+    if resolution == 'day':
+        return bucket + timedelta(days=1)
+    if resolution == 'week':
+        return bucket + timedelta(days=7)
+    months = {'month': 1, 'quarter': 3, 'year': 12}[resolution]
+    month_index = bucket.month - 1 + months
+    return bucket.replace(year=bucket.year + month_index // 12, month=month_index % 12 + 1)
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> List[Interval]:
+    """Union of [start, end) intervals, sorted; None is an open bound."""
+    merged: List[List[datetime]] = []
+    bounded = sorted(
+        (to_datetime(start) if start is not None else MIN_TIME, to_datetime(end) if end is not None else MAX_TIME)
+        for start, end in intervals
+    )
+    for start, end in bounded:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(None if start == MIN_TIME else start, None if end == MAX_TIME else end) for start, end in merged]
+
+
+def covers(intervals: Iterable[Interval], start: datetime, end: datetime) -> bool:
+    """Whether one of the merged intervals spans [start, end)."""
+    return any(
+        (low is None or low <= start) and (high is None or high >= end)
+        for low, high in intervals
+    )
+
+
+def source_resolutions(model_label: str) -> List[str]:
+    """Stored resolutions for a source; date-only time fields have no hourly rollup."""
+    config = ROLLUP_SOURCES[model_label]
+    field = apps.get_model(model_label)._meta.get_field(config['time_field'])
+    if isinstance(field, models.DateTimeField):
+        return list(RESOLUTIONS)
+    return [resolution for resolution in RESOLUTIONS if resolution != 'hour']
+
+
+def rebucket(cells: Iterable[AggregateCell], resolution: str,
+             dimensions: Optional[List[str]] = None) -> List[AggregateCell]:
+    """
+    Merge cells into coarser buckets, optionally dropping dimensions.
+
+    Args:
+        cells: Cells to merge
+        resolution: Target bucket resolution
+        dimensions: Dimensions to keep (default: all)
+
+    Returns:
+        Merged cells sorted by bucket
+    """
+    merged: Dict[Tuple[datetime, str], AggregateCell] = {}
+    for cell in cells:
+        bucket = truncate(cell.time_bucket, resolution)
+        dims = cell.dimensions if dimensions is None else {
+            dim: cell.dimensions.get(dim) for dim in dimensions
+        }
+        key = (bucket, dimension_key(dims))
+        if key not in merged:
+            merged[key] = AggregateCell(cell.aggregate_id, bucket, dims, PartialAggregate())
+        merged[key].partial.merge(cell.partial)
+    return sorted(merged.values(), key=lambda cell: cell.time_bucket)
+
+
+class RollupStore(ABC):
+    """Abstract base class for rollup storage."""
+
+    @abstractmethod
+    def replace_buckets(self, source: str, company_id: str, resolution: str,
+                        buckets: List[datetime], cells: List[AggregateCell]) -> None:
+        """Replace every cell in the given buckets with the given cells."""
+        pass
+
+    @abstractmethod
+    def read(self, source: str, company_id: str, resolution: str,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[AggregateCell]:
+        """Read cells with start <= bucket < end."""
+        pass
+
+    @abstractmethod
+    def delete_before(self, source: str, company_id: str, resolution: str, cutoff: datetime) -> int:
+        """Delete cells in buckets before the cutoff."""
+        pass
+
+    @abstractmethod
+    def mark_dirty(self, source: str, company_id: str, months: List[datetime]) -> None:
+        """Record months whose rollups must be rebuilt; marking a dirty month again is a no-op."""
+        pass
+
+    @abstractmethod
+    def pop_dirty(self) -> List[Tuple[str, str, datetime]]:
+        """Atomically take every dirty (source, company_id, month)."""
+        pass
+
+    @abstractmethod
+    def add_coverage(self, source: str, company_id: str, start: Optional[datetime],
+                     end: Optional[datetime]) -> None:
+        """Record that rollups were built for [start, end); None is an open bound."""
+        pass
+
+    @abstractmethod
+    def get_coverage(self, source: str, company_id: str) -> List[Interval]:
+        """Merged intervals rollups were built for."""
+        pass
+
+    @abstractmethod
+    def health_check(self) -> bool:
+        """Check if the store is available."""
+        pass
+
+
+class InMemoryRollupStore(RollupStore):
+    """
+    Process-local rollup storage.
+    Used for tests and single-process deployments; rollups are not shared.
+    """
+
+    def __init__(self):
+        self.cells: Dict[Tuple[str, str, str], Dict[Tuple[datetime, str], AggregateCell]] = {}
+        self.dirty: Set[Tuple[str, str, datetime]] = set()
+        self.coverage: Dict[Tuple[str, str], List[Interval]] = {}
+        self.lock = threading.Lock()
+
+    def replace_buckets(self, source: str, company_id: str, resolution: str,
+                        buckets: List[datetime], cells: List[AggregateCell]) -> None:
+        with self.lock:
+            stored = self.cells.setdefault((source, str(company_id), resolution), {})
+            replaced = set(buckets)
+            for key in [key for key in stored if key[0] in replaced]:
+                del stored[key]
+            for cell in cells:
+                stored[(cell.time_bucket, dimension_key(cell.dimensions))] = cell
+
+    def read(self, source: str, company_id: str, resolution: str,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[AggregateCell]:
+        with self.lock:
+            return [
+                cell for cell in self.cells.get((source, str(company_id), resolution), {}).values()
+                if (start is None or cell.time_bucket >= start) and (end is None or cell.time_bucket < end)
+            ]
+
+    def delete_before(self, source: str, company_id: str, resolution: str, cutoff: datetime) -> int:
+        with self.lock:
+            stored = self.cells.get((source, str(company_id), resolution), {})
+            expired = [key for key in stored if key[0] < cutoff]
+            for key in expired:
+                del stored[key]
+            return len(expired)
+
+    def mark_dirty(self, source: str, company_id: str, months: List[datetime]) -> None:
+        with self.lock:
+            self.dirty.update((source, str(company_id), month) for month in months)
+
+    def pop_dirty(self) -> List[Tuple[str, str, datetime]]:
+        with self.lock:
+            dirty, self.dirty = sorted(self.dirty), set()
+            return dirty
+
+    def add_coverage(self, source: str, company_id: str, start: Optional[datetime],
+                     end: Optional[datetime]) -> None:
+        with self.lock:
+            key = (source, str(company_id))
+            self.coverage[key] = merge_intervals(self.coverage.get(key, []) + [(start, end)])
+
+    def get_coverage(self, source: str, company_id: str) -> List[Interval]:
+        with self.lock:
+            return list(self.coverage.get((source, str(company_id)), []))
+
+    def health_check(self) -> bool:
+        return True
+
+
+class PostgresRollupStore(RollupStore):
+    """
+    PostgreSQL rollup storage.
+    One row per (source, tenant, resolution, bucket, dimensions) holding the
+    serialized PartialAggregate; the primary key serves range reads. Dirty
+    months and built coverage are kept in their own tables.
+    """
+
+    TABLE = 'analytics_rollup'
+    DIRTY_TABLE = 'analytics_rollup_dirty'
+    COVERAGE_TABLE = 'analytics_rollup_coverage'
+
+    def replace_buckets(self, source: str, company_id: str, resolution: str,
+                        buckets: List[datetime], cells: List[AggregateCell]) -> None:
+        from django.db import connection
+
+        key = [source, str(company_id), resolution]
+        with transaction.atomic(), connection.cursor() as cursor:
+            if buckets:
+                cursor.execute(
+                    f"""
+                    DELETE FROM {self.TABLE}
+                    WHERE source = %s AND company_id = %s AND resolution = %s
+                      AND bucket_start = ANY(%s)
+                    """,
+                    key + [list(buckets)]
+                )
+            if not cells:
+                return
+            placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, NOW())'] * len(cells))
+            params = []
+            for cell in cells:
+                params.extend(key + [
+                    cell.time_bucket,
+                    dimension_key(cell.dimensions),
+                    json.dumps(cell.dimensions, sort_keys=True, default=str),
+                    json.dumps(cell.partial.to_dict()),
+                ])
+            cursor.execute(
+                f"""
+                INSERT INTO {self.TABLE} (
+                    source, company_id, resolution, bucket_start, dimension_hash,
+                    dimensions, state, updated_at
+                )
+                VALUES {placeholders}
+                """,
+                params
+            )
+
+    def read(self, source: str, company_id: str, resolution: str,
+             start: Optional[datetime] = None, end: Optional[datetime] = None) -> List[AggregateCell]:
+        from django.db import connection
+
+        sql = f"""
+            SELECT bucket_start, dimensions, state, updated_at FROM {self.TABLE}
+            WHERE source = %s AND company_id = %s AND resolution = %s
+        """
+        params: List[Any] = [source, str(company_id), resolution]
+        if start is not None:
+            sql += " AND bucket_start >= %s"
+            params.append(start)
+        if end is not None:
+            sql += " AND bucket_start < %s"
+            params.append(end)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [
+                AggregateCell(
+                    aggregate_id=f"{source}:{resolution}",
+                    time_bucket=bucket_start,
+                    dimensions=json.loads(dims) if isinstance(dims, str) else dims,
+                    partial=PartialAggregate.from_dict(json.loads(state) if isinstance(state, str) else state),
+                    last_updated=updated_at,
+                )
+                for bucket_start, dims, state, updated_at in cursor.fetchall()
+            ]
+
+    def delete_before(self, source: str, company_id: str, resolution: str, cutoff: datetime) -> int:
+        from django.db import connection
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                DELETE FROM {self.TABLE}
+                WHERE source = %s AND company_id = %s AND resolution = %s AND bucket_start < %s
+                """,
+                [source, str(company_id), resolution, cutoff]
+            )
+            return cursor.rowcount
+
+    def mark_dirty(self, source: str, company_id: str, months: List[datetime]) -> None:
+        from django.db import connection
+
+        if not months:
+            return
+        params = []
+        for month in months:
+            params.extend([source, str(company_id), month])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO {self.DIRTY_TABLE} (source, company_id, month_start)
+                VALUES {', '.join(['(%s, %s, %s)'] * len(months))}
+                ON CONFLICT DO NOTHING
+                """,
+                params
+            )
+
+    def pop_dirty(self) -> List[Tuple[str, str, datetime]]:
+        from django.db import connection
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.DIRTY_TABLE} RETURNING source, company_id, month_start")
+            return sorted(cursor.fetchall())
+
+    def add_coverage(self, source: str, company_id: str, start: Optional[datetime],
+                     end: Optional[datetime]) -> None:
+        from django.db import connection
+
+        key = [source, str(company_id)]
+        with transaction.atomic(), connection.cursor() as cursor:
+            # Serialize coverage updates of one tenant's source until commit
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))",
+                           [f"{self.COVERAGE_TABLE}:{source}:{company_id}"])
+            cursor.execute(
+                f"SELECT covered_from, covered_to FROM {self.COVERAGE_TABLE} WHERE source = %s AND company_id = %s",
+                key
+            )
+            intervals = merge_intervals(list(cursor.fetchall()) + [(start, end)])
+            cursor.execute(f"DELETE FROM {self.COVERAGE_TABLE} WHERE source = %s AND company_id = %s", key)
+            params = []
+            for covered_from, covered_to in intervals:
+                params.extend(key + [covered_from, covered_to])
+            cursor.execute(
+                f"""
+                INSERT INTO {self.COVERAGE_TABLE} (source, company_id, covered_from, covered_to)
+                VALUES {', '.join(['(%s, %s, %s, %s)'] * len(intervals))}
+                """,
+                params
+            )
+
+    def get_coverage(self, source: str, company_id: str) -> List[Interval]:
+        from django.db import connection
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT covered_from, covered_to FROM {self.COVERAGE_TABLE} WHERE source = %s AND company_id = %s",
+                [source, str(company_id)]
+            )
+            return merge_intervals(cursor.fetchall())
+
+    def health_check(self) -> bool:
+        from django.db import connection
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT 1 FROM {self.TABLE} LIMIT 1")
+            return True
+        except Exception as e:
+            logger.error(f"Health check failed: {e}")
+            return False
+
+
+def get_rollup_store(store_name: Optional[str] = None) -> RollupStore:
+    """
+    Build the configured rollup store.
+
+    Reads ROLLUP_STORE ('postgres' or 'memory') from settings and falls back
+    to in-memory rollups if the table is unavailable.
+    """
+    store_name = store_name or getattr(settings, 'ROLLUP_STORE', 'postgres')
+
+    if store_name == 'postgres':
+        try:
+            store = PostgresRollupStore()
+            if store.health_check():
+                return store
+        except Exception as e:
+            logger.debug(f"Rollup store {store_name} not available: {e}")
+        logger.warning("Rollup table unavailable, using in-memory rollups")
+
+    return InMemoryRollupStore()
+
+
+class RollupManager:
+    """
+    Maintains and queries rollups of the analytics models in ROLLUP_SOURCES.
+
+    The finest stored resolution is aggregated from source rows in one
+    GROUP BY; coarser resolutions are merged from it. Saves and deletes mark
+    their month dirty in the store, and refresh_dirty() rebuilds only those
+    months. compact() applies the retention policy: hourly and daily
+    rollups expire once coarser rollups cover them, and raw rows older than
+    the raw retention are deleted after their days are rolled up. query()
+    answers a range from the coarsest rollup that tiles the requested
+    resolution and still covers the range, and from raw rows when rollups
+    were never built for the whole range.
+    """
+
+    _default_store: Optional[RollupStore] = None
+
+    def __init__(self, store: Optional[RollupStore] = None):
+        self._store = store
+
+    @property
+    def store(self) -> RollupStore:
+        if self._store is None:
+            if RollupManager._default_store is None:
+                RollupManager._default_store = get_rollup_store()
+            self._store = RollupManager._default_store
+        return self._store
+
+    # Building
+
+    def _aggregate_source(self, model_label: str, company_id: Any, resolution: str,
+                          start: Optional[datetime] = None,
+                          end: Optional[datetime] = None) -> List[AggregateCell]:
+        """Aggregate source rows into cells of one resolution with a single GROUP BY."""
+        config = ROLLUP_SOURCES[model_label]
+        time_field = config['time_field']
+        metrics = config['metrics']
+
+        queryset = apps.get_model(model_label).objects.filter(company_id=company_id)
+        if start is not None:
+            queryset = queryset.filter(**{f'{time_field}__gte': self._field_value(model_label, start)})
+        if end is not None:
+            queryset = queryset.filter(**{f'{time_field}__lt': self._field_value(model_label, end)})
+
+        annotations = {'_count': Count('pk')}
+        for metric in metrics:
+            annotations[f'_sum_{metric}'] = Sum(metric)
+            annotations[f'_min_{metric}'] = Min(metric)
+            annotations[f'_max_{metric}'] = Max(metric)
+
+        rows = (
+            queryset
+            .annotate(_bucket=TRUNCATIONS[resolution](time_field))
+            .values('_bucket', *config['dimensions'])
+            .annotate(**annotations)
+            .order_by()
+        )
+
+        cells = []
+        for row in rows:
+            partial = PartialAggregate(record_count=row['_count'])
+            for metric in metrics:
+                if row[f'_sum_{metric}'] is None:
+                    continue
+                partial.sums[metric] = float(row[f'_sum_{metric}'])
+                partial.mins[metric] = float(row[f'_min_{metric}'])
+                partial.maxs[metric] = float(row[f'_max_{metric}'])
+            cells.append(AggregateCell(
+                aggregate_id=f"{model_label}:{resolution}",
+                time_bucket=to_datetime(row['_bucket']),
+                dimensions={dim: self._json_value(row[dim]) for dim in config['dimensions']},
+                partial=partial,
+            ))
+        return cells
+
+    @staticmethod
+    def _field_value(model_label: str, value: datetime) -> Any:
+        field = apps.get_model(model_label)._meta.get_field(ROLLUP_SOURCES[model_label]['time_field'])
+        return value if isinstance(field, models.DateTimeField) else value.date()
+
+    @staticmethod
+    def _json_value(value: Any) -> Any:
+        if isinstance(value, Decimal):
+            return float(value)
+        if value is None or isinstance(value, (int, float, str, bool)):
+            return value
+        return str(value)
+
+    def rebuild(self, model_label: str, company_id: Any, start: Optional[datetime] = None,
+                end: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Rebuild rollups of a tenant's source rows in [start, end).
+
+        The range is widened to whole months so month rollups stay complete.
+        Months whose raw rows were compacted away are never rebuilt, since
+        their rollups are the only remaining copy.
+
+        Returns:
+            Number of cells written per resolution
+        """
+        raw_cutoff = self._retention_cutoff('raw')
+        if raw_cutoff is not None:
+            raw_cutoff = truncate(raw_cutoff, 'month')
+            if start is None or to_datetime(start) < raw_cutoff:
+                start = raw_cutoff
+            if end is not None and to_datetime(end) <= start:
+                return {}
+        return self._rebuild_range(model_label, company_id, start, end)
+
+    def _rebuild_range(self, model_label: str, company_id: Any, start: Optional[datetime],
+                       end: Optional[datetime]) -> Dict[str, int]:
+        resolutions = source_resolutions(model_label)
+        finest = resolutions[0]
+        # Rows written later mark their months dirty, so an open-ended rebuild stays covered
+        open_ended = end is None
+        if start is not None:
+            start = truncate(start, 'month')
+        if end is not None:
+            end = next_bucket(truncate(to_datetime(end) - timedelta(microseconds=1), 'month'), 'month')
+
+        cells = self._aggregate_source(model_label, company_id, finest, start, end)
+        if start is not None and end is None:
+            last = max([timezone.now()] + [cell.time_bucket for cell in cells])
+            end = next_bucket(truncate(last, 'month'), 'month')
+
+        written = {}
+        # Readers never see a level deleted but not yet rewritten, or coverage without its cells
+        with transaction.atomic():
+            for resolution in resolutions:
+                level = cells if resolution == finest else rebucket(cells, resolution)
+                if start is None:
+                    # Full rebuild: nothing outside the source rows survives
+                    self.store.delete_before(model_label, company_id, resolution, MAX_TIME)
+                    buckets = []
+                else:
+                    buckets = self._bucket_range(start, end, resolution)
+                self.store.replace_buckets(model_label, company_id, resolution, buckets, level)
+                written[resolution] = len(level)
+            self.store.add_coverage(model_label, company_id, start, None if open_ended else end)
+
+        logger.info(f"Rebuilt {model_label} rollups for {company_id}: {written}")
+        return written
+
+    def _bucket_range(self, start: datetime, end: datetime, resolution: str) -> List[datetime]:
+        buckets = []
+        bucket = truncate(start, resolution)
+        while bucket < end:
+            buckets.append(bucket)
+            bucket = next_bucket(bucket, resolution)
+        return buckets
+
+    # Incremental maintenance
+
+    def mark_dirty(self, model_label: str, company_id: Any, *timestamps: Any) -> None:
+        """
+        Mark the months containing the given timestamps for rebuild.
+
+        Each month is its own insert-if-absent mark, so concurrent writers
+        never overwrite each other's marks.
+        """
+        months = sorted({truncate(value, 'month') for value in timestamps if value is not None})
+        if months:
+            self.store.mark_dirty(model_label, str(company_id), months)
+
+    def refresh_dirty(self) -> List[Dict[str, Any]]:
+        """
+        Rebuild the months marked dirty since the last refresh.
+
+        Marks are taken atomically; a month marked again during its rebuild
+        stays dirty for the next refresh.
+        """
+        results = []
+        for model_label, company_id, start in self.store.pop_dirty():
+            start = to_datetime(start)
+            try:
+                written = self.rebuild(model_label, company_id, start, next_bucket(start, 'month'))
+                results.append({'source': model_label, 'company_id': company_id,
+                                'month': start.isoformat(), 'written': written})
+            except Exception as e:
+                logger.error(f"Error refreshing {model_label} rollups ({company_id}, {start:%Y-%m}): {e}")
+                self.mark_dirty(model_label, company_id, start)
+        return results
+
+    # Retention
+
+    def _retention_cutoff(self, level: str) -> Optional[datetime]:
+        days = get_retention().get(level)
+        if days is None:
+            return None
+        return truncate(timezone.now() - timedelta(days=days), 'day')
+
+    def compact(self, model_label: str, company_id: Any) -> Dict[str, int]:
+        """
+        Apply the retention policy to one tenant's rollups and raw rows.
+
+        Raw rows past the raw retention are rolled up before they are
+        deleted. Hourly rollups expire before daily ones, which expire
+        before monthly ones, so every range stays covered by some level.
+
+        Returns:
+            Rows or cells deleted per level
+        """
+        deleted = {}
+        raw_cutoff = self._retention_cutoff('raw')
+        if raw_cutoff is not None:
+            raw_cutoff = truncate(raw_cutoff, 'month')
+            config = ROLLUP_SOURCES[model_label]
+            expired = apps.get_model(model_label).objects.filter(
+                company_id=company_id,
+                **{f"{config['time_field']}__lt": self._field_value(model_label, raw_cutoff)}
+            )
+            oldest = expired.order_by(config['time_field']).values_list(config['time_field'], flat=True).first()
+            if oldest is not None:
+                self._rebuild_range(model_label, company_id, to_datetime(oldest), raw_cutoff)
+                deleted['raw'], _ = expired.delete()
+
+        for resolution in source_resolutions(model_label):
+            cutoff = self._retention_cutoff(resolution)
+            if cutoff is not None:
+                deleted[resolution] = self.store.delete_before(
+                    model_label, company_id, resolution, truncate(cutoff, 'month')
+                )
+        return deleted
+
+    # Querying
+
+    def choose_resolution(self, model_label: str, company_id: Any, resolution: str,
+                          start: datetime, end: datetime) -> Optional[str]:
+        """
+        Pick the coarsest stored resolution that tiles the requested one and covers [start, end).
+
+        Rollups are only used when the tenant's built coverage spans the range.
+
+        Returns:
+            Stored resolution, or None if only raw rows can answer
+        """
+        if not covers(self.store.get_coverage(model_label, str(company_id)), start, end):
+            return None
+        stored = source_resolutions(model_label)
+        for candidate in reversed(TILING_RESOLUTIONS[resolution]):
+            if candidate not in stored:
+                continue
+            cutoff = self._retention_cutoff(candidate)
+            if cutoff is None or truncate(cutoff, 'month') <= start:
+                return candidate
+        return None
+
+    def query(self, model_label: str, company_id: Any, start: Any, end: Any,
+              resolution: str = 'day', dimensions: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Aggregate a tenant's source over [start, end) at a resolution.
+
+        Range bounds are aligned to buckets of the requested resolution.
+
+        Args:
+            model_label: Source model label from ROLLUP_SOURCES
+            company_id: Company UUID
+            start: Range start (date or datetime)
+            end: Range end, exclusive
+            resolution: 'hour', 'day', 'week', 'month', 'quarter' or 'year'
+            dimensions: Dimensions to group by (default: none)
+
+        Returns:
+            Dictionary with the 'source' used and one row per bucket and dimension group
+        """
+        start = truncate(start, resolution)
+        end = to_datetime(end)
+        stored = self.choose_resolution(model_label, company_id, resolution, start, end)
+
+        if stored is not None:
+            cells = self.store.read(model_label, company_id, stored, start, end)
+            source = f"rollup:{stored}"
+        else:
+            finest = source_resolutions(model_label)[0]
+            cells = self._aggregate_source(model_label, company_id, finest, start, end)
+            source = 'raw'
+
+        rows = []
+        for cell in rebucket(cells, resolution, dimensions or []):
+            rows.append({
+                'bucket': cell.time_bucket.isoformat(),
+                **cell.dimensions,
+                'record_count': cell.partial.record_count,
+                'sums': cell.partial.sums,
+                'mins': cell.partial.mins,
+                'maxs': cell.partial.maxs,
+            })
+
+        return {
+            'source_model': model_label,
+            'source': source,
+            'resolution': resolution,
+            'rows': rows,
+        }
+
+
+# Signal handlers marking rolled-up periods dirty
+def snapshot_rollup_time(sender, instance, **kwargs):
+    """Remember the time field as loaded, so a moved row also dirties its old period."""
+    setattr(instance, SNAPSHOT_ATTR, getattr(instance, ROLLUP_SOURCES[sender._meta.label]['time_field'], None))
+
+
+def mark_rollup_dirty(sender, instance, raw=False, **kwargs):
+    """Mark a saved or deleted row's period for rollup refresh once it commits."""
+    if raw or not getattr(instance, 'company_id', None):
+        return
+    model_label = sender._meta.label
+    timestamps = (
+        getattr(instance, ROLLUP_SOURCES[model_label]['time_field'], None),
+        getattr(instance, SNAPSHOT_ATTR, None),
+    )
+    company_id = instance.company_id
+    transaction.on_commit(lambda: RollupManager().mark_dirty(model_label, company_id, *timestamps))
+
+
+for _model_label in ROLLUP_SOURCES:
+    post_init.connect(
+        snapshot_rollup_time, sender=_model_label,
+        dispatch_uid=f'rollup_init_{_model_label}'
+    )
+    post_save.connect(
+        mark_rollup_dirty, sender=_model_label,
+        dispatch_uid=f'rollup_save_{_model_label}'
+    )
+    post_delete.connect(
+        mark_rollup_dirty, sender=_model_label,
+        dispatch_uid=f'rollup_delete_{_model_label}'
+    )
@@ -0,0 +1,735 @@
+# analytics/local_vector_index.py
+# Self-contained memory-mapped vector index with exact and IVF kNN search
+
+import fcntl
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class LocalVectorIndex:
+    """
+    Cosine-similarity kNN index over float32 vectors.
+
+    Vectors are L2-normalized on insert and stored row-wise in a matrix that
+    is memory-mapped from ``<path>/vectors.f32`` (or held in memory when no
+    path is given). Row ids, metadata and the IVF partition are persisted
+    alongside it.
+
+    Searches scan every candidate row exactly while the index, or the set of
+    rows matching the metadata filters, is small. Larger indexes are
+    partitioned with spherical k-means (IVF) and only the lists nearest to
+    the query are scanned.
+
+    Writes append their changes to ``journal.ndjson``; the manifest (ids,
+    metadata) and IVF files are only rewritten when the journal outgrows the
+    index, or when training or compaction renumbers rows. Other processes
+    replay the journal tail on their next search or write.
+    """
+
+    EXACT_SEARCH_MAX_VECTORS = 20000
+    DEFAULT_NPROBE = 16
+    KMEANS_ITERATIONS = 10
+    KMEANS_SAMPLE_PER_LIST = 64
+    RETRAIN_GROWTH_FACTOR = 4
+    REBUILD_PENDING_RATIO = 0.1
+    COMPACT_DELETED_RATIO = 0.25
+    SCAN_CHUNK_ROWS = 65536
+    INITIAL_CAPACITY = 1024
+
+    JOURNAL_SNAPSHOT_ENTRIES = 10000
+
+    MANIFEST_FILE = 'manifest.json'
+    JOURNAL_FILE = 'journal.ndjson'
+    VECTORS_FILE = 'vectors.f32'
+    IVF_FILE = 'ivf.npz'
+    LOCK_FILE = '.lock'
+
+    def __init__(self, dimension: int, path: Optional[str] = None,
+                 exact_threshold: Optional[int] = None, nprobe: Optional[int] = None):
+        """
+        Open or create an index.
+
+        Args:
+            dimension: Vector dimension
+            path: Directory to persist to; None keeps the index in memory
+            exact_threshold: Candidate count up to which search is exact
+            nprobe: IVF lists scanned per query
+        """
+        self.dimension = dimension
+        self.path = path
+        self.exact_threshold = exact_threshold if exact_threshold is not None else self.EXACT_SEARCH_MAX_VECTORS
+        self.nprobe = nprobe or self.DEFAULT_NPROBE
+        self._manifest_mtime = None
+        self._generation = None
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._journal_pending: List[Dict[str, Any]] = []
+        self._snapshot_due = False
+        self._write_depth = 0
+        self._reset()
+
+        if path and os.path.exists(self._file(self.MANIFEST_FILE)):
+            self._load()
+
+    def _reset(self) -> None:
+        self._vectors = np.zeros((0, self.dimension), dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+        self._count = 0
+        self._ids: List[Optional[str]] = []
+        self._metadata: List[Optional[Dict[str, Any]]] = []
+        self._rows: Dict[str, int] = {}
+        self._postings: Dict[Tuple[str, str], set] = {}
+        self._reset_ivf()
+
+    def _reset_ivf(self) -> None:
+        self._centroids = None
+        self._assignments = np.full(len(self._live), -1, dtype=np.int32)
+        self._list_rows = np.empty(0, dtype=np.int64)
+        self._list_offsets = np.zeros(1, dtype=np.int64)
+        self._pending: List[int] = []
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._rows
+
+    @property
+    def is_trained(self) -> bool:
+        return self._centroids is not None
+
+    # Writes
+
+    def add(self, doc_id: str, vector: Sequence[float], metadata: Optional[Dict[str, Any]] = None) -> None:
+        """Insert or replace one document."""
+        self.add_batch([(doc_id, vector, metadata)])
+
+    def add_batch(self, items: Iterable[Tuple[str, Sequence[float], Optional[Dict[str, Any]]]]) -> int:
+        """
+        Insert or replace documents.
+
+        Args:
+            items: (doc_id, vector, metadata) tuples
+
+        Returns:
+            Number of documents written
+        """
+        items = list(items)
+        if not items:
+            return 0
+
+        vectors = self._normalize(np.asarray([vector for _, vector, _ in items], dtype=np.float32))
+        if vectors.ndim != 2 or vectors.shape[1] != self.dimension:
+            raise ValueError(f"Vector dimension mismatch: expected {self.dimension}")
+
+        with self._write():
+            rows = []
+            for doc_id, _, metadata in items:
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._count
+                    self._ensure_capacity(row + 1)
+                    self._count += 1
+                    self._ids.append(doc_id)
+                    self._metadata.append(None)
+                    self._rows[doc_id] = row
+                else:
+                    self._unindex_metadata(row)
+                self._metadata[row] = metadata or {}
+                self._index_metadata(row)
+                self._live[row] = True
+                rows.append(row)
+
+            rows = np.asarray(rows)
+            self._vectors[rows] = vectors
+            if self.is_trained:
+                self._assignments[rows] = self._nearest_lists(vectors)
+                self._pending.extend(rows.tolist())
+            self._journal(
+                {'op': 'add', 'row': row, 'id': doc_id, 'metadata': self._metadata[row],
+                 'list': int(self._assignments[row])}
+                for (doc_id, _, _), row in zip(items, rows.tolist())
+            )
+            self._maintain_ivf()
+
+        return len(items)
+
+    def remove(self, doc_ids: Iterable[str]) -> int:
+        """
+        Remove documents by id.
+
+        Returns:
+            Number of documents removed
+        """
+        removed_rows = []
+        with self._write():
+            for doc_id in doc_ids:
+                row = self._rows.pop(doc_id, None)
+                if row is None:
+                    continue
+                self._unindex_metadata(row)
+                self._live[row] = False
+                self._ids[row] = None
+                self._metadata[row] = None
+                removed_rows.append(row)
+            if removed_rows:
+                self._journal([{'op': 'remove', 'rows': removed_rows}])
+
+            if self._count and (self._count - len(self._rows)) > self.COMPACT_DELETED_RATIO * self._count:
+                self._compact()
+
+        return len(removed_rows)
+
+    def train(self, nlist: Optional[int] = None, seed: int = 0) -> None:
+        """
+        Partition the live vectors into IVF lists with spherical k-means.
+
+        Args:
+            nlist: Number of lists (default sqrt of the document count)
+            seed: Random seed for sampling
+        """
+        live_rows = np.flatnonzero(self._live[:self._count])
+        if not len(live_rows):
+            self._reset_ivf()
+            return
+
+        nlist = min(nlist or max(1, int(np.sqrt(len(live_rows)))), len(live_rows))
+        rng = np.random.default_rng(seed)
+        sample_size = min(len(live_rows), nlist * self.KMEANS_SAMPLE_PER_LIST)
+        sample = np.sort(rng.choice(live_rows, size=sample_size, replace=False))
+        data = np.asarray(self._vectors[sample])
+
+        centroids = data[rng.choice(len(data), size=nlist, replace=False)].copy()
+        for _ in range(self.KMEANS_ITERATIONS):
+            assignments = np.argmax(data @ centroids.T, axis=1)
+            counts = np.bincount(assignments, minlength=nlist)
+            nonempty = np.flatnonzero(counts)
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])[nonempty]
+            sums = np.add.reduceat(data[np.argsort(assignments, kind='stable')], starts, axis=0)
+            centroids[nonempty] = sums / counts[nonempty, None]
+            centroids = self._normalize(centroids)
+
+        self._centroids = centroids.astype(np.float32)
+        self._assignments = np.full(len(self._live), -1, dtype=np.int32)
+        for start in range(0, len(live_rows), self.SCAN_CHUNK_ROWS):
+            chunk = live_rows[start:start + self.SCAN_CHUNK_ROWS]
+            self._assignments[chunk] = self._nearest_lists(self._vectors[chunk])
+        self._trained_size = len(live_rows)
+        self._build_lists()
+        self._snapshot_due = True
+        logger.info(f"Trained vector index: {len(live_rows)} vectors in {nlist} lists")
+
+    def _maintain_ivf(self) -> None:
+        """Train, retrain or fold pending rows into the IVF lists as the index grows."""
+        size = len(self._rows)
+        if not self.is_trained:
+            if size > self.exact_threshold:
+                self.train()
+        elif size > self.RETRAIN_GROWTH_FACTOR * self._trained_size:
+            self.train()
+        elif len(self._pending) > self.REBUILD_PENDING_RATIO * size:
+            self._build_lists()
+
+    def _build_lists(self) -> None:
+        """Group live rows by IVF list so each list is a contiguous slice."""
+        live_rows = np.flatnonzero(self._live[:self._count] & (self._assignments[:self._count] >= 0))
+        assignments = self._assignments[live_rows]
+        order = np.argsort(assignments, kind='stable')
+        self._list_rows = live_rows[order]
+        self._list_offsets = np.searchsorted(assignments[order], np.arange(len(self._centroids) + 1))
+        self._pending = []
+
+    def _compact(self) -> None:
+        """Drop deleted rows and renumber the remaining ones."""
+        live_rows = np.flatnonzero(self._live[:self._count])
+        self._vectors[:len(live_rows)] = self._vectors[live_rows]
+        self._assignments[:len(live_rows)] = self._assignments[live_rows]
+        self._assignments[len(live_rows):] = -1
+        self._live[:] = False
+        self._live[:len(live_rows)] = True
+
+        self._ids = [self._ids[row] for row in live_rows]
+        self._metadata = [self._metadata[row] for row in live_rows]
+        self._count = len(live_rows)
+        self._rows = {doc_id: row for row, doc_id in enumerate(self._ids)}
+        self._postings = {}
+        for row in range(self._count):
+            self._index_metadata(row)
+
+        if self.is_trained:
+            self._build_lists()
+        self._snapshot_due = True
+
+    # Search
+
+    def search(self, query_vector: Sequence[float], k: int = 10, filters: Optional[Dict[str, Any]] = None,
+               nprobe: Optional[int] = None, exact: bool = False) -> List[Dict[str, Any]]:
+        """
+        Find the k most similar documents.
+
+        Args:
+            query_vector: Query embedding
+            k: Number of results
+            filters: Metadata equality filters; list values match any element
+            nprobe: IVF lists to scan (default self.nprobe)
+            exact: Force a brute-force scan
+
+        Returns:
+            Results with id, cosine similarity score and metadata, best first
+        """
+        self._refresh()
+        if k <= 0 or not self._rows:
+            return []
+
+        query = self._normalize(np.asarray(query_vector, dtype=np.float32).reshape(1, -1))[0]
+        if query.shape[0] != self.dimension:
+            raise ValueError(f"Query dimension mismatch: expected {self.dimension}")
+
+        candidates = self._filter_rows(filters)
+        if candidates is not None and not len(candidates):
+            return []
+
+        small = candidates is not None and len(candidates) <= self.exact_threshold
+        if exact or small or not self.is_trained:
+            rows, scores = self._scan(query, k, candidates)
+        else:
+            rows, scores = self._ivf_search(query, k, candidates, nprobe or self.nprobe)
+
+        return [
+            {'id': self._ids[row], 'score': float(score), 'metadata': self._metadata[row]}
+            for row, score in zip(rows.tolist(), scores.tolist())
+        ]
+
+    def _scan(self, query: np.ndarray, k: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-k over the given rows (all live rows when None), in bounded chunks."""
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+        total = self._count if rows is None else len(rows)
+
+        for start in range(0, total, self.SCAN_CHUNK_ROWS):
+            if rows is None:
+                stop = min(start + self.SCAN_CHUNK_ROWS, total)
+                chunk_rows = np.arange(start, stop)
+                scores = self._vectors[start:stop] @ query
+                live = self._live[start:stop]
+                chunk_rows, scores = chunk_rows[live], scores[live]
+            else:
+                chunk_rows = rows[start:start + self.SCAN_CHUNK_ROWS]
+                scores = self._vectors[chunk_rows] @ query
+
+            best_rows = np.concatenate([best_rows, chunk_rows])
+            best_scores = np.concatenate([best_scores, scores])
+            if len(best_scores) > k:
+                keep = np.argpartition(-best_scores, k - 1)[:k]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        order = np.argsort(-best_scores, kind='stable')
+        return best_rows[order], best_scores[order]
+
+    def _ivf_search(self, query: np.ndarray, k: int, candidates: Optional[np.ndarray],
+                    nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Scan the nprobe lists nearest to the query plus rows not yet folded into lists."""
+        probes = np.argsort(-(self._centroids @ query))[:nprobe]
+        parts = [self._list_rows[self._list_offsets[probe]:self._list_offsets[probe + 1]] for probe in probes]
+        if self._pending:
+            pending = np.asarray(self._pending)
+            parts.append(pending[np.isin(self._assignments[pending], probes)])
+
+        rows = np.unique(np.concatenate(parts))
+        rows = rows[self._live[rows]]
+        if candidates is not None:
+            rows = np.intersect1d(rows, candidates, assume_unique=True)
+
+        if len(rows) < k:
+            # Too few rows in the probed lists; fall back to an exact scan
+            return self._scan(query, k, candidates)
+        return self._scan(query, k, rows)
+
+    def _nearest_lists(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(np.asarray(vectors) @ self._centroids.T, axis=1).astype(np.int32)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return (vectors / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+    # Metadata filters
+
+    @staticmethod
+    def _posting_key(field: str, value: Any) -> Tuple[str, str]:
+        return field, json.dumps(value, sort_keys=True, default=str)
+
+    def _metadata_terms(self, row: int):
+        for field, value in (self._metadata[row] or {}).items():
+            values = value if isinstance(value, list) else [value]
+            for item in values:
+                yield self._posting_key(field, item)
+
+    def _index_metadata(self, row: int) -> None:
+        for key in self._metadata_terms(row):
+            self._postings.setdefault(key, set()).add(row)
+
+    def _unindex_metadata(self, row: int) -> None:
+        for key in self._metadata_terms(row):
+            rows = self._postings.get(key)
+            if rows is not None:
+                rows.discard(row)
+                if not rows:
+                    del self._postings[key]
+
+    def _filter_rows(self, filters: Optional[Dict[str, Any]]) -> Optional[np.ndarray]:
+        """Sorted rows matching every filter, or None when there are no filters."""
+        if not filters:
+            return None
+
+        matched = None
+        for field, value in filters.items():
+            values = value if isinstance(value, (list, tuple, set)) else [value]
+            rows = set()
+            for item in values:
+                rows |= self._postings.get(self._posting_key(field, item), set())
+            matched = rows if matched is None else matched & rows
+            if not matched:
+                return np.empty(0, dtype=np.int64)
+
+        return np.fromiter(sorted(matched), dtype=np.int64, count=len(matched))
+
+    # Storage
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _ensure_capacity(self, size: int) -> None:
+        capacity = len(self._live)
+        if size <= capacity:
+            return
+
+        capacity = max(size, capacity * 2, self.INITIAL_CAPACITY)
+        if self.path:
+            self._open_vectors(capacity)
+        else:
+            vectors = np.zeros((capacity, self.dimension), dtype=np.float32)
+            vectors[:self._count] = self._vectors[:self._count]
+            self._vectors = vectors
+
+        self._extend_rows(capacity)
+
+    def _extend_rows(self, capacity: int) -> None:
+        """Grow the per-row arrays to capacity rows."""
+        self._live = np.concatenate([self._live, np.zeros(capacity - len(self._live), dtype=bool)])
+        self._assignments = np.concatenate(
+            [self._assignments, np.full(capacity - len(self._assignments), -1, dtype=np.int32)]
+        )
+
+    def _open_vectors(self, capacity: Optional[int] = None) -> int:
+        """Memory-map the vector file, growing it to capacity rows when given."""
+        filename = self._file(self.VECTORS_FILE)
+        row_bytes = self.dimension * np.dtype(np.float32).itemsize
+
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+        self._vectors = None
+
+        if not os.path.exists(filename):
+            open(filename, 'wb').close()
+        if capacity is not None and os.path.getsize(filename) < capacity * row_bytes:
+            os.truncate(filename, capacity * row_bytes)
+        rows = os.path.getsize(filename) // row_bytes
+
+        self._vectors = (
+            np.memmap(filename, dtype=np.float32, mode='r+', shape=(rows, self.dimension))
+            if rows else np.zeros((0, self.dimension), dtype=np.float32)
+        )
+        return rows
+
+    @contextmanager
+    def batch(self):
+        """Group writes: everything inside takes the lock, refreshes and saves once."""
+        with self._write():
+            yield self
+
+    @contextmanager
+    def _write(self):
+        """Serialize writers across processes and persist the result."""
+        if not self.path or self._write_depth:
+            self._write_depth += 1
+            try:
+                yield
+            finally:
+                self._write_depth -= 1
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+        with open(self._file(self.LOCK_FILE), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._write_depth += 1
+            try:
+                self._refresh()
+                yield
+                self.save()
+            finally:
+                self._write_depth -= 1
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _journal(self, entries: Iterable[Dict[str, Any]]) -> None:
+        if self.path:
+            self._journal_pending.extend(entries)
+
+    def _refresh(self) -> None:
+        """Catch up with writes made by other processes."""
+        if not self.path:
+            return
+        try:
+            mtime = os.stat(self._file(self.MANIFEST_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._manifest_mtime:
+            self._load()
+            return
+
+        added = self._replay_journal()
+        if added and self.is_trained:
+            self._pending.extend(added)
+            if len(self._pending) > self.REBUILD_PENDING_RATIO * len(self._rows):
+                self._build_lists()
+
+    def save(self) -> None:
+        """
+        Flush vectors and persist pending changes.
+
+        Changes are appended to the journal. The manifest and IVF files are
+        rewritten, and the journal emptied, only when rows were renumbered
+        or retrained, or when the journal holds more entries than the index
+        has rows (and at least JOURNAL_SNAPSHOT_ENTRIES).
+        """
+        if not self.path:
+            return
+
+        os.makedirs(self.path, exist_ok=True)
+        if isinstance(self._vectors, np.memmap):
+            self._vectors.flush()
+
+        journal_size = self._journal_entries + len(self._journal_pending)
+        if (self._snapshot_due or self._generation is None
+                or journal_size > max(self.JOURNAL_SNAPSHOT_ENTRIES, self._count)):
+            self._write_snapshot()
+        elif self._journal_pending:
+            with open(self._file(self.JOURNAL_FILE), 'a') as handle:
+                handle.write(''.join(json.dumps(entry, default=str) + '\n' for entry in self._journal_pending))
+            self._journal_entries = journal_size
+            self._journal_offset = os.path.getsize(self._file(self.JOURNAL_FILE))
+        self._journal_pending = []
+
+    def _write_snapshot(self) -> None:
+        """Atomically replace the manifest and IVF files and start an empty journal."""
+        generation = uuid.uuid4().hex
+        if self.is_trained:
+            with open(self._file(self.IVF_FILE + '.tmp'), 'wb') as handle:
+                np.savez(
+                    handle,
+                    centroids=self._centroids,
+                    assignments=self._assignments[:self._count],
+                    trained_size=np.asarray(self._trained_size),
+                )
+            os.replace(self._file(self.IVF_FILE + '.tmp'), self._file(self.IVF_FILE))
+        elif os.path.exists(self._file(self.IVF_FILE)):
+            os.remove(self._file(self.IVF_FILE))
+
+        manifest = {
+            'dimension': self.dimension,
+            'count': self._count,
+            'ids': self._ids,
+            'metadata': self._metadata,
+            'generation': generation,
+        }
+        with open(self._file(self.MANIFEST_FILE + '.tmp'), 'w') as handle:
+            json.dump(manifest, handle, default=str)
+        header = json.dumps({'generation': generation}) + '\n'
+        with open(self._file(self.JOURNAL_FILE + '.tmp'), 'w') as handle:
+            handle.write(header)
+        # A journal left from the previous generation is ignored on load
+        os.replace(self._file(self.MANIFEST_FILE + '.tmp'), self._file(self.MANIFEST_FILE))
+        os.replace(self._file(self.JOURNAL_FILE + '.tmp'), self._file(self.JOURNAL_FILE))
+
+        self._manifest_mtime = os.stat(self._file(self.MANIFEST_FILE)).st_mtime_ns
+        self._generation = generation
+        self._journal_offset = len(header.encode())
+        self._journal_entries = 0
+        self._snapshot_due = False
+
+    def _replay_journal(self) -> List[int]:
+        """
+        Apply journal entries written since the last read.
+
+        Returns:
+            Rows added or replaced
+        """
+        try:
+            with open(self._file(self.JOURNAL_FILE), 'rb') as handle:
+                handle.seek(self._journal_offset)
+                data = handle.read()
+        except FileNotFoundError:
+            self._snapshot_due = True
+            return []
+
+        # A writer may be mid-append; only complete lines are applied
+        data = data[:data.rfind(b'\n') + 1]
+        lines = data.splitlines()
+        if self._journal_offset == 0 and lines:
+            header = json.loads(lines.pop(0))
+            if header.get('generation') != self._generation:
+                # Left over from an earlier snapshot; the next write starts a new one
+                self._snapshot_due = True
+                return []
+
+        added = []
+        for line in lines:
+            entry = json.loads(line)
+            if entry['op'] == 'add':
+                added.append(self._apply_add(entry))
+            elif entry['op'] == 'remove':
+                self._apply_remove(entry['rows'])
+        self._journal_offset += len(data)
+        self._journal_entries += len(lines)
+        return added
+
+    def _apply_add(self, entry: Dict[str, Any]) -> int:
+        row = entry['row']
+        if row >= len(self._live):
+            self._extend_rows(max(self._open_vectors(), row + 1))
+        while self._count <= row:
+            self._ids.append(None)
+            self._metadata.append(None)
+            self._count += 1
+
+        previous = self._ids[row]
+        if previous is not None:
+            self._unindex_metadata(row)
+            if previous != entry['id']:
+                self._rows.pop(previous, None)
+        self._ids[row] = entry['id']
+        self._metadata[row] = entry['metadata']
+        self._rows[entry['id']] = row
+        self._live[row] = True
+        self._assignments[row] = entry['list']
+        self._index_metadata(row)
+        return row
+
+    def _apply_remove(self, rows: List[int]) -> None:
+        for row in rows:
+            doc_id = self._ids[row]
+            if doc_id is None:
+                continue
+            self._unindex_metadata(row)
+            self._rows.pop(doc_id, None)
+            self._live[row] = False
+            self._ids[row] = None
+            self._metadata[row] = None
+
+    def _load(self) -> None:
+        manifest_file = self._file(self.MANIFEST_FILE)
+        mtime = os.stat(manifest_file).st_mtime_ns
+        with open(manifest_file) as handle:
+            manifest = json.load(handle)
+
+        if manifest['dimension'] != self.dimension:
+            raise ValueError(
+                f"Index at {self.path} has dimension {manifest['dimension']}, expected {self.dimension}"
+            )
+
+        self._reset()
+        capacity = self._open_vectors()
+        self._count = manifest['count']
+        self._ids = manifest['ids']
+        self._metadata = manifest['metadata']
+        self._live = np.zeros(capacity, dtype=bool)
+        self._assignments = np.full(capacity, -1, dtype=np.int32)
+        for row, doc_id in enumerate(self._ids):
+            if doc_id is not None:
+                self._rows[doc_id] = row
+                self._live[row] = True
+                self._index_metadata(row)
+
+        if os.path.exists(self._file(self.IVF_FILE)):
+            with np.load(self._file(self.IVF_FILE)) as ivf:
+                self._centroids = ivf['centroids']
+                self._assignments[:len(ivf['assignments'])] = ivf['assignments']
+                self._trained_size = int(ivf['trained_size'])
+
+        self._manifest_mtime = mtime
+        self._generation = manifest.get('generation')
+        self._journal_offset = 0
+        self._journal_entries = 0
+        self._journal_pending = []
+        self._replay_journal()
+        if self.is_trained:
+            self._build_lists()
+
+
+def benchmark_vector_index(document_counts: Iterable[int] = (10000, 100000), dimension: int = 128,
+                           queries: int = 100, k: int = 10, nprobe: Optional[int] = None,
+                           clusters: int = 100, seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Measure exact and IVF search throughput and IVF recall@k.
+
+    Vectors are drawn from a Gaussian mixture so the IVF partition has
+    structure to exploit, as real embeddings do.
+
+    Args:
+        document_counts: Index sizes to measure
+        dimension: Vector dimension
+        queries: Queries per measurement
+        k: Results per query
+        nprobe: IVF lists scanned per query
+        clusters: Mixture components in the synthetic data
+        seed: Random seed
+
+    Returns:
+        One row per index size with QPS for both paths and IVF recall@k
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+
+    for count in document_counts:
+        centers = rng.standard_normal((clusters, dimension)).astype(np.float32)
+        labels = rng.integers(0, clusters, size=count)
+        vectors = centers[labels] + 0.5 * rng.standard_normal((count, dimension)).astype(np.float32)
+        query_vectors = centers[rng.integers(0, clusters, size=queries)] + \
+            0.5 * rng.standard_normal((queries, dimension)).astype(np.float32)
+
+        index = LocalVectorIndex(dimension, nprobe=nprobe)
+        index.add_batch((str(i), vector, None) for i, vector in enumerate(vectors))
+        if not index.is_trained:
+            index.train()
+
+        start = time.perf_counter()
+        exact = [index.search(query, k, exact=True) for query in query_vectors]
+        exact_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        approximate = [index.search(query, k) for query in query_vectors]
+        ivf_seconds = time.perf_counter() - start
+
+        hits = sum(
+            len({hit['id'] for hit in truth} & {hit['id'] for hit in found})
+            for truth, found in zip(exact, approximate)
+        )
+        results.append({
+            'documents': count,
+            'exact_qps': round(queries / exact_seconds, 1),
+            'ivf_qps': round(queries / ivf_seconds, 1),
+            'recall_at_k': round(hits / (queries * k), 4),
+        })
+        logger.info(f"Vector index benchmark: {results[-1]}")
+
+    return results
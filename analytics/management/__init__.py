@@ -0,0 +1 @@
+# analytics/management/__init__.py
@@ -0,0 +1 @@
+# analytics/management/commands/__init__.py
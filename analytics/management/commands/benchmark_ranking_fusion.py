@@ -0,0 +1,54 @@
+# analytics/management/commands/benchmark_ranking_fusion.py
+# Django management command to benchmark hybrid ranking score fusion
+
+from django.core.management.base import BaseCommand
+from analytics.score_fusion import benchmark_fusion
+
+
+class Command(BaseCommand):
+    help = 'Benchmark list-based against NumPy score fusion and top-k ranking'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--documents',
+            type=int,
+            nargs='+',
+            default=[100, 1000, 10000, 100000],
+            help='Document counts to benchmark'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=10,
+            help='Results kept per query'
+        )
+        parser.add_argument(
+            '--repeats',
+            type=int,
+            default=5,
+            help='Timed repetitions per measurement'
+        )
+        parser.add_argument(
+            '--batch-queries',
+            type=int,
+            default=32,
+            help='Queries fused together on the batch path'
+        )
+
+    def handle(self, *args, **options):
+        results = benchmark_fusion(
+            document_counts=options['documents'],
+            k=options['top_k'],
+            repeats=options['repeats'],
+            batch_queries=options['batch_queries'],
+        )
+
+        self.stdout.write(
+            f"{'documents':>10} {'python ms':>12} {'numpy ms':>12} {'batch ms/query':>16} {'speedup':>8}"
+        )
+        for row in results:
+            self.stdout.write(
+                f"{row['documents']:>10} {row['python_ms']:>12} {row['numpy_ms']:>12} "
+                f"{row['numpy_batch_per_query_ms']:>16} {str(row['speedup']) + 'x':>8}"
+            )
+        self.stdout.write(self.style.SUCCESS('Fusion benchmark completed'))
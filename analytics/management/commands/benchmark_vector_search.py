@@ -0,0 +1,51 @@
+# analytics/management/commands/benchmark_vector_search.py
+# Django management command to benchmark local kNN recall and throughput
+
+from django.core.management.base import BaseCommand
+from analytics.vector_search import vector_search_manager
+
+
+class Command(BaseCommand):
+    help = 'Benchmark exact and IVF search of the local vector index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--documents',
+            type=int,
+            nargs='+',
+            default=[10000, 100000],
+            help='Index sizes to benchmark'
+        )
+        parser.add_argument(
+            '--queries',
+            type=int,
+            default=100,
+            help='Queries per measurement'
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=10,
+            help='Results per query'
+        )
+        parser.add_argument(
+            '--nprobe',
+            type=int,
+            default=None,
+            help='IVF lists scanned per query'
+        )
+
+    def handle(self, *args, **options):
+        results = vector_search_manager.benchmark(
+            document_counts=tuple(options['documents']),
+            queries=options['queries'],
+            k=options['top_k'],
+            nprobe=options['nprobe'],
+        )
+
+        self.stdout.write(f"{'documents':>10} {'exact qps':>10} {'ivf qps':>10} {'recall@k':>10}")
+        for row in results:
+            self.stdout.write(
+                f"{row['documents']:>10} {row['exact_qps']:>10} {row['ivf_qps']:>10} {row['recall_at_k']:>10}"
+            )
+        self.stdout.write(self.style.SUCCESS('Vector search benchmark completed'))
@@ -0,0 +1,256 @@
+# analytics/materialized_views.py
+# Change-driven concurrent refresh of reporting materialized views
+
+import logging
+import time
+from typing import Dict, Any, List, Optional
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# View name -> source models whose writes make the view stale, and the
+# unique key REFRESH ... CONCURRENTLY needs (see DatabaseOptimizer.create_materialized_views)
+MATERIALIZED_VIEWS = {
+    'mv_account_stats': {
+        'sources': ['crm.Account', 'crm.Contact', 'deals.Deal'],
+        'unique_key': ['account_id'],
+    },
+    'mv_lead_conversion_stats': {
+        'sources': ['crm.Lead'],
+        'unique_key': ['company_id', 'source'],
+    },
+    'mv_sales_pipeline': {
+        'sources': ['deals.Deal'],
+        'unique_key': ['company_id', 'stage_id'],
+    },
+}
+
+
+class MaterializedViewManager:
+    """
+    Refreshes materialized views when their source tables have changed enough.
+
+    Writes to source models bump a per-model change counter. A view is due
+    for refresh when the changes since its last refresh reach
+    CHANGE_THRESHOLD, or when it has any pending change and is older than
+    MAX_STALENESS, which bounds staleness. A view is never refreshed more
+    often than MIN_INTERVAL. Each run refreshes at most MAX_REFRESHES_PER_RUN
+    views, stalest first, so a burst of writes cannot cause a refresh storm.
+    Refreshes use REFRESH MATERIALIZED VIEW CONCURRENTLY, so readers are
+    never blocked.
+    """
+
+    CACHE_PREFIX = 'matview'
+    CACHE_VERSION = 'v1'
+    CHANGE_THRESHOLD = getattr(settings, 'MATERIALIZED_VIEW_CHANGE_THRESHOLD', 500)
+    MAX_STALENESS = getattr(settings, 'MATERIALIZED_VIEW_MAX_STALENESS', 900)  # 15 minutes
+    MIN_INTERVAL = getattr(settings, 'MATERIALIZED_VIEW_MIN_INTERVAL', 60)
+    MAX_REFRESHES_PER_RUN = getattr(settings, 'MATERIALIZED_VIEW_MAX_REFRESHES_PER_RUN', 2)
+    LOCK_TIMEOUT = 600
+
+    @classmethod
+    def _counter_key(cls, model_label: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:changes:{model_label}"
+
+    @classmethod
+    def _state_key(cls, view_name: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:state:{view_name}"
+
+    @classmethod
+    def _lock_key(cls, view_name: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:lock:{view_name}"
+
+    @classmethod
+    def record_changes(cls, model_label: str, count: int = 1) -> None:
+        """
+        Count writes to a source model.
+
+        Called from post_save/post_delete; bulk writers that bypass signals
+        should call it with the number of rows written.
+        """
+        key = cls._counter_key(model_label)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            cache.set(key, count, None)
+
+    @classmethod
+    def _change_count(cls, view_name: str) -> int:
+        sources = MATERIALIZED_VIEWS[view_name]['sources']
+        counters = cache.get_many([cls._counter_key(label) for label in sources])
+        return sum(counters.values())
+
+    @classmethod
+    def get_staleness(cls, view_name: str) -> Dict[str, Any]:
+        """
+        Get a view's staleness metadata.
+
+        Returns:
+            Dictionary with 'last_refreshed_at', 'age_seconds' (None if never
+            refreshed), 'pending_changes' and 'is_stale'
+        """
+        state = cache.get(cls._state_key(view_name)) or {}
+        pending = max(cls._change_count(view_name) - state.get('change_count', 0), 0)
+        refreshed_at = state.get('refreshed_at')
+        age = time.time() - refreshed_at if refreshed_at else None
+
+        return {
+            'view': view_name,
+            'last_refreshed_at': state.get('refreshed_at_iso'),
+            'age_seconds': age,
+            'pending_changes': pending,
+            'last_duration_ms': state.get('duration_ms'),
+            'is_stale': age is None or pending > 0,
+        }
+
+    @classmethod
+    def is_fresh(cls, view_name: str, max_staleness: Optional[int] = None) -> bool:
+        """
+        Whether a view can answer queries within a staleness bound.
+
+        A view with no pending changes is fresh however old it is; otherwise
+        its last refresh must be within max_staleness seconds.
+        """
+        if view_name not in MATERIALIZED_VIEWS:
+            return False
+        staleness = cls.get_staleness(view_name)
+        if staleness['age_seconds'] is None:
+            return False
+        if staleness['pending_changes'] == 0:
+            return True
+        bound = cls.MAX_STALENESS if max_staleness is None else max_staleness
+        return staleness['age_seconds'] <= bound
+
+    @classmethod
+    def is_due(cls, view_name: str) -> bool:
+        """Whether a view should be refreshed now."""
+        staleness = cls.get_staleness(view_name)
+        if staleness['age_seconds'] is None:
+            return True
+        if staleness['pending_changes'] == 0 or staleness['age_seconds'] < cls.MIN_INTERVAL:
+            return False
+        return (staleness['pending_changes'] >= cls.CHANGE_THRESHOLD
+                or staleness['age_seconds'] >= cls.MAX_STALENESS)
+
+    @classmethod
+    def ensure_unique_index(cls, view_name: str) -> None:
+        """Create the unique index REFRESH ... CONCURRENTLY requires."""
+        qn = connection.ops.quote_name
+        columns = ', '.join(qn(column) for column in MATERIALIZED_VIEWS[view_name]['unique_key'])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {qn(view_name + '_refresh_key')} "
+                f"ON {qn(view_name)} ({columns})"
+            )
+
+    @classmethod
+    def is_populated(cls, view_name: str) -> bool:
+        """Whether PostgreSQL holds data for the view (it has been refreshed or created WITH DATA)."""
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT ispopulated FROM pg_matviews WHERE matviewname = %s", [view_name])
+            row = cursor.fetchone()
+        return bool(row and row[0])
+
+    @classmethod
+    def mark_refreshed(cls, view_name: str, change_count: Optional[int] = None,
+                       duration_ms: Optional[float] = None) -> None:
+        """Record that a view reflects its sources as of the given change count (default: now)."""
+        cache.set(cls._state_key(view_name), {
+            'refreshed_at': time.time(),
+            'refreshed_at_iso': timezone.now().isoformat(),
+            'change_count': cls._change_count(view_name) if change_count is None else change_count,
+            'duration_ms': duration_ms,
+        }, None)
+
+    @classmethod
+    def refresh_view(cls, view_name: str) -> Dict[str, Any]:
+        """
+        Refresh one view, concurrently where possible.
+
+        The change count is read before refreshing, so writes made during
+        the refresh stay pending for the next one.
+
+        Returns:
+            Refresh result with status and duration
+        """
+        if connection.vendor != 'postgresql':
+            return {'view': view_name, 'status': 'skipped', 'reason': 'requires PostgreSQL'}
+        if not cache.add(cls._lock_key(view_name), 1, cls.LOCK_TIMEOUT):
+            return {'view': view_name, 'status': 'skipped', 'reason': 'refresh in progress'}
+
+        try:
+            change_count = cls._change_count(view_name)
+            started = time.perf_counter()
+            qn = connection.ops.quote_name
+
+            # CONCURRENTLY needs a populated view with a unique index; only an unpopulated view gets a plain refresh
+            concurrently = cls.is_populated(view_name)
+            if concurrently:
+                cls.ensure_unique_index(view_name)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{qn(view_name)}"
+                )
+
+            duration_ms = (time.perf_counter() - started) * 1000
+            cls.mark_refreshed(view_name, change_count, duration_ms)
+
+            logger.info(f"Refreshed materialized view {view_name} in {duration_ms:.0f}ms")
+            return {'view': view_name, 'status': 'refreshed', 'concurrently': concurrently,
+                    'duration_ms': duration_ms}
+        finally:
+            cache.delete(cls._lock_key(view_name))
+
+    @classmethod
+    def refresh_due_views(cls, force: bool = False) -> List[Dict[str, Any]]:
+        """
+        Refresh the views that are due, stalest first.
+
+        Args:
+            force: Refresh every registered view regardless of change counts
+
+        Returns:
+            Refresh results
+        """
+        candidates = [
+            cls.get_staleness(view_name) for view_name in MATERIALIZED_VIEWS
+            if force or cls.is_due(view_name)
+        ]
+        candidates.sort(key=lambda s: float('inf') if s['age_seconds'] is None else s['age_seconds'], reverse=True)
+        if not force:
+            candidates = candidates[:cls.MAX_REFRESHES_PER_RUN]
+
+        results = []
+        for staleness in candidates:
+            try:
+                results.append(cls.refresh_view(staleness['view']))
+            except Exception as e:
+                logger.error(f"Error refreshing materialized view {staleness['view']}: {e}")
+                results.append({'view': staleness['view'], 'status': 'error', 'error': str(e)})
+        return results
+
+
+# Signal handlers counting source table changes
+def record_change_on_write(sender, instance, raw=False, **kwargs):
+    """Count a write to a view source model once it commits."""
+    if raw:
+        return
+    model_label = sender._meta.label
+    transaction.on_commit(lambda: MaterializedViewManager.record_changes(model_label))
+
+
+for _model_label in {label for view in MATERIALIZED_VIEWS.values() for label in view['sources']}:
+    post_save.connect(
+        record_change_on_write, sender=_model_label,
+        dispatch_uid=f'matview_changes_save_{_model_label}'
+    )
+    post_delete.connect(
+        record_change_on_write, sender=_model_label,
+        dispatch_uid=f'matview_changes_delete_{_model_label}'
+    )
@@ -0,0 +1,53 @@
+# Generated migration for shared incremental aggregate state
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_vector_search_index'),
+    ]
+
+    operations = [
+        # Aggregate definitions shared across workers
+        migrations.RunSQL(
+            sql="""
+            CREATE TABLE IF NOT EXISTS analytics_aggregate_definition (
+                id VARCHAR(64) PRIMARY KEY,
+                company_id VARCHAR(64) NOT NULL,
+                definition JSONB NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            );
+            """,
+            reverse_sql="DROP TABLE IF EXISTS analytics_aggregate_definition;"
+        ),
+
+        migrations.RunSQL(
+            sql="""
+            CREATE INDEX IF NOT EXISTS idx_aggregate_definition_company
+            ON analytics_aggregate_definition (company_id);
+            """,
+            reverse_sql="DROP INDEX IF EXISTS idx_aggregate_definition_company;"
+        ),
+
+        # Mergeable aggregate state, one row per cell and metric
+        migrations.RunSQL(
+            sql="""
+            CREATE TABLE IF NOT EXISTS analytics_aggregate_state (
+                aggregate_id VARCHAR(64) NOT NULL,
+                time_bucket TIMESTAMP WITH TIME ZONE NOT NULL,
+                dimension_hash VARCHAR(32) NOT NULL,
+                metric VARCHAR(128) NOT NULL,
+                dimensions JSONB NOT NULL DEFAULT '{}',
+                record_count BIGINT NOT NULL DEFAULT 0,
+                sum_value DOUBLE PRECISION NOT NULL DEFAULT 0,
+                min_value DOUBLE PRECISION,
+                max_value DOUBLE PRECISION,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                PRIMARY KEY (aggregate_id, time_bucket, dimension_hash, metric)
+            );
+            """,
+            reverse_sql="DROP TABLE IF EXISTS analytics_aggregate_state;"
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated migration for mergeable sketch state on incremental aggregates
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_aggregate_state'),
+    ]
+
+    operations = [
+        # Serialized HyperLogLog / t-digest sketches
+        migrations.RunSQL(
+            sql="""
+            ALTER TABLE analytics_aggregate_state
+            ADD COLUMN IF NOT EXISTS sketch BYTEA;
+            """,
+            reverse_sql="ALTER TABLE analytics_aggregate_state DROP COLUMN IF EXISTS sketch;"
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated migration for pre-aggregated rollups of analytics models
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_aggregate_state_sketches'),
+    ]
+
+    operations = [
+        # Hourly/daily/monthly rollup cells, one row per bucket and dimension group
+        migrations.RunSQL(
+            sql="""
+            CREATE TABLE IF NOT EXISTS analytics_rollup (
+                source VARCHAR(64) NOT NULL,
+                company_id VARCHAR(64) NOT NULL,
+                resolution VARCHAR(16) NOT NULL,
+                bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+                dimension_hash VARCHAR(32) NOT NULL,
+                dimensions JSONB NOT NULL DEFAULT '{}',
+                state JSONB NOT NULL,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                PRIMARY KEY (source, company_id, resolution, bucket_start, dimension_hash)
+            );
+            """,
+            reverse_sql="DROP TABLE IF EXISTS analytics_rollup;"
+        ),
+    ]
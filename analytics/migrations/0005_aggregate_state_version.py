@@ -0,0 +1,23 @@
+# Generated migration for commit-ordered aggregate state versions
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_analytics_rollup'),
+    ]
+
+    operations = [
+        # Per-aggregate write counter, incremented in each writing transaction
+        migrations.RunSQL(
+            sql="""
+            CREATE TABLE IF NOT EXISTS analytics_aggregate_version (
+                aggregate_id VARCHAR(64) PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0
+            );
+            """,
+            reverse_sql="DROP TABLE IF EXISTS analytics_aggregate_version;"
+        ),
+    ]
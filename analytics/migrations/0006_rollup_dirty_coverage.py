@@ -0,0 +1,39 @@
+# Generated migration for rollup dirty months and built coverage
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0005_aggregate_state_version'),
+    ]
+
+    operations = [
+        # Months whose rollups must be rebuilt, one row per source, tenant and month
+        migrations.RunSQL(
+            sql="""
+            CREATE TABLE IF NOT EXISTS analytics_rollup_dirty (
+                source VARCHAR(64) NOT NULL,
+                company_id VARCHAR(64) NOT NULL,
+                month_start TIMESTAMP WITH TIME ZONE NOT NULL,
+                PRIMARY KEY (source, company_id, month_start)
+            );
+            """,
+            reverse_sql="DROP TABLE IF EXISTS analytics_rollup_dirty;"
+        ),
+        # Ranges rollups were built for; NULL bounds are open
+        migrations.RunSQL(
+            sql="""
+            CREATE TABLE IF NOT EXISTS analytics_rollup_coverage (
+                source VARCHAR(64) NOT NULL,
+                company_id VARCHAR(64) NOT NULL,
+                covered_from TIMESTAMP WITH TIME ZONE,
+                covered_to TIMESTAMP WITH TIME ZONE
+            );
+            CREATE INDEX IF NOT EXISTS analytics_rollup_coverage_tenant
+                ON analytics_rollup_coverage (source, company_id);
+            """,
+            reverse_sql="DROP TABLE IF EXISTS analytics_rollup_coverage;"
+        ),
+    ]
@@ -4,13 +4,18 @@
 import hashlib
 import json
 import logging
+import time
 from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
 from django.db import connection, models
 from django.utils import timezone
 from django.db.models import Q, Count, Sum, Avg, Min, Max
 from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.db.models import F, ExpressionWrapper, DurationField
+from analytics.sketches import HyperLogLog, TDigest, SKETCH_CLASSES
+from analytics.materialized_views import MaterializedViewManager
 
 logger = logging.getLogger(__name__)
 
@@ -37,19 +42,20 @@ class QueryPlanCache:
         return hashlib.md5(query_str.encode()).hexdigest()
     
     @classmethod
-    def get_query_plan(cls, sql: str) -> Optional[Dict[str, Any]]:
+    def get_query_plan(cls, sql: str, params: Optional[Tuple] = None) -> Optional[Dict[str, Any]]:
         """
         Get execution plan for SQL query.
         
         Args:
             sql: SQL query string
+            params: Query parameters
             
         Returns:
             Query execution plan from EXPLAIN
         """
         try:
             with connection.cursor() as cursor:
-                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}")
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
                 plan = cursor.fetchone()[0]
                 return plan[0] if isinstance(plan, list) else plan
         except Exception as e:
@@ -74,7 +80,7 @@ class QueryPlanCache:
         cache_key = cls.get_cache_key(query_hash)
         
         # Get plan from database
-        plan = cls.get_query_plan(sql)
+        plan = cls.get_query_plan(sql, params)
         
         if plan:
             timeout = timeout or cls.DEFAULT_TIMEOUT
@@ -149,6 +155,12 @@ class MaterializedAggregateManager:
         'max': Max,
     }
     
+    # Approximate aggregate types backed by mergeable sketches
+    SKETCH_AGGREGATE_TYPES = {
+        'approx_distinct': HyperLogLog,
+        'approx_quantile': TDigest,
+    }
+    
     @classmethod
     def get_cache_key(cls, entity_type: str, aggregate_name: str,
                       company_id: Optional[str] = None,
@@ -190,6 +202,11 @@ class MaterializedAggregateManager:
         field_name = aggregate_config['field']
         dimensions = aggregate_config.get('dimensions', [])
         
+        if aggregate_type in cls.SKETCH_AGGREGATE_TYPES:
+            return cls.materialize_sketch_aggregate(
+                entity_type, aggregate_config, model_class, company_id, filters
+            )
+        
         logger.info(f"Materializing aggregate {entity_type}.{aggregate_name}")
         
         # Build queryset
@@ -227,6 +244,167 @@ class MaterializedAggregateManager:
         
         return formatted_results
     
+    @classmethod
+    def materialize_sketch_aggregate(cls, entity_type: str, aggregate_config: Dict[str, Any],
+                                    model_class: models.Model, company_id: Optional[str] = None,
+                                    filters: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Materialize an approximate aggregate as mergeable sketches.
+        
+        Streams (dimensions, value) tuples in a single pass and builds one
+        sketch per dimension group. Each row carries the estimate plus the
+        serialized sketch, so cached results can be merged and updated
+        incrementally without rescanning the table.
+        
+        Args:
+            entity_type: Type of entity
+            aggregate_config: Configuration with 'name', 'type', 'field', 'dimensions'
+                and optional 'expression' (annotated as 'field') and 'filters'
+            model_class: Django model class
+            company_id: Optional company UUID
+            filters: Additional filters
+            
+        Returns:
+            Materialized aggregate result with serialized sketches
+        """
+        aggregate_name = aggregate_config['name']
+        aggregate_type = aggregate_config['type']
+        field_name = aggregate_config['field']
+        dimensions = aggregate_config.get('dimensions', [])
+        sketch_class = cls.SKETCH_AGGREGATE_TYPES[aggregate_type]
+        
+        logger.info(f"Materializing sketch aggregate {entity_type}.{aggregate_name}")
+        
+        queryset = model_class.objects.all()
+        if company_id:
+            queryset = queryset.filter(company_id=company_id)
+        if aggregate_config.get('expression') is not None:
+            queryset = queryset.annotate(**{field_name: aggregate_config['expression']})
+        if aggregate_config.get('filters'):
+            queryset = queryset.filter(**aggregate_config['filters'])
+        if filters:
+            queryset = queryset.filter(**filters)
+        
+        sketches: Dict[Tuple, Any] = {}
+        rows = queryset.values_list(*dimensions, field_name).iterator(chunk_size=5000)
+        for row in rows:
+            group = tuple(row[:-1])
+            if group not in sketches:
+                sketches[group] = sketch_class()
+            sketches[group].add(row[-1])
+        
+        return {
+            'aggregate_name': aggregate_name,
+            'aggregate_type': aggregate_type,
+            'field': field_name,
+            'dimensions': dimensions,
+            'data': [
+                cls._sketch_row(aggregate_name, dimensions, group, sketch)
+                for group, sketch in sketches.items()
+            ],
+            'computed_at': timezone.now().isoformat(),
+            'record_count': len(sketches)
+        }
+    
+    @classmethod
+    def _sketch_row(cls, aggregate_name: str, dimensions: List[str],
+                    group: Tuple, sketch: Any) -> Dict[str, Any]:
+        """Format one dimension group of a sketch aggregate."""
+        row = {dim: value for dim, value in zip(dimensions, group)}
+        row[f'{aggregate_name}_value'] = sketch.estimate()
+        row[f'{aggregate_name}_sketch'] = {'type': sketch.SKETCH_TYPE, **sketch.to_dict()}
+        return row
+    
+    @classmethod
+    def _load_sketch(cls, payload: Dict[str, Any]) -> Any:
+        """Deserialize a sketch stored in a cached aggregate row."""
+        return SKETCH_CLASSES[payload['type']].from_dict(payload)
+    
+    @classmethod
+    def merge_sketch_aggregates(cls, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Merge sketch aggregate results (e.g. per time bucket or per worker).
+        
+        Args:
+            results: Results of materialize_sketch_aggregate for the same aggregate
+            
+        Returns:
+            Merged result with estimates recomputed from the merged sketches
+        """
+        if not results:
+            return {}
+        
+        aggregate_name = results[0]['aggregate_name']
+        dimensions = results[0]['dimensions']
+        sketch_field = f'{aggregate_name}_sketch'
+        
+        merged: Dict[Tuple, Any] = {}
+        for result in results:
+            for row in result['data']:
+                group = tuple(row.get(dim) for dim in dimensions)
+                sketch = cls._load_sketch(row[sketch_field])
+                if group in merged:
+                    merged[group].merge(sketch)
+                else:
+                    merged[group] = sketch
+        
+        return {
+            **results[0],
+            'data': [
+                cls._sketch_row(aggregate_name, dimensions, group, sketch)
+                for group, sketch in merged.items()
+            ],
+            'computed_at': timezone.now().isoformat(),
+            'record_count': len(merged)
+        }
+    
+    @classmethod
+    def update_cached_sketch_aggregate(cls, entity_type: str, aggregate_config: Dict[str, Any],
+                                      record: Dict[str, Any], company_id: Optional[str] = None,
+                                      filters: Optional[Dict] = None) -> bool:
+        """
+        Incrementally add one record to a cached sketch aggregate.
+        
+        Args:
+            entity_type: Type of entity
+            aggregate_config: Sketch aggregate configuration
+            record: Record values keyed by dimension and field name
+            company_id: Optional company UUID
+            filters: Filters the cached aggregate was computed with
+            
+        Returns:
+            True if a cached aggregate was updated
+        """
+        aggregate_name = aggregate_config['name']
+        dimensions = aggregate_config.get('dimensions', [])
+        
+        cached = cls.get_cached_aggregate(entity_type, aggregate_name, company_id, dimensions, filters)
+        if not cached:
+            return False
+        
+        group = tuple(record.get(dim) for dim in dimensions)
+        sketch_field = f'{aggregate_name}_sketch'
+        
+        for index, row in enumerate(cached['data']):
+            if tuple(row.get(dim) for dim in dimensions) == group:
+                sketch = cls._load_sketch(row[sketch_field])
+                break
+        else:
+            index = None
+            sketch = cls.SKETCH_AGGREGATE_TYPES[aggregate_config['type']]()
+        
+        sketch.add(record.get(aggregate_config['field']))
+        row = cls._sketch_row(aggregate_name, dimensions, group, sketch)
+        
+        if index is None:
+            cached['data'].append(row)
+            cached['record_count'] = len(cached['data'])
+        else:
+            cached['data'][index] = row
+        
+        cls.cache_aggregate(entity_type, aggregate_config, cached, company_id, filters)
+        return True
+    
     @classmethod
     def cache_aggregate(cls, entity_type: str, aggregate_config: Dict[str, Any],
                        result: Dict[str, Any], company_id: Optional[str] = None,
@@ -342,6 +520,23 @@ class ReportingPresets:
             'dimensions': ['close_date'],
             'time_dimension': 'month',
         },
+        {
+            'name': 'unique_accounts_by_stage',
+            'type': 'approx_distinct',
+            'field': 'account_id',
+            'dimensions': ['stage'],
+        },
+        {
+            'name': 'deal_cycle_days',
+            'type': 'approx_quantile',
+            'field': 'cycle_time',
+            'expression': ExpressionWrapper(
+                F('actual_close_date') - TruncDate('created_at'),
+                output_field=DurationField()
+            ),
+            'filters': {'actual_close_date__isnull': False},
+            'dimensions': [],
+        },
     ]
     
     # Account aggregates
@@ -379,26 +574,466 @@ class ReportingPresets:
             return []
 
 
+class ReportLatencyTracker:
+    """
+    Records per-report latency so precomputation can prioritize slow reports.
+    
+    Each report keeps EWMAs of its end-to-end latency and of the time spent
+    computing aggregates that were not cached, together with its config so it
+    can be re-run by precompute_common_reports.
+    """
+    
+    CACHE_PREFIX = 'report:latency'
+    CACHE_VERSION = 'v1'
+    DEFAULT_TIMEOUT = 86400 * 7  # 7 days
+    MAX_TRACKED_REPORTS = 200  # Per entity type
+    EWMA_ALPHA = 0.3
+    
+    @classmethod
+    def get_report_key(cls, report_config: Dict[str, Any], company_id: Optional[str] = None) -> str:
+        """Identify a report by entity type, aggregates, filters and tenant."""
+        key_data = json.dumps({
+            'entity_type': report_config.get('entity_type'),
+            'aggregates': sorted(
+                (agg['name'], agg['type'], agg['field'], sorted(agg.get('dimensions', [])))
+                for agg in report_config.get('aggregates', [])
+            ),
+            'filters': report_config.get('filters', {}),
+            'company_id': company_id,
+        }, sort_keys=True, default=str)
+        return hashlib.md5(key_data.encode()).hexdigest()
+    
+    @classmethod
+    def _stats_key(cls, report_key: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:{report_key}"
+    
+    @classmethod
+    def _index_key(cls, entity_type: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:index:{entity_type}"
+    
+    @classmethod
+    def _ewma(cls, previous: Optional[float], value: float) -> float:
+        if previous is None:
+            return value
+        return cls.EWMA_ALPHA * value + (1 - cls.EWMA_ALPHA) * previous
+    
+    @classmethod
+    def record(cls, report_config: Dict[str, Any], company_id: Optional[str],
+              latency_ms: float, compute_ms: float = 0.0) -> Dict[str, Any]:
+        """
+        Record one execution of a report.
+        
+        Args:
+            report_config: Report configuration
+            company_id: Optional company UUID
+            latency_ms: End-to-end execution time
+            compute_ms: Time spent computing uncached aggregates (0 if all were cached)
+            
+        Returns:
+            Updated latency stats for the report
+        """
+        entity_type = report_config.get('entity_type')
+        report_key = cls.get_report_key(report_config, company_id)
+        stats = cache.get(cls._stats_key(report_key)) or {
+            'report_key': report_key,
+            'entity_type': entity_type,
+            'company_id': company_id,
+            'count': 0,
+            'latency_ewma_ms': None,
+            'compute_ewma_ms': None,
+            'max_ms': 0.0,
+        }
+        
+        stats['report_config'] = report_config
+        stats['count'] += 1
+        stats['last_ms'] = latency_ms
+        stats['max_ms'] = max(stats['max_ms'], latency_ms)
+        stats['latency_ewma_ms'] = cls._ewma(stats['latency_ewma_ms'], latency_ms)
+        if compute_ms:
+            stats['compute_ewma_ms'] = cls._ewma(stats['compute_ewma_ms'], compute_ms)
+        stats['updated_at'] = timezone.now().isoformat()
+        cache.set(cls._stats_key(report_key), stats, cls.DEFAULT_TIMEOUT)
+        
+        index = [key for key in cache.get(cls._index_key(entity_type), []) if key != report_key]
+        index.append(report_key)
+        cache.set(cls._index_key(entity_type), index[-cls.MAX_TRACKED_REPORTS:], cls.DEFAULT_TIMEOUT)
+        
+        return stats
+    
+    @classmethod
+    def get_stats(cls, report_config: Dict[str, Any], company_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get latency stats for a report."""
+        return cache.get(cls._stats_key(cls.get_report_key(report_config, company_id)))
+    
+    @classmethod
+    def get_slowest(cls, entity_type: str, limit: int = 10,
+                    company_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Get the tracked reports with the highest compute latency.
+        
+        Args:
+            entity_type: Type of entity
+            limit: Maximum number of reports
+            company_id: Only return this tenant's reports
+            
+        Returns:
+            Latency stats, slowest first
+        """
+        index = cache.get(cls._index_key(entity_type), [])
+        stats = cache.get_many([cls._stats_key(key) for key in index]).values()
+        if company_id:
+            stats = [s for s in stats if s['company_id'] == company_id]
+        return sorted(
+            stats,
+            key=lambda s: s['compute_ewma_ms'] or s['latency_ewma_ms'] or 0,
+            reverse=True
+        )[:limit]
+
+
+class ReportPlanner:
+    """
+    Plans and executes the uncached aggregates of a report.
+    
+    Aggregates that share filters are merged: those with the same
+    dimensions become one GROUP BY with several aggregate columns, and on
+    PostgreSQL different dimension sets are folded into a single
+    GROUP BY GROUPING SETS scan. A group that a registered materialized view
+    can answer is read from whichever of the view or the live table has the
+    lower estimated cost in its cached query plan, provided the view is
+    fresh enough (see MaterializedViewManager.is_fresh).
+    """
+    
+    # Re-aggregation of materialized view columns: (aggregate type, field) -> (function, column).
+    # 'dimension_columns' maps report dimensions to view columns where their names differ.
+    VIEW_ROUTES: Dict[str, List[Dict[str, Any]]] = {
+        'lead': [
+            {
+                'view': 'mv_lead_conversion_stats',
+                'dimensions': ['source'],
+                'filters': {'is_active': True},
+                'columns': {('count', 'id'): ('SUM', 'total_leads')},
+            },
+        ],
+        'deal': [
+            {
+                'view': 'mv_sales_pipeline',
+                'dimensions': ['stage'],
+                'dimension_columns': {'stage': 'stage_id'},
+                'filters': {'status': 'open', 'is_active': True},
+                'columns': {
+                    ('count', 'id'): ('SUM', 'deals_count'),
+                    ('sum', 'amount'): ('SUM', 'total_amount'),
+                },
+            },
+        ],
+    }
+    
+    GROUPING_ALIAS = '_grouping_id'
+    
+    @classmethod
+    def register_view_route(cls, entity_type: str, route: Dict[str, Any]) -> None:
+        """Register a materialized view that can answer aggregates of an entity type."""
+        cls.VIEW_ROUTES.setdefault(entity_type, []).append(route)
+    
+    @classmethod
+    def plan(cls, entity_type: str, aggregates: List[Dict[str, Any]],
+             filters: Optional[Dict] = None, max_staleness: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Group aggregates into as few queries as possible.
+        
+        Args:
+            entity_type: Type of entity
+            aggregates: Aggregate configurations to compute
+            filters: Report filters shared by all aggregates
+            max_staleness: Seconds a materialized view may lag its sources
+            
+        Returns:
+            Query groups with 'aggregates' and distinct 'dimension_sets'
+        """
+        groups: Dict[str, Dict[str, Any]] = {}
+        plan = []
+        
+        for aggregate_config in aggregates:
+            mergeable = (
+                aggregate_config['type'] in MaterializedAggregateManager.AGGREGATE_TYPES
+                and aggregate_config.get('expression') is None
+            )
+            if not mergeable:
+                plan.append({'aggregates': [aggregate_config], 'mergeable': False})
+                continue
+            
+            group_key = json.dumps(aggregate_config.get('filters') or {}, sort_keys=True, default=str)
+            if group_key not in groups:
+                groups[group_key] = {
+                    'aggregates': [],
+                    'mergeable': True,
+                    'filters': aggregate_config.get('filters') or {},
+                    'dimension_sets': [],
+                }
+                plan.append(groups[group_key])
+            group = groups[group_key]
+            group['aggregates'].append(aggregate_config)
+            dimensions = tuple(aggregate_config.get('dimensions', []))
+            if dimensions not in group['dimension_sets']:
+                group['dimension_sets'].append(dimensions)
+        
+        for group in plan:
+            group['source'] = 'live'
+            if group['mergeable']:
+                group['view_route'] = cls._find_view_route(entity_type, group, filters, max_staleness)
+        
+        return plan
+    
+    @classmethod
+    def execute(cls, entity_type: str, group: Dict[str, Any], model_class: models.Model,
+                company_id: Optional[str] = None, filters: Optional[Dict] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Execute one planned query group.
+        
+        Returns:
+            Aggregate results keyed by aggregate name, in materialize_aggregate format
+        """
+        if not group['mergeable']:
+            aggregate_config = group['aggregates'][0]
+            return {
+                aggregate_config['name']: MaterializedAggregateManager.materialize_aggregate(
+                    entity_type, aggregate_config, model_class, company_id, filters
+                )
+            }
+        
+        queryset = model_class.objects.all()
+        if company_id:
+            queryset = queryset.filter(company_id=company_id)
+        if group['filters']:
+            queryset = queryset.filter(**group['filters'])
+        if filters:
+            queryset = queryset.filter(**filters)
+        
+        route = group.get('view_route')
+        if route and cls._view_is_cheaper(route, group, queryset, company_id):
+            group['source'] = route['view']
+            group['staleness'] = MaterializedViewManager.get_staleness(route['view'])
+            rows_by_set = cls._query_view(route, group, company_id)
+        elif len(group['dimension_sets']) > 1 and connection.vendor == 'postgresql':
+            rows_by_set = cls._query_grouping_sets(group, queryset, model_class)
+        else:
+            rows_by_set = None
+        
+        if rows_by_set is None:
+            rows_by_set = {
+                dimensions: cls._query_dimension_set(group, dimensions, queryset)
+                for dimensions in group['dimension_sets']
+            }
+        
+        computed_at = timezone.now().isoformat()
+        results = {}
+        for aggregate_config in group['aggregates']:
+            dimensions = list(aggregate_config.get('dimensions', []))
+            value_field = f"{aggregate_config['name']}_value"
+            data = [
+                {**{dim: row[dim] for dim in dimensions}, value_field: row[value_field]}
+                for row in rows_by_set[tuple(dimensions)]
+            ]
+            results[aggregate_config['name']] = {
+                'aggregate_name': aggregate_config['name'],
+                'aggregate_type': aggregate_config['type'],
+                'field': aggregate_config['field'],
+                'dimensions': dimensions,
+                'data': data,
+                'computed_at': computed_at,
+                'record_count': len(data),
+                'source': group['source'],
+            }
+            if 'staleness' in group:
+                results[aggregate_config['name']]['staleness'] = group['staleness']
+        return results
+    
+    @classmethod
+    def _annotations(cls, aggregates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        return {
+            f"{agg['name']}_value": MaterializedAggregateManager.AGGREGATE_TYPES[agg['type']](agg['field'])
+            for agg in aggregates
+        }
+    
+    @classmethod
+    def _query_dimension_set(cls, group: Dict[str, Any], dimensions: Tuple,
+                             queryset: models.QuerySet) -> List[Dict[str, Any]]:
+        """One GROUP BY computing every aggregate of the group that uses these dimensions."""
+        aggregates = [agg for agg in group['aggregates'] if tuple(agg.get('dimensions', [])) == dimensions]
+        annotations = cls._annotations(aggregates)
+        if not dimensions:
+            return [queryset.aggregate(**annotations)]
+        return list(queryset.values(*dimensions).annotate(**annotations).order_by())
+    
+    @classmethod
+    def _query_grouping_sets(cls, group: Dict[str, Any], queryset: models.QuerySet,
+                             model_class: models.Model) -> Optional[Dict[Tuple, List[Dict[str, Any]]]]:
+        """
+        Compute every dimension set of the group in one GROUPING SETS scan.
+        
+        Returns:
+            Rows per dimension set, or None if the query cannot be rewritten
+        """
+        dimensions = []
+        for dimension_set in group['dimension_sets']:
+            dimensions.extend(dim for dim in dimension_set if dim not in dimensions)
+        
+        annotations = cls._annotations(group['aggregates'])
+        sql, params = queryset.values(*dimensions).annotate(**annotations).order_by().query.sql_with_params()
+        sql = cls.grouping_sets_sql(sql, model_class, dimensions, group['dimension_sets'])
+        if sql is None:
+            return None
+        
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        
+        # GROUPING() sets bit (n - 1 - i) when dimension i is rolled up in a row's grouping set
+        masks = {
+            sum(1 << (len(dimensions) - 1 - i) for i, dim in enumerate(dimensions) if dim not in dimension_set):
+                dimension_set
+            for dimension_set in group['dimension_sets']
+        }
+        columns = [cls.GROUPING_ALIAS] + dimensions + list(annotations)
+        rows_by_set: Dict[Tuple, List[Dict[str, Any]]] = {dimension_set: [] for dimension_set in group['dimension_sets']}
+        for row in rows:
+            row = dict(zip(columns, row))
+            rows_by_set[masks[row.pop(cls.GROUPING_ALIAS)]].append(row)
+        return rows_by_set
+    
+    @classmethod
+    def grouping_sets_sql(cls, sql: str, model_class: models.Model, dimensions: List[str],
+                          dimension_sets: List[Tuple]) -> Optional[str]:
+        """
+        Rewrite a GROUP BY over all dimensions into GROUP BY GROUPING SETS.
+        
+        A GROUPING() column is prepended to the select list so rows can be
+        routed back to their dimension set.
+        
+        Returns:
+            Rewritten SQL, or None if the GROUP BY columns are not plain columns
+        """
+        head, separator, group_by = sql.rpartition(' GROUP BY ')
+        if not separator or not head.startswith('SELECT '):
+            return None
+        
+        columns = [column.strip() for column in group_by.split(', ')]
+        if len(columns) != len(dimensions):
+            return None
+        for column, dim in zip(columns, dimensions):
+            try:
+                field_column = model_class._meta.get_field(dim).column
+            except FieldDoesNotExist:
+                return None
+            if not column.endswith(connection.ops.quote_name(field_column)):
+                return None
+        
+        column_for = dict(zip(dimensions, columns))
+        grouping_sets = ', '.join(
+            '(' + ', '.join(column_for[dim] for dim in dimension_set) + ')'
+            for dimension_set in dimension_sets
+        )
+        grouping = f"GROUPING({', '.join(columns)}) AS {connection.ops.quote_name(cls.GROUPING_ALIAS)}"
+        return f"SELECT {grouping}, {head[len('SELECT '):]} GROUP BY GROUPING SETS ({grouping_sets})"
+    
+    @classmethod
+    def _find_view_route(cls, entity_type: str, group: Dict[str, Any], filters: Optional[Dict],
+                         max_staleness: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Find a fresh materialized view with the group's filters, dimensions and aggregate columns."""
+        if len(group['dimension_sets']) != 1 or not group['dimension_sets'][0] or group['filters']:
+            return None
+        dimensions = set(group['dimension_sets'][0])
+        for route in cls.VIEW_ROUTES.get(entity_type, []):
+            if (route.get('filters', {}) == (filters or {})
+                    and dimensions <= set(route['dimensions'])
+                    and all((agg['type'], agg['field']) in route['columns'] for agg in group['aggregates'])
+                    and MaterializedViewManager.is_fresh(route['view'], max_staleness)):
+                return route
+        return None
+    
+    @classmethod
+    def _view_sql(cls, route: Dict[str, Any], group: Dict[str, Any],
+                  company_id: Optional[str]) -> Tuple[str, Tuple]:
+        qn = connection.ops.quote_name
+        dimensions = list(group['dimension_sets'][0])
+        columns = [route.get('dimension_columns', {}).get(dim, dim) for dim in dimensions]
+        select = [
+            qn(column) if column == dim else f"{qn(column)} AS {qn(dim)}"
+            for dim, column in zip(dimensions, columns)
+        ] + [
+            f"{route['columns'][(agg['type'], agg['field'])][0]}"
+            f"({qn(route['columns'][(agg['type'], agg['field'])][1])}) AS {qn(agg['name'] + '_value')}"
+            for agg in group['aggregates']
+        ]
+        sql = f"SELECT {', '.join(select)} FROM {qn(route['view'])}"
+        params: Tuple = ()
+        if company_id:
+            sql += f" WHERE {qn('company_id')} = %s"
+            params = (company_id,)
+        if dimensions:
+            sql += f" GROUP BY {', '.join(qn(column) for column in columns)}"
+        return sql, params
+    
+    @classmethod
+    def _view_is_cheaper(cls, route: Dict[str, Any], group: Dict[str, Any],
+                         queryset: models.QuerySet, company_id: Optional[str]) -> bool:
+        """Compare the cached plan costs of the view query and the live query."""
+        if connection.vendor != 'postgresql':
+            return False
+        
+        live_queryset = queryset.values(*group['dimension_sets'][0]).annotate(
+            **cls._annotations(group['aggregates'])
+        ).order_by()
+        live_sql, live_params = live_queryset.query.sql_with_params()
+        view_sql, view_params = cls._view_sql(route, group, company_id)
+        
+        live = QueryPlanCache.analyze_query_performance(live_sql, live_params)
+        view = QueryPlanCache.analyze_query_performance(view_sql, view_params)
+        if 'error' in live or 'error' in view:
+            return False
+        return view['estimated_cost'] < live['estimated_cost']
+    
+    @classmethod
+    def _query_view(cls, route: Dict[str, Any], group: Dict[str, Any],
+                    company_id: Optional[str]) -> Dict[Tuple, List[Dict[str, Any]]]:
+        sql, params = cls._view_sql(route, group, company_id)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            columns = [col[0] for col in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        return {group['dimension_sets'][0]: rows}
+
+
 class ReportingOptimizer:
     """
     Combines query plan caching and materialized aggregates for optimized reporting.
     """
     
+    PRECOMPUTE_SLOW_REPORTS = 10  # Slowest tracked reports refreshed before presets
+    
     @classmethod
     def execute_report(cls, report_config: Dict[str, Any],
                       model_class: Optional[models.Model] = None,
-                      company_id: Optional[str] = None) -> Dict[str, Any]:
+                      company_id: Optional[str] = None,
+                      refresh: bool = False) -> Dict[str, Any]:
         """
         Execute optimized report query.
         
+        Cached aggregates are returned as-is. The rest are planned by
+        ReportPlanner into as few queries as possible, then cached. The
+        report's latency is recorded in ReportLatencyTracker.
+        
         Args:
-            report_config: Report configuration with aggregates and filters
+            report_config: Report configuration with aggregates, filters and
+                optional 'max_staleness' (seconds a materialized view may lag)
             model_class: Django model class
             company_id: Optional company UUID
+            refresh: Recompute every aggregate instead of reading the cache
             
         Returns:
             Report results with aggregates
         """
+        started = time.perf_counter()
         entity_type = report_config.get('entity_type')
         aggregates = report_config.get('aggregates', [])
         filters = report_config.get('filters', {})
@@ -406,34 +1041,53 @@ class ReportingOptimizer:
         logger.info(f"Executing optimized report for {entity_type}")
         
         results = {}
+        missing = []
         
         for aggregate_config in aggregates:
             aggregate_name = aggregate_config['name']
             
             # Try to get from cache
-            cached_agg = MaterializedAggregateManager.get_cached_aggregate(
-                entity_type, aggregate_name, company_id,
-                aggregate_config.get('dimensions', []), filters
-            )
+            cached_agg = None
+            if not refresh:
+                cached_agg = MaterializedAggregateManager.get_cached_aggregate(
+                    entity_type, aggregate_name, company_id,
+                    aggregate_config.get('dimensions', []), filters
+                )
             
             if cached_agg:
                 results[aggregate_name] = cached_agg
             else:
-                # Compute and cache
-                if model_class:
-                    agg_result = MaterializedAggregateManager.materialize_aggregate(
-                        entity_type, aggregate_config, model_class, company_id, filters
-                    )
-                    
+                missing.append(aggregate_config)
+        
+        plan = []
+        compute_ms = 0.0
+        if missing and model_class:
+            compute_started = time.perf_counter()
+            plan = ReportPlanner.plan(entity_type, missing, filters, report_config.get('max_staleness'))
+            configs = {agg['name']: agg for agg in missing}
+            
+            for group in plan:
+                for aggregate_name, agg_result in ReportPlanner.execute(
+                    entity_type, group, model_class, company_id, filters
+                ).items():
                     MaterializedAggregateManager.cache_aggregate(
-                        entity_type, aggregate_config, agg_result, company_id, filters
+                        entity_type, configs[aggregate_name], agg_result, company_id, filters
                     )
-                    
                     results[aggregate_name] = agg_result
+            
+            compute_ms = (time.perf_counter() - compute_started) * 1000
+        
+        latency_ms = (time.perf_counter() - started) * 1000
+        ReportLatencyTracker.record(report_config, company_id, latency_ms, compute_ms)
         
         return {
             'entity_type': entity_type,
             'aggregates': results,
+            'plan': [
+                {'aggregates': [agg['name'] for agg in group['aggregates']], 'source': group['source']}
+                for group in plan
+            ],
+            'latency_ms': latency_ms,
             'executed_at': timezone.now().isoformat()
         }
     
@@ -444,6 +1098,9 @@ class ReportingOptimizer:
         Precompute common report aggregates.
         Should be run periodically (e.g., via Celery task).
         
+        The slowest tracked reports are refreshed first, so the reports that
+        cost most to compute on demand are the ones kept warm.
+        
         Args:
             entity_type: Type of entity
             model_class: Django model class
@@ -451,6 +1108,14 @@ class ReportingOptimizer:
         """
         logger.info(f"Precomputing common reports for {entity_type}")
         
+        for stats in ReportLatencyTracker.get_slowest(entity_type, cls.PRECOMPUTE_SLOW_REPORTS, company_id):
+            try:
+                cls.execute_report(stats['report_config'], model_class, stats['company_id'], refresh=True)
+                logger.info(f"Precomputed slow report {stats['report_key'][:16]} "
+                            f"({stats['compute_ewma_ms'] or stats['latency_ewma_ms']:.0f}ms)")
+            except Exception as e:
+                logger.error(f"Error precomputing report {stats['report_key'][:16]}: {e}")
+        
         aggregates = ReportingPresets.get_aggregates_for_entity(entity_type)
         
         for aggregate_config in aggregates:
@@ -0,0 +1,306 @@
+# analytics/score_fusion.py
+# Vectorized BM25/vector score fusion, top-k selection and batch grid search
+
+import logging
+import time
+from typing import Dict, Any, Callable, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# Score arrays are (documents,) for one query or (queries, documents) for a
+# batch. Rows of different lengths are padded with NaN, which sorts last and
+# is ignored by normalization and ranking.
+
+def pad_scores(rows: Sequence[Sequence[float]]) -> np.ndarray:
+    """Stack score lists of different lengths into a NaN-padded 2D array."""
+    width = max((len(row) for row in rows), default=0)
+    matrix = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        matrix[i, :len(row)] = row
+    return matrix
+
+
+def normalize_scores(scores: np.ndarray) -> np.ndarray:
+    """Min-max normalize along the last axis; constant rows become 0.5."""
+    scores = np.asarray(scores, dtype=float)
+    valid = ~np.isnan(scores)
+    if not valid.any():
+        return scores.copy()
+
+    low = np.nanmin(np.where(valid, scores, np.inf), axis=-1, keepdims=True)
+    high = np.nanmax(np.where(valid, scores, -np.inf), axis=-1, keepdims=True)
+    spread = high - low
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        normalized = np.where(spread > 0, (scores - low) / np.where(spread > 0, spread, 1), 0.5)
+    return np.where(valid, normalized, np.nan)
+
+
+def get_rankings(scores: np.ndarray) -> np.ndarray:
+    """
+    Rank position of each score along the last axis (0 = best).
+
+    Ties keep document order, matching a stable descending sort.
+    """
+    scores = np.asarray(scores, dtype=float)
+    order = np.argsort(-scores, axis=-1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(scores.shape[-1]), axis=-1)
+    return ranks
+
+
+def _valid_counts(scores: np.ndarray) -> np.ndarray:
+    return (~np.isnan(scores)).sum(axis=-1, keepdims=True)
+
+
+def weighted_sum_fusion(bm25: np.ndarray, vector: np.ndarray, alpha) -> np.ndarray:
+    """alpha * bm25 + (1 - alpha) * vector."""
+    return alpha * bm25 + (1 - alpha) * vector
+
+
+def reciprocal_rank_fusion(bm25: np.ndarray, vector: np.ndarray, alpha) -> np.ndarray:
+    """alpha / (bm25 rank + 1) + (1 - alpha) / (vector rank + 1)."""
+    fused = alpha / (get_rankings(bm25) + 1) + (1 - alpha) / (get_rankings(vector) + 1)
+    return np.where(np.isnan(bm25), np.nan, fused)
+
+
+def borda_count_fusion(bm25: np.ndarray, vector: np.ndarray, alpha) -> np.ndarray:
+    """alpha * (n - bm25 rank) + (1 - alpha) * (n - vector rank)."""
+    n = _valid_counts(bm25)
+    fused = alpha * (n - get_rankings(bm25)) + (1 - alpha) * (n - get_rankings(vector))
+    return np.where(np.isnan(bm25), np.nan, fused)
+
+
+def condorcet_fusion(bm25: np.ndarray, vector: np.ndarray, alpha) -> np.ndarray:
+    """Condorcet fusion, approximated by weighted sum."""
+    return weighted_sum_fusion(bm25, vector, alpha)
+
+
+FUSION_STRATEGIES: Dict[str, Callable] = {
+    'weighted_sum': weighted_sum_fusion,
+    'reciprocal_rank': reciprocal_rank_fusion,
+    'borda_count': borda_count_fusion,
+    'condorcet': condorcet_fusion,
+}
+
+
+def fuse_scores(bm25_scores, vector_scores, fusion_method: str = 'weighted_sum',
+                alpha: float = 0.5) -> np.ndarray:
+    """
+    Normalize and fuse BM25 and vector scores.
+
+    Args:
+        bm25_scores: (documents,) or (queries, documents) BM25 scores
+        vector_scores: Vector similarity scores of the same shape
+        fusion_method: Key of FUSION_STRATEGIES (default weighted_sum)
+        alpha: BM25 weight
+
+    Returns:
+        Fused scores of the input shape
+    """
+    fusion_func = FUSION_STRATEGIES.get(fusion_method, weighted_sum_fusion)
+    return fusion_func(normalize_scores(bm25_scores), normalize_scores(vector_scores), alpha)
+
+
+def fuse_batch(bm25_scores: np.ndarray, vector_scores: np.ndarray,
+               alphas: Sequence[float], fusion_method: str = 'weighted_sum') -> np.ndarray:
+    """
+    Fuse a batch of queries for several alphas at once.
+
+    Normalization and rankings are computed once and broadcast over alphas.
+
+    Args:
+        bm25_scores: (queries, documents) BM25 scores
+        vector_scores: (queries, documents) vector scores
+        alphas: BM25 weights to evaluate
+        fusion_method: Key of FUSION_STRATEGIES
+
+    Returns:
+        (alphas, queries, documents) fused scores
+    """
+    bm25 = normalize_scores(bm25_scores)
+    vector = normalize_scores(vector_scores)
+    alpha = np.asarray(alphas, dtype=float)[:, None, None]
+
+    if fusion_method == 'reciprocal_rank':
+        bm25_part, vector_part = 1.0 / (get_rankings(bm25) + 1), 1.0 / (get_rankings(vector) + 1)
+    elif fusion_method == 'borda_count':
+        n = _valid_counts(bm25)
+        bm25_part, vector_part = n - get_rankings(bm25), n - get_rankings(vector)
+    else:
+        bm25_part, vector_part = bm25, vector
+
+    fused = alpha * bm25_part + (1 - alpha) * vector_part
+    return np.where(np.isnan(bm25), np.nan, fused)
+
+
+def top_k_indices(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """
+    Indices of the k best scores along the last axis, best first.
+
+    Uses argpartition so only the selected k are sorted; NaN scores sort
+    last and ties keep document order, matching a stable descending sort.
+    """
+    scores = np.asarray(scores, dtype=float)
+    keys = np.where(np.isnan(scores), np.inf, -scores)
+    n = keys.shape[-1]
+
+    if k is None or k >= n:
+        return np.argsort(keys, axis=-1, kind='stable')
+    if keys.ndim > 1:
+        rows = keys.reshape(-1, n)
+        selected = np.stack([_top_k_row(row, k) for row in rows]) if len(rows) else np.empty((0, max(k, 0)), dtype=int)
+        return selected.reshape(keys.shape[:-1] + (selected.shape[-1],))
+    return _top_k_row(keys, k)
+
+
+def _top_k_row(keys: np.ndarray, k: int) -> np.ndarray:
+    """Top-k of one row of ascending sort keys."""
+    if k <= 0:
+        return np.empty(0, dtype=int)
+
+    boundary = keys[np.argpartition(keys, k - 1)[:k]].max()
+    # Everything strictly better than the k-th key, then ties in document order
+    better = np.flatnonzero(keys < boundary)
+    ties = np.flatnonzero(keys == boundary)[:k - len(better)]
+    selected = np.concatenate([better, ties])
+    return selected[np.argsort(keys[selected], kind='stable')]
+
+
+def ndcg_at_k(scores: np.ndarray, relevance: np.ndarray, k: int = 10) -> np.ndarray:
+    """
+    NDCG@k of each ranking along the last axis.
+
+    Args:
+        scores: (..., documents) ranking scores
+        relevance: (queries, documents) graded relevance, broadcastable to scores
+        k: Cut-off
+
+    Returns:
+        NDCG@k with the document axis reduced
+    """
+    relevance = np.nan_to_num(np.asarray(relevance, dtype=float))
+    k = min(k, scores.shape[-1])
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+
+    top = top_k_indices(scores, k)
+    gains = np.take_along_axis(np.broadcast_to(relevance, scores.shape), top, axis=-1)
+    dcg = ((2 ** gains - 1) * discounts).sum(axis=-1)
+
+    ideal = -np.sort(-relevance, axis=-1)[..., :k]
+    idcg = ((2 ** ideal - 1) * discounts).sum(axis=-1)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(idcg > 0, dcg / np.where(idcg > 0, idcg, 1), 0.0)
+
+
+def grid_search_fusion(bm25_scores: np.ndarray, vector_scores: np.ndarray,
+                       relevance: np.ndarray, parameter_space: Dict[str, List],
+                       k: int = 10) -> Dict[str, Any]:
+    """
+    Evaluate every (fusion_method, alpha) pair over a batch of queries.
+
+    Args:
+        bm25_scores: (queries, documents) BM25 scores
+        vector_scores: (queries, documents) vector scores
+        relevance: (queries, documents) graded relevance labels
+        parameter_space: {'alpha': [...], 'fusion_method': [...]}
+        k: NDCG cut-off
+
+    Returns:
+        Best parameters, their mean NDCG@k and the full result grid
+    """
+    alphas = list(parameter_space.get('alpha', [0.5]))
+    grid = []
+
+    for fusion_method in parameter_space.get('fusion_method', ['weighted_sum']):
+        fused = fuse_batch(bm25_scores, vector_scores, alphas, fusion_method)
+        mean_ndcg = ndcg_at_k(fused, relevance, k).mean(axis=-1)
+        grid.extend(
+            {'fusion_method': fusion_method, 'alpha': alpha, 'ndcg': float(score)}
+            for alpha, score in zip(alphas, mean_ndcg)
+        )
+
+    best = max(grid, key=lambda entry: entry['ndcg'])
+    return {
+        'alpha': best['alpha'],
+        'fusion_method': best['fusion_method'],
+        f'ndcg@{k}': best['ndcg'],
+        'grid': grid,
+    }
+
+
+def _python_fuse_and_rank(bm25: List[float], vector: List[float], alpha: float) -> List[int]:
+    """List-based reciprocal rank fusion and full sort, for benchmarking."""
+    def normalize(scores):
+        low, high = min(scores), max(scores)
+        if high == low:
+            return [0.5] * len(scores)
+        return [(s - low) / (high - low) for s in scores]
+
+    def rankings(scores):
+        order = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
+        ranks = [0] * len(scores)
+        for rank, index in enumerate(order):
+            ranks[index] = rank
+        return ranks
+
+    bm25_ranks, vector_ranks = rankings(normalize(bm25)), rankings(normalize(vector))
+    fused = [
+        alpha / (bm25_ranks[i] + 1) + (1 - alpha) / (vector_ranks[i] + 1)
+        for i in range(len(bm25))
+    ]
+    return sorted(range(len(fused)), key=lambda i: fused[i], reverse=True)
+
+
+def benchmark_fusion(document_counts: Iterable[int] = (100, 1000, 10000, 100000),
+                     k: int = 10, repeats: int = 5, batch_queries: int = 32,
+                     seed: int = 0) -> List[Dict[str, Any]]:
+    """
+    Benchmark list-based against array-based fusion and top-k ranking.
+
+    Args:
+        document_counts: Document counts to measure
+        k: Results kept per query
+        repeats: Timed repetitions (best is reported)
+        batch_queries: Queries per batch for the batch path
+        seed: Random seed
+
+    Returns:
+        One row per document count with timings in milliseconds
+    """
+    rng = np.random.default_rng(seed)
+    results = []
+
+    def best_of(func):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return min(timings)
+
+    for count in document_counts:
+        bm25 = rng.random(count)
+        vector = rng.random(count)
+        bm25_list, vector_list = bm25.tolist(), vector.tolist()
+        bm25_batch = rng.random((batch_queries, count))
+        vector_batch = rng.random((batch_queries, count))
+
+        python_ms = best_of(lambda: _python_fuse_and_rank(bm25_list, vector_list, 0.5)[:k])
+        numpy_ms = best_of(lambda: top_k_indices(fuse_scores(bm25, vector, 'reciprocal_rank', 0.5), k))
+        batch_ms = best_of(lambda: top_k_indices(fuse_scores(bm25_batch, vector_batch, 'reciprocal_rank', 0.5), k))
+
+        results.append({
+            'documents': count,
+            'python_ms': round(python_ms, 3),
+            'numpy_ms': round(numpy_ms, 3),
+            'numpy_batch_per_query_ms': round(batch_ms / batch_queries, 3),
+            'speedup': round(python_ms / numpy_ms, 1) if numpy_ms else None,
+        })
+        logger.info(f"Fusion benchmark: {results[-1]}")
+
+    return results
@@ -0,0 +1,156 @@
+# analytics/search_cache.py
+# Two-level query representation and ranked result cache for hybrid search
+
+import hashlib
+import json
+import logging
+from typing import Dict, Any, List, Optional
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class SearchCache:
+    """
+    Two-level cache for hybrid search.
+
+    Level 1 maps a normalized query to its term vector and embedding, which
+    depend only on the query text and the embedder. Level 2 maps (tenant,
+    query, filters, A/B variant) to that variant's ranked results. Result
+    keys include the tenant's index version, so bumping the version when
+    the index changes invalidates every cached ranking for the tenant.
+
+    Hits and misses are counted per variant. Variants never share cached
+    rankings, so an experiment's arms are cached and measured independently.
+    """
+
+    CACHE_PREFIX = 'search:fusion'
+    CACHE_VERSION = 'v1'
+    QUERY_TIMEOUT = 3600  # Query representations only change with the embedder
+    RESULT_TIMEOUT = 60  # Rankings also go stale as records change between version bumps
+    STATS_TIMEOUT = 86400 * 7
+
+    @staticmethod
+    def normalize_query(query_text: str) -> str:
+        """Case- and whitespace-normalize a query."""
+        return ' '.join((query_text or '').lower().split())
+
+    @classmethod
+    def _key(cls, *parts: Any) -> str:
+        key_data = ':'.join([cls.CACHE_PREFIX, cls.CACHE_VERSION] + [str(part) for part in parts])
+        return hashlib.md5(key_data.encode()).hexdigest()
+
+    @classmethod
+    def _index_version_key(cls, company_id: Any) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:index_version:{company_id}"
+
+    @classmethod
+    def _stats_key(cls, variant: str, outcome: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:stats:{variant}:{outcome}"
+
+    # Level 1: query representations
+
+    @classmethod
+    def get_query_representation(cls, query_text: str, embedder=None) -> Dict[str, Any]:
+        """
+        Get a query's term list and embedding, computing them on a miss.
+
+        Args:
+            query_text: Raw query text
+            embedder: Object with ``embed(texts)``; None skips the embedding
+
+        Returns:
+            Dictionary with normalized 'query', 'terms' and 'embedding'
+        """
+        normalized = cls.normalize_query(query_text)
+        embedder_name = getattr(embedder, 'name', type(embedder).__name__) if embedder else None
+        cache_key = cls._key('query', embedder_name, normalized)
+
+        representation = cache.get(cache_key)
+        if representation is None:
+            embedding = None
+            if embedder is not None:
+                embedding = [float(value) for value in embedder.embed([normalized])[0]]
+            representation = {'query': normalized, 'terms': normalized.split(), 'embedding': embedding}
+            cache.set(cache_key, representation, cls.QUERY_TIMEOUT)
+
+        return representation
+
+    # Level 2: ranked results
+
+    @classmethod
+    def get_index_version(cls, company_id: Any) -> int:
+        return cache.get(cls._index_version_key(company_id), 0)
+
+    @classmethod
+    def bump_index_version(cls, company_id: Any) -> None:
+        """Invalidate a tenant's cached rankings after its index changes."""
+        key = cls._index_version_key(company_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, None)
+
+    @classmethod
+    def _result_key(cls, company_id: Any, query_text: str, filters: Optional[Dict[str, Any]],
+                    variant: str) -> str:
+        filters_hash = hashlib.md5(
+            json.dumps(filters or {}, sort_keys=True, cls=DjangoJSONEncoder).encode()
+        ).hexdigest()
+        return cls._key(
+            'results', company_id, cls.get_index_version(company_id),
+            variant, filters_hash, cls.normalize_query(query_text)
+        )
+
+    @classmethod
+    def get_results(cls, company_id: Any, query_text: str, filters: Optional[Dict[str, Any]],
+                    variant: str) -> Optional[List[Dict[str, Any]]]:
+        """Get a variant's cached ranking, counting the hit or miss."""
+        results = cache.get(cls._result_key(company_id, query_text, filters, variant))
+        cls._record(variant, results is not None)
+        return results
+
+    @classmethod
+    def set_results(cls, company_id: Any, query_text: str, filters: Optional[Dict[str, Any]],
+                    variant: str, results: List[Dict[str, Any]], timeout: Optional[int] = None) -> None:
+        """Cache a variant's ranking under the tenant's current index version."""
+        cache.set(
+            cls._result_key(company_id, query_text, filters, variant),
+            results,
+            timeout or cls.RESULT_TIMEOUT
+        )
+
+    # Stats
+
+    @classmethod
+    def _record(cls, variant: str, hit: bool) -> None:
+        key = cls._stats_key(variant, 'hits' if hit else 'misses')
+        cache.add(key, 0, cls.STATS_TIMEOUT)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 1, cls.STATS_TIMEOUT)
+
+    @classmethod
+    def get_stats(cls, variants: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get result cache hits, misses and hit rate for each variant."""
+        counts = cache.get_many(
+            [cls._stats_key(variant, outcome) for variant in variants for outcome in ('hits', 'misses')]
+        )
+        stats = {}
+        for variant in variants:
+            hits = counts.get(cls._stats_key(variant, 'hits'), 0)
+            misses = counts.get(cls._stats_key(variant, 'misses'), 0)
+            stats[variant] = {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': hits / (hits + misses) if hits + misses else 0.0,
+            }
+        return stats
+
+    @classmethod
+    def reset_stats(cls, variants: List[str]) -> None:
+        cache.delete_many(
+            [cls._stats_key(variant, outcome) for variant in variants for outcome in ('hits', 'misses')]
+        )
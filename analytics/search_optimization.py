@@ -1,13 +1,17 @@
 # analytics/search_optimization.py
 # Search facet precomputation layer and window caching
 
+import base64
+import binascii
 import hashlib
 import json
 import logging
-from typing import Dict, Any, List, Optional, Set
-from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Set, Tuple
+from datetime import date, datetime, time, timedelta
 from django.core.cache import cache
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections, models
+from django.db.models import F, Q
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
@@ -21,8 +25,8 @@ class FacetConfig:
         'status': {'type': 'terms', 'size': 50},
         'priority': {'type': 'terms', 'size': 20},
         'owner': {'type': 'terms', 'size': 100},
-        'created_date': {'type': 'date_histogram', 'interval': 'month'},
-        'modified_date': {'type': 'date_histogram', 'interval': 'week'},
+        'created_date': {'type': 'date_histogram', 'interval': 'month', 'field': 'created_at'},
+        'modified_date': {'type': 'date_histogram', 'interval': 'week', 'field': 'updated_at'},
     }
     
     # Entity-specific facets
@@ -52,6 +56,10 @@ class FacetConfig:
     PRECOMPUTE_INTERVAL = 300  # 5 minutes
     PRECOMPUTE_TIMEOUT = 3600  # 1 hour cache
     
+    # Filtered views warmed per tenant and entity, most recently requested first
+    FILTERED_PRECOMPUTE_LIMIT = 20
+    FILTERED_VIEW_TTL = 86400  # Views not requested for a day are no longer warmed
+    
     # Window sizes for trending facets
     WINDOW_SIZES = {
         'hour': 3600,
@@ -105,24 +113,23 @@ class FacetPrecomputer:
         """
         logger.info(f"Precomputing facet {entity_type}.{facet_name}")
         
-        # Build base queryset
-        queryset = model_class.objects.all()
-        if company_id:
-            queryset = queryset.filter(company_id=company_id)
-        if filters:
-            queryset = queryset.filter(**filters)
+        # Filters are translated exactly as a search translates them
+        queryset = SearchOptimizer.build_queryset(
+            entity_type, model_class, {'filters': filters}, company_id
+        )
         
         facet_type = facet_config.get('type', 'terms')
+        field_name = facet_config.get('field', facet_name)
         
         if facet_type == 'terms':
             # Count distinct values
-            result = cls._compute_terms_facet(queryset, facet_name, facet_config)
+            result = cls._compute_terms_facet(queryset, field_name, facet_config)
         elif facet_type == 'range':
             # Aggregate by ranges
-            result = cls._compute_range_facet(queryset, facet_name, facet_config)
+            result = cls._compute_range_facet(queryset, field_name, facet_config)
         elif facet_type == 'date_histogram':
             # Aggregate by date intervals
-            result = cls._compute_date_histogram_facet(queryset, facet_name, facet_config)
+            result = cls._compute_date_histogram_facet(queryset, field_name, facet_config)
         else:
             result = {'error': f'Unknown facet type: {facet_type}'}
         
@@ -254,6 +261,61 @@ class FacetPrecomputer:
         
         return result
     
+    @classmethod
+    def get_filtered_views_key(cls, entity_type: str, company_id: str) -> str:
+        """Cache key listing a tenant's recently requested filtered views."""
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:filtered_views:{company_id}:{entity_type}"
+    
+    @classmethod
+    def record_filtered_view(cls, entity_type: str, company_id: str, filters: Dict) -> None:
+        """
+        Remember a filtered facet request that missed the cache so it is warmed.
+        
+        Only the FILTERED_PRECOMPUTE_LIMIT most recent views are kept. The
+        list is a warm-up hint: a concurrent update may drop a view, which is
+        recorded again on its next miss.
+        """
+        key = cls.get_filtered_views_key(entity_type, company_id)
+        views = cache.get(key) or {}
+        filter_hash = hashlib.md5(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+        views[filter_hash] = {'filters': filters, 'last_seen': timezone.now().timestamp()}
+        recent = sorted(views.items(), key=lambda item: item[1]['last_seen'], reverse=True)
+        cache.set(key, dict(recent[:FacetConfig.FILTERED_PRECOMPUTE_LIMIT]), FacetConfig.FILTERED_VIEW_TTL)
+    
+    @classmethod
+    def get_filtered_views(cls, entity_type: str, company_id: str) -> List[Dict]:
+        """Filters of the tenant's recently requested views, most recent first."""
+        views = cache.get(cls.get_filtered_views_key(entity_type, company_id)) or {}
+        cutoff = timezone.now().timestamp() - FacetConfig.FILTERED_VIEW_TTL
+        return [
+            view['filters']
+            for view in sorted(views.values(), key=lambda view: view['last_seen'], reverse=True)
+            if view['last_seen'] >= cutoff
+        ]
+    
+    @classmethod
+    def warm_filtered_views(cls, entity_type: str, company_id: str, model_class: models.Model) -> int:
+        """
+        Precompute and cache every facet of the tenant's recent filtered views.
+        
+        Returns:
+            Number of facets cached
+        """
+        all_facets = {**FacetConfig.COMMON_FACETS, **FacetConfig.ENTITY_FACETS.get(entity_type, {})}
+        cached = 0
+        for filters in cls.get_filtered_views(entity_type, company_id):
+            for facet_name, facet_config in all_facets.items():
+                try:
+                    result = cls.precompute_facet(
+                        entity_type, facet_name, facet_config, model_class, company_id, filters
+                    )
+                except Exception as e:
+                    logger.error(f"Error precomputing facet {entity_type}.{facet_name} for {filters}: {e}")
+                    continue
+                cls.cache_facet(entity_type, facet_name, result, company_id, filters)
+                cached += 1
+        return cached
+    
     @classmethod
     def invalidate_facets(cls, entity_type: str, company_id: Optional[str] = None) -> None:
         """Invalidate all cached facets for an entity type."""
@@ -282,13 +344,13 @@ class WindowCache:
     def compute_query_hash(cls, query_params: Dict[str, Any]) -> str:
         """Compute hash for query parameters."""
         # Sort and serialize query params for consistent hashing
-        query_str = json.dumps(query_params, sort_keys=True)
+        query_str = json.dumps(query_params, sort_keys=True, cls=DjangoJSONEncoder)
         return hashlib.md5(query_str.encode()).hexdigest()
     
     @classmethod
     def cache_window(cls, entity_type: str, query_params: Dict[str, Any],
                     window_start: int, window_size: int, results: List[Dict],
-                    timeout: Optional[int] = None) -> None:
+                    timeout: Optional[int] = None, next_cursor: Optional[str] = None) -> None:
         """
         Cache a result window.
         
@@ -299,6 +361,7 @@ class WindowCache:
             window_size: Size of the window
             results: List of result dictionaries
             timeout: Cache timeout in seconds
+            next_cursor: Keyset cursor for the window after this one
         """
         query_hash = cls.compute_query_hash(query_params)
         cache_key = cls.get_cache_key(entity_type, query_hash, window_start, window_size)
@@ -308,6 +371,7 @@ class WindowCache:
             'results': results,
             'window_start': window_start,
             'window_size': window_size,
+            'next_cursor': next_cursor,
             'cached_at': timezone.now().isoformat()
         }
         
@@ -337,81 +401,395 @@ class WindowCache:
         # In production, would use Redis SCAN
 
 
+class SearchCursor:
+    """
+    Opaque keyset pagination cursor.
+
+    Encodes the sort key and primary key of the last row of a window, plus
+    the window's end offset so cursor pages share WindowCache entries with
+    numbered pages.
+    """
+    
+    @staticmethod
+    def _serialize(value: Any) -> Any:
+        # Full-precision ISO timestamps; DjangoJSONEncoder truncates to milliseconds
+        if isinstance(value, (datetime, date, time)):
+            return value.isoformat()
+        return str(value)
+    
+    @classmethod
+    def encode(cls, sort_value: Any, pk: Any, offset: int) -> str:
+        """Encode the position after a row as a URL-safe cursor."""
+        payload = json.dumps({'v': sort_value, 'pk': pk, 'o': offset}, default=cls._serialize)
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+    
+    @staticmethod
+    def decode(cursor: str) -> Dict[str, Any]:
+        """
+        Decode a cursor produced by encode().
+        
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            return {'v': payload['v'], 'pk': payload['pk'], 'o': int(payload['o'])}
+        except (TypeError, KeyError, binascii.Error, json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid search cursor: {e}") from e
+
+
 class SearchOptimizer:
     """
     Combines facet precomputation and window caching for optimized search.
+    
+    Query parameters:
+        filters: {field or field__lookup: value}; list values become __in
+        query: Text matched by prefix against the entity's SEARCH_FIELDS
+        sort: Sort field, '-' prefix for descending (default '-created_at')
+        fields: Optional list of columns to return
+    
+    Pages are fetched with keyset (seek) predicates on (sort, pk) so deep
+    pages cost the same as the first one; the following window is read in
+    the same query and stored in WindowCache.
     """
     
+    # Indexed text columns matched by the 'query' parameter
+    SEARCH_FIELDS = {
+        'lead': ['full_name', 'company_name', 'email'],
+        'account': ['name'],
+        'contact': ['full_name', 'email'],
+        'deal': ['name'],
+    }
+    
+    ALLOWED_LOOKUPS = {
+        'exact', 'iexact', 'in', 'gt', 'gte', 'lt', 'lte',
+        'range', 'isnull', 'startswith', 'istartswith',
+    }
+    
+    DEFAULT_SORT = '-created_at'
+    MAX_PAGE_SIZE = 500
+    
+    # Planner estimates below this are replaced with an exact count
+    EXACT_COUNT_THRESHOLD = 10000
+    COUNT_CACHE_PREFIX = 'search:count'
+    COUNT_CACHE_TIMEOUT = 60
+    
     @classmethod
     def execute_search(cls, entity_type: str, query_params: Dict[str, Any],
                       page: int = 1, page_size: int = 50,
                       model_class: Optional[models.Model] = None,
-                      company_id: Optional[str] = None) -> Dict[str, Any]:
+                      company_id: Optional[str] = None,
+                      cursor: Optional[str] = None,
+                      exact_count: bool = False,
+                      prefetch: bool = True) -> Dict[str, Any]:
         """
         Execute optimized search with caching.
         
         Args:
             entity_type: Type of entity to search
             query_params: Search query parameters
-            page: Page number (1-indexed)
+            page: Page number (1-indexed), used when no cursor is given
             page_size: Results per page
             model_class: Django model class
             company_id: Optional company UUID
+            cursor: next_cursor from a previous page (keyset pagination)
+            exact_count: Always run COUNT(*) instead of using planner estimates
+            prefetch: Read and cache the following window in the same query
             
         Returns:
-            Search results with facets
+            Search results with facets, total and next_cursor
         """
-        window_start = (page - 1) * page_size
+        page_size = max(1, min(page_size, cls.MAX_PAGE_SIZE))
+        position = SearchCursor.decode(cursor) if cursor else None
+        window_start = position['o'] if position else (page - 1) * page_size
+        
+        # Cursor is not part of the window identity; the offset and tenant are
+        window_params = {k: v for k, v in query_params.items() if k != 'cursor'}
+        window_params['company_id'] = str(company_id) if company_id else None
         
         # Try to get cached window
         cached_window = WindowCache.get_window(
-            entity_type, query_params, window_start, page_size
+            entity_type, window_params, window_start, page_size
         )
         
+        total = None
+        total_is_estimate = False
+        
         if cached_window:
             results = cached_window['results']
+            next_cursor = cached_window.get('next_cursor')
+        elif model_class:
+            queryset = cls.build_queryset(entity_type, model_class, window_params, company_id)
+            sort_field, descending = cls._parse_sort(model_class, window_params.get('sort'))
+            
+            results, next_cursor = cls._fetch_windows(
+                entity_type, queryset, window_params, sort_field, descending,
+                position, window_start, page_size, prefetch
+            )
         else:
-            # Execute search query
-            if model_class:
-                queryset = model_class.objects.all()
-                if company_id:
-                    queryset = queryset.filter(company_id=company_id)
-                
-                # Apply search filters
-                # ... (would implement actual search logic here)
-                
-                results = list(queryset[window_start:window_start + page_size].values())
-                
-                # Cache the window
-                WindowCache.cache_window(
-                    entity_type, query_params, window_start, page_size, results
-                )
-            else:
-                results = []
+            results, next_cursor = [], None
+        
+        if model_class:
+            total, total_is_estimate = cls.count_results(
+                entity_type, model_class, window_params, company_id, exact_count
+            )
         
         # Get precomputed facets
-        facets = cls.get_facets_for_entity(entity_type, company_id, query_params)
+        facets = cls.get_facets_for_entity(entity_type, company_id, query_params.get('filters') or None)
         
         return {
             'results': results,
             'facets': facets,
-            'page': page,
+            'page': window_start // page_size + 1,
             'page_size': page_size,
-            'total': len(results)  # Would get actual count from database
+            'total': total if total is not None else len(results),
+            'total_is_estimate': total_is_estimate,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
         }
     
+    @classmethod
+    def build_queryset(cls, entity_type: str, model_class: models.Model,
+                       query_params: Dict[str, Any], company_id: Optional[str] = None):
+        """
+        Translate query parameters into a filtered queryset.
+        
+        Filters are restricted to concrete fields and index-friendly lookups
+        (equality, ranges, prefix matches); text queries become prefix
+        matches on the entity's indexed SEARCH_FIELDS.
+        
+        Raises:
+            ValueError: For unknown fields, lookups or sort fields
+        """
+        queryset = model_class.objects.all()
+        if company_id:
+            queryset = queryset.filter(company_id=company_id)
+        
+        filters = {}
+        for key, value in (query_params.get('filters') or {}).items():
+            field_name, _, lookup = key.partition('__')
+            cls._get_field(model_class, field_name)
+            if lookup and lookup not in cls.ALLOWED_LOOKUPS:
+                raise ValueError(f"Unsupported search lookup: {key}")
+            if not lookup and isinstance(value, (list, tuple, set)):
+                key = f'{field_name}__in'
+            elif not lookup and isinstance(value, dict):
+                # {'gte': 10, 'lt': 50} range syntax
+                for range_lookup, range_value in value.items():
+                    if range_lookup not in cls.ALLOWED_LOOKUPS:
+                        raise ValueError(f"Unsupported search lookup: {field_name}__{range_lookup}")
+                    filters[f'{field_name}__{range_lookup}'] = range_value
+                continue
+            filters[key] = value
+        
+        if filters:
+            queryset = queryset.filter(**filters)
+        
+        text = (query_params.get('query') or '').strip()
+        if text:
+            search_fields = [
+                name for name in cls.SEARCH_FIELDS.get(entity_type, [])
+                if cls._has_field(model_class, name)
+            ]
+            if search_fields:
+                text_filter = Q()
+                for name in search_fields:
+                    text_filter |= Q(**{f'{name}__istartswith': text})
+                queryset = queryset.filter(text_filter)
+        
+        return queryset
+    
+    @classmethod
+    def _get_field(cls, model_class: models.Model, field_name: str):
+        """Get a concrete model field by name or attname."""
+        for field in model_class._meta.concrete_fields:
+            if field_name in (field.name, field.attname):
+                return field
+        raise ValueError(f"Unknown search field for {model_class.__name__}: {field_name}")
+    
+    @classmethod
+    def _has_field(cls, model_class: models.Model, field_name: str) -> bool:
+        try:
+            cls._get_field(model_class, field_name)
+            return True
+        except ValueError:
+            return False
+    
+    @classmethod
+    def _parse_sort(cls, model_class: models.Model, sort: Optional[str]) -> Tuple[str, bool]:
+        """Resolve the sort parameter to (field attname, descending)."""
+        sort = sort or cls.DEFAULT_SORT
+        descending = sort.startswith('-')
+        field = cls._get_field(model_class, sort.lstrip('-'))
+        return field.attname, descending
+    
+    @classmethod
+    def _keyset_filter(cls, sort_field: str, descending: bool, value: Any, pk: Any) -> Q:
+        """
+        Rows strictly after (value, pk) in (sort, pk) order.
+        
+        Ordering places NULL sort values last ascending and first descending,
+        matching PostgreSQL's defaults.
+        """
+        if descending:
+            if value is None:
+                return Q(**{f'{sort_field}__isnull': True, 'pk__lt': pk}) | Q(**{f'{sort_field}__isnull': False})
+            return Q(**{f'{sort_field}__lt': value}) | Q(**{sort_field: value, 'pk__lt': pk})
+        
+        if value is None:
+            return Q(**{f'{sort_field}__isnull': True, 'pk__gt': pk})
+        return (
+            Q(**{f'{sort_field}__gt': value})
+            | Q(**{sort_field: value, 'pk__gt': pk})
+            | Q(**{f'{sort_field}__isnull': True})
+        )
+    
+    @classmethod
+    def _fetch_windows(cls, entity_type: str, queryset, query_params: Dict[str, Any],
+                       sort_field: str, descending: bool, position: Optional[Dict[str, Any]],
+                       window_start: int, page_size: int,
+                       prefetch: bool) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Fetch the requested window and optionally the next one in one query.
+        
+        Returns:
+            Tuple of (results, next_cursor)
+        """
+        if descending:
+            ordering = [F(sort_field).desc(nulls_first=True), F('pk').desc()]
+        else:
+            ordering = [F(sort_field).asc(nulls_last=True), F('pk').asc()]
+        queryset = queryset.order_by(*ordering)
+        
+        if position:
+            field = cls._get_field(queryset.model, sort_field)
+            value = field.to_python(position['v']) if position['v'] is not None else None
+            queryset = queryset.filter(cls._keyset_filter(sort_field, descending, value, position['pk']))
+            offset = 0
+        else:
+            # Numbered page without a cursor: OFFSET once, keyset afterwards
+            offset = window_start
+        
+        pk_name = queryset.model._meta.pk.attname
+        fields = list(query_params.get('fields') or [])
+        if fields:
+            for name in fields:
+                cls._get_field(queryset.model, name)
+            # Cursors need the sort key and primary key of each row
+            queryset = queryset.values(*dict.fromkeys(fields + [sort_field, pk_name]))
+        else:
+            queryset = queryset.values()
+        
+        # One extra row tells whether another window follows
+        windows = 2 if prefetch else 1
+        rows = list(queryset[offset:offset + windows * page_size + 1])
+        
+        def cursor_after(row_index: int) -> Optional[str]:
+            if row_index + 1 >= len(rows):
+                return None
+            row = rows[row_index]
+            return SearchCursor.encode(row[sort_field], row[pk_name], window_start + row_index + 1)
+        
+        results = rows[:page_size]
+        next_cursor = cursor_after(page_size - 1) if results else None
+        
+        WindowCache.cache_window(
+            entity_type, query_params, window_start, page_size, results,
+            next_cursor=next_cursor
+        )
+        
+        if prefetch and next_cursor:
+            WindowCache.cache_window(
+                entity_type, query_params, window_start + page_size, page_size,
+                rows[page_size:2 * page_size], next_cursor=cursor_after(2 * page_size - 1)
+            )
+        
+        return results, next_cursor
+    
+    @classmethod
+    def count_results(cls, entity_type: str, model_class: models.Model,
+                      query_params: Dict[str, Any], company_id: Optional[str] = None,
+                      exact: bool = False) -> Tuple[int, bool]:
+        """
+        Count matching rows.
+        
+        Uses the PostgreSQL planner's row estimate for large result sets and
+        an exact COUNT(*) for small ones or when requested.
+        
+        Returns:
+            Tuple of (total, is_estimate)
+        """
+        query_hash = WindowCache.compute_query_hash(
+            {**query_params, 'company_id': str(company_id) if company_id else None, 'exact': exact}
+        )
+        cache_key = f"{cls.COUNT_CACHE_PREFIX}:{entity_type}:{query_hash}"
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return tuple(cached)
+        
+        queryset = cls.build_queryset(entity_type, model_class, query_params, company_id)
+        
+        estimate = None if exact else cls.estimate_count(queryset)
+        if estimate is not None and estimate >= cls.EXACT_COUNT_THRESHOLD:
+            result = (estimate, True)
+        else:
+            result = (queryset.count(), False)
+        
+        cache.set(cache_key, result, cls.COUNT_CACHE_TIMEOUT)
+        return result
+    
+    @classmethod
+    def estimate_count(cls, queryset) -> Optional[int]:
+        """
+        Estimate row count from the query planner.
+        
+        Returns:
+            Planner row estimate, or None when unavailable (non-PostgreSQL)
+        """
+        db_connection = connections[queryset.db]
+        if db_connection.vendor != 'postgresql':
+            return None
+        
+        try:
+            sql, params = queryset.order_by().query.sql_with_params()
+            with db_connection.cursor() as cursor:
+                cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        except Exception as e:
+            logger.error(f"Error estimating search count: {e}")
+            return None
+    
     @classmethod
     def get_facets_for_entity(cls, entity_type: str, company_id: Optional[str] = None,
                              filters: Optional[Dict] = None) -> Dict[str, Any]:
-        """Get all facets for an entity type, using cache when available."""
+        """
+        Get all facets for an entity type.
+        
+        Unfiltered tenant facets are served from the incrementally maintained
+        counters; otherwise precomputed cached facets are used when available.
+        Filtered tenant views that miss the cache are recorded so the next
+        precompute_filtered_facets run warms them.
+        """
+        from analytics.facet_counters import FacetCounterMaintainer
+        
         entity_facets = FacetConfig.ENTITY_FACETS.get(entity_type, {})
         common_facets = FacetConfig.COMMON_FACETS
         
         all_facets = {**common_facets, **entity_facets}
         
         result_facets = {}
+        missed = False
         
         for facet_name, facet_config in all_facets.items():
+            if company_id and not filters:
+                counted_facet = FacetCounterMaintainer.get_facet(entity_type, facet_name, company_id)
+                if counted_facet:
+                    result_facets[facet_name] = counted_facet
+                    continue
+            
             # Try to get from cache
             cached_facet = FacetPrecomputer.get_cached_facet(
                 entity_type, facet_name, company_id, filters
@@ -420,7 +798,7 @@ class SearchOptimizer:
             if cached_facet:
                 result_facets[facet_name] = cached_facet
             else:
-                # Would trigger precomputation or return empty facet
+                missed = True
                 result_facets[facet_name] = {
                     'type': facet_config['type'],
                     'field': facet_name,
@@ -428,4 +806,7 @@ class SearchOptimizer:
                     '_meta': {'status': 'not_computed'}
                 }
         
+        if missed and company_id and filters:
+            FacetPrecomputer.record_filtered_view(entity_type, company_id, filters)
+        
         return result_facets
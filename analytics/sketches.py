@@ -0,0 +1,343 @@
+# analytics/sketches.py
+# Mergeable approximate sketches for distinct counts and quantiles
+
+import base64
+import bisect
+import hashlib
+import math
+import struct
+import zlib
+from array import array
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional
+
+
+def sketch_value(value: Any) -> Optional[float]:
+    """Convert a model value to a float for quantile sketches."""
+    if value is None:
+        return None
+    if isinstance(value, timedelta):
+        return value.total_seconds() / 86400.0  # days
+    if isinstance(value, Decimal):
+        return float(value)
+    return float(value)
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct-count sketch.
+
+    Uses 2^precision one-byte registers (precision 14 = 16KB, ~0.8% standard
+    error). Sketches with the same precision merge by register-wise max, so
+    partial sketches from different time buckets or workers combine exactly.
+    """
+
+    SKETCH_TYPE = 'hll'
+    DEFAULT_PRECISION = 14
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[bytearray] = None):
+        """
+        Initialize HyperLogLog sketch.
+
+        Args:
+            precision: Number of index bits (4-18)
+            registers: Existing register state
+        """
+        if not 4 <= precision <= 18:
+            raise ValueError(f"HyperLogLog precision must be between 4 and 18, got {precision}")
+
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.num_registers)
+
+    @staticmethod
+    def _hash(value: Any) -> int:
+        """64-bit hash of a value."""
+        digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+        return int.from_bytes(digest, 'big')
+
+    def add(self, value: Any) -> None:
+        """Add a value to the sketch."""
+        if value is None:
+            return
+
+        hashed = self._hash(value)
+        index = hashed >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        remainder = hashed & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - remainder.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable[Any]) -> None:
+        """Add many values to the sketch."""
+        for value in values:
+            self.add(value)
+
+    def count(self) -> int:
+        """Estimate the number of distinct values added."""
+        m = self.num_registers
+        if m == 16:
+            alpha = 0.673
+        elif m == 32:
+            alpha = 0.697
+        elif m == 64:
+            alpha = 0.709
+        else:
+            alpha = 0.7213 / (1 + 1.079 / m)
+
+        harmonic_sum = sum(2.0 ** -register for register in self.registers)
+        estimate = alpha * m * m / harmonic_sum
+
+        # Small-range correction (linear counting)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Merge another sketch into this one (in place)."""
+        if other.precision != self.precision:
+            raise ValueError(
+                f"Cannot merge HyperLogLog sketches with precision {self.precision} and {other.precision}"
+            )
+        self.registers = bytearray(map(max, self.registers, other.registers))
+        return self
+
+    def copy(self) -> 'HyperLogLog':
+        """Return an independent copy of the sketch."""
+        return HyperLogLog(self.precision, bytearray(self.registers))
+
+    def to_bytes(self) -> bytes:
+        """Serialize to compact bytes (registers are zlib-compressed)."""
+        return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        """Deserialize from to_bytes() output."""
+        return cls(data[0], bytearray(zlib.decompress(data[1:])))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to a JSON-compatible dictionary."""
+        return {'data': base64.b64encode(self.to_bytes()).decode()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HyperLogLog':
+        """Deserialize from to_dict() output."""
+        return cls.from_bytes(base64.b64decode(data['data']))
+
+    def estimate(self) -> int:
+        """Sketch estimate used in report output."""
+        return self.count()
+
+
+class TDigest:
+    """
+    Merging t-digest quantile sketch.
+
+    Keeps at most ~compression centroids, sized by the k1 scale function so
+    tail quantiles (p95/p99) stay accurate. Digests merge by re-clustering
+    their centroids, so per-bucket digests combine across time and workers.
+    """
+
+    SKETCH_TYPE = 'tdigest'
+    DEFAULT_COMPRESSION = 100
+    DEFAULT_QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, compression: float = DEFAULT_COMPRESSION):
+        """
+        Initialize t-digest.
+
+        Args:
+            compression: Accuracy/size trade-off (higher = more centroids)
+        """
+        self.compression = compression
+        self.means: List[float] = []
+        self.weights: List[float] = []
+        self.total_weight = 0.0
+        self.min_value = math.inf
+        self.max_value = -math.inf
+        self._buffer: List[float] = []
+        self._buffer_limit = int(compression * 5)
+
+    def _scale(self, q: float) -> float:
+        """k1 scale function."""
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _inverse_scale(self, k: float) -> float:
+        """Inverse of the k1 scale function."""
+        return (math.sin(min(max(k * 2 * math.pi / self.compression, -math.pi / 2), math.pi / 2)) + 1) / 2
+
+    def add(self, value: Any, weight: float = 1.0) -> None:
+        """Add a value to the digest."""
+        value = sketch_value(value)
+        if value is None or math.isnan(value):
+            return
+
+        if weight == 1.0:
+            self._buffer.append(value)
+        else:
+            self._merge_centroids([value], [weight])
+
+        self.min_value = min(self.min_value, value)
+        self.max_value = max(self.max_value, value)
+
+        if len(self._buffer) >= self._buffer_limit:
+            self._flush()
+
+    def update(self, values: Iterable[Any]) -> None:
+        """Add many values to the digest."""
+        for value in values:
+            self.add(value)
+
+    def _flush(self) -> None:
+        """Fold buffered points into the centroids."""
+        if self._buffer:
+            buffered = self._buffer
+            self._buffer = []
+            self._merge_centroids(buffered, [1.0] * len(buffered))
+
+    def _merge_centroids(self, means: List[float], weights: List[float]) -> None:
+        """Re-cluster existing centroids together with new weighted points."""
+        points = sorted(zip(self.means + means, self.weights + weights))
+        total = self.total_weight + sum(weights)
+
+        merged_means: List[float] = []
+        merged_weights: List[float] = []
+
+        current_mean, current_weight = points[0]
+        weight_so_far = 0.0
+        q_limit = self._inverse_scale(self._scale(0.0) + 1)
+
+        for mean, weight in points[1:]:
+            if (weight_so_far + current_weight + weight) / total <= q_limit:
+                current_weight += weight
+                current_mean += (mean - current_mean) * weight / current_weight
+            else:
+                merged_means.append(current_mean)
+                merged_weights.append(current_weight)
+                weight_so_far += current_weight
+                q_limit = self._inverse_scale(self._scale(weight_so_far / total) + 1)
+                current_mean, current_weight = mean, weight
+
+        merged_means.append(current_mean)
+        merged_weights.append(current_weight)
+
+        self.means = merged_means
+        self.weights = merged_weights
+        self.total_weight = total
+
+    def count(self) -> float:
+        """Total weight of values added."""
+        return self.total_weight + len(self._buffer)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the value at quantile q.
+
+        Args:
+            q: Quantile in [0, 1]
+
+        Returns:
+            Estimated value, or None for an empty digest
+        """
+        self._flush()
+        if not self.means:
+            return None
+        if len(self.means) == 1 or q <= 0:
+            return self.min_value if q <= 0 else self.means[0]
+        if q >= 1:
+            return self.max_value
+
+        target = q * self.total_weight
+
+        # Centroid centers in cumulative weight space
+        centers = []
+        cumulative = 0.0
+        for weight in self.weights:
+            centers.append(cumulative + weight / 2)
+            cumulative += weight
+
+        if target <= centers[0]:
+            fraction = target / centers[0]
+            return self.min_value + fraction * (self.means[0] - self.min_value)
+        if target >= centers[-1]:
+            fraction = (target - centers[-1]) / (self.total_weight - centers[-1])
+            return self.means[-1] + fraction * (self.max_value - self.means[-1])
+
+        index = bisect.bisect_right(centers, target) - 1
+        fraction = (target - centers[index]) / (centers[index + 1] - centers[index])
+        return self.means[index] + fraction * (self.means[index + 1] - self.means[index])
+
+    def quantiles(self, qs: Iterable[float] = DEFAULT_QUANTILES) -> Dict[str, Optional[float]]:
+        """Estimate several quantiles, keyed as p50/p95/..."""
+        return {f"p{q * 100:g}": self.quantile(q) for q in qs}
+
+    def merge(self, other: 'TDigest') -> 'TDigest':
+        """Merge another digest into this one (in place)."""
+        other._flush()
+        self._flush()
+        if other.means:
+            self._merge_centroids(list(other.means), list(other.weights))
+            self.min_value = min(self.min_value, other.min_value)
+            self.max_value = max(self.max_value, other.max_value)
+        return self
+
+    def copy(self) -> 'TDigest':
+        """Return an independent copy of the digest."""
+        return TDigest.from_bytes(self.to_bytes())
+
+    def to_bytes(self) -> bytes:
+        """Serialize to compact bytes (header plus packed float64 centroids)."""
+        self._flush()
+        centroids = array('d')
+        for mean, weight in zip(self.means, self.weights):
+            centroids.append(mean)
+            centroids.append(weight)
+        header = struct.pack('<ddd', self.compression, self.min_value, self.max_value)
+        return header + centroids.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'TDigest':
+        """Deserialize from to_bytes() output."""
+        compression, min_value, max_value = struct.unpack('<ddd', data[:24])
+        centroids = array('d')
+        centroids.frombytes(data[24:])
+
+        digest = cls(compression)
+        digest.means = list(centroids[0::2])
+        digest.weights = list(centroids[1::2])
+        digest.total_weight = sum(digest.weights)
+        digest.min_value = min_value
+        digest.max_value = max_value
+        return digest
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize to a JSON-compatible dictionary."""
+        return {'data': base64.b64encode(self.to_bytes()).decode()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TDigest':
+        """Deserialize from to_dict() output."""
+        return cls.from_bytes(base64.b64decode(data['data']))
+
+    def estimate(self) -> Dict[str, Optional[float]]:
+        """Sketch estimate used in report output."""
+        return self.quantiles()
+
+
+# Sketch types by serialized type name
+SKETCH_CLASSES = {
+    HyperLogLog.SKETCH_TYPE: HyperLogLog,
+    TDigest.SKETCH_TYPE: TDigest,
+}
+
+
+def create_sketch(sketch_type: str, **kwargs) -> Any:
+    """Create an empty sketch of the given type."""
+    if sketch_type not in SKETCH_CLASSES:
+        raise ValueError(f"Unknown sketch type: {sketch_type}")
+    return SKETCH_CLASSES[sketch_type](**kwargs)
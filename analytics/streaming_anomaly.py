@@ -0,0 +1,618 @@
+# analytics/streaming_anomaly.py
+# Online anomaly detection over KPI time series with O(1) per-point scoring
+
+import logging
+import math
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Dict, Any, Deque, Iterable, List, Optional, Tuple
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_save
+
+try:
+    from sklearn.ensemble import IsolationForest
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    # Without scikit-learn the online ensemble runs the statistical detectors only
+    SKLEARN_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+
+# KPI period type -> seasonal period (points per season)
+SEASONAL_PERIODS = {
+    'daily': 7,
+    'weekly': 52,
+    'monthly': 12,
+    'quarterly': 4,
+    'yearly': 1,
+}
+
+
+@dataclass
+class SeriesState:
+    """Rolling state of one time series; everything needed to score the next point."""
+    count: int = 0
+    period: int = 12
+    last_value: Optional[float] = None
+    last_timestamp: Optional[str] = None
+
+    # Exponentially weighted mean and variance
+    ewma_mean: float = 0.0
+    ewma_var: float = 0.0
+
+    # Additive Holt-Winters level, trend and seasonal components
+    level: float = 0.0
+    trend: float = 0.0
+    seasonal: List[float] = field(default_factory=list)
+    first_season: List[float] = field(default_factory=list)
+    residual_var: float = 0.0
+    forecasts: int = 0
+
+    # Per-phase seasonal buffers
+    phase_mean: List[float] = field(default_factory=list)
+    phase_var: List[float] = field(default_factory=list)
+    phase_count: List[int] = field(default_factory=list)
+
+    # Sliding feature window the Isolation Forest is refit on
+    features: Deque[List[float]] = field(default_factory=lambda: deque(maxlen=256))
+
+
+class StreamingAnomalyDetector:
+    """
+    Online counterpart of AnomalyDetectionEngine.detect_anomalies.
+
+    Each series keeps rolling state in the cache: an EWMA mean/variance
+    (statistical detector), additive Holt-Winters components (forecast
+    residuals), per-phase seasonal means/variances and a sliding feature
+    window. A new point is scored against the state and then folded into it,
+    so scoring costs O(1) and never revisits history.
+
+    When scikit-learn is installed, an Isolation Forest over the feature
+    window also votes. It is fit off the write path by the
+    analytics.refit_anomaly_model task, queued once FOREST_REFIT_INTERVAL
+    points have arrived since the last fit, and cached under its own key
+    once per fit. Scoring only reads it.
+
+    State is read and written per series with last-writer-wins semantics;
+    points of one KPI are expected to arrive sequentially.
+    """
+
+    CACHE_PREFIX = 'anomaly:stream'
+    CACHE_VERSION = 'v1'
+    ALERTS_TIMEOUT = 86400 * 7
+    MAX_RECENT_ALERTS = 100
+
+    MIN_POINTS = 10  # Same minimum as the batch engine
+    FOREST_WINDOW = 256
+    FOREST_REFIT_INTERVAL = 50
+    FOREST_MIN_POINTS = 32
+    REFIT_LOCK_TIMEOUT = 600
+
+    # Fitted forests already loaded in this process: series key -> (fitted_at, forest)
+    _models: Dict[str, Tuple[int, Any]] = {}
+    MAX_LOADED_MODELS = 1000
+
+    DEFAULT_CONFIG = {
+        'seasonal_period': 12,
+        'ewma_alpha': 0.1,
+        'holt_winters_alpha': 0.3,
+        'holt_winters_beta': 0.1,
+        'holt_winters_gamma': 0.1,
+        'z_threshold': 3.0,
+        'threshold_multiplier': 3.0,
+        'seasonal_threshold': 3.0,
+        'contamination': 0.05,
+        'min_votes': 2,
+        'min_alert_severity': 'high',
+    }
+
+    SEVERITY_LEVELS = {
+        'low': 0.3,
+        'medium': 0.6,
+        'high': 0.8,
+        'critical': 0.9,
+    }
+
+    # State
+
+    @classmethod
+    def _state_key(cls, series_key: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:state:{series_key}"
+
+    @classmethod
+    def _alerts_key(cls, company_id: Any) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:alerts:{company_id}"
+
+    @classmethod
+    def _model_key(cls, series_key: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:model:{series_key}"
+
+    @classmethod
+    def _model_version_key(cls, series_key: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:model_version:{series_key}"
+
+    @classmethod
+    def _refit_lock_key(cls, series_key: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:refit:{series_key}"
+
+    @classmethod
+    def _warm_start_lock_key(cls, series_key: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:warm_start:{series_key}"
+
+    @classmethod
+    def _batch_alerted_key(cls, series_key: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:batch_alerted:{series_key}"
+
+    @classmethod
+    def _config(cls, config: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        return {**cls.DEFAULT_CONFIG, **(config or {})}
+
+    @classmethod
+    def get_state(cls, series_key: str) -> Optional[SeriesState]:
+        return cache.get(cls._state_key(series_key))
+
+    @classmethod
+    def save_state(cls, series_key: str, state: SeriesState) -> None:
+        cache.set(cls._state_key(series_key), state, None)
+
+    @classmethod
+    def reset(cls, series_key: str) -> None:
+        cache.delete_many([
+            cls._state_key(series_key), cls._model_key(series_key), cls._model_version_key(series_key)
+        ])
+        cls._models.pop(series_key, None)
+
+    @classmethod
+    def get_model_version(cls, series_key: str) -> Optional[int]:
+        """Point count the series' forest was fit at, or None if it has none."""
+        return cache.get(cls._model_version_key(series_key))
+
+    @classmethod
+    def get_model(cls, series_key: str) -> Any:
+        """
+        The series' fitted Isolation Forest, or None.
+
+        Only a small version key is read per point; the pickled forest is
+        loaded from the cache once per fit and kept in this process.
+        """
+        version = cls.get_model_version(series_key)
+        if version is None:
+            return None
+        loaded = cls._models.get(series_key)
+        if loaded and loaded[0] == version:
+            return loaded[1]
+
+        model = cache.get(cls._model_key(series_key))
+        if not model:
+            return None
+        if len(cls._models) >= cls.MAX_LOADED_MODELS:
+            cls._models.clear()
+        cls._models[series_key] = (model['fitted_at'], model['forest'])
+        return model['forest']
+
+    @classmethod
+    def save_model(cls, series_key: str, forest: Any, fitted_at: int) -> None:
+        cache.set(cls._model_key(series_key), {'fitted_at': fitted_at, 'forest': forest}, None)
+        cache.set(cls._model_version_key(series_key), fitted_at, None)
+
+    @classmethod
+    def _new_state(cls, config: Dict[str, Any]) -> SeriesState:
+        period = max(1, int(config['seasonal_period']))
+        return SeriesState(
+            period=period,
+            phase_mean=[0.0] * period,
+            phase_var=[0.0] * period,
+            phase_count=[0] * period,
+            features=deque(maxlen=cls.FOREST_WINDOW),
+        )
+
+    # Scoring
+
+    @classmethod
+    def observe(cls, series_key: str, value: float, timestamp: Any = None,
+                config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Score a new point and fold it into the series state.
+
+        Args:
+            series_key: Series identifier (e.g. "<company_id>:<kpi_id>")
+            value: New observation
+            timestamp: Observation time, echoed in the result
+            config: Overrides of DEFAULT_CONFIG
+
+        Returns:
+            Per-method scores and votes, anomaly flag, severity and alert (if any)
+        """
+        config = cls._config(config)
+        state = cls.get_state(series_key) or cls._new_state(config)
+        result = cls.score(state, value, timestamp, config, cls.get_model(series_key))
+        cls.save_state(series_key, state)
+        if cls._refit_due(series_key, state):
+            cls._queue_refit(series_key, config)
+        return result
+
+    @classmethod
+    def warm_start(cls, series_key: str, points: Iterable[Tuple[Any, float]],
+                   config: Optional[Dict[str, Any]] = None) -> SeriesState:
+        """
+        Build a series' state from its history once, replacing any existing state.
+
+        The Isolation Forest is fit once on the resulting window. Replays many
+        points; call it from a task (warm_start_kpi_series_task), not a request.
+        """
+        config = cls._config(config)
+        state = cls._new_state(config)
+        for timestamp, value in points:
+            cls.score(state, value, timestamp, config)
+        cls.save_state(series_key, state)
+        cls.refit(series_key, config, state)
+        return state
+
+    @classmethod
+    def acquire_warm_start_lock(cls, series_key: str) -> bool:
+        """Claim the series' warm start; False if one is already queued or running."""
+        return cache.add(cls._warm_start_lock_key(series_key), True, cls.REFIT_LOCK_TIMEOUT)
+
+    @classmethod
+    def release_warm_start_lock(cls, series_key: str) -> None:
+        cache.delete(cls._warm_start_lock_key(series_key))
+
+    @classmethod
+    def _refit_due(cls, series_key: str, state: SeriesState) -> bool:
+        if not SKLEARN_AVAILABLE or len(state.features) < cls.FOREST_MIN_POINTS:
+            return False
+        fitted_at = cls.get_model_version(series_key)
+        return fitted_at is None or state.count - fitted_at >= cls.FOREST_REFIT_INTERVAL
+
+    @classmethod
+    def _queue_refit(cls, series_key: str, config: Dict[str, Any]) -> None:
+        """Queue one refit per series at a time."""
+        if not cache.add(cls._refit_lock_key(series_key), True, cls.REFIT_LOCK_TIMEOUT):
+            return
+        try:
+            from analytics.tasks import refit_anomaly_model_task
+            refit_anomaly_model_task.delay(series_key, config)
+        except Exception as e:
+            cache.delete(cls._refit_lock_key(series_key))
+            logger.error(f"Failed to queue anomaly model refit for {series_key}: {e}")
+
+    @classmethod
+    def refit(cls, series_key: str, config: Optional[Dict[str, Any]] = None,
+              state: Optional[SeriesState] = None) -> bool:
+        """
+        Fit the series' Isolation Forest on its current feature window and cache it.
+
+        Returns:
+            Whether a forest was fit
+        """
+        try:
+            state = state or cls.get_state(series_key)
+            if not SKLEARN_AVAILABLE or state is None or len(state.features) < cls.FOREST_MIN_POINTS:
+                return False
+            forest = IsolationForest(
+                n_estimators=50,
+                contamination=cls._config(config)['contamination'],
+                random_state=42
+            ).fit(list(state.features))
+            cls.save_model(series_key, forest, state.count)
+            return True
+        finally:
+            cache.delete(cls._refit_lock_key(series_key))
+
+    @classmethod
+    def score(cls, state: SeriesState, value: float, timestamp: Any,
+              config: Dict[str, Any], forest: Any = None) -> Dict[str, Any]:
+        """Score one point against state (and forest, if fitted), then update state in place."""
+        value = float(value)
+        phase = state.count % state.period
+        scores: Dict[str, float] = {}
+        votes: List[str] = []
+
+        # Statistical: deviation from the exponentially weighted mean
+        if state.count >= cls.MIN_POINTS and state.ewma_var > 0:
+            scores['statistical'] = (value - state.ewma_mean) / math.sqrt(state.ewma_var)
+            if abs(scores['statistical']) > config['z_threshold']:
+                votes.append('statistical')
+
+        # Holt-Winters: deviation from the one-step-ahead forecast
+        forecast = None
+        if state.count >= state.period and state.seasonal:
+            forecast = state.level + state.trend + state.seasonal[phase]
+            if state.forecasts >= cls.MIN_POINTS and state.residual_var > 0:
+                scores['holt_winters'] = (value - forecast) / math.sqrt(state.residual_var)
+                if abs(scores['holt_winters']) > config['threshold_multiplier']:
+                    votes.append('holt_winters')
+
+        # Seasonal: deviation from the mean of this phase
+        if state.period > 1 and state.phase_count[phase] >= 3 and state.phase_var[phase] > 0:
+            scores['seasonal'] = (value - state.phase_mean[phase]) / math.sqrt(state.phase_var[phase])
+            if abs(scores['seasonal']) > config['seasonal_threshold']:
+                votes.append('seasonal')
+
+        # Isolation Forest on features relative to the rolling state
+        features = [
+            value,
+            value - state.ewma_mean,
+            value - (forecast if forecast is not None else state.ewma_mean),
+            value - (state.last_value if state.last_value is not None else value),
+        ]
+        if forest is not None:
+            scores['isolation_forest'] = float(forest.decision_function([features])[0])
+            if scores['isolation_forest'] < 0:
+                votes.append('isolation_forest')
+
+        is_anomaly = len(votes) >= min(config['min_votes'], max(1, len(scores)))
+        z_scores = [abs(score) for method, score in scores.items() if method != 'isolation_forest']
+        severity_score = min(max(z_scores, default=0.0) / (2 * config['z_threshold']), 1.0) if is_anomaly else 0.0
+        severity_level = cls._severity_level(severity_score)
+
+        result = {
+            'timestamp': timestamp,
+            'value': value,
+            'forecast': forecast,
+            'scores': scores,
+            'votes': votes,
+            'is_anomaly': is_anomaly,
+            'severity_score': severity_score,
+            'severity_level': severity_level,
+            'alert': None,
+        }
+        if is_anomaly and cls._meets_severity(severity_level, config['min_alert_severity']):
+            result['alert'] = {
+                'timestamp': timestamp,
+                'value': value,
+                'severity_level': severity_level,
+                'severity_score': severity_score,
+                'methods': votes,
+                'message': f"Anomaly detected: {severity_level} severity",
+            }
+
+        cls._update(state, cls._clip(state, value, config), timestamp, forecast, features, config)
+        return result
+
+    @classmethod
+    def _clip(cls, state: SeriesState, value: float, config: Dict[str, Any]) -> float:
+        """Winsorize the update value so one outlier cannot drag the baseline."""
+        if state.count < cls.MIN_POINTS or state.ewma_var <= 0:
+            return value
+        bound = config['z_threshold'] * math.sqrt(state.ewma_var)
+        return min(max(value, state.ewma_mean - bound), state.ewma_mean + bound)
+
+    @classmethod
+    def _update(cls, state: SeriesState, value: float, timestamp: Any, forecast: Optional[float],
+                features: List[float], config: Dict[str, Any]) -> None:
+        phase = state.count % state.period
+
+        # EWMA mean/variance (West's incremental form)
+        if state.count == 0:
+            state.ewma_mean = value
+        else:
+            alpha = config['ewma_alpha']
+            diff = value - state.ewma_mean
+            increment = alpha * diff
+            state.ewma_mean += increment
+            state.ewma_var = (1 - alpha) * (state.ewma_var + diff * increment)
+
+        # Holt-Winters: initialize from the first season, then update
+        if state.count < state.period:
+            state.first_season.append(value)
+            if len(state.first_season) == state.period:
+                state.level = sum(state.first_season) / state.period
+                state.seasonal = [v - state.level for v in state.first_season]
+                state.first_season = []
+        else:
+            alpha, beta, gamma = (
+                config['holt_winters_alpha'], config['holt_winters_beta'], config['holt_winters_gamma']
+            )
+            seasonal = state.seasonal[phase]
+            level = alpha * (value - seasonal) + (1 - alpha) * (state.level + state.trend)
+            state.trend = beta * (level - state.level) + (1 - beta) * state.trend
+            state.seasonal[phase] = gamma * (value - level) + (1 - gamma) * seasonal
+            state.level = level
+
+            residual = value - forecast
+            weight = config['ewma_alpha'] if state.forecasts else 1.0
+            state.residual_var = (1 - weight) * state.residual_var + weight * residual * residual
+            state.forecasts += 1
+
+        # Per-phase seasonal buffer
+        if state.phase_count[phase] == 0:
+            state.phase_mean[phase] = value
+        else:
+            weight = max(config['ewma_alpha'], 1.0 / (state.phase_count[phase] + 1))
+            diff = value - state.phase_mean[phase]
+            state.phase_mean[phase] += weight * diff
+            state.phase_var[phase] = (1 - weight) * (state.phase_var[phase] + weight * diff * diff)
+        state.phase_count[phase] += 1
+
+        # Isolation Forest window; fitting happens in refit()
+        state.features.append(features)
+
+        state.count += 1
+        state.last_value = value
+        state.last_timestamp = str(timestamp) if timestamp is not None else None
+
+    @classmethod
+    def _severity_level(cls, severity_score: float) -> str:
+        for level in ('critical', 'high', 'medium'):
+            if severity_score >= cls.SEVERITY_LEVELS[level]:
+                return level
+        return 'low'
+
+    @classmethod
+    def _meets_severity(cls, level: str, minimum: str) -> bool:
+        return cls.SEVERITY_LEVELS[level] >= cls.SEVERITY_LEVELS.get(minimum, cls.SEVERITY_LEVELS['high'])
+
+    # Alerts
+
+    @classmethod
+    def record_alert(cls, company_id: Any, alert: Dict[str, Any]) -> None:
+        """Keep an alert in the tenant's recent-alerts list."""
+        key = cls._alerts_key(company_id)
+        alerts = cache.get(key, [])
+        alerts.insert(0, alert)
+        cache.set(key, alerts[:cls.MAX_RECENT_ALERTS], cls.ALERTS_TIMEOUT)
+
+    @classmethod
+    def batch_alerts(cls, series_key: str, anomalies: List[Dict[str, Any]], last_timestamp: str,
+                     z_threshold: float = 2.0) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+        """
+        (anomaly, alert) pairs for BatchAnomalyScorer anomalies severe enough
+        to alert on, with alerts in observe()'s format.
+
+        Rescoring a series' history each night finds its old anomalies again,
+        so only anomalies after the last batch run's final point are alerted;
+        last_timestamp (the series' newest point) becomes that mark.
+        """
+        key = cls._batch_alerted_key(series_key)
+        alerted_through = cache.get(key)
+        cache.set(key, last_timestamp, None)
+
+        alerts = []
+        for anomaly in anomalies:
+            if alerted_through is not None and anomaly['timestamp'] <= alerted_through:
+                continue
+            severity_score = min(abs(anomaly.get('z_score', 0.0)) / (2 * z_threshold), 1.0)
+            severity_level = cls._severity_level(severity_score)
+            if not cls._meets_severity(severity_level, cls.DEFAULT_CONFIG['min_alert_severity']):
+                continue
+            alerts.append((anomaly, {
+                'timestamp': anomaly['timestamp'],
+                'value': anomaly['value'],
+                'severity_level': severity_level,
+                'severity_score': severity_score,
+                'methods': anomaly['ensemble_votes'],
+                'message': f"Anomaly detected: {severity_level} severity",
+            }))
+        return alerts
+
+    @classmethod
+    def get_recent_alerts(cls, company_id: Any, limit: int = 50) -> List[Dict[str, Any]]:
+        return cache.get(cls._alerts_key(company_id), [])[:limit]
+
+
+def kpi_series_key(company_id: Any, kpi_id: Any) -> str:
+    return f"{company_id}:{kpi_id}"
+
+
+def kpi_detection_config(kpi) -> Dict[str, Any]:
+    """Online detection config for a KPI, with its seasonal period from its period type."""
+    return {'seasonal_period': SEASONAL_PERIODS.get(kpi.period_type, 12)}
+
+
+def warm_start_kpi_series(kpi, since: Optional[date] = None) -> SeriesState:
+    """
+    Build a KPI's series state from its most recent FOREST_WINDOW measurements.
+
+    Measurements ending on or after since (the one that found the series
+    without state, and any saved while the state was being built) are not
+    history: they are scored afterwards, and can raise alerts.
+    """
+    from analytics.models import KPIMeasurement
+
+    measurements = KPIMeasurement.objects.filter(kpi=kpi)
+    history = measurements.filter(period_end__lt=since) if since is not None else measurements
+    history = history.order_by('-period_end').values_list(
+        'period_end', 'value'
+    )[:StreamingAnomalyDetector.FOREST_WINDOW]
+    state = StreamingAnomalyDetector.warm_start(
+        kpi_series_key(kpi.company_id, kpi.pk),
+        [(period_end.isoformat(), float(value)) for period_end, value in reversed(history)],
+        kpi_detection_config(kpi)
+    )
+    if since is None:
+        return state
+
+    # Read after the state is saved, so a measurement is either here or was
+    # scored by its own signal handler; _observe_kpi_point skips duplicates.
+    pending = measurements.filter(period_end__gte=since).order_by('period_end').values_list(
+        'pk', 'period_end', 'value'
+    )
+    for measurement_id, period_end, value in pending:
+        _observe_kpi_point(kpi, kpi.company_id, measurement_id, period_end, value)
+    return StreamingAnomalyDetector.get_state(kpi_series_key(kpi.company_id, kpi.pk)) or state
+
+
+def _observe_kpi_point(kpi, company_id: Any, measurement_id: Any, period_end: date,
+                       value: Any) -> Optional[Dict[str, Any]]:
+    """Score one KPI point against existing state and publish its alert, if any."""
+    series_key = kpi_series_key(company_id, kpi.pk)
+    state = StreamingAnomalyDetector.get_state(series_key)
+    timestamp = period_end.isoformat()
+    if state is None or (state.last_timestamp is not None and timestamp <= state.last_timestamp):
+        return None
+
+    result = StreamingAnomalyDetector.observe(series_key, float(value), timestamp, kpi_detection_config(kpi))
+
+    if result['alert']:
+        publish_kpi_alert(kpi, company_id, measurement_id, result['alert'])
+
+    return result
+
+
+def publish_kpi_alert(kpi, company_id: Any, measurement_id: Any, alert: Dict[str, Any]) -> Dict[str, Any]:
+    """Record a KPI alert in the tenant's recent alerts and publish KPI_ANOMALY_DETECTED."""
+    alert = {**alert, 'kpi_id': str(kpi.pk), 'kpi_name': kpi.name, 'measurement_id': str(measurement_id)}
+    StreamingAnomalyDetector.record_alert(company_id, alert)
+    logger.warning(f"KPI anomaly: {kpi.name} = {alert['value']} ({alert['severity_level']})")
+    try:
+        from events.event_bus import event_bus
+        event_bus.publish(
+            'KPI_ANOMALY_DETECTED', alert,
+            company_id=str(company_id),
+            priority=1
+        )
+    except Exception as e:
+        logger.error(f"Failed to publish KPI anomaly alert: {e}")
+    return alert
+
+
+def observe_kpi_measurement(measurement) -> Optional[Dict[str, Any]]:
+    """
+    Score a KPI measurement against its series.
+
+    A KPI without series state is warm-started by warm_start_kpi_series_task
+    from the history before this measurement; the task then scores this
+    measurement and any saved in the meantime, so this returns None for them.
+    Measurements already folded in by the warm start are skipped (None).
+    """
+    kpi = measurement.kpi
+    series_key = kpi_series_key(measurement.company_id, kpi.pk)
+
+    if StreamingAnomalyDetector.get_state(series_key) is None:
+        if StreamingAnomalyDetector.acquire_warm_start_lock(series_key):
+            try:
+                from analytics.tasks import warm_start_kpi_series_task
+                warm_start_kpi_series_task.delay(str(kpi.pk), measurement.period_end.isoformat())
+            except Exception as e:
+                StreamingAnomalyDetector.release_warm_start_lock(series_key)
+                logger.error(f"Failed to queue anomaly warm start for KPI {kpi.pk}: {e}")
+        return None
+
+    return _observe_kpi_point(
+        kpi, measurement.company_id, measurement.pk, measurement.period_end, measurement.value
+    )
+
+
+# Signal handler: score new measurements as they are committed
+def score_measurement_on_save(sender, instance, created=False, raw=False, **kwargs):
+    """Score newly created KPI measurements after commit."""
+    if raw or not created:
+        return
+
+    def apply():
+        try:
+            observe_kpi_measurement(instance)
+        except Exception as e:
+            logger.error(f"Streaming anomaly scoring failed for measurement {instance.pk}: {e}")
+
+    transaction.on_commit(apply)
+
+
+post_save.connect(
+    score_measurement_on_save, sender='analytics.KPIMeasurement',
+    dispatch_uid='streaming_anomaly_kpi_measurement'
+)
@@ -11,63 +11,84 @@ logger = logging.getLogger(__name__)
 @shared_task(name='analytics.precompute_facets')
 def precompute_facets_task():
     """
-    Precompute search facets for all entity types.
-    Run every 5 minutes via Celery Beat.
+    Reconcile incremental facet counters for all tenants and entity types.
+    Counters are updated on every save/delete; this scan corrects drift from
+    bulk operations. Run hourly via Celery Beat.
     """
-    from analytics.search_optimization import FacetPrecomputer, FacetConfig
+    from analytics.facet_counters import FacetCounterMaintainer, FACET_ENTITY_MODELS
+    from core.models import Company
+    
+    logger.info("Starting facet counter reconciliation")
+    
+    results = []
+    
+    for company_id in Company.objects.values_list('id', flat=True).iterator():
+        for entity_type in FACET_ENTITY_MODELS:
+            try:
+                summary = FacetCounterMaintainer.reconcile(entity_type, company_id)
+                results.append({**summary, 'status': 'success'})
+            except Exception as e:
+                logger.error(f"Error reconciling facets {entity_type} ({company_id}): {e}")
+                results.append({
+                    'entity': entity_type,
+                    'company_id': str(company_id),
+                    'status': 'error',
+                    'error': str(e)
+                })
+    
+    logger.info(f"Facet reconciliation complete: {len(results)} tenant entities processed")
+    return results
+
+
+@shared_task(name='analytics.precompute_filtered_facets')
+def precompute_filtered_facets_task():
+    """
+    Precompute facets for each tenant's recently requested filtered views.
+    Filtered facets are not covered by the counters; misses are recorded by
+    SearchOptimizer.get_facets_for_entity. Run every 5 minutes via Celery Beat.
+    """
+    from analytics.facet_counters import FACET_ENTITY_MODELS
+    from analytics.search_optimization import FacetPrecomputer
+    from core.models import Company
     from django.apps import apps
     
-    logger.info("Starting facet precomputation")
+    logger.info("Starting filtered facet precomputation")
     
-    # Entity type to model mapping
-    entity_models = {
-        'lead': 'leads.Lead',
-        'deal': 'deals.Deal',
-        'account': 'accounts.Account',
-        'contact': 'contacts.Contact',
-    }
+    cached = 0
+    for company_id in Company.objects.values_list('id', flat=True).iterator():
+        for entity_type, model_label in FACET_ENTITY_MODELS.items():
+            try:
+                cached += FacetPrecomputer.warm_filtered_views(
+                    entity_type, str(company_id), apps.get_model(model_label)
+                )
+            except Exception as e:
+                logger.error(f"Error precomputing filtered facets {entity_type} ({company_id}): {e}")
     
-    results = []
+    logger.info(f"Filtered facet precomputation complete: {cached} facets cached")
+    return cached
+
+
+@shared_task(name='analytics.rebuild_bm25_index')
+def rebuild_bm25_index_task(company_id=None):
+    """
+    Rebuild BM25 inverted indexes from the database.
+    Indexes are maintained on save/delete; run after bulk imports or to backfill.
+    """
+    from analytics.bm25_index import BM25_INDEXED_MODELS, rebuild_tenant_index
+    from core.models import Company
     
-    for entity_type, model_path in entity_models.items():
-        try:
-            # Get model class
-            app_label, model_name = model_path.split('.')
-            model_class = apps.get_model(app_label, model_name)
-            
-            # Get facet configs
-            common_facets = FacetConfig.COMMON_FACETS
-            entity_facets = FacetConfig.ENTITY_FACETS.get(entity_type, {})
-            all_facets = {**common_facets, **entity_facets}
-            
-            # Precompute each facet
-            for facet_name, facet_config in all_facets.items():
-                try:
-                    result = FacetPrecomputer.precompute_facet(
-                        entity_type, facet_name, facet_config, model_class
-                    )
-                    
-                    # Cache the result
-                    FacetPrecomputer.cache_facet(entity_type, facet_name, result)
-                    
-                    results.append({
-                        'entity': entity_type,
-                        'facet': facet_name,
-                        'status': 'success'
-                    })
-                except Exception as e:
-                    logger.error(f"Error precomputing facet {entity_type}.{facet_name}: {e}")
-                    results.append({
-                        'entity': entity_type,
-                        'facet': facet_name,
-                        'status': 'error',
-                        'error': str(e)
-                    })
-        
-        except Exception as e:
-            logger.error(f"Error processing entity {entity_type}: {e}")
+    company_ids = [company_id] if company_id else Company.objects.values_list('id', flat=True)
+    
+    results = []
+    for cid in company_ids:
+        for model_label in BM25_INDEXED_MODELS:
+            try:
+                indexed = rebuild_tenant_index(model_label, cid)
+                results.append({'model': model_label, 'company_id': str(cid), 'indexed': indexed})
+            except Exception as e:
+                logger.error(f"Error rebuilding BM25 index {model_label} ({cid}): {e}")
+                results.append({'model': model_label, 'company_id': str(cid), 'error': str(e)})
     
-    logger.info(f"Facet precomputation complete: {len(results)} facets processed")
     return results
 
 
@@ -117,6 +138,69 @@ def precompute_aggregates_task():
     return results
 
 
+@shared_task(name='analytics.refresh_materialized_views')
+def refresh_materialized_views_task(force=False):
+    """
+    Refresh materialized views whose sources changed enough or whose staleness bound is reached.
+    Run every minute via Celery Beat; views with no pending changes are skipped.
+    """
+    from analytics.materialized_views import MaterializedViewManager
+    
+    return MaterializedViewManager.refresh_due_views(force=force)
+
+
+@shared_task(name='analytics.maintain_rollups')
+def maintain_rollups_task(full=False, company_id=None):
+    """
+    Rebuild analytics rollups for periods changed since the last run.
+    Run every 5 minutes via Celery Beat; full=True backfills every tenant.
+    """
+    from analytics.kpi_rollups import RollupManager, ROLLUP_SOURCES
+    from core.models import Company
+    
+    manager = RollupManager()
+    if not full:
+        return manager.refresh_dirty()
+    
+    company_ids = [company_id] if company_id else Company.objects.values_list('id', flat=True)
+    
+    results = []
+    for cid in company_ids:
+        for model_label in ROLLUP_SOURCES:
+            try:
+                written = manager.rebuild(model_label, cid)
+                results.append({'source': model_label, 'company_id': str(cid), 'written': written})
+            except Exception as e:
+                logger.error(f"Error rebuilding rollups {model_label} ({cid}): {e}")
+                results.append({'source': model_label, 'company_id': str(cid), 'error': str(e)})
+    
+    return results
+
+
+@shared_task(name='analytics.compact_rollups')
+def compact_rollups_task():
+    """
+    Apply rollup retention: expire fine-grained rollups and compact old raw analytics rows.
+    Run daily via Celery Beat.
+    """
+    from analytics.kpi_rollups import RollupManager, ROLLUP_SOURCES
+    from core.models import Company
+    
+    manager = RollupManager()
+    
+    results = []
+    for cid in Company.objects.values_list('id', flat=True).iterator():
+        for model_label in ROLLUP_SOURCES:
+            try:
+                deleted = manager.compact(model_label, cid)
+                results.append({'source': model_label, 'company_id': str(cid), 'deleted': deleted})
+            except Exception as e:
+                logger.error(f"Error compacting rollups {model_label} ({cid}): {e}")
+                results.append({'source': model_label, 'company_id': str(cid), 'error': str(e)})
+    
+    return results
+
+
 @shared_task(name='system_config.audit_maintenance')
 def audit_maintenance_task():
     """
@@ -195,10 +279,11 @@ def execute_workflow_step_task(workflow_id, step_config, context):
 
 
 @shared_task(name='master_data.background_export')
-def background_export_task(export_id, queryset_params, format, fields, user_id):
+def background_export_task(export_id, queryset_params, format, fields, user_id, options=None):
     """
     Execute background export operation.
     Used for large exports that would timeout in HTTP request.
+    The export file is written to default storage under exports/.
     """
     from master_data.streaming_export import ExportManager, ExportProgress
     from django.apps import apps
@@ -217,21 +302,19 @@ def background_export_task(export_id, queryset_params, format, fields, user_id):
         queryset = model_class.objects.filter(**queryset_params.get('filters', {}))
         
         # Create exporter
-        exporter = ExportManager.create_exporter(format, queryset, fields)
+        exporter = ExportManager.create_exporter(format, queryset, fields, **(options or {}))
         
-        # TODO: Save export to file storage (S3, local, etc.)
-        # For now, just count records
-        record_count = 0
-        for record in exporter.iter_records():
-            record_count += 1
-            
-            if record_count % 1000 == 0:
-                ExportProgress.update_progress(export_id, record_count)
+        file_path = ExportManager.save_export(
+            exporter,
+            f"exports/{export_id}.{exporter.FILE_EXTENSION}",
+            progress_callback=lambda count: ExportProgress.update_progress(export_id, count)
+        )
+        record_count = exporter.exported_records
         
         duration = time.time() - start_time
         
         # Complete export
-        file_url = f"/exports/{export_id}.{format}.gz"  # TODO: actual file URL
+        file_url = ExportManager.get_export_url(file_path)
         ExportProgress.complete_export(export_id, file_url)
         
         logger.info(
@@ -253,25 +336,99 @@ def background_export_task(export_id, queryset_params, format, fields, user_id):
         raise
 
 
+@shared_task(name='master_data.sharded_export')
+def sharded_export_task(export_id, queryset_params, format, fields, user_id, options=None,
+                        rows_per_shard=None):
+    """
+    Split a large export into primary key shards and export them in parallel.
+    Each shard writes its own part; a manifest is written once all complete.
+    """
+    from master_data.sharded_export import ShardedExport
+    
+    ShardedExport.plan(export_id, queryset_params, format, fields, user_id, options, rows_per_shard)
+    return resume_sharded_export_task(export_id)
+
+
+@shared_task(name='master_data.resume_sharded_export')
+def resume_sharded_export_task(export_id):
+    """
+    Dispatch every shard of an export that has not completed, then finalize.
+    Run again after failures; completed shards are not re-exported.
+    """
+    from celery import chord
+    from master_data.sharded_export import ShardedExport
+    
+    indexes = ShardedExport.pending_shards(export_id)
+    if not indexes:
+        return finalize_sharded_export_task(export_id)
+    
+    chord(
+        export_shard_task.s(export_id, index) for index in indexes
+    )(finalize_sharded_export_task.si(export_id))
+    
+    logger.info(f"Dispatched {len(indexes)} shards of export {export_id}")
+    return {'export_id': export_id, 'dispatched_shards': indexes}
+
+
+@shared_task(name='master_data.export_shard', bind=True, max_retries=3, default_retry_delay=60)
+def export_shard_task(self, export_id, index):
+    """
+    Export one shard of a sharded export.
+    Failed shards are retried on their own without touching other shards.
+    """
+    from master_data.sharded_export import ShardedExport
+    
+    try:
+        shard = ShardedExport.export_shard(export_id, index)
+        return {'index': index, 'exported_records': shard['exported_records']}
+    except Exception as e:
+        raise self.retry(exc=e)
+
+
+@shared_task(name='master_data.finalize_sharded_export')
+def finalize_sharded_export_task(export_id):
+    """Write the manifest of a sharded export once every shard has completed."""
+    from master_data.sharded_export import ShardedExport
+    
+    manifest_path = ShardedExport.write_manifest(export_id)
+    return {'export_id': export_id, 'manifest': manifest_path, **ShardedExport.get_progress(export_id)}
+
+
+@shared_task(name='data_import.process_job')
+def process_import_job_task(job_id):
+    """
+    Stage and commit an import job's upload in bounded-memory chunks.
+    Live rows/second progress is available via ImportPipeline.get_progress.
+    """
+    from data_import.models import ImportJob
+    from data_import.pipeline import ImportPipeline
+    
+    job = ImportPipeline(ImportJob.objects.select_related('template').get(pk=job_id)).run()
+    return {
+        'job_id': str(job.pk),
+        'status': job.status,
+        'processed_rows': job.processed_rows,
+        'imported_rows': job.imported_rows,
+        'invalid_rows': job.invalid_rows,
+    }
+
+
 @shared_task(name='analytics.index_vectors')
 def index_vectors_task(documents):
     """
     Bulk index vectors for similarity search.
+    Documents are written in sized batches, each retried before failing.
     """
-    from analytics.vector_search import vector_search_manager
+    from analytics.vector_indexing import VectorIndexingPipeline
     
     logger.info(f"Indexing {len(documents)} vectors")
     
     try:
-        success = vector_search_manager.bulk_index(documents)
-        
-        if success:
-            logger.info(f"Successfully indexed {len(documents)} vectors")
-        else:
-            logger.warning(f"Vector indexing completed with warnings")
+        VectorIndexingPipeline().write_documents(documents)
+        logger.info(f"Successfully indexed {len(documents)} vectors")
         
         return {
-            'status': 'success' if success else 'partial',
+            'status': 'success',
             'document_count': len(documents)
         }
     
@@ -280,6 +437,134 @@ def index_vectors_task(documents):
         raise
 
 
+@shared_task(name='analytics.reindex_vectors', bind=True, max_retries=3, default_retry_delay=60)
+def reindex_vectors_task(self, company_id=None, full=False):
+    """
+    Stream CRM records into the vector index, re-embedding only changed records.
+    Progress is checkpointed per tenant and model, so retries resume where they failed.
+    """
+    from analytics.vector_indexing import VECTOR_INDEXED_MODELS, VectorIndexingPipeline
+    from core.models import Company
+    
+    company_ids = [company_id] if company_id else Company.objects.values_list('id', flat=True)
+    pipeline = VectorIndexingPipeline()
+    
+    try:
+        return [
+            pipeline.index_tenant(model_label, cid, full=full)
+            for cid in company_ids
+            for model_label in VECTOR_INDEXED_MODELS
+        ]
+    except Exception as e:
+        logger.error(f"Vector reindex failed, retrying from checkpoint: {e}")
+        raise self.retry(exc=e)
+
+
+@shared_task(name='analytics.refit_anomaly_model')
+def refit_anomaly_model_task(series_key, config=None):
+    """
+    Refit one series' Isolation Forest and cache it.
+    Queued by StreamingAnomalyDetector.observe, at most one per series at a time.
+    """
+    from analytics.streaming_anomaly import StreamingAnomalyDetector
+
+    return StreamingAnomalyDetector.refit(series_key, config)
+
+
+@shared_task(name='analytics.warm_start_kpi_series')
+def warm_start_kpi_series_task(kpi_id, since=None):
+    """
+    Build a KPI's streaming anomaly state from its recent measurements.
+    Queued for the first measurement scored for a KPI, whose period end is
+    passed as since; measurements from then on are scored, not replayed.
+    """
+    from datetime import date
+    from analytics.models import KPI
+    from analytics.streaming_anomaly import StreamingAnomalyDetector, kpi_series_key, warm_start_kpi_series
+
+    kpi = KPI.objects.filter(pk=kpi_id).first()
+    if kpi is None:
+        return {'kpi_id': kpi_id, 'points': 0}
+
+    try:
+        state = warm_start_kpi_series(kpi, date.fromisoformat(since) if since else None)
+    finally:
+        StreamingAnomalyDetector.release_warm_start_lock(kpi_series_key(kpi.company_id, kpi.pk))
+
+    return {'kpi_id': kpi_id, 'points': state.count}
+
+
+@shared_task(name='analytics.score_kpi_anomalies')
+def score_kpi_anomalies_task(company_id=None, max_workers=None):
+    """
+    Nightly batch anomaly scoring of every KPI series, one tenant at a time.
+    Run nightly via Celery Beat; online scoring of new points is done on save.
+    Series are scored in this worker (see BatchAnomalyScorer for max_workers).
+    Anomalies since the last run are published like online KPI alerts.
+    """
+    from analytics.batch_anomaly import BatchAnomalyScorer
+    from analytics.models import KPI, KPIMeasurement
+    from analytics.streaming_anomaly import StreamingAnomalyDetector, kpi_series_key, publish_kpi_alert
+    from core.models import Company
+    
+    company_ids = [company_id] if company_id else Company.objects.values_list('id', flat=True)
+    scorer = BatchAnomalyScorer(max_workers=max_workers)
+    z_threshold = scorer.config.get('z_threshold', 2.0)
+    
+    results = []
+    for cid in company_ids:
+        series = {}
+        series_kpis = {}
+        measurements = (
+            KPIMeasurement.objects
+            .filter(company_id=cid)
+            .order_by('kpi_id', 'period_end')
+            .values_list('pk', 'kpi_id', 'period_end', 'value')
+            .iterator(chunk_size=5000)
+        )
+        for measurement_id, kpi_id, period_end, value in measurements:
+            series_key = kpi_series_key(cid, kpi_id)
+            series_kpis[series_key] = kpi_id
+            series.setdefault(series_key, []).append(
+                {'timestamp': period_end.isoformat(), 'value': float(value), 'measurement_id': measurement_id}
+            )
+        
+        summary = {'company_id': str(cid), 'series_scored': 0, 'series_skipped': 0,
+                   'anomalies_detected': 0, 'anomalous_series': [], 'alerts': 0}
+        try:
+            kpis = KPI.objects.filter(company_id=cid).only('id', 'name').in_bulk()
+            # Measurements the online path has already alerted on
+            alerted = {
+                alert.get('measurement_id') for alert in
+                StreamingAnomalyDetector.get_recent_alerts(cid, StreamingAnomalyDetector.MAX_RECENT_ALERTS)
+            }
+            for result in scorer.score(series):
+                if result['status'] != 'success':
+                    summary['series_skipped'] += 1
+                    continue
+                summary['series_scored'] += 1
+                summary['anomalies_detected'] += result['anomalies_detected']
+                if result['anomalies_detected']:
+                    summary['anomalous_series'].append(result['series_key'])
+                
+                points = series[result['series_key']]
+                batch_alerts = StreamingAnomalyDetector.batch_alerts(
+                    result['series_key'], result['anomalies'], points[-1]['timestamp'], z_threshold
+                )
+                for anomaly, alert in batch_alerts:
+                    measurement_id = points[anomaly['index']]['measurement_id']
+                    if str(measurement_id) in alerted:
+                        continue
+                    publish_kpi_alert(kpis[series_kpis[result['series_key']]], cid, measurement_id, alert)
+                    summary['alerts'] += 1
+            results.append(summary)
+        except Exception as e:
+            logger.error(f"KPI anomaly scoring failed ({cid}): {e}")
+            results.append({'company_id': str(cid), 'error': str(e)})
+    
+    return results
+
+
 @shared_task(name='analytics.warm_caches')
 def warm_caches_task():
     """
@@ -0,0 +1,260 @@
+# analytics/vector_indexing.py
+# Chunked, checkpointed vector indexing pipeline for CRM records
+
+import hashlib
+import logging
+import time
+import zlib
+from typing import Dict, Any, Iterator, List, Optional, Sequence
+import numpy as np
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.module_loading import import_string
+
+from .bm25_index import BM25_INDEXED_MODELS, get_document_text, tokenize
+from .search_cache import SearchCache
+
+logger = logging.getLogger(__name__)
+
+
+# Model label -> (entity type, embedded text fields); same records as the BM25 index
+VECTOR_INDEXED_MODELS = BM25_INDEXED_MODELS
+
+
+class HashingEmbedder:
+    """
+    Feature-hashing embedder over unigrams and bigrams.
+
+    Needs no model download and is stable across processes. Set
+    VECTOR_EMBEDDER to the dotted path of a class taking the dimension and
+    exposing ``embed(texts)`` to use a learned model instead.
+    """
+
+    name = 'hashing-v1'
+
+    def __init__(self, dimension: int = 768):
+        self.dimension = dimension
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed a batch of texts.
+
+        Returns:
+            (len(texts), dimension) L2-normalized float32 matrix
+        """
+        rows, columns, signs = [], [], []
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            for feature in tokens + [f'{a} {b}' for a, b in zip(tokens, tokens[1:])]:
+                digest = zlib.crc32(feature.encode('utf-8'))
+                rows.append(row)
+                columns.append(digest % self.dimension)
+                signs.append(1.0 if (digest >> 31) & 1 else -1.0)
+
+        matrix = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        np.add.at(matrix, (rows, columns), signs)
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.where(norms > 0, norms, 1)
+
+
+def get_embedder(dimension: int):
+    """Get the configured embedder (settings.VECTOR_EMBEDDER) for a dimension."""
+    embedder_path = getattr(settings, 'VECTOR_EMBEDDER', None)
+    if embedder_path:
+        return import_string(embedder_path)(dimension)
+    return HashingEmbedder(dimension)
+
+
+class VectorIndexingPipeline:
+    """
+    Streams CRM records into the vector search backend.
+
+    Records are read per tenant in primary-key order with keyset pagination,
+    embedded in batches and written in sized bulk batches with retry. After
+    each chunk is written the last primary key is checkpointed, so a failed
+    run resumes where it stopped. A content hash per record (text plus
+    embedder name) skips records whose text has not changed since they were
+    last indexed.
+    """
+
+    CACHE_PREFIX = 'vector_indexing'
+    CACHE_VERSION = 'v1'
+    HASH_TIMEOUT = 86400 * 30  # Evicted hashes only cost a redundant re-embed
+
+    CHUNK_SIZE = 1000
+    EMBEDDING_BATCH_SIZE = 64
+    WRITE_BATCH_SIZE = 500
+    WRITE_ATTEMPTS = 3
+    RETRY_BACKOFF_SECONDS = 0.5
+
+    def __init__(self, manager=None, embedder=None, chunk_size: Optional[int] = None):
+        """
+        Args:
+            manager: VectorSearchManager (default the global instance)
+            embedder: Object with ``embed(texts)`` (default get_embedder())
+            chunk_size: Records read per database query
+        """
+        if manager is None:
+            from .vector_search import vector_search_manager
+            manager = vector_search_manager
+        self.manager = manager
+        self.embedder = embedder or get_embedder(manager.dimension)
+        self.embedder_name = getattr(self.embedder, 'name', type(self.embedder).__name__)
+        self.chunk_size = chunk_size or self.CHUNK_SIZE
+
+    # Keys
+
+    @classmethod
+    def _checkpoint_key(cls, model_label: str, company_id: Any) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:checkpoint:{model_label}:{company_id}"
+
+    @classmethod
+    def _hash_key(cls, doc_id: str) -> str:
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:hash:{doc_id}"
+
+    @staticmethod
+    def document_id(entity_type: str, pk: Any) -> str:
+        """Vector index id of a record, unique across entity types."""
+        return f"{entity_type}:{pk}"
+
+    def content_hash(self, text: str) -> str:
+        return hashlib.md5(f"{self.embedder_name}\x00{text}".encode('utf-8')).hexdigest()
+
+    # Checkpoints
+
+    @classmethod
+    def get_checkpoint(cls, model_label: str, company_id: Any) -> Optional[Dict[str, Any]]:
+        """Get the resume point of an unfinished run, if any."""
+        return cache.get(cls._checkpoint_key(model_label, company_id))
+
+    @classmethod
+    def clear_checkpoint(cls, model_label: str, company_id: Any) -> None:
+        cache.delete(cls._checkpoint_key(model_label, company_id))
+
+    # Pipeline
+
+    def iter_chunks(self, model_label: str, company_id: Any, after_pk: Any = None) -> Iterator[List[Any]]:
+        """Yield a tenant's records in primary-key order, chunk by chunk."""
+        _, fields = VECTOR_INDEXED_MODELS[model_label]
+        model_class = apps.get_model(model_label)
+        queryset = model_class.objects.filter(company_id=company_id).only('pk', *fields).order_by('pk')
+
+        while True:
+            page = queryset.filter(pk__gt=after_pk) if after_pk is not None else queryset
+            records = list(page[:self.chunk_size])
+            if not records:
+                return
+            yield records
+            after_pk = records[-1].pk
+
+    def index_tenant(self, model_label: str, company_id: Any, full: bool = False) -> Dict[str, Any]:
+        """
+        Index one model's records for a tenant, resuming from any checkpoint.
+
+        Args:
+            model_label: Key of VECTOR_INDEXED_MODELS
+            company_id: Tenant to index
+            full: Re-embed every record, ignoring content hashes
+
+        Returns:
+            Counts of scanned, indexed and unchanged records
+        """
+        entity_type, fields = VECTOR_INDEXED_MODELS[model_label]
+        checkpoint = self.get_checkpoint(model_label, company_id)
+        stats = {
+            'model': model_label,
+            'company_id': str(company_id),
+            'scanned': checkpoint['scanned'] if checkpoint else 0,
+            'indexed': checkpoint['indexed'] if checkpoint else 0,
+            'unchanged': checkpoint['unchanged'] if checkpoint else 0,
+            'resumed': checkpoint is not None,
+        }
+
+        for records in self.iter_chunks(model_label, company_id, checkpoint['pk'] if checkpoint else None):
+            documents = [
+                {
+                    'id': self.document_id(entity_type, record.pk),
+                    'text': get_document_text(record, fields),
+                    'metadata': {
+                        'company_id': str(company_id),
+                        'entity_type': entity_type,
+                        'record_id': str(record.pk),
+                    },
+                }
+                for record in records
+            ]
+            indexed = self.index_documents(documents, skip_unchanged=not full)
+
+            stats['scanned'] += len(documents)
+            stats['indexed'] += indexed
+            stats['unchanged'] += len(documents) - indexed
+            cache.set(
+                self._checkpoint_key(model_label, company_id),
+                {'pk': records[-1].pk, **{key: stats[key] for key in ('scanned', 'indexed', 'unchanged')}},
+                timeout=None
+            )
+
+        self.clear_checkpoint(model_label, company_id)
+        if stats['indexed']:
+            SearchCache.bump_index_version(company_id)
+        logger.info(f"Vector indexed {model_label} for {company_id}: {stats}")
+        return stats
+
+    def index_documents(self, documents: List[Dict[str, Any]], skip_unchanged: bool = True) -> int:
+        """
+        Embed and write documents with 'id', 'text' and 'metadata'.
+
+        Returns:
+            Number of documents written (unchanged ones are skipped)
+        """
+        hashes = {doc['id']: self.content_hash(doc['text']) for doc in documents}
+        if skip_unchanged:
+            stored = cache.get_many([self._hash_key(doc_id) for doc_id in hashes])
+            documents = [
+                doc for doc in documents
+                if stored.get(self._hash_key(doc['id'])) != hashes[doc['id']]
+            ]
+        if not documents:
+            return 0
+
+        vectorized = []
+        for start in range(0, len(documents), self.EMBEDDING_BATCH_SIZE):
+            batch = documents[start:start + self.EMBEDDING_BATCH_SIZE]
+            vectors = self.embedder.embed([doc['text'] for doc in batch])
+            vectorized.extend(
+                {'id': doc['id'], 'vector': [float(value) for value in vector], 'metadata': doc['metadata']}
+                for doc, vector in zip(batch, vectors)
+            )
+
+        self.write_documents(vectorized)
+        cache.set_many(
+            {self._hash_key(doc['id']): hashes[doc['id']] for doc in documents},
+            timeout=self.HASH_TIMEOUT
+        )
+        return len(documents)
+
+    def write_documents(self, documents: List[Dict[str, Any]]) -> int:
+        """
+        Write vectorized documents in WRITE_BATCH_SIZE batches, retrying each batch.
+
+        Raises:
+            RuntimeError: If a batch still fails after WRITE_ATTEMPTS tries
+
+        Returns:
+            Number of documents written
+        """
+        for start in range(0, len(documents), self.WRITE_BATCH_SIZE):
+            batch = documents[start:start + self.WRITE_BATCH_SIZE]
+            for attempt in range(1, self.WRITE_ATTEMPTS + 1):
+                if self.manager.bulk_index(batch):
+                    break
+                if attempt == self.WRITE_ATTEMPTS:
+                    raise RuntimeError(
+                        f"Vector batch at offset {start} failed after {self.WRITE_ATTEMPTS} attempts"
+                    )
+                logger.warning(f"Vector batch at offset {start} failed (attempt {attempt}), retrying")
+                time.sleep(self.RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+        return len(documents)
@@ -1,13 +1,15 @@
 # analytics/vector_search.py
-# Vector search index with OpenSearch kNN/pgvector support and fallback
+# Vector search index with OpenSearch kNN/pgvector support and local kNN fallback
 
 import logging
 import hashlib
 import json
+import os
 from typing import Dict, Any, List, Optional, Tuple
 from abc import ABC, abstractmethod
 from django.conf import settings
-from django.core.cache import cache
+
+from .local_vector_index import LocalVectorIndex, benchmark_vector_index
 
 logger = logging.getLogger(__name__)
 
@@ -47,6 +49,8 @@ class OpenSearchKNNBackend(VectorSearchBackend):
     Uses OpenSearch's k-NN plugin for approximate nearest neighbor search.
     """
     
+    WRITE_BATCH_SIZE = 500
+    
     def __init__(self, host: str, port: int, index_name: str, dimension: int = 768):
         """
         Initialize OpenSearch k-NN backend.
@@ -198,14 +202,25 @@ class OpenSearchKNNBackend(VectorSearchBackend):
         if not self.client:
             return False
         
-        # Prepare bulk operations
-        # bulk_data = []
-        # for doc in documents:
-        #     bulk_data.append({"index": {"_index": self.index_name, "_id": doc['id']}})
-        #     bulk_data.append({"vector": doc['vector'], "metadata": doc['metadata']})
-        
         try:
-            # self.client.bulk(body=bulk_data)
+            # Send bulk requests of at most WRITE_BATCH_SIZE documents each
+            for start in range(0, len(documents), self.WRITE_BATCH_SIZE):
+                batch = documents[start:start + self.WRITE_BATCH_SIZE]
+                bulk_data = []
+                for doc in batch:
+                    bulk_data.append({"index": {"_index": self.index_name, "_id": doc['id']}})
+                    bulk_data.append({"vector": doc['vector'], "metadata": doc.get('metadata', {})})
+                response = self.client.bulk(body=bulk_data)
+                if response.get('errors'):
+                    failed = [
+                        item for item in response.get('items', [])
+                        if item.get('index', {}).get('error')
+                    ]
+                    logger.error(
+                        f"Bulk batch at offset {start} had {len(failed)} item errors: "
+                        f"{failed[0]['index']['error'] if failed else 'unknown'}"
+                    )
+                    return False
             logger.info(f"Bulk indexed {len(documents)} documents")
             return True
         except Exception as e:
@@ -232,6 +247,8 @@ class PgVectorBackend(VectorSearchBackend):
     Uses pgvector extension for vector similarity search.
     """
     
+    WRITE_BATCH_SIZE = 500
+    
     def __init__(self, dimension: int = 768):
         """
         Initialize pgvector backend.
@@ -291,7 +308,7 @@ class PgVectorBackend(VectorSearchBackend):
         from django.db import connection
         
         if len(query_vector) != self.dimension:
-            logger.error(f"Query vector dimension mismatch")
+            logger.error(f"Query vector dimension mismatch: {len(query_vector)} != {self.dimension}")
             return []
         
         vector_str = f"[{','.join(map(str, query_vector))}]"
@@ -349,29 +366,42 @@ class PgVectorBackend(VectorSearchBackend):
             return False
     
     def bulk_index(self, documents: List[Dict[str, Any]]) -> bool:
-        """Bulk index multiple documents."""
+        """Bulk index documents with one multi-row INSERT per WRITE_BATCH_SIZE rows."""
         from django.db import connection
         
+        valid = [doc for doc in documents if len(doc['vector']) == self.dimension]
+        if len(valid) != len(documents):
+            logger.error(f"Skipped {len(documents) - len(valid)} documents with wrong vector dimension")
+        
+        # ON CONFLICT cannot touch the same row twice in one statement; keep the last version
+        valid = list({doc['id']: doc for doc in valid}.values())
+        
         try:
             with connection.cursor() as cursor:
-                for doc in documents:
-                    vector_str = f"[{','.join(map(str, doc['vector']))}]"
-                    metadata_json = json.dumps(doc['metadata'])
+                for start in range(0, len(valid), self.WRITE_BATCH_SIZE):
+                    batch = valid[start:start + self.WRITE_BATCH_SIZE]
+                    params = []
+                    for doc in batch:
+                        params.extend([
+                            doc['id'],
+                            f"[{','.join(map(str, doc['vector']))}]",
+                            json.dumps(doc['metadata']),
+                        ])
                     
                     cursor.execute(
-                        """
+                        f"""
                         INSERT INTO vector_search_index (doc_id, vector, metadata, indexed_at)
-                        VALUES (%s, %s::vector, %s, NOW())
+                        VALUES {', '.join(['(%s, %s::vector, %s, NOW())'] * len(batch))}
                         ON CONFLICT (doc_id) DO UPDATE SET
                             vector = EXCLUDED.vector,
                             metadata = EXCLUDED.metadata,
                             indexed_at = NOW()
                         """,
-                        [doc['id'], vector_str, metadata_json]
+                        params
                     )
             
-            logger.info(f"Bulk indexed {len(documents)} documents")
-            return True
+            logger.info(f"Bulk indexed {len(valid)} documents")
+            return len(valid) == len(documents)
         except Exception as e:
             logger.error(f"Error bulk indexing: {e}")
             return False
@@ -392,38 +422,85 @@ class PgVectorBackend(VectorSearchBackend):
 
 class FallbackSearchBackend(VectorSearchBackend):
     """
-    Fallback search backend using traditional text search when vector search is unavailable.
+    Local kNN backend used when OpenSearch and pgvector are unavailable.
+    
+    Vectors live in a memory-mapped LocalVectorIndex on disk: searches are exact
+    for small indexes and filtered tenants, and use IVF partitions beyond that.
     """
     
+    def __init__(self, dimension: int = 768, path: Optional[str] = None):
+        """
+        Initialize local backend.
+        
+        Args:
+            dimension: Vector dimension size
+            path: Index directory (default settings.VECTOR_INDEX_PATH)
+        """
+        self.dimension = dimension
+        self.path = path or getattr(
+            settings, 'VECTOR_INDEX_PATH', os.path.join(str(settings.BASE_DIR), 'var', 'vector_index')
+        )
+        self._index = None
+    
+    @property
+    def index(self) -> LocalVectorIndex:
+        """Open the index lazily so importing this module touches no files."""
+        if self._index is None:
+            self._index = LocalVectorIndex(self.dimension, path=self.path)
+        return self._index
+    
     def index_document(self, doc_id: str, vector: List[float], metadata: Dict[str, Any]) -> bool:
-        """Store metadata for text search fallback."""
-        cache_key = f"fallback:doc:{doc_id}"
-        cache.set(cache_key, metadata, timeout=86400)  # 24 hours
-        logger.debug(f"Stored fallback metadata for: {doc_id}")
-        return True
+        """Index a document with its vector."""
+        if len(vector) != self.dimension:
+            logger.error(f"Vector dimension mismatch: {len(vector)} != {self.dimension}")
+            return False
+        
+        try:
+            self.index.add(doc_id, vector, metadata)
+            logger.debug(f"Indexed document: {doc_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error indexing document: {e}")
+            return False
     
     def search(self, query_vector: List[float], k: int = 10, filters: Optional[Dict] = None) -> List[Dict[str, Any]]:
-        """Fallback to text-based search."""
-        logger.warning("Using fallback search (vector search unavailable)")
+        """Search for similar vectors by cosine similarity."""
+        if len(query_vector) != self.dimension:
+            logger.error(f"Query vector dimension mismatch: {len(query_vector)} != {self.dimension}")
+            return []
         
-        # This would implement traditional text search
-        # For now, return empty results
-        return []
+        try:
+            return self.index.search(query_vector, k, filters)
+        except Exception as e:
+            logger.error(f"Error searching: {e}")
+            return []
     
     def delete_document(self, doc_id: str) -> bool:
-        """Delete fallback metadata."""
-        cache_key = f"fallback:doc:{doc_id}"
-        cache.delete(cache_key)
-        return True
+        """Delete a document."""
+        try:
+            self.index.remove([doc_id])
+            logger.debug(f"Deleted document: {doc_id}")
+            return True
+        except Exception as e:
+            logger.error(f"Error deleting document: {e}")
+            return False
     
     def bulk_index(self, documents: List[Dict[str, Any]]) -> bool:
-        """Bulk store fallback metadata."""
-        for doc in documents:
-            self.index_document(doc['id'], doc.get('vector', []), doc['metadata'])
-        return True
+        """Bulk index multiple documents in a single write."""
+        valid = [doc for doc in documents if len(doc.get('vector', [])) == self.dimension]
+        if len(valid) != len(documents):
+            logger.error(f"Skipped {len(documents) - len(valid)} documents with wrong vector dimension")
+        
+        try:
+            self.index.add_batch((doc['id'], doc['vector'], doc.get('metadata')) for doc in valid)
+            logger.info(f"Bulk indexed {len(valid)} documents")
+            return len(valid) == len(documents)
+        except Exception as e:
+            logger.error(f"Error bulk indexing: {e}")
+            return False
     
     def health_check(self) -> bool:
-        """Fallback is always available."""
+        """Local index is always available."""
         return True
 
 
@@ -455,9 +532,9 @@ class VectorSearchManager:
             logger.info("Using pgvector backend")
             return
         
-        # Fall back to traditional search
-        logger.warning("Vector search unavailable, using fallback")
-        self.backend = FallbackSearchBackend()
+        # Fall back to the local kNN index
+        logger.warning("OpenSearch and pgvector unavailable, using local vector index")
+        self.backend = FallbackSearchBackend(self.dimension)
     
     def _try_opensearch(self) -> bool:
         """Try to initialize OpenSearch backend."""
@@ -516,6 +593,20 @@ class VectorSearchManager:
             return False
         
         return self.backend.bulk_index(documents)
+    
+    def benchmark(self, document_counts: Tuple[int, ...] = (10000, 100000), queries: int = 100,
+                  k: int = 10, nprobe: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Benchmark exact and approximate local kNN at this manager's dimension.
+        
+        Uses synthetic vectors in memory; the configured backend is untouched.
+        
+        Returns:
+            QPS for exact and IVF search and IVF recall@k per index size
+        """
+        return benchmark_vector_index(
+            document_counts, dimension=self.dimension, queries=queries, k=k, nprobe=nprobe
+        )
 
 
 # Global vector search manager instance
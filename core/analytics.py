@@ -14,73 +14,20 @@ class AnalyticsService:
     """Advanced analytics service"""
     
     @staticmethod
-    def get_dashboard_metrics(company, user=None, days=30):
-        """Get dashboard metrics for the last N days"""
-        from crm.models import Lead, Account, Contact
-        from deals.models import Deal
-        from activities.models import Activity, Task
-        
-        end_date = timezone.now()
-        start_date = end_date - timedelta(days=days)
-        
-        # Base queryset for company
-        leads_qs = Lead.objects.filter(company=company, created_at__gte=start_date)
-        accounts_qs = Account.objects.filter(company=company, created_at__gte=start_date)
-        contacts_qs = Contact.objects.filter(company=company, created_at__gte=start_date)
-        deals_qs = Deal.objects.filter(company=company, created_at__gte=start_date)
-        activities_qs = Activity.objects.filter(company=company, created_at__gte=start_date)
-        tasks_qs = Task.objects.filter(company=company, created_at__gte=start_date)
-        
-        # Filter by user if specified
-        if user:
-            leads_qs = leads_qs.filter(owner=user)
-            accounts_qs = accounts_qs.filter(owner=user)
-            contacts_qs = contacts_qs.filter(owner=user)
-            deals_qs = deals_qs.filter(owner=user)
-            activities_qs = activities_qs.filter(owner=user)
-            tasks_qs = tasks_qs.filter(owner=user)
-        
-        # Calculate metrics
-        metrics = {
-            'leads': {
-                'total': leads_qs.count(),
-                'new': leads_qs.filter(status='new').count(),
-                'qualified': leads_qs.filter(status='qualified').count(),
-                'converted': leads_qs.filter(status='converted').count(),
-            },
-            'accounts': {
-                'total': accounts_qs.count(),
-                'active': accounts_qs.filter(status='active').count(),
-            },
-            'contacts': {
-                'total': contacts_qs.count(),
-            },
-            'deals': {
-                'total': deals_qs.count(),
-                'total_value': deals_qs.aggregate(Sum('amount'))['amount__sum'] or 0,
-                'average_value': deals_qs.aggregate(Avg('amount'))['amount__avg'] or 0,
-                'won': deals_qs.filter(stage='closed_won').count(),
-                'lost': deals_qs.filter(stage='closed_lost').count(),
-                'open': deals_qs.exclude(stage__in=['closed_won', 'closed_lost']).count(),
-            },
-            'activities': {
-                'total': activities_qs.count(),
-                'calls': activities_qs.filter(activity_type='call').count(),
-                'meetings': activities_qs.filter(activity_type='meeting').count(),
-                'emails': activities_qs.filter(activity_type='email').count(),
-            },
-            'tasks': {
-                'total': tasks_qs.count(),
-                'pending': tasks_qs.filter(status='pending').count(),
-                'completed': tasks_qs.filter(status='completed').count(),
-                'overdue': tasks_qs.filter(
-                    status='pending',
-                    due_date__lt=timezone.now()
-                ).count(),
-            },
-        }
-        
-        return metrics
+    def get_dashboard_metrics(company, user=None, days=30, use_cache=True):
+        """
+        Get dashboard metrics for the last N days.
+        
+        Each model is aggregated in a single conditional-aggregation query,
+        the queries run serially on the request connection unless
+        parallel=True is passed to DashboardMetricsEngine, and the payload
+        is cached per company and user (see core.dashboard_metrics).
+        """
+        from core.dashboard_metrics import DashboardMetricsEngine
+        
+        return DashboardMetricsEngine.get_dashboard_metrics(
+            company, user=user, days=days, use_cache=use_cache
+        )
     
     @staticmethod
     def get_sales_pipeline(company, user=None):
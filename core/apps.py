@@ -0,0 +1,13 @@
+# core/apps.py
+# Core App Configuration
+
+from django.apps import AppConfig
+
+class CoreConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'core'
+    verbose_name = 'Core'
+    
+    def ready(self):
+        # Register dashboard metrics cache invalidation signals
+        import core.dashboard_metrics
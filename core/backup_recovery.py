@@ -3,27 +3,54 @@
 
 import os
 import json
+import gzip
+import time
+import fnmatch
+import hashlib
+import tarfile
 import zipfile
 import shutil
+import posixpath
 import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from django.core.management import call_command
 from django.conf import settings
-from django.db import connection
+from django.db import connection, connections
 from django.core import serializers
 from django.core.management.base import BaseCommand
 import logging
 import boto3
 from botocore.exceptions import ClientError
+from .cloud_transfer import MultipartTransfer, S3TransferAdapter, FilesystemTransferAdapter
 
 logger = logging.getLogger(__name__)
 
 class BackupManager:
     """Centralized backup management"""
     
-    def __init__(self, backup_dir=None, retention_days=30):
+    # Components of a parallel backup, run concurrently
+    PARALLEL_COMPONENTS = ('database', 'media', 'code', 'configuration')
+    
+    # Shared content-addressed store for media files, inside the backup directory
+    MEDIA_OBJECT_STORE = 'objects'
+    
+    # Unreferenced media objects younger than this are kept (a backup may be writing them)
+    OBJECT_PRUNE_GRACE_SECONDS = 86400
+    
+    CONFIG_FILES = [
+        '.env', '.env.production', 'env.production.example',
+        'Dockerfile', 'docker-compose.yml', 'docker-compose.prod.yml',
+        'requirements.txt', 'requirements-dev.txt',
+    ]
+    
+    def __init__(self, backup_dir=None, retention_days=30, parallel_jobs=None, compression_level=None):
         self.backup_dir = backup_dir or os.path.join(settings.BASE_DIR, 'backups')
         self.retention_days = retention_days
+        self.parallel_jobs = parallel_jobs or getattr(
+            settings, 'BACKUP_PARALLEL_JOBS', min(4, os.cpu_count() or 1)
+        )
+        self.compression_level = compression_level or getattr(settings, 'BACKUP_COMPRESSION_LEVEL', 6)
         self.ensure_backup_dir()
     
     def ensure_backup_dir(self):
@@ -43,6 +70,8 @@ class BackupManager:
             return self.create_media_backup(backup_name, compress)
         elif backup_type == 'code':
             return self.create_code_backup(backup_name, compress)
+        elif backup_type == 'parallel':
+            return self.create_parallel_backup(backup_name)
         else:
             raise ValueError(f"Unknown backup type: {backup_type}")
     
@@ -206,6 +235,317 @@ class BackupManager:
             logger.error(f"Code backup failed: {e}")
             raise
     
+    def create_parallel_backup(self, backup_name, components=None, incremental=True):
+        """
+        Create a backup whose components run concurrently
+        
+        Nothing is staged uncompressed: PostgreSQL is dumped in directory
+        format with -j workers (other databases as a gzipped dumpdata
+        stream), code and configuration are streamed into tar.gz archives,
+        and media files go to a content-addressed object store shared by all
+        backups, so only new or changed files are copied. The manifest lists
+        every table and file for selective restores.
+        """
+        components = list(components or self.PARALLEL_COMPONENTS)
+        tasks = {
+            'database': self.backup_database_parallel,
+            'media': lambda path: self.backup_media_incremental(path, incremental),
+            'code': self.backup_code_archive,
+            'configuration': self.backup_configuration_archive,
+        }
+        unknown = set(components) - set(tasks)
+        if unknown:
+            raise ValueError(f"Unknown backup components: {sorted(unknown)}")
+        
+        backup_path = os.path.join(self.backup_dir, backup_name)
+        os.makedirs(backup_path, exist_ok=True)
+        started = time.monotonic()
+        
+        try:
+            results = {}
+            with ThreadPoolExecutor(max_workers=len(components)) as executor:
+                futures = {
+                    executor.submit(self.run_component, tasks[name], backup_path): name for name in components
+                }
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+            
+            manifest = {
+                'backup_name': backup_name,
+                'backup_type': 'parallel',
+                'format_version': 2,
+                'timestamp': datetime.now().isoformat(),
+                'duration': round(time.monotonic() - started, 2),
+                'components': results,
+                'compression': True
+            }
+            
+            manifest_path = os.path.join(backup_path, 'manifest.json')
+            with open(manifest_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+            
+            logger.info(f"Parallel backup {backup_name} completed in {manifest['duration']}s")
+            return backup_path
+            
+        except Exception as e:
+            logger.error(f"Parallel backup failed: {e}")
+            shutil.rmtree(backup_path, ignore_errors=True)
+            raise
+    
+    def run_component(self, task, backup_path):
+        """Run one backup component in a worker thread, closing the database connections it opened"""
+        try:
+            return task(backup_path)
+        finally:
+            connections.close_all()
+    
+    def create_tenant_backup(self, company_id, backup_name=None):
+        """Create a logical backup of one company's data (see core.tenant_backup)"""
+        from core.tenant_backup import TenantBackupManager
+        
+        return TenantBackupManager(self.backup_dir, compression_level=self.compression_level).export(
+            company_id, backup_name
+        )
+    
+    def backup_database_parallel(self, backup_path):
+        """Backup database without staging an uncompressed dump"""
+        db_config = settings.DATABASES['default']
+        
+        if db_config['ENGINE'] == 'django.db.backends.postgresql':
+            return self.backup_postgresql_directory(db_config, backup_path)
+        else:
+            return self.backup_django_data_compressed(backup_path)
+    
+    def postgresql_dump_command(self, db_config, dump_dir):
+        """pg_dump command for a compressed directory-format dump with parallel workers"""
+        return [
+            'pg_dump',
+            '-h', db_config.get('HOST', 'localhost'),
+            '-p', str(db_config.get('PORT', 5432)),
+            '-U', db_config.get('USER', 'postgres'),
+            '-d', db_config.get('NAME'),
+            '-Fd',
+            '-j', str(self.parallel_jobs),
+            '-Z', str(self.compression_level),
+            '-f', dump_dir
+        ]
+    
+    def backup_postgresql_directory(self, db_config, backup_path):
+        """Backup PostgreSQL as a directory-format dump, one compressed file per table"""
+        try:
+            dump_dir = os.path.join(backup_path, 'database')
+            
+            env = os.environ.copy()
+            if db_config.get('PASSWORD'):
+                env['PGPASSWORD'] = db_config['PASSWORD']
+            
+            result = subprocess.run(self.postgresql_dump_command(db_config, dump_dir),
+                                    env=env, capture_output=True, text=True)
+            
+            if result.returncode != 0:
+                raise Exception(f"pg_dump failed: {result.stderr}")
+            
+            # The dump's table of contents, so restores can select tables
+            listing = subprocess.run(['pg_restore', '-l', dump_dir], capture_output=True, text=True)
+            tables = []
+            for line in listing.stdout.splitlines():
+                if ' TABLE DATA ' in line and not line.startswith(';'):
+                    schema, table = line.split(' TABLE DATA ', 1)[1].split()[:2]
+                    tables.append(f"{schema}.{table}")
+            
+            return {
+                'type': 'postgresql_directory',
+                'path': 'database',
+                'jobs': self.parallel_jobs,
+                'tables': tables,
+                'size': self.get_directory_size(dump_dir)
+            }
+            
+        except Exception as e:
+            logger.error(f"PostgreSQL backup failed: {e}")
+            raise
+    
+    def backup_django_data_compressed(self, backup_path):
+        """Backup Django data as a dumpdata stream compressed while it is written"""
+        try:
+            db_backup_path = os.path.join(backup_path, 'database')
+            os.makedirs(db_backup_path, exist_ok=True)
+            
+            data_file = os.path.join(db_backup_path, 'data.json.gz')
+            with gzip.open(data_file, 'wt', encoding='utf-8', compresslevel=self.compression_level) as f:
+                call_command('dumpdata', '--natural-foreign', '--natural-primary', stdout=f)
+            
+            return {
+                'type': 'django',
+                'file': os.path.join('database', 'data.json.gz'),
+                'size': os.path.getsize(data_file)
+            }
+            
+        except Exception as e:
+            logger.error(f"Django data backup failed: {e}")
+            raise
+    
+    def get_media_store(self):
+        """Path of the shared content-addressed media object store"""
+        return os.path.join(self.backup_dir, self.MEDIA_OBJECT_STORE)
+    
+    def get_previous_media_index(self):
+        """Media file index of the latest backup that has one"""
+        for backup in self.list_backups():
+            manifest_path = os.path.join(backup['path'], 'manifest.json')
+            if not os.path.isfile(manifest_path):
+                continue
+            with open(manifest_path, 'r') as f:
+                media = json.load(f).get('components', {}).get('media') or {}
+            if media.get('type') == 'media_objects':
+                return media['files']
+        return {}
+    
+    def hash_file(self, path):
+        """SHA-256 of a file, read in 1MB blocks"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    
+    def store_media_object(self, src_path):
+        """
+        Store a file in the object store unless its content is already there
+        
+        The file is hashed first, so content another backup already stored
+        is never copied. New content is hashed again while it is copied, in
+        case the file changed in between. Returns (sha256, stored bytes).
+        """
+        store = self.get_media_store()
+        sha256 = self.hash_file(src_path)
+        if os.path.exists(os.path.join(store, sha256[:2], sha256)):
+            return sha256, 0
+        
+        os.makedirs(store, exist_ok=True)
+        digest = hashlib.sha256()
+        temp_path = os.path.join(store, f".tmp-{os.getpid()}-{id(digest)}")
+        
+        try:
+            with open(src_path, 'rb') as src, open(temp_path, 'wb') as dst:
+                for block in iter(lambda: src.read(1024 * 1024), b''):
+                    digest.update(block)
+                    dst.write(block)
+            
+            sha256 = digest.hexdigest()
+            object_path = os.path.join(store, sha256[:2], sha256)
+            if os.path.exists(object_path):
+                return sha256, 0
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            os.replace(temp_path, object_path)
+            return sha256, os.path.getsize(object_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    
+    def backup_media_incremental(self, backup_path, incremental=True):
+        """
+        Backup media files into the content-addressed object store
+        
+        Files whose size and modification time match the previous backup
+        reuse its hash without being read. Other files are hashed, and only
+        copied if no backup holds the same content yet.
+        """
+        media_root = str(settings.MEDIA_ROOT)
+        previous = self.get_previous_media_index() if incremental else {}
+        store = self.get_media_store()
+        
+        files = {}
+        changed = []
+        for root, dirs, filenames in os.walk(media_root):
+            for filename in filenames:
+                src_path = os.path.join(root, filename)
+                rel_path = os.path.relpath(src_path, media_root).replace(os.sep, '/')
+                stat = os.stat(src_path)
+                known = previous.get(rel_path)
+                if (known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns
+                        and os.path.exists(os.path.join(store, known['sha256'][:2], known['sha256']))):
+                    files[rel_path] = known
+                else:
+                    changed.append((rel_path, src_path, stat))
+        
+        stored_objects = stored_bytes = 0
+        with ThreadPoolExecutor(max_workers=self.parallel_jobs) as executor:
+            hashed = executor.map(lambda item: self.store_media_object(item[1]), changed)
+            for (rel_path, src_path, stat), (sha256, size) in zip(changed, hashed):
+                files[rel_path] = {'sha256': sha256, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+                if size:
+                    stored_objects += 1
+                    stored_bytes += size
+        
+        return {
+            'type': 'media_objects',
+            'store': self.MEDIA_OBJECT_STORE,
+            'files': files,
+            'file_count': len(files),
+            'changed_files': len(changed),
+            'stored_objects': stored_objects,
+            'stored_bytes': stored_bytes,
+            'size': sum(entry['size'] for entry in files.values())
+        }
+    
+    def iter_code_files(self):
+        """Code files to back up, as (path, path relative to BASE_DIR)"""
+        exclude_dirs = {'.git', '__pycache__', 'node_modules', '.venv', 'venv', 'env'}
+        exclude_files = {'.pyc', '.pyo', '.pyd', '.so', '.dll', '.exe'}
+        backup_dir = os.path.abspath(self.backup_dir)
+        
+        for root, dirs, files in os.walk(settings.BASE_DIR):
+            # Skip excluded directories and the backups themselves
+            dirs[:] = [
+                d for d in dirs
+                if d not in exclude_dirs and os.path.abspath(os.path.join(root, d)) != backup_dir
+            ]
+            
+            for file in files:
+                if any(file.endswith(ext) for ext in exclude_files):
+                    continue
+                src_path = os.path.join(root, file)
+                yield src_path, os.path.relpath(src_path, settings.BASE_DIR)
+    
+    def write_archive(self, archive_path, files):
+        """Stream files into a tar.gz archive; returns the number of files"""
+        count = 0
+        with tarfile.open(archive_path, 'w:gz', compresslevel=self.compression_level) as tar:
+            for src_path, arcname in files:
+                tar.add(src_path, arcname=arcname, recursive=False)
+                count += 1
+        return count
+    
+    def backup_code_archive(self, backup_path):
+        """Backup code files straight into a compressed archive"""
+        archive_path = os.path.join(backup_path, 'code.tar.gz')
+        file_count = self.write_archive(archive_path, self.iter_code_files())
+        
+        return {
+            'type': 'code_archive',
+            'file': 'code.tar.gz',
+            'file_count': file_count,
+            'size': os.path.getsize(archive_path)
+        }
+    
+    def backup_configuration_archive(self, backup_path):
+        """Backup configuration files straight into a compressed archive"""
+        archive_path = os.path.join(backup_path, 'config.tar.gz')
+        files = [
+            (os.path.join(settings.BASE_DIR, name), name)
+            for name in self.CONFIG_FILES
+            if os.path.exists(os.path.join(settings.BASE_DIR, name))
+        ]
+        file_count = self.write_archive(archive_path, files)
+        
+        return {
+            'type': 'configuration_archive',
+            'file': 'config.tar.gz',
+            'file_count': file_count,
+            'size': os.path.getsize(archive_path)
+        }
+    
     def backup_database(self, backup_path):
         """Backup database"""
         db_backup_path = os.path.join(backup_path, 'database')
@@ -341,27 +681,15 @@ class BackupManager:
         code_path = os.path.join(backup_path, 'code')
         os.makedirs(code_path, exist_ok=True)
         
-        # Copy code files (exclude certain directories)
-        exclude_dirs = {'.git', '__pycache__', 'node_modules', '.venv', 'venv', 'env'}
-        exclude_files = {'.pyc', '.pyo', '.pyd', '.so', '.dll', '.exe'}
-        
-        for root, dirs, files in os.walk(settings.BASE_DIR):
-            # Skip excluded directories
-            dirs[:] = [d for d in dirs if d not in exclude_dirs]
+        # Copy code files (excluding VCS, caches, environments and backups)
+        for src_path, rel_path in self.iter_code_files():
+            dst_path = os.path.join(code_path, rel_path)
             
-            for file in files:
-                if any(file.endswith(ext) for ext in exclude_files):
-                    continue
-                
-                src_path = os.path.join(root, file)
-                rel_path = os.path.relpath(src_path, settings.BASE_DIR)
-                dst_path = os.path.join(code_path, rel_path)
-                
-                # Create directory if needed
-                os.makedirs(os.path.dirname(dst_path), exist_ok=True)
-                
-                # Copy file
-                shutil.copy2(src_path, dst_path)
+            # Create directory if needed
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            
+            # Copy file
+            shutil.copy2(src_path, dst_path)
         
         return {
             'type': 'code',
@@ -464,6 +792,35 @@ class BackupManager:
                     logger.info(f"Deleted old backup: {backup['name']}")
                 except Exception as e:
                     logger.error(f"Failed to delete backup {backup['name']}: {e}")
+        
+        self.prune_media_objects()
+    
+    def prune_media_objects(self):
+        """Delete media objects no remaining backup references"""
+        store = self.get_media_store()
+        if not os.path.isdir(store):
+            return 0
+        
+        referenced = set()
+        for backup in self.list_backups():
+            manifest_path = os.path.join(backup['path'], 'manifest.json')
+            if os.path.isfile(manifest_path):
+                with open(manifest_path, 'r') as f:
+                    media = json.load(f).get('components', {}).get('media') or {}
+                referenced.update(entry['sha256'] for entry in media.get('files', {}).values())
+        
+        cutoff = time.time() - self.OBJECT_PRUNE_GRACE_SECONDS
+        removed = 0
+        for root, dirs, files in os.walk(store):
+            for file in files:
+                object_path = os.path.join(root, file)
+                if file not in referenced and os.path.getmtime(object_path) < cutoff:
+                    os.remove(object_path)
+                    removed += 1
+        
+        if removed:
+            logger.info(f"Pruned {removed} unreferenced media objects")
+        return removed
 
 class RecoveryManager:
     """Centralized recovery management"""
@@ -491,6 +848,10 @@ class RecoveryManager:
         with open(manifest_path, 'r') as f:
             manifest = json.load(f)
         
+        if manifest.get('format_version') == 2:
+            components = None if restore_type == 'full' else [restore_type]
+            return self.restore_parallel_backup(backup_path, components)
+        
         try:
             if restore_type == 'full' or restore_type == 'database':
                 self.restore_database(backup_path, manifest)
@@ -510,6 +871,130 @@ class RecoveryManager:
             logger.error(f"Restore failed: {e}")
             raise
     
+    def restore_parallel_backup(self, backup_path, components=None, tables=None, paths=None):
+        """
+        Restore a parallel backup, optionally only some of it
+        
+        Args:
+            backup_path: Backup directory
+            components: Components to restore (default: all in the manifest)
+            tables: Tables to restore from a PostgreSQL dump (default: all)
+            paths: Glob patterns of media, code or configuration files to restore (default: all)
+        """
+        with open(os.path.join(backup_path, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+        
+        components = components or list(manifest['components'])
+        missing = set(components) - set(manifest['components'])
+        if missing:
+            raise ValueError(f"Backup has no {sorted(missing)} component")
+        
+        try:
+            for name in components:
+                component = manifest['components'][name]
+                if name == 'database':
+                    self.restore_database_parallel(backup_path, component, tables)
+                elif name == 'media':
+                    self.restore_media_objects(backup_path, component, paths)
+                else:
+                    self.restore_archive(backup_path, component, paths)
+            
+            logger.info(f"Restored {components} from backup: {manifest['backup_name']}")
+            
+        except Exception as e:
+            logger.error(f"Restore failed: {e}")
+            raise
+    
+    def restore_tenant_backup(self, backup_path, company_id=None, replace=False):
+        """Restore one company's data from a tenant backup, leaving other companies untouched"""
+        from core.tenant_backup import TenantBackupManager
+        
+        return TenantBackupManager(self.backup_dir).restore(backup_path, company_id, replace)
+    
+    def restore_database_parallel(self, backup_path, component, tables=None):
+        """Restore a directory-format dump with parallel workers, or a compressed dumpdata file"""
+        if component['type'] == 'postgresql_directory':
+            self.restore_postgresql_directory(
+                settings.DATABASES['default'], os.path.join(backup_path, component['path']),
+                component.get('jobs', 1), tables
+            )
+        elif tables:
+            raise ValueError("Table selection requires a PostgreSQL directory dump")
+        else:
+            self.restore_django_data(os.path.join(backup_path, component['file']))
+    
+    def restore_postgresql_directory(self, db_config, dump_dir, jobs=1, tables=None):
+        """Restore PostgreSQL from a directory-format dump"""
+        try:
+            cmd = [
+                'pg_restore',
+                '-h', db_config.get('HOST', 'localhost'),
+                '-p', str(db_config.get('PORT', 5432)),
+                '-U', db_config.get('USER', 'postgres'),
+                '-d', db_config.get('NAME'),
+                '-j', str(jobs),
+                '--clean', '--if-exists'
+            ]
+            for table in tables or []:
+                cmd.extend(['-t', table.split('.')[-1]])
+            cmd.append(dump_dir)
+            
+            env = os.environ.copy()
+            if db_config.get('PASSWORD'):
+                env['PGPASSWORD'] = db_config['PASSWORD']
+            
+            result = subprocess.run(cmd, env=env, capture_output=True, text=True)
+            
+            if result.returncode != 0:
+                raise Exception(f"pg_restore failed: {result.stderr}")
+            
+        except Exception as e:
+            logger.error(f"PostgreSQL restore failed: {e}")
+            raise
+    
+    def restore_media_objects(self, backup_path, component, paths=None):
+        """Restore media files from the object store, verifying their hashes"""
+        store = os.path.join(os.path.dirname(os.path.abspath(backup_path)), component['store'])
+        media_root = str(settings.MEDIA_ROOT)
+        
+        def restore_file(item):
+            rel_path, entry = item
+            object_path = os.path.join(store, entry['sha256'][:2], entry['sha256'])
+            dst_path = os.path.join(media_root, *rel_path.split('/'))
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            
+            digest = hashlib.sha256()
+            with open(object_path, 'rb') as src, open(dst_path, 'wb') as dst:
+                for block in iter(lambda: src.read(1024 * 1024), b''):
+                    digest.update(block)
+                    dst.write(block)
+            if digest.hexdigest() != entry['sha256']:
+                raise ValueError(f"Media object for {rel_path} is corrupt")
+            return rel_path
+        
+        selected = [
+            (rel_path, entry) for rel_path, entry in component['files'].items()
+            if not paths or any(fnmatch.fnmatch(rel_path, pattern) for pattern in paths)
+        ]
+        with ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1)) as executor:
+            restored = list(executor.map(restore_file, selected))
+        
+        logger.info(f"Restored {len(restored)} media files")
+        return restored
+    
+    def restore_archive(self, backup_path, component, paths=None):
+        """Extract a code or configuration archive into BASE_DIR"""
+        with tarfile.open(os.path.join(backup_path, component['file']), 'r:gz') as tar:
+            members = [
+                member for member in tar.getmembers()
+                if not paths or any(fnmatch.fnmatch(member.name, pattern) for pattern in paths)
+            ]
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(settings.BASE_DIR, members=members, filter='data')
+            else:
+                tar.extractall(settings.BASE_DIR, members=members)
+        return [member.name for member in members]
+    
     def restore_database(self, backup_path, manifest):
         """Restore database from backup"""
         db_component = manifest['components'].get('database')
@@ -663,13 +1148,19 @@ class RecoveryManager:
 class CloudBackupManager:
     """Cloud backup management"""
     
-    def __init__(self, provider='aws', bucket_name=None, region=None):
+    def __init__(self, provider='aws', bucket_name=None, region=None, client=None):
         self.provider = provider
         self.bucket_name = bucket_name
         self.region = region
+        self.multipart_threshold = getattr(settings, 'CLOUD_BACKUP_MULTIPART_THRESHOLD', 64 * 1024 * 1024)
         
         if provider == 'aws':
-            self.s3_client = boto3.client('s3', region_name=region)
+            # client may be any S3-compatible client (e.g. one with endpoint_url set)
+            self.s3_client = client or boto3.client('s3', region_name=region)
+            self.transfer = MultipartTransfer(S3TransferAdapter(self.s3_client, bucket_name))
+        elif provider == 'filesystem':
+            # bucket_name is the storage directory
+            self.transfer = MultipartTransfer(FilesystemTransferAdapter(bucket_name))
         elif provider == 'gcp':
             # Initialize GCP client
             pass
@@ -679,8 +1170,12 @@ class CloudBackupManager:
     
     def upload_backup(self, backup_path, remote_path=None):
         """Upload backup to cloud storage"""
+        if os.path.isdir(backup_path):
+            return self.upload_backup_directory(backup_path, remote_path)
         if self.provider == 'aws':
             return self.upload_to_s3(backup_path, remote_path)
+        elif self.provider == 'filesystem':
+            return self.upload_to_filesystem(backup_path, remote_path)
         elif self.provider == 'gcp':
             return self.upload_to_gcp(backup_path, remote_path)
         elif self.provider == 'azure':
@@ -692,7 +1187,10 @@ class CloudBackupManager:
             if not remote_path:
                 remote_path = os.path.basename(backup_path)
             
-            self.s3_client.upload_file(backup_path, self.bucket_name, remote_path)
+            if os.path.getsize(backup_path) >= self.multipart_threshold:
+                self.transfer.upload(backup_path, remote_path)
+            else:
+                self.s3_client.upload_file(backup_path, self.bucket_name, remote_path)
             
             logger.info(f"Uploaded backup to S3: {remote_path}")
             return f"s3://{self.bucket_name}/{remote_path}"
@@ -701,10 +1199,68 @@ class CloudBackupManager:
             logger.error(f"S3 upload failed: {e}")
             raise
     
+    def upload_to_filesystem(self, backup_path, remote_path=None):
+        """Upload backup to a storage directory"""
+        if not remote_path:
+            remote_path = os.path.basename(backup_path)
+        
+        self.transfer.upload(backup_path, remote_path)
+        
+        logger.info(f"Uploaded backup to {self.bucket_name}: {remote_path}")
+        return self.transfer.adapter.object_path(remote_path)
+    
+    def object_exists(self, remote_path):
+        """Whether the store already holds an object"""
+        try:
+            self.transfer.adapter.object_size(remote_path)
+            return True
+        except (ClientError, OSError):
+            return False
+    
+    def upload_backup_directory(self, backup_path, remote_path=None):
+        """
+        Upload a parallel backup directory with the media objects it references
+        
+        Media files live in the shared object store next to the backups, so
+        the referenced objects are uploaded to an objects/ prefix next to the
+        remote backup, skipping objects an earlier upload already sent. The
+        manifest goes last, so a backup is only listed complete once every
+        file it needs is stored. The remote layout mirrors the local one and
+        restores as it is.
+        """
+        backup_path = os.path.normpath(backup_path)
+        remote_path = remote_path or os.path.basename(backup_path)
+        
+        with open(os.path.join(backup_path, 'manifest.json'), 'r') as f:
+            media = json.load(f).get('components', {}).get('media') or {}
+        uploaded_objects = 0
+        if media.get('type') == 'media_objects':
+            store = os.path.join(os.path.dirname(backup_path), media['store'])
+            for sha256 in sorted({entry['sha256'] for entry in media['files'].values()}):
+                key = posixpath.join(posixpath.dirname(remote_path), media['store'], sha256[:2], sha256)
+                if not self.object_exists(key):
+                    self.upload_backup(os.path.join(store, sha256[:2], sha256), key)
+                    uploaded_objects += 1
+        
+        files = []
+        for root, dirs, filenames in os.walk(backup_path):
+            for filename in filenames:
+                rel_path = os.path.relpath(os.path.join(root, filename), backup_path).replace(os.sep, '/')
+                if not rel_path.endswith('.upload.json'):
+                    files.append(rel_path)
+        files.sort(key=lambda rel_path: rel_path == 'manifest.json')
+        for rel_path in files:
+            self.upload_backup(os.path.join(backup_path, *rel_path.split('/')), posixpath.join(remote_path, rel_path))
+        
+        logger.info(f"Uploaded backup {remote_path}: {len(files)} files, {uploaded_objects} new media objects")
+        return remote_path
+    
     def download_backup(self, remote_path, local_path):
         """Download backup from cloud storage"""
         if self.provider == 'aws':
             return self.download_from_s3(remote_path, local_path)
+        elif self.provider == 'filesystem':
+            return self.transfer.download(remote_path, local_path)
         elif self.provider == 'gcp':
             return self.download_from_gcp(remote_path, local_path)
         elif self.provider == 'azure':
@@ -713,7 +1269,11 @@ class CloudBackupManager:
     def download_from_s3(self, remote_path, local_path):
         """Download backup from S3"""
         try:
-            self.s3_client.download_file(self.bucket_name, remote_path, local_path)
+            size = self.s3_client.head_object(Bucket=self.bucket_name, Key=remote_path)['ContentLength']
+            if size >= self.multipart_threshold:
+                self.transfer.download(remote_path, local_path)
+            else:
+                self.s3_client.download_file(self.bucket_name, remote_path, local_path)
             
             logger.info(f"Downloaded backup from S3: {remote_path}")
             return local_path
@@ -726,6 +1286,11 @@ class CloudBackupManager:
         """List backups in cloud storage"""
         if self.provider == 'aws':
             return self.list_s3_backups()
+        elif self.provider == 'filesystem':
+            return [
+                obj for obj in self.transfer.adapter.list_objects()
+                if not obj['key'].endswith(MultipartTransfer.MANIFEST_SUFFIX)
+            ]
         elif self.provider == 'gcp':
             return self.list_gcp_backups()
         elif self.provider == 'azure':
@@ -738,6 +1303,8 @@ class CloudBackupManager:
             
             backups = []
             for obj in response.get('Contents', []):
+                if obj['Key'].endswith(MultipartTransfer.MANIFEST_SUFFIX):
+                    continue
                 backups.append({
                     'key': obj['Key'],
                     'size': obj['Size'],
@@ -0,0 +1,275 @@
+# core/dashboard_metrics.py
+# Single-pass dashboard metrics engine with caching
+
+import hashlib
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Sum, Avg, Q
+from django.db.models.signals import post_save, post_delete
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+# Dashboard section -> model label
+DASHBOARD_MODELS = {
+    'leads': 'crm.Lead',
+    'accounts': 'crm.Account',
+    'contacts': 'crm.Contact',
+    'deals': 'deals.Deal',
+    'activities': 'activities.Activity',
+    'tasks': 'activities.Task',
+}
+
+CLOSED_DEAL_STAGES = ['closed_won', 'closed_lost']
+
+
+class DashboardMetricsEngine:
+    """
+    Computes dashboard metrics with one conditional-aggregation query per model.
+
+    Each model section is a single aggregate() using Count(filter=Q(...)) /
+    Sum(...) instead of one count() per metric. Sections run one after another
+    on the request's connection, so a cache miss costs six queries and no
+    extra connections. The assembled payload is cached per company and user;
+    saves and deletes on the source models invalidate a company's cached
+    payloads.
+    """
+
+    CACHE_PREFIX = 'dashboard:metrics'
+    CACHE_VERSION = 'v1'
+    DEFAULT_TIMEOUT = 300  # 5 minutes
+
+    @classmethod
+    def get_metric_definitions(cls, now: datetime) -> Dict[str, Dict[str, Any]]:
+        """
+        Get aggregate expressions for each dashboard section.
+
+        Args:
+            now: Reference time for time-relative metrics (e.g. overdue tasks)
+
+        Returns:
+            Mapping of section -> {metric name: aggregate expression}
+        """
+        return {
+            'leads': {
+                'total': Count('id'),
+                'new': Count('id', filter=Q(status='new')),
+                'qualified': Count('id', filter=Q(status='qualified')),
+                'converted': Count('id', filter=Q(status='converted')),
+            },
+            'accounts': {
+                'total': Count('id'),
+                'active': Count('id', filter=Q(is_active=True)),
+            },
+            'contacts': {
+                'total': Count('id'),
+            },
+            'deals': {
+                'total': Count('id'),
+                'total_value': Sum('amount'),
+                'average_value': Avg('amount'),
+                'won': Count('id', filter=Q(stage='closed_won')),
+                'lost': Count('id', filter=Q(stage='closed_lost')),
+                'open': Count('id', filter=~Q(stage__in=CLOSED_DEAL_STAGES)),
+            },
+            'activities': {
+                'total': Count('id'),
+                'calls': Count('id', filter=Q(activity_type='call')),
+                'meetings': Count('id', filter=Q(activity_type='meeting')),
+                'emails': Count('id', filter=Q(activity_type='email')),
+            },
+            'tasks': {
+                'total': Count('id'),
+                'pending': Count('id', filter=Q(status='pending')),
+                'completed': Count('id', filter=Q(status='completed')),
+                'overdue': Count('id', filter=Q(status='pending', due_date__lt=now)),
+            },
+        }
+
+    @classmethod
+    def compute_section(cls, section: str, company, user=None,
+                        start_date: Optional[datetime] = None,
+                        now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Compute all metrics for one dashboard section in a single query.
+
+        Args:
+            section: Dashboard section (key of DASHBOARD_MODELS)
+            company: Company instance or UUID
+            user: Optional owner to filter by
+            start_date: Only include records created on or after this time
+            now: Reference time for time-relative metrics
+
+        Returns:
+            Metric values for the section
+        """
+        now = now or timezone.now()
+        model_class = apps.get_model(DASHBOARD_MODELS[section])
+
+        queryset = model_class.objects.filter(company=company)
+        if start_date:
+            queryset = queryset.filter(created_at__gte=start_date)
+        if user:
+            queryset = queryset.filter(owner=user)
+
+        result = queryset.aggregate(**cls.get_metric_definitions(now)[section])
+        return {metric: value if value is not None else 0 for metric, value in result.items()}
+
+    @classmethod
+    def _compute_section_in_thread(cls, *args) -> Dict[str, Any]:
+        """Compute a section on a worker thread and release its DB connection."""
+        try:
+            return cls.compute_section(*args)
+        finally:
+            connection.close()
+
+    @classmethod
+    def compute_metrics(cls, company, user=None, days: int = 30,
+                        parallel: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Compute dashboard metrics for the last N days.
+
+        Args:
+            company: Company instance or UUID
+            user: Optional owner to filter by
+            days: Number of days to include
+            parallel: Run sections concurrently, each thread opening (and
+                closing) its own DB connection (default: DASHBOARD_METRICS_PARALLEL
+                setting, False). Worker threads do not see uncommitted writes
+                of the caller's transaction.
+
+        Returns:
+            Dashboard metrics keyed by section
+        """
+        now = timezone.now()
+        start_date = now - timedelta(days=days)
+        sections = list(DASHBOARD_MODELS)
+
+        if parallel is None:
+            parallel = getattr(settings, 'DASHBOARD_METRICS_PARALLEL', False)
+
+        start_time = time.time()
+
+        if parallel:
+            with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+                futures = {
+                    section: executor.submit(
+                        cls._compute_section_in_thread, section, company, user, start_date, now
+                    )
+                    for section in sections
+                }
+                metrics = {section: future.result() for section, future in futures.items()}
+        else:
+            metrics = {
+                section: cls.compute_section(section, company, user, start_date, now)
+                for section in sections
+            }
+
+        logger.debug(f"Computed dashboard metrics in {(time.time() - start_time) * 1000:.1f}ms")
+        return metrics
+
+    @classmethod
+    def _company_id(cls, company) -> str:
+        return str(getattr(company, 'pk', company))
+
+    @classmethod
+    def get_version_key(cls, company_id: str) -> str:
+        """Cache key holding a company's dashboard metrics version."""
+        return f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:version:{company_id}"
+
+    @classmethod
+    def get_company_version(cls, company_id: str) -> int:
+        """Current dashboard metrics version for a company."""
+        version_key = cls.get_version_key(company_id)
+        version = cache.get(version_key)
+        if version is None:
+            version = time.time_ns()
+            cache.add(version_key, version, None)
+            version = cache.get(version_key, version)
+        return version
+
+    @classmethod
+    def get_cache_key(cls, company_id: str, user_id: Optional[str], days: int, version: int) -> str:
+        """Generate cache key for a dashboard payload."""
+        key_data = (
+            f"{cls.CACHE_PREFIX}:{cls.CACHE_VERSION}:{company_id}:"
+            f"{user_id or 'all'}:{days}:{version}"
+        )
+        return hashlib.md5(key_data.encode()).hexdigest()
+
+    @classmethod
+    def get_dashboard_metrics(cls, company, user=None, days: int = 30,
+                              use_cache: bool = True,
+                              parallel: Optional[bool] = None,
+                              timeout: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get dashboard metrics from cache or compute and cache them.
+
+        Args:
+            company: Company instance or UUID
+            user: Optional owner to filter by
+            days: Number of days to include
+            use_cache: Read and write the cached payload
+            parallel: Run section queries concurrently
+            timeout: Cache timeout in seconds
+
+        Returns:
+            Dashboard metrics keyed by section
+        """
+        if not use_cache:
+            return cls.compute_metrics(company, user, days, parallel)
+
+        company_id = cls._company_id(company)
+        user_id = str(user.pk) if user else None
+        cache_key = cls.get_cache_key(company_id, user_id, days, cls.get_company_version(company_id))
+
+        metrics = cache.get(cache_key)
+        if metrics is not None:
+            logger.debug(f"Cache hit for dashboard metrics: {company_id}/{user_id or 'all'}")
+            return metrics
+
+        logger.debug(f"Cache miss for dashboard metrics: {company_id}/{user_id or 'all'}")
+        metrics = cls.compute_metrics(company, user, days, parallel)
+        cache.set(cache_key, metrics, timeout or cls.DEFAULT_TIMEOUT)
+        return metrics
+
+    @classmethod
+    def invalidate_company(cls, company_id: str) -> None:
+        """
+        Invalidate all cached dashboard payloads for a company.
+
+        Bumps the company version so every user's cached payload is bypassed
+        without enumerating keys; old entries expire via their TTL.
+        """
+        cache.set(cls.get_version_key(company_id), time.time_ns(), None)
+        logger.debug(f"Invalidated dashboard metrics cache for company {company_id}")
+
+
+# Signal handlers for automatic cache invalidation.
+# Bulk operations (bulk_create/update, queryset.update) do not send signals;
+# their changes become visible when cached payloads expire.
+def invalidate_dashboard_metrics(sender, instance, **kwargs):
+    """Invalidate dashboard metrics once a change to a source record commits."""
+    company_id = getattr(instance, 'company_id', None)
+    if company_id:
+        company_id = str(company_id)
+        transaction.on_commit(lambda: DashboardMetricsEngine.invalidate_company(company_id))
+
+
+for _model_label in DASHBOARD_MODELS.values():
+    post_save.connect(
+        invalidate_dashboard_metrics, sender=_model_label,
+        dispatch_uid=f'dashboard_metrics_save_{_model_label}'
+    )
+    post_delete.connect(
+        invalidate_dashboard_metrics, sender=_model_label,
+        dispatch_uid=f'dashboard_metrics_delete_{_model_label}'
+    )
@@ -189,6 +189,7 @@ class DatabaseOptimizer:
     @staticmethod
     def create_materialized_views():
         """Create materialized views for complex queries"""
+        from analytics.materialized_views import MaterializedViewManager
         
         views = [
             {
@@ -255,6 +256,9 @@ class DatabaseOptimizer:
                     cursor.execute(f"DROP MATERIALIZED VIEW IF EXISTS {view_config['name']};")
                     # Create materialized view
                     cursor.execute(view_config['sql'])
+                    # Unique index lets MaterializedViewManager refresh it concurrently
+                    MaterializedViewManager.ensure_unique_index(view_config['name'])
+                    MaterializedViewManager.mark_refreshed(view_config['name'])
                     logger.info(f"Created materialized view: {view_config['name']}")
                 except Exception as e:
                     logger.warning(f"Failed to create materialized view {view_config['name']}: {e}")
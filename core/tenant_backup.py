@@ -0,0 +1,412 @@
+# core/tenant_backup.py
+# Per-tenant logical backup and restore as compressed NDJSON, one file per model
+
+import os
+import json
+import gzip
+import base64
+import hashlib
+import logging
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import islice
+from uuid import UUID
+from django.apps import apps
+from django.conf import settings
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, models, transaction
+from django.utils.duration import duration_iso_string
+
+from core.models import Company, CompanyIsolatedModel
+
+logger = logging.getLogger(__name__)
+
+
+def _encode(value):
+    """JSON encoding for database values that round-trips through Field.to_python"""
+    if isinstance(value, (datetime, date, time)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return duration_iso_string(value)
+    if isinstance(value, (Decimal, UUID)):
+        return str(value)
+    if isinstance(value, (bytes, memoryview)):
+        return base64.b64encode(bytes(value)).decode('ascii')
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _pk_key(pk_field, value):
+    """A stored object_id in the form the exported primary keys take, for looking up pk maps"""
+    return json.loads(json.dumps(pk_field.to_python(value), default=_encode))
+
+
+def tenant_models():
+    """
+    Every model holding tenant rows, with the lookup that selects one company's rows.
+
+    Returns:
+        List of (model, company lookup): CompanyIsolatedModel subclasses
+        filter on company_id; auto-created many-to-many tables of those
+        models filter through their source row.
+    """
+    result = []
+    for model in apps.get_models():
+        if not issubclass(model, CompanyIsolatedModel) or model._meta.proxy:
+            continue
+        result.append((model, 'company_id'))
+        for field in model._meta.local_many_to_many:
+            through = field.remote_field.through
+            if through._meta.auto_created:
+                result.append((through, f"{field.m2m_field_name()}__company_id"))
+    return result
+
+
+def dependency_order(entries):
+    """
+    Sort tenant models so every model comes after the tenant models it references.
+
+    Self-references, and nullable foreign keys that close a cycle, cannot
+    be satisfied by ordering; they are returned as deferred fields, which
+    restore fills in once every row exists.
+
+    Returns:
+        (ordered entries, {model label: [deferred field names]})
+    """
+    by_label = {model._meta.label: (model, lookup) for model, lookup in entries}
+    hard, soft = {}, {}
+    deferred = {label: [] for label in by_label}
+
+    for label, (model, _) in by_label.items():
+        hard[label], soft[label] = set(), {}
+        for field in model._meta.concrete_fields:
+            if not field.is_relation or field.related_model is None:
+                continue
+            target = field.related_model._meta.label
+            if target not in by_label:
+                continue
+            if target == label:
+                deferred[label].append(field.name)
+            elif field.null:
+                soft[label].setdefault(target, []).append(field.name)
+            else:
+                hard[label].add(target)
+
+    ordered = []
+    remaining = set(by_label)
+    while remaining:
+        ready = sorted(
+            label for label in remaining
+            if not (hard[label] | set(soft[label])) & remaining
+        )
+        if not ready:
+            # Break a cycle: defer the nullable references of the model with fewest hard dependencies
+            label = min(sorted(remaining), key=lambda name: len(hard[name] & remaining))
+            for target in list(soft[label]):
+                if target in remaining:
+                    deferred[label].extend(soft[label].pop(target))
+            if (hard[label] & remaining) or not deferred[label]:
+                raise ValueError(f"Cannot order tenant models: {label} is in a cycle of required relations")
+            continue
+        for label in ready:
+            ordered.append(by_label[label])
+            remaining.discard(label)
+
+    return ordered, {label: fields for label, fields in deferred.items() if fields}
+
+
+@contextmanager
+def preserve_timestamps(model):
+    """Keep restored auto_now / auto_now_add values instead of stamping the current time"""
+    fields = [
+        field for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    try:
+        for field in fields:
+            field.auto_now = field.auto_now_add = False
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class TenantBackupManager:
+    """
+    Logical backup and restore of one company's data.
+
+    Export walks every tenant model in dependency order and streams the
+    company's rows, a chunk at a time, into one gzipped NDJSON file per
+    model. Restore reads the files back in the same order with bulk
+    inserts, giving rows new primary keys and remapping every foreign key
+    and generic foreign key between tenant rows; references to shared rows
+    (users, content types) are kept. Only the one company's rows are read,
+    deleted or written.
+    """
+
+    FORMAT = 'tenant-ndjson'
+    FORMAT_VERSION = 1
+
+    def __init__(self, backup_dir=None, chunk_size=2000, compression_level=None):
+        self.backup_dir = backup_dir or os.path.join(settings.BASE_DIR, 'backups')
+        self.chunk_size = chunk_size
+        self.compression_level = compression_level or getattr(settings, 'BACKUP_COMPRESSION_LEVEL', 6)
+
+    def export(self, company_id, backup_name=None):
+        """
+        Export one company's rows.
+
+        Args:
+            company_id: Company to export
+            backup_name: Directory name (default: tenant_<company>_<timestamp>)
+
+        Returns:
+            Backup directory path
+        """
+        company = Company.objects.get(pk=company_id)
+        backup_name = backup_name or f"tenant_{company.code}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        backup_path = os.path.join(self.backup_dir, backup_name)
+        os.makedirs(backup_path, exist_ok=True)
+
+        ordered, deferred = dependency_order(tenant_models())
+        manifest_models = []
+        total_rows = 0
+
+        snapshot = connection.vendor == 'postgresql' and not connection.in_atomic_block
+        with transaction.atomic():
+            if snapshot:
+                # One snapshot for every model, so references between files stay consistent
+                with connection.cursor() as cursor:
+                    cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+
+            for position, (model, lookup) in enumerate(ordered):
+                label = model._meta.label
+                file_name = f"{position:03d}_{label}.ndjson.gz"
+                rows = self.export_model(model, lookup, company.pk, os.path.join(backup_path, file_name))
+                manifest_models.append({
+                    'model': label,
+                    'file': file_name,
+                    'rows': rows['rows'],
+                    'sha256': rows['sha256'],
+                    'deferred_fields': deferred.get(label, []),
+                })
+                total_rows += rows['rows']
+
+        manifest = {
+            'format': self.FORMAT,
+            'format_version': self.FORMAT_VERSION,
+            'backup_name': backup_name,
+            'backup_type': 'tenant',
+            'timestamp': datetime.now().isoformat(),
+            'company': {
+                field.attname: field.value_from_object(company)
+                for field in Company._meta.concrete_fields
+            },
+            'total_rows': total_rows,
+            'models': manifest_models,
+        }
+        with open(os.path.join(backup_path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2, default=_encode)
+
+        logger.info(f"Exported {total_rows} rows of company {company.code} to {backup_path}")
+        return backup_path
+
+    def export_model(self, model, lookup, company_id, file_path):
+        """Stream one model's rows for a company into a gzipped NDJSON file"""
+        attnames = [field.attname for field in model._meta.concrete_fields]
+        rows = (
+            model._base_manager.filter(**{lookup: company_id})
+            .order_by('pk')
+            .values_list(*attnames)
+            .iterator(chunk_size=self.chunk_size)
+        )
+
+        count = 0
+        digest = hashlib.sha256()
+        with gzip.open(file_path, 'wt', encoding='utf-8', compresslevel=self.compression_level) as f:
+            for values in rows:
+                line = json.dumps(dict(zip(attnames, values)), default=_encode, separators=(',', ':')) + '\n'
+                digest.update(line.encode('utf-8'))
+                f.write(line)
+                count += 1
+
+        return {'rows': count, 'sha256': digest.hexdigest()}
+
+    def read_manifest(self, backup_path):
+        with open(os.path.join(backup_path, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != self.FORMAT:
+            raise ValueError(f"Not a tenant backup: {backup_path}")
+        return manifest
+
+    def iter_rows(self, backup_path, entry):
+        with gzip.open(os.path.join(backup_path, entry['file']), 'rt', encoding='utf-8') as f:
+            for line in f:
+                yield json.loads(line)
+
+    def restore(self, backup_path, company_id=None, replace=False):
+        """
+        Restore one company's rows.
+
+        Args:
+            backup_path: Tenant backup directory
+            company_id: Company to restore into (default: the exported company,
+                created from the manifest if it no longer exists)
+            replace: Delete the target company's existing tenant rows first
+
+        Returns:
+            Rows restored per model label
+        """
+        manifest = self.read_manifest(backup_path)
+        models_by_label = {model._meta.label: (model, lookup) for model, lookup in tenant_models()}
+        missing = [entry['model'] for entry in manifest['models'] if entry['model'] not in models_by_label]
+        if missing:
+            raise ValueError(f"Backup has models this installation lacks: {missing}")
+
+        with transaction.atomic():
+            company = self.get_target_company(manifest, company_id)
+            if replace:
+                self.delete_tenant_rows(company.pk, [entry['model'] for entry in manifest['models']], models_by_label)
+
+            pk_maps = {}
+            pending = []
+            restored = {}
+            for entry in manifest['models']:
+                model, _ = models_by_label[entry['model']]
+                restored[entry['model']] = self.restore_model(
+                    model, self.iter_rows(backup_path, entry), company.pk,
+                    set(entry['deferred_fields']), pk_maps, pending
+                )
+            self.apply_deferred(pending, pk_maps)
+
+        logger.info(f"Restored {sum(restored.values())} rows into company {company.code}")
+        return restored
+
+    def get_target_company(self, manifest, company_id):
+        if company_id is not None:
+            return Company.objects.get(pk=company_id)
+        data = manifest['company']
+        company = Company.objects.filter(pk=data['id']).first()
+        if company is None:
+            company = Company(**{
+                field.attname: field.to_python(data[field.attname])
+                for field in Company._meta.concrete_fields if field.attname in data
+            })
+            with preserve_timestamps(Company):
+                company.save(force_insert=True)
+        return company
+
+    def delete_tenant_rows(self, company_id, labels, models_by_label):
+        """Delete a company's rows, most dependent models first"""
+        for label in reversed(labels):
+            model, lookup = models_by_label[label]
+            model._base_manager.filter(**{lookup: company_id}).delete()
+
+    def restore_model(self, model, rows, company_id, deferred_fields, pk_maps, pending):
+        """
+        Bulk insert one model's rows, remapping foreign keys to restored rows.
+
+        Deferred references are inserted as NULL and queued in pending.
+        Generic foreign keys to tenant rows are remapped through the
+        content type's model; when that model is restored later, the
+        object_id is deferred the same way (keeping its old value until
+        then if the column is not nullable).
+
+        Returns:
+            Number of rows inserted
+        """
+        opts = model._meta
+        pk_field = opts.pk
+        keep_pks = not isinstance(pk_field, models.AutoField) or not connection.features.can_return_rows_from_bulk_insert
+        relations = []
+        for field in opts.concrete_fields:
+            if field.is_relation and field.related_model is not None:
+                relations.append((field, field.related_model._meta.label))
+        converters = [
+            (field.attname, field.to_python)
+            for field in opts.concrete_fields if not field.is_relation
+        ]
+        generic = [
+            (opts.get_field(field.ct_field).attname, opts.get_field(field.fk_field))
+            for field in opts.private_fields if isinstance(field, GenericForeignKey)
+        ]
+
+        pk_map = pk_maps.setdefault(opts.label, {})
+        count = 0
+        with preserve_timestamps(model):
+            while True:
+                chunk = list(islice(rows, self.chunk_size))
+                if not chunk:
+                    break
+
+                objects, old_pks = [], []
+                for row in chunk:
+                    old_pk = row[pk_field.attname]
+                    # Columns missing from older backups keep their model defaults
+                    values = {attname: convert(row[attname]) for attname, convert in converters if attname in row}
+                    if not keep_pks:
+                        values.pop(pk_field.attname)
+
+                    for field, target in relations:
+                        if field.attname not in row:
+                            continue
+                        value = row[field.attname]
+                        if value is None:
+                            values[field.attname] = None
+                        elif target == Company._meta.label:
+                            values[field.attname] = company_id
+                        elif field.name in deferred_fields:
+                            values[field.attname] = None
+                            pending.append((model, field, opts.label, old_pk, target, value))
+                        elif target in pk_maps and field.target_field.primary_key:
+                            if value not in pk_maps[target]:
+                                raise ValueError(f"{opts.label}.{field.name} references {target} {value}, "
+                                                 f"which is not in the backup")
+                            values[field.attname] = pk_maps[target][value]
+                        else:
+                            # Shared rows (users, content types) keep their keys
+                            values[field.attname] = field.to_python(value)
+
+                    for ct_attname, id_field in generic:
+                        content_type_id, value = row.get(ct_attname), row.get(id_field.attname)
+                        if content_type_id is None or value is None:
+                            continue
+                        target_model = ContentType.objects.get_for_id(content_type_id).model_class()
+                        if target_model is None or not issubclass(target_model, CompanyIsolatedModel):
+                            continue
+                        target = target_model._meta.label
+                        key = _pk_key(target_model._meta.pk, value)
+                        if target in pk_maps and target != opts.label:
+                            if key not in pk_maps[target]:
+                                raise ValueError(f"{opts.label}.{id_field.name} references {target} {value}, "
+                                                 f"which is not in the backup")
+                            values[id_field.attname] = id_field.to_python(pk_maps[target][key])
+                        else:
+                            if id_field.null:
+                                values[id_field.attname] = None
+                            pending.append((model, id_field, opts.label, old_pk, target, key))
+
+                    objects.append(model(**values))
+                    old_pks.append(old_pk)
+
+                model._base_manager.bulk_create(objects, batch_size=self.chunk_size)
+                for old_pk, obj in zip(old_pks, objects):
+                    pk_map[old_pk] = obj.pk
+                count += len(objects)
+
+        return count
+
+    def apply_deferred(self, pending, pk_maps):
+        """Fill in self-references and cycle-breaking references once every row exists"""
+        updates = {}
+        for model, field, label, old_pk, target, value in pending:
+            if value not in pk_maps.get(target, {}):
+                raise ValueError(f"{label}.{field.name} references {target} {value}, which is not in the backup")
+            obj = model(pk=pk_maps[label][old_pk])
+            setattr(obj, field.attname, pk_maps[target][value])
+            updates.setdefault((model, field.name), []).append(obj)
+
+        for (model, field_name), objects in updates.items():
+            model._base_manager.bulk_update(objects, [field_name], batch_size=self.chunk_size)
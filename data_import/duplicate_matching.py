@@ -0,0 +1,223 @@
+# data_import/duplicate_matching.py
+# Bulk duplicate matching of staged import rows against existing records by hashed match keys
+
+import hashlib
+import logging
+import time
+from array import array
+from typing import Any, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+from .models import DuplicateMatch, ImportJob, StagedRecord
+
+logger = logging.getLogger(__name__)
+
+KEY_SEPARATOR = '\x1f'
+
+
+def normalize_value(value: Any) -> str:
+    """Case-fold and collapse whitespace, so 'Ann@X.io ' and 'ann@x.io' match."""
+    if value is None:
+        return ''
+    return ' '.join(str(value).casefold().split())
+
+
+def match_key(values: Sequence[Any]) -> Optional[int]:
+    """
+    Hash normalized field values into a 64-bit match key.
+
+    Returns:
+        The key, or None if any value is empty (empty values never match)
+    """
+    normalized = [normalize_value(value) for value in values]
+    if not all(normalized):
+        return None
+    digest = hashlib.blake2b(KEY_SEPARATOR.join(normalized).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+class MatchKeyIndex:
+    """
+    Sorted array of (match key, primary key) pairs for one tenant's records.
+
+    Built in one streaming pass over the key fields; 1M records with
+    integer primary keys take about 16MB (other primary keys, e.g. UUIDs,
+    are kept in an object array). Lookups are a binary search per key over
+    the whole chunk at once.
+    """
+
+    SCAN_CHUNK_SIZE = 10000
+
+    def __init__(self, keys: np.ndarray, pks: np.ndarray):
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.pks = pks[order]
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def build(cls, queryset: models.QuerySet, fields: Sequence[str]) -> 'MatchKeyIndex':
+        """
+        Index every record of a queryset by the match key of its fields.
+
+        Args:
+            queryset: Existing records (already filtered to the tenant)
+            fields: Fields the match key is built from
+        """
+        keys = array('Q')
+        pks: Union[array, list] = array('q')
+        rows = queryset.order_by().values_list('pk', *fields).iterator(chunk_size=cls.SCAN_CHUNK_SIZE)
+        for pk, *values in rows:
+            key = match_key(values)
+            if key is not None:
+                if isinstance(pks, array) and not isinstance(pk, int):
+                    pks = list(pks)
+                keys.append(key)
+                pks.append(pk)
+        if isinstance(pks, array):
+            pk_array = np.frombuffer(pks, dtype=np.int64)
+        else:
+            pk_array = np.empty(len(pks), dtype=object)
+            pk_array[:] = pks
+        return cls(np.frombuffer(keys, dtype=np.uint64), pk_array)
+
+    def lookup(self, keys: Iterable[Optional[int]]) -> List[List[int]]:
+        """
+        Find the records matching each key.
+
+        Returns:
+            Matching primary keys per key, in input order (empty for None or no match)
+        """
+        keys = list(keys)
+        probe = np.array([key or 0 for key in keys], dtype=np.uint64)
+        starts = np.searchsorted(self.keys, probe, side='left')
+        ends = np.searchsorted(self.keys, probe, side='right')
+        matches: List[List[int]] = [[] for _ in keys]
+        for position in np.flatnonzero(ends > starts).tolist():
+            if keys[position] is not None:
+                matches[position] = self.pks[starts[position]:ends[position]].tolist()
+        return matches
+
+
+class BulkDuplicateMatcher:
+    """
+    Flags staged rows that duplicate existing records of the import's target model.
+
+    The tenant's existing records are indexed once per job (MatchKeyIndex),
+    so each staged chunk costs a vectorized lookup plus one bulk write of
+    DuplicateMatch rows and one bulk update of the staged rows, instead of
+    one query per row. Matching is exact on normalized duplicate_fields;
+    every match has a similarity score of 1.0.
+
+    Rows are also probed against the rows staged before them: a row whose
+    key repeats an earlier row of the same file is flagged as a duplicate
+    with no matches and skipped, so the first occurrence wins. Matched
+    records with non-integer primary keys are listed in duplicate_matches
+    as strings and get no DuplicateMatch row (object_id is an integer).
+    """
+
+    MATCH_ALGORITHM = 'hashed'
+
+    def __init__(self, job: ImportJob, model: type):
+        self.job = job
+        self.template = job.template
+        self.model = model
+        self.fields = list(self.template.duplicate_fields or [])
+        self.resolution = 'update' if self.template.update_existing else 'skip'
+        self._index = None
+        self._content_type = None
+        self._seen = np.empty(0, dtype=np.uint64)  # Sorted keys of rows already staged
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.template.duplicate_detection_enabled and self.fields)
+
+    @property
+    def index(self) -> MatchKeyIndex:
+        if self._index is None:
+            started = time.monotonic()
+            self._index = MatchKeyIndex.build(
+                self.model.objects.filter(company_id=self.job.company_id), self.fields
+            )
+            logger.info(
+                f"Indexed {len(self._index)} {self.model.__name__} match keys for import job "
+                f"{self.job.pk} in {time.monotonic() - started:.2f}s"
+            )
+        return self._index
+
+    def match(self, records: List[StagedRecord]) -> int:
+        """
+        Match a chunk of saved staged records and record the duplicates.
+
+        Args:
+            records: Staged records with primary keys
+
+        Returns:
+            Number of records flagged as duplicates
+        """
+        if not self.enabled or not records:
+            return 0
+        if self._content_type is None:
+            self._content_type = ContentType.objects.get_for_model(self.model)
+
+        keys = [
+            match_key([record.processed_data.get(f) for f in self.fields]) if record.is_valid else None
+            for record in records
+        ]
+
+        repeated = self._repeated(keys)
+
+        matches, flagged = [], []
+        for record, pks, is_repeat in zip(records, self.index.lookup(keys), repeated):
+            if not pks:
+                if is_repeat:
+                    record.is_duplicate = True
+                    record.duplicate_matches = []
+                    record.duplicate_strategy = 'skip'
+                    flagged.append(record)
+                continue
+            record.is_duplicate = True
+            record.duplicate_matches = [pk if isinstance(pk, int) else str(pk) for pk in pks]
+            record.duplicate_strategy = self.resolution
+            flagged.append(record)
+            matches.extend(
+                DuplicateMatch(
+                    company_id=self.job.company_id,
+                    job=self.job,
+                    staged_record=record,
+                    content_type=self._content_type,
+                    object_id=pk,
+                    similarity_score=1.0,
+                    match_fields=self.fields,
+                    match_algorithm=self.MATCH_ALGORITHM,
+                    resolution=self.resolution,
+                )
+                for pk in pks if isinstance(pk, int)
+            )
+
+        if matches:
+            DuplicateMatch.objects.bulk_create(matches, batch_size=len(records))
+        if flagged:
+            StagedRecord.objects.bulk_update(
+                flagged, ['is_duplicate', 'duplicate_matches', 'duplicate_strategy'], batch_size=len(records)
+            )
+        return len(flagged)
+
+    def _repeated(self, keys: List[Optional[int]]) -> List[bool]:
+        """
+        Flag keys that repeat an earlier row of the file, in this chunk or a previous one.
+
+        Returns:
+            Per key, whether an earlier row has the same key (False for None)
+        """
+        present = np.array([key is not None for key in keys], dtype=bool)
+        probe = np.array([key or 0 for key in keys], dtype=np.uint64)[present]
+        unique, first, inverse = np.unique(probe, return_index=True, return_inverse=True)
+        repeated = np.zeros(len(keys), dtype=bool)
+        repeated[present] = (np.arange(len(probe)) != first[inverse]) | np.isin(probe, self._seen)
+        self._seen = np.sort(np.concatenate([self._seen, unique]), kind='stable')
+        return repeated.tolist()
@@ -0,0 +1,726 @@
+# data_import/pipeline.py
+# Streaming, chunked import pipeline: parse, transform, validate, stage and commit
+
+import csv
+import io
+import logging
+import re
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from django.apps import apps
+from django.core.cache import cache
+from django.db import DataError, IntegrityError, models, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .copy_loader import CopyLoader
+from .duplicate_matching import BulkDuplicateMatcher
+from .models import ImportJob, ImportLog, ImportTemplate, StagedRecord
+
+logger = logging.getLogger(__name__)
+
+
+# Template type -> target model label; 'custom' templates name their model in target_model
+TARGET_MODELS = {
+    'contacts': 'crm.Contact',
+    'leads': 'crm.Lead',
+    'accounts': 'crm.Account',
+    'deals': 'deals.Deal',
+    'products': 'products.Product',
+    'activities': 'activities.Activity',
+}
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'f', ''}
+
+
+def resolve_target_model(template: ImportTemplate) -> type:
+    """Get the model class an import template writes to."""
+    label = TARGET_MODELS.get(template.template_type) or template.target_model
+    if '.' in label:
+        return apps.get_model(label)
+    for model in apps.get_models():
+        if model.__name__.lower() == label.lower():
+            return model
+    raise LookupError(f"Unknown import target model: {label}")
+
+
+# Readers
+
+def iter_csv_rows(file: Any, encoding: str = 'utf-8-sig') -> Iterator[Dict[str, Any]]:
+    """
+    Stream rows of a CSV upload as dictionaries keyed by header.
+
+    Args:
+        file: Binary file object
+        encoding: Text encoding (a UTF-8 BOM is skipped)
+
+    Yields:
+        One dictionary per data row
+    """
+    text = io.TextIOWrapper(file, encoding=encoding, newline='')
+    try:
+        yield from csv.DictReader(text)
+    finally:
+        text.detach()
+
+
+def iter_xlsx_rows(file: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Stream rows of the first sheet of an XLSX upload.
+
+    openpyxl's read-only mode parses the sheet lazily, so memory does not
+    grow with the number of rows.
+
+    Yields:
+        One dictionary per data row, keyed by the header row
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        headers = [str(value).strip() if value is not None else '' for value in next(rows, ())]
+        for values in rows:
+            if values is None or all(value is None for value in values):
+                continue
+            yield dict(zip(headers, values))
+    finally:
+        workbook.close()
+
+
+READERS = {
+    'csv': iter_csv_rows,
+    'excel': iter_xlsx_rows,
+}
+
+
+def count_xlsx_rows(file: Any) -> Optional[int]:
+    """Data rows of the first sheet according to its stored dimensions, if present."""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True)
+    try:
+        max_row = workbook.worksheets[0].max_row
+        return max_row - 1 if max_row else None
+    finally:
+        workbook.close()
+
+
+# Compiled transformations and validations
+
+def _to_text(value: Any) -> Any:
+    return value if value is None or isinstance(value, str) else str(value)
+
+
+def _to_int(value: Any) -> Any:
+    if value in (None, ''):
+        return None
+    return int(Decimal(str(value).replace(',', '').strip()))
+
+
+def _to_float(value: Any) -> Any:
+    if value in (None, ''):
+        return None
+    return float(str(value).replace(',', '').strip())
+
+
+def _to_decimal(value: Any) -> Any:
+    if value in (None, ''):
+        return None
+    return str(Decimal(str(value).replace(',', '').strip()))
+
+
+def _to_bool(value: Any) -> Any:
+    if isinstance(value, bool) or value is None:
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError(f"not a boolean: {value}")
+
+
+def _date_parser(date_format: Optional[str], with_time: bool) -> Callable[[Any], Any]:
+    def parse(value: Any) -> Any:
+        if value in (None, ''):
+            return None
+        if isinstance(value, datetime):
+            return value.isoformat() if with_time else value.date().isoformat()
+        if isinstance(value, date):
+            return value.isoformat()
+        text = str(value).strip()
+        if date_format:
+            parsed = datetime.strptime(text, date_format)
+            return parsed.isoformat() if with_time else parsed.date().isoformat()
+        parsed = parse_datetime(text) if with_time else parse_date(text)
+        if parsed is None:
+            raise ValueError(f"not a {'datetime' if with_time else 'date'}: {value}")
+        return parsed.isoformat()
+    return parse
+
+
+SIMPLE_TRANSFORMS: Dict[str, Callable[[Any], Any]] = {
+    'strip': lambda v: v.strip() if isinstance(v, str) else v,
+    'lower': lambda v: v.lower() if isinstance(v, str) else v,
+    'upper': lambda v: v.upper() if isinstance(v, str) else v,
+    'title': lambda v: v.title() if isinstance(v, str) else v,
+    'text': _to_text,
+    'int': _to_int,
+    'float': _to_float,
+    'decimal': _to_decimal,
+    'bool': _to_bool,
+    'date': _date_parser(None, False),
+    'datetime': _date_parser(None, True),
+    'email': lambda v: v.strip().lower() if isinstance(v, str) else v,
+    'phone': lambda v: re.sub(r'[^\d+]', '', str(v)) if v not in (None, '') else v,
+    'empty_to_none': lambda v: None if v == '' else v,
+}
+
+
+def compile_transform(spec: Any) -> Callable[[Any], Any]:
+    """
+    Compile one transformation rule into a function.
+
+    A rule is a name from SIMPLE_TRANSFORMS or a dictionary with a 'type':
+    'default' (value), 'replace' (old, new), 'map' (values, default),
+    'date' / 'datetime' (format), or 'truncate' (length).
+    """
+    if isinstance(spec, str):
+        if spec not in SIMPLE_TRANSFORMS:
+            raise ValueError(f"Unknown transformation: {spec}")
+        return SIMPLE_TRANSFORMS[spec]
+
+    kind = spec.get('type')
+    if kind == 'default':
+        default = spec.get('value')
+        return lambda v: default if v in (None, '') else v
+    if kind == 'replace':
+        old, new = spec['old'], spec.get('new', '')
+        return lambda v: v.replace(old, new) if isinstance(v, str) else v
+    if kind == 'map':
+        mapping = {str(key).lower(): value for key, value in spec.get('values', {}).items()}
+        keep = object()
+        fallback = spec.get('default', keep)
+        return lambda v: mapping.get(str(v).strip().lower(), v if fallback is keep else fallback)
+    if kind in ('date', 'datetime'):
+        return _date_parser(spec.get('format'), kind == 'datetime')
+    if kind == 'truncate':
+        length = int(spec['length'])
+        return lambda v: v[:length] if isinstance(v, str) else v
+    raise ValueError(f"Unknown transformation: {spec}")
+
+
+def compile_validation(field_name: str, rules: Dict[str, Any]) -> Callable[[Any], Optional[str]]:
+    """
+    Compile a field's validation rules into one function returning an error message or None.
+
+    Supported rules: required, type ('email'), max_length, min_length,
+    regex, choices, min, max.
+    """
+    checks: List[Callable[[Any], Optional[str]]] = []
+
+    if rules.get('required'):
+        checks.append(lambda v: 'is required' if v in (None, '') else None)
+    if rules.get('type') == 'email':
+        checks.append(lambda v: 'is not a valid email' if v and not EMAIL_PATTERN.match(str(v)) else None)
+    if 'max_length' in rules:
+        max_length = int(rules['max_length'])
+        checks.append(lambda v: f'is longer than {max_length} characters'
+                      if v is not None and len(str(v)) > max_length else None)
+    if 'min_length' in rules:
+        min_length = int(rules['min_length'])
+        checks.append(lambda v: f'is shorter than {min_length} characters'
+                      if v not in (None, '') and len(str(v)) < min_length else None)
+    if 'regex' in rules:
+        pattern = re.compile(rules['regex'])
+        checks.append(lambda v: 'has an invalid format'
+                      if v not in (None, '') and not pattern.fullmatch(str(v)) else None)
+    if 'choices' in rules:
+        choices = set(rules['choices'])
+        checks.append(lambda v: f'must be one of {sorted(choices)}'
+                      if v not in (None, '') and v not in choices else None)
+    if 'min' in rules:
+        minimum = Decimal(str(rules['min']))
+        checks.append(lambda v: f'must be at least {minimum}'
+                      if v not in (None, '') and Decimal(str(v)) < minimum else None)
+    if 'max' in rules:
+        maximum = Decimal(str(rules['max']))
+        checks.append(lambda v: f'must be at most {maximum}'
+                      if v not in (None, '') and Decimal(str(v)) > maximum else None)
+
+    def validate(value: Any) -> Optional[str]:
+        for check in checks:
+            try:
+                error = check(value)
+            except (InvalidOperation, TypeError, ValueError):
+                error = 'has an invalid value'
+            if error:
+                return f"{field_name} {error}"
+        return None
+
+    return validate
+
+
+class CompiledTemplate:
+    """
+    An import template compiled into per-field functions.
+
+    Mappings, transformation chains and validation rules are parsed once per
+    job, so processing a row is a loop over prebuilt closures.
+    """
+
+    def __init__(self, template: ImportTemplate):
+        self.template = template
+        mappings = template.field_mappings or {}
+        self.mappings: List[Tuple[str, str]] = [
+            (source, target if isinstance(target, str) else target['target'])
+            for source, target in mappings.items() if target
+        ]
+
+        self.transforms: Dict[str, List[Callable[[Any], Any]]] = {}
+        for field_name, specs in (template.transformations or {}).items():
+            specs = specs if isinstance(specs, list) else [specs]
+            self.transforms[field_name] = [compile_transform(spec) for spec in specs]
+
+        self.validators: List[Tuple[str, Callable[[Any], Optional[str]]]] = [
+            (field_name, compile_validation(field_name, rules))
+            for field_name, rules in (template.validation_rules or {}).items()
+        ]
+
+    def process(self, raw: Dict[str, Any]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Map, transform and validate one raw row.
+
+        Returns:
+            (processed data, validation errors)
+        """
+        if self.mappings:
+            data = {target: raw.get(source) for source, target in self.mappings}
+        else:
+            data = dict(raw)
+
+        errors = []
+        failed = set()
+        for field_name, chain in self.transforms.items():
+            value = data.get(field_name)
+            try:
+                for transform in chain:
+                    value = transform(value)
+            except (ValueError, TypeError, InvalidOperation, KeyError):
+                errors.append(f"{field_name} has an invalid value: {data.get(field_name)!r}")
+                failed.add(field_name)
+                continue
+            data[field_name] = value
+
+        for field_name, validate in self.validators:
+            if field_name in failed:
+                continue
+            error = validate(data.get(field_name))
+            if error:
+                errors.append(error)
+
+        return data, errors
+
+
+def _json_safe(row: Dict[str, Any]) -> Dict[str, Any]:
+    """Make raw spreadsheet values JSON-serializable for StagedRecord.raw_data."""
+    safe = {}
+    for key, value in row.items():
+        if isinstance(value, (datetime, date)):
+            value = value.isoformat()
+        elif isinstance(value, Decimal):
+            value = str(value)
+        safe[str(key)] = value
+    return safe
+
+
+class ImportPipeline:
+    """
+    Runs an import job: stream-parse the upload, stage rows, commit to the target model.
+
+    The upload is read row by row (csv module, openpyxl read-only mode) in
+    chunks of the template's batch_size, so memory is bounded by one chunk.
+    Each chunk is compiled-template processed and written with one
+    StagedRecord bulk_create, then checked for duplicates of existing
+    records in bulk (BulkDuplicateMatcher). Valid staged rows are then
+    committed in chunks: duplicates are bulk-updated (update_existing) or
+    skipped, and the rest bulk-inserted. Bulk writes send no post_save, so
+    the derived data its handlers maintain (materialized view change
+    counts, facet counters, BM25 index, KPI rollups, dashboard cache) is
+    updated explicitly once the writes commit. Progress, including rows per
+    second, is written to the job and the cache.
+    """
+
+    CACHE_PREFIX = 'import:progress'
+    PROGRESS_TIMEOUT = 86400
+    MAX_ERROR_LOG = 100
+
+    def __init__(self, job: ImportJob, file: Any = None):
+        """
+        Args:
+            job: Import job to run
+            file: Open binary upload (default: job.file_path from default storage)
+        """
+        self.job = job
+        self.template = job.template
+        self.file = file
+        self.batch_size = max(int(self.template.batch_size or 0), 1)
+        self.compiled = CompiledTemplate(self.template)
+        self.model = resolve_target_model(self.template)
+        self.matcher = BulkDuplicateMatcher(job, self.model)
+        self.loader = None
+        self.written_rows = 0
+        self.reindex = False  # Some written rows have no pk to index (COPY inserts)
+        self.started = None
+        self.phase = 'pending'
+
+    @classmethod
+    def get_progress(cls, job_id: Any) -> Optional[Dict[str, Any]]:
+        """Get live progress of a running job."""
+        return cache.get(f"{cls.CACHE_PREFIX}:{job_id}")
+
+    def _open(self) -> Any:
+        if self.file is not None:
+            return self.file
+        from django.core.files.storage import default_storage
+        return default_storage.open(self.job.file_path, 'rb')
+
+    def _report(self, rows: int, **fields) -> None:
+        """Persist counters on the job and publish rows/second to the cache."""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        rows_per_second = rows / elapsed
+        if fields:
+            for name, value in fields.items():
+                setattr(self.job, name, value)
+            ImportJob.objects.filter(pk=self.job.pk).update(**fields)
+        cache.set(f"{self.CACHE_PREFIX}:{self.job.pk}", {
+            'job_id': str(self.job.pk),
+            'phase': self.phase,
+            'rows': rows,
+            'rows_per_second': round(rows_per_second, 1),
+            'elapsed_seconds': round(elapsed, 2),
+            'progress': self.job.progress,
+        }, self.PROGRESS_TIMEOUT)
+
+    def _log(self, log_type: str, message: str, **details) -> None:
+        ImportLog.objects.create(company_id=self.job.company_id, job=self.job,
+                                 log_type=log_type, message=message, details=details)
+
+    def run(self) -> ImportJob:
+        """
+        Stage and commit the whole upload.
+
+        Returns:
+            The updated job
+        """
+        self.started = time.monotonic()
+        self.job.status = 'running'
+        self.job.started_at = self.job.started_at or timezone.now()
+        self.job.save(update_fields=['status', 'started_at'])
+
+        try:
+            self.stage()
+            if self.job.invalid_rows and not self.template.skip_errors:
+                raise ValueError(f"{self.job.invalid_rows} invalid rows and skip_errors is off")
+            self.commit()
+
+            finished = timezone.now()
+            self.phase = 'completed'
+            self._report(self.job.processed_rows, status='completed', progress=100,
+                         completed_at=finished, duration=finished - self.job.started_at)
+            elapsed = time.monotonic() - self.started
+            self._log('success', f"Imported {self.job.imported_rows} of {self.job.processed_rows} rows",
+                      rows_per_second=round(self.job.processed_rows / max(elapsed, 1e-9), 1),
+                      elapsed_seconds=round(elapsed, 2))
+        except Exception as e:
+            logger.error(f"Import job {self.job.pk} failed: {e}")
+            finished = timezone.now()
+            self.phase = 'failed'
+            self._report(self.job.processed_rows, status='failed', completed_at=finished,
+                         duration=finished - self.job.started_at)
+            self._log('error', f"Import failed: {e}")
+            raise
+
+        return self.job
+
+    def iter_rows(self, file: Any) -> Iterator[Dict[str, Any]]:
+        reader = READERS.get(self.job.file_type)
+        if reader is None:
+            raise ValueError(f"Unsupported import file type: {self.job.file_type}")
+        return reader(file)
+
+    def stage(self) -> None:
+        """
+        Parse, transform and validate the upload into StagedRecords, one chunk at a time.
+
+        A rerun of the job restages every row except those an earlier run
+        already imported, which are kept as they are.
+        """
+        self.phase = 'staging'
+        StagedRecord.objects.filter(job=self.job).exclude(import_status='imported').delete()
+        file = self._open()
+        try:
+            total = count_xlsx_rows(file) if self.job.file_type == 'excel' else None
+            if total is not None:
+                file.seek(0)
+            size = self.job.file_size or None
+
+            rows = self.iter_rows(file)
+            row_number = 0
+            valid = invalid = duplicates = 0
+            error_log = []
+
+            while True:
+                chunk = list(islice(rows, self.batch_size))
+                if not chunk:
+                    break
+
+                imported = set(
+                    StagedRecord.objects
+                    .filter(job=self.job, row_number__gt=row_number, row_number__lte=row_number + len(chunk))
+                    .values_list('row_number', flat=True)
+                )
+
+                staged = []
+                for raw in chunk:
+                    row_number += 1
+                    if row_number in imported:
+                        valid += 1
+                        continue
+                    processed, errors = self.compiled.process(raw)
+                    if errors:
+                        invalid += 1
+                        if len(error_log) < self.MAX_ERROR_LOG:
+                            error_log.append({'row': row_number, 'errors': errors})
+                    else:
+                        valid += 1
+                    staged.append(StagedRecord(
+                        company_id=self.job.company_id,
+                        job=self.job,
+                        row_number=row_number,
+                        raw_data=_json_safe(raw),
+                        processed_data=_json_safe(processed),
+                        is_valid=not errors,
+                        validation_errors=errors,
+                        import_status='pending' if not errors else 'error',
+                    ))
+                StagedRecord.objects.bulk_create(staged, batch_size=self.batch_size)
+                duplicates += self.matcher.match(staged)
+
+                if total:
+                    progress = row_number / total
+                elif size and hasattr(file, 'tell'):
+                    try:
+                        progress = file.tell() / size
+                    except (OSError, ValueError):
+                        progress = 0
+                else:
+                    progress = 0
+                self._report(row_number, processed_rows=row_number, valid_rows=valid,
+                             invalid_rows=invalid, duplicate_rows=duplicates,
+                             error_count=invalid, error_log=error_log,
+                             total_rows=max(total or 0, row_number),
+                             progress=min(int(progress * 50), 50))
+        finally:
+            if self.file is None:
+                file.close()
+
+        self._report(row_number, total_rows=row_number, progress=50)
+
+    def _matched_objects(self, chunk: List[StagedRecord]) -> Dict[Any, models.Model]:
+        """Existing records the chunk's duplicates matched, by primary key, in one query."""
+        ids = {record.duplicate_matches[0] for record in chunk if record.is_duplicate and record.duplicate_matches}
+        if not ids:
+            return {}
+        return self.model.objects.filter(company_id=self.job.company_id).in_bulk(ids)
+
+    def commit(self) -> None:
+        """Write valid staged rows to the target model with bulk insert and update."""
+        self.phase = 'committing'
+        model_fields = {f.attname: f for f in self.model._meta.concrete_fields}
+        for f in self.model._meta.concrete_fields:
+            model_fields.setdefault(f.name, f)
+        for name in ('id', 'pk', 'company', 'company_id'):
+            model_fields.pop(name, None)
+
+        pending = StagedRecord.objects.filter(job=self.job, is_valid=True, import_status='pending')
+        total = pending.count() or 1
+        if CopyLoader.can_load(self.model, total):
+            self.loader = CopyLoader(self.model)
+        committed = skipped = 0
+        imported = StagedRecord.objects.filter(job=self.job, import_status='imported').count()  # By earlier runs
+        last_pk = None
+
+        while True:
+            page = pending.order_by('pk')
+            if last_pk is not None:
+                page = page.filter(pk__gt=last_pk)
+            chunk = list(page[:self.batch_size])
+            if not chunk:
+                break
+            last_pk = chunk[-1].pk
+
+            existing = self._matched_objects(chunk) if self.template.update_existing else {}
+            creates, updates, update_fields = [], [], set()
+            written: List[Tuple[Any, models.Model]] = []
+            skipped_ids = []
+
+            for record in chunk:
+                values = {name: value for name, value in record.processed_data.items() if name in model_fields}
+                match = existing.get(record.duplicate_matches[0]) if record.duplicate_matches else None
+                if match is not None:
+                    for name, value in values.items():
+                        setattr(match, name, value)
+                    update_fields.update(model_fields[name].name for name in values)
+                    updates.append(match)
+                    written.append((record.pk, match))
+                elif self.template.create_missing and not record.is_duplicate:
+                    obj = self.model(company_id=self.job.company_id, **values)
+                    creates.append(obj)
+                    written.append((record.pk, obj))
+                else:
+                    skipped_ids.append(record.pk)
+
+            failed_ids = self._write(creates, updates, update_fields, written)
+            imported_ids = [staged_id for staged_id, _ in written if staged_id not in failed_ids]
+            self._sync_written([obj for staged_id, obj in written if staged_id not in failed_ids])
+
+            StagedRecord.objects.filter(pk__in=imported_ids).update(import_status='imported')
+            StagedRecord.objects.filter(pk__in=skipped_ids).update(import_status='skipped')
+            imported += len(imported_ids)
+            skipped += len(skipped_ids)
+            committed += len(chunk)
+
+            self._report(committed, imported_rows=imported, skipped_rows=skipped,
+                         progress=50 + int(committed / total * 50))
+
+        self._sync_totals()
+
+    def _sync_written(self, objects: List[models.Model]) -> None:
+        """
+        Mark rollup months dirty and index the BM25 documents of one written chunk.
+
+        Runs once the chunk's write commits, as the post_save handlers
+        would. Rows inserted by the COPY loader have no pk yet; the tenant's
+        BM25 index is then rebuilt by _sync_totals instead.
+        """
+        from analytics.bm25_index import BM25_INDEXED_MODELS, BM25Index, get_document_text
+        from analytics.kpi_rollups import ROLLUP_SOURCES, SNAPSHOT_ATTR, RollupManager
+
+        if not objects:
+            return
+        model_label = self.model._meta.label
+        company_id = self.job.company_id
+        self.written_rows += len(objects)
+
+        timestamps = []
+        if model_label in ROLLUP_SOURCES:
+            time_field = ROLLUP_SOURCES[model_label]['time_field']
+            for obj in objects:
+                timestamps.extend((getattr(obj, time_field, None), getattr(obj, SNAPSHOT_ATTR, None)))
+
+        documents = []
+        if model_label in BM25_INDEXED_MODELS:
+            _, fields = BM25_INDEXED_MODELS[model_label]
+            documents = [(obj.pk, get_document_text(obj, fields)) for obj in objects if obj.pk is not None]
+            self.reindex = self.reindex or len(documents) < len(objects)
+
+        def apply():
+            try:
+                if timestamps:
+                    RollupManager().mark_dirty(model_label, company_id, *timestamps)
+                if documents and not self.reindex:
+                    index = BM25Index.for_tenant(company_id, BM25_INDEXED_MODELS[model_label][0])
+                    for doc_id, text in documents:
+                        index.add_document(doc_id, text)
+            except Exception as e:
+                logger.error(f"Error updating derived data for import job {self.job.pk}: {e}")
+
+        transaction.on_commit(apply)
+
+    def _sync_totals(self) -> None:
+        """
+        Record the commit phase's writes where post_save handlers would have.
+
+        Counts the rows toward materialized view staleness, reconciles the
+        tenant's facet counters, rebuilds or refreshes its BM25 index and
+        invalidates its dashboard cache, once the writes commit.
+        """
+        from analytics.bm25_index import BM25_INDEXED_MODELS, rebuild_tenant_index
+        from analytics.facet_counters import ENTITY_TYPES_BY_MODEL, FacetCounterMaintainer
+        from analytics.materialized_views import MATERIALIZED_VIEWS, MaterializedViewManager
+        from analytics.search_cache import SearchCache
+        from core.dashboard_metrics import DASHBOARD_MODELS, DashboardMetricsEngine
+
+        if not self.written_rows:
+            return
+        model_label = self.model._meta.label
+        company_id = self.job.company_id
+        written, reindex = self.written_rows, self.reindex
+
+        def apply():
+            try:
+                if any(model_label in view['sources'] for view in MATERIALIZED_VIEWS.values()):
+                    MaterializedViewManager.record_changes(model_label, written)
+                if model_label in ENTITY_TYPES_BY_MODEL:
+                    FacetCounterMaintainer.reconcile(ENTITY_TYPES_BY_MODEL[model_label], company_id)
+                if model_label in BM25_INDEXED_MODELS:
+                    if reindex:
+                        rebuild_tenant_index(model_label, company_id)
+                    else:
+                        SearchCache.bump_index_version(company_id)
+                if model_label in DASHBOARD_MODELS.values():
+                    DashboardMetricsEngine.invalidate_company(str(company_id))
+            except Exception as e:
+                logger.error(f"Error updating derived data for import job {self.job.pk}: {e}")
+
+        transaction.on_commit(apply)
+
+    def _write(self, creates: List[models.Model], updates: List[models.Model],
+               update_fields: set, written: List[Tuple[Any, models.Model]]) -> set:
+        """
+        Bulk insert and update one chunk.
+
+        Large jobs on PostgreSQL write through the COPY loader; otherwise
+        bulk_create and bulk_update are used. If the bulk write fails, rows
+        are retried one at a time so a single bad row only fails itself (or
+        the job, when skip_errors is off).
+
+        Returns:
+            Staged record ids that failed
+        """
+        try:
+            with transaction.atomic():
+                if self.loader is not None:
+                    self.loader.load(creates + updates, update_fields)
+                    return set()
+                if creates:
+                    self.model.objects.bulk_create(creates, batch_size=self.batch_size)
+                if updates and update_fields:
+                    self.model.objects.bulk_update(updates, sorted(update_fields), batch_size=self.batch_size)
+            return set()
+        except (IntegrityError, DataError, ValueError, TypeError) as e:
+            if not self.template.skip_errors:
+                raise
+            logger.warning(f"Bulk write failed for import job {self.job.pk}, retrying rows: {e}")
+
+        failed = set()
+        for staged_id, obj in written:
+            try:
+                with transaction.atomic():
+                    obj.save()
+            except Exception as e:
+                failed.add(staged_id)
+                StagedRecord.objects.filter(pk=staged_id).update(
+                    import_status='error', validation_errors=[str(e)]
+                )
+        if failed:
+            self.job.error_count += len(failed)
+            ImportJob.objects.filter(pk=self.job.pk).update(error_count=self.job.error_count)
+        return failed
@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.utils import timezone
 
 from .models import ImportTemplate, ImportJob, StagedRecord, ImportLog, DuplicateMatch
 from .serializers import (
@@ -71,16 +72,34 @@ class ImportJobViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        from analytics.tasks import process_import_job_task
+        
         # Update job status
         job.status = 'running'
         job.started_at = timezone.now()
         job.save()
         
-        # Start background processing (implement actual import logic)
-        # This would typically use Celery or similar task queue
+        # Stage and commit in the background
+        process_import_job_task.delay(str(job.id))
         
         return Response({'message': 'Import job started'})
     
+    @action(detail=True, methods=['get'])
+    def progress(self, request, pk=None):
+        """Get live import progress, including rows per second"""
+        from .pipeline import ImportPipeline
+        
+        job = self.get_object()
+        live = ImportPipeline.get_progress(job.id) or {}
+        return Response({
+            'status': job.status,
+            'progress': job.progress,
+            'processed_rows': job.processed_rows,
+            'imported_rows': job.imported_rows,
+            'invalid_rows': job.invalid_rows,
+            **live,
+        })
+    
     @action(detail=True, methods=['get'])
     def staging_data(self, request, pk=None):
         """Get staged records for preview"""
@@ -490,4 +490,68 @@ class DataSynchronization(CompanyIsolatedModel):
         ordering = ['name']
     
     def __str__(self):
-        return f"{self.name} ({self.source_system} -> {self.target_system})"
\ No newline at end of file
+        return f"{self.name} ({self.source_system} -> {self.target_system})"
+
+class ShardedExportJob(models.Model):
+    """Plan of a sharded export, shared by every worker exporting its shards"""
+    
+    export_id = models.CharField(max_length=255, unique=True)
+    plan = models.JSONField(default=dict, help_text="Queryset, format, fields and options")
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'data_export_sharded_job'
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return self.export_id
+
+class ExportShard(models.Model):
+    """One primary key range of a sharded export and its checkpointed state"""
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    job = models.ForeignKey(
+        ShardedExportJob,
+        on_delete=models.CASCADE,
+        related_name='shards'
+    )
+    index = models.IntegerField()
+    
+    # Key range (None is unbounded)
+    pk_gte = models.CharField(max_length=255, null=True, blank=True)
+    pk_lt = models.CharField(max_length=255, null=True, blank=True)
+    row_count = models.BigIntegerField(default=0)
+    
+    # Status
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending'
+    )
+    attempts = models.IntegerField(default=0)
+    exported_records = models.BigIntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    
+    # Output
+    file_path = models.CharField(max_length=500, null=True, blank=True)
+    size_bytes = models.BigIntegerField(null=True, blank=True)
+    sha256 = models.CharField(max_length=64, null=True, blank=True)
+    
+    # Timing; updated_at doubles as the running worker's heartbeat
+    started_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'data_export_shard'
+        ordering = ['job', 'index']
+        unique_together = ('job', 'index')
+    
+    def __str__(self):
+        return f"{self.job.export_id} #{self.index} ({self.status})"
@@ -0,0 +1,354 @@
+# master_data/sharded_export.py
+# Parallel sharded exports with per-shard checkpoints and a manifest
+
+import hashlib
+import json
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+from typing import Dict, Any, List, Optional
+from django.apps import apps
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import F, Q, Window
+from django.db.models.functions import Mod, RowNumber
+from django.utils import timezone
+
+from master_data.models import ExportShard, ShardedExportJob
+from master_data.streaming_export import ExportManager, ExportProgress
+
+logger = logging.getLogger(__name__)
+
+
+def _export_shard_worker(export_id: str, index: int) -> Dict[str, Any]:
+    """Process pool entry point; each worker opens its own database connection."""
+    import django
+    django.setup()
+    return ShardedExport.export_shard(export_id, index)
+
+
+class ShardedExport:
+    """
+    Exports one queryset as independently retryable shards.
+
+    The primary key space is split into ranges of about ROWS_PER_SHARD rows;
+    the database numbers the keys and returns only the range boundaries.
+    Each shard is exported by its own Celery task (or process pool worker)
+    to a separate compressed part. The plan and each shard's state
+    (pending, running, completed, failed) are checkpointed in the database
+    (ShardedExportJob / ExportShard), so every worker sees them. A worker
+    claims a shard with a conditional UPDATE before exporting it, so two
+    workers never export the same shard; a running shard whose heartbeat
+    is older than STALE_AFTER can be claimed again. Completed shards are
+    skipped on resume, so a failed 10M-row export only re-runs the shards
+    that failed. When every shard has completed, a manifest listing the
+    parts in key order is written next to them.
+    """
+
+    PROGRESS_TIMEOUT = 86400 * 7
+    ROWS_PER_SHARD = 250000
+    STALE_AFTER = timedelta(minutes=10)
+    SHARD_FIELDS = [
+        'index', 'pk_gte', 'pk_lt', 'row_count', 'status', 'attempts', 'exported_records',
+        'file_path', 'size_bytes', 'sha256', 'error', 'started_at', 'completed_at',
+    ]
+
+    @classmethod
+    def get_queryset(cls, plan: Dict[str, Any]) -> models.QuerySet:
+        """Rebuild the exported queryset from a plan."""
+        model_class = apps.get_model(plan['app'], plan['model'])
+        return model_class.objects.filter(**plan.get('filters', {}))
+
+    @classmethod
+    def split_keyspace(cls, queryset: models.QuerySet,
+                       rows_per_shard: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Split a queryset's primary keys into contiguous ranges.
+
+        Args:
+            queryset: Queryset to split
+            rows_per_shard: Target rows per shard
+
+        Returns:
+            Shards with 'pk_gte' / 'pk_lt' bounds (None is unbounded) and 'row_count'
+        """
+        rows_per_shard = rows_per_shard or cls.ROWS_PER_SHARD
+        total = queryset.count()
+
+        # Every rows_per_shard-th key starts a shard; only those keys leave the database
+        boundaries = list(
+            queryset.order_by()
+            .annotate(_row=Window(RowNumber(), order_by=F('pk').asc()))
+            .annotate(_offset=Mod(F('_row') - 1, rows_per_shard))
+            .filter(_offset=0, _row__gt=1)
+            .order_by('_row')
+            .values_list('pk', flat=True)
+        )
+
+        starts = [None] + boundaries
+        ends = boundaries + [None]
+        shards = []
+        for index, (start, end) in enumerate(zip(starts, ends)):
+            row_count = rows_per_shard if end is not None else total - rows_per_shard * index
+            shards.append({
+                'index': index,
+                'pk_gte': None if start is None else str(start),
+                'pk_lt': None if end is None else str(end),
+                'row_count': max(row_count, 0),
+            })
+        return shards
+
+    @classmethod
+    def plan(cls, export_id: str, queryset_params: Dict[str, Any], format: str,
+             fields: Optional[List[str]] = None, user_id: Optional[str] = None,
+             options: Optional[Dict[str, Any]] = None,
+             rows_per_shard: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Plan a sharded export and checkpoint every shard as pending.
+
+        Args:
+            export_id: Unique export ID
+            queryset_params: {'app', 'model', 'filters'} of the exported queryset
+            format: Export format
+            fields: Optional list of fields
+            user_id: User ID initiating export
+            options: Exporter options (iteration, dictionary_fields, ...)
+            rows_per_shard: Target rows per shard
+
+        Returns:
+            Export plan
+        """
+        plan = {
+            'export_id': export_id,
+            'app': queryset_params['app'],
+            'model': queryset_params['model'],
+            'filters': queryset_params.get('filters', {}),
+            'format': format,
+            'fields': fields,
+            'options': options or {},
+            'user_id': user_id,
+            'created_at': timezone.now().isoformat(),
+        }
+        shards = cls.split_keyspace(cls.get_queryset(plan), rows_per_shard)
+        plan['shard_count'] = len(shards)
+        plan['total_records'] = sum(shard['row_count'] for shard in shards)
+
+        with transaction.atomic():
+            ShardedExportJob.objects.filter(export_id=export_id).delete()
+            job = ShardedExportJob.objects.create(export_id=export_id, plan=plan)
+            ExportShard.objects.bulk_create([ExportShard(job=job, **shard) for shard in shards])
+
+        # Export-level progress for the UI, as for unsharded exports
+        progress = ExportProgress.track_export(export_id, None, format, user_id)
+        progress['total_records'] = plan['total_records']
+        cache.set(f"export:progress:{export_id}", progress, timeout=cls.PROGRESS_TIMEOUT)
+
+        logger.info(f"Planned export {export_id}: {plan['total_records']} records in {len(shards)} shards")
+        return plan
+
+    @classmethod
+    def get_plan(cls, export_id: str) -> Optional[Dict[str, Any]]:
+        return ShardedExportJob.objects.filter(export_id=export_id).values_list('plan', flat=True).first()
+
+    @classmethod
+    def _shards(cls, export_id: str) -> models.QuerySet:
+        return ExportShard.objects.filter(job__export_id=export_id)
+
+    @classmethod
+    def get_shards(cls, export_id: str) -> List[Dict[str, Any]]:
+        """Get the checkpointed state of every shard, in key order."""
+        return list(cls._shards(export_id).order_by('index').values(*cls.SHARD_FIELDS))
+
+    @classmethod
+    def claim_shard(cls, export_id: str, index: int) -> bool:
+        """
+        Mark a shard running for this worker if no other worker holds it.
+
+        Pending and failed shards can be claimed, as can running shards whose
+        worker stopped checkpointing STALE_AFTER ago.
+        """
+        now = timezone.now()
+        claimable = Q(status__in=['pending', 'failed']) | Q(status='running', updated_at__lt=now - cls.STALE_AFTER)
+        return cls._shards(export_id).filter(claimable, index=index).update(
+            status='running', attempts=F('attempts') + 1, error=None, started_at=now, updated_at=now
+        ) == 1
+
+    @classmethod
+    def export_shard(cls, export_id: str, index: int) -> Dict[str, Any]:
+        """
+        Export one shard to its own part file.
+
+        Completed shards, and shards another worker is exporting, are
+        skipped, so re-running a shard is safe.
+
+        Returns:
+            Shard state after the export
+        """
+        plan = cls.get_plan(export_id)
+        if plan is None:
+            raise ValueError(f"Unknown sharded export: {export_id}")
+        if not cls._shards(export_id).filter(index=index).exists():
+            raise ValueError(f"Unknown shard {index} of export {export_id}")
+        if not cls.claim_shard(export_id, index):
+            return cls._shards(export_id).values(*cls.SHARD_FIELDS).get(index=index)
+
+        shard = cls._shards(export_id).values(*cls.SHARD_FIELDS).get(index=index)
+        shard_rows = cls._shards(export_id).filter(index=index)
+
+        try:
+            queryset = cls.get_queryset(plan).order_by('pk')
+            if shard['pk_gte'] is not None:
+                queryset = queryset.filter(pk__gte=shard['pk_gte'])
+            if shard['pk_lt'] is not None:
+                queryset = queryset.filter(pk__lt=shard['pk_lt'])
+
+            exporter = ExportManager.create_exporter(plan['format'], queryset, plan['fields'],
+                                                     **plan['options'])
+
+            def checkpoint(count):
+                shard_rows.update(exported_records=count, updated_at=timezone.now())
+
+            file_path = ExportManager.save_export(
+                exporter,
+                f"exports/{export_id}/part-{index:05d}.{exporter.FILE_EXTENSION}",
+                progress_callback=checkpoint
+            )
+            size_bytes, sha256 = cls._describe_file(file_path)
+
+            shard.update(status='completed', exported_records=exporter.exported_records,
+                         file_path=file_path, size_bytes=size_bytes, sha256=sha256, error=None,
+                         completed_at=timezone.now())
+        except Exception as e:
+            logger.error(f"Export {export_id} shard {index} failed: {e}")
+            shard.update(status='failed', error=str(e))
+            raise
+        finally:
+            shard_rows.update(**{field: shard[field] for field in cls.SHARD_FIELDS if field != 'index'},
+                              updated_at=timezone.now())
+            ExportProgress.update_progress(export_id, cls.get_progress(export_id)['exported_records'])
+
+        return shard
+
+    @staticmethod
+    def _describe_file(file_path: str) -> tuple:
+        """Size and SHA-256 of a stored part, so readers can verify it."""
+        from django.core.files.storage import default_storage
+
+        digest = hashlib.sha256()
+        with default_storage.open(file_path, 'rb') as part:
+            for chunk in part.chunks():
+                digest.update(chunk)
+        return default_storage.size(file_path), digest.hexdigest()
+
+    @classmethod
+    def get_progress(cls, export_id: str) -> Dict[str, Any]:
+        """
+        Aggregate progress across shards.
+
+        Returns:
+            Dictionary with shard counts per status and exported/total records
+        """
+        plan = cls.get_plan(export_id) or {}
+        shards = cls.get_shards(export_id)
+        statuses: Dict[str, int] = {}
+        for shard in shards:
+            statuses[shard['status']] = statuses.get(shard['status'], 0) + 1
+
+        return {
+            'export_id': export_id,
+            'shard_count': len(shards),
+            'shards_by_status': statuses,
+            'exported_records': sum(shard['exported_records'] for shard in shards),
+            'total_records': plan.get('total_records'),
+            'is_complete': bool(shards) and statuses.get('completed', 0) == len(shards),
+        }
+
+    @classmethod
+    def pending_shards(cls, export_id: str) -> List[int]:
+        """Indexes of shards that still need to run (pending, failed or interrupted)."""
+        return list(cls._shards(export_id).exclude(status='completed').order_by('index').values_list('index', flat=True))
+
+    @classmethod
+    def write_manifest(cls, export_id: str) -> Optional[str]:
+        """
+        Write the manifest stitching the parts together, once every shard completed.
+
+        Returns:
+            Manifest storage path, or None if shards are still outstanding
+        """
+        from django.core.files.base import ContentFile
+        from django.core.files.storage import default_storage
+
+        progress = cls.get_progress(export_id)
+        if not progress['is_complete']:
+            return None
+
+        plan = cls.get_plan(export_id)
+        manifest = {
+            'export_id': export_id,
+            'model': f"{plan['app']}.{plan['model']}",
+            'filters': plan['filters'],
+            'format': plan['format'],
+            'fields': plan['fields'],
+            'record_count': progress['exported_records'],
+            'created_at': plan['created_at'],
+            'completed_at': timezone.now().isoformat(),
+            'parts': [
+                {
+                    'index': shard['index'],
+                    'path': shard['file_path'],
+                    'pk_gte': shard['pk_gte'],
+                    'pk_lt': shard['pk_lt'],
+                    'record_count': shard['exported_records'],
+                    'size_bytes': shard['size_bytes'],
+                    'sha256': shard['sha256'],
+                }
+                for shard in cls.get_shards(export_id)
+            ],
+        }
+
+        manifest_path = f"exports/{export_id}/manifest.json"
+        if default_storage.exists(manifest_path):
+            default_storage.delete(manifest_path)
+        manifest_path = default_storage.save(
+            manifest_path, ContentFile(json.dumps(manifest, indent=2, default=str).encode('utf-8'))
+        )
+        ExportProgress.complete_export(export_id, ExportManager.get_export_url(manifest_path))
+        logger.info(f"Export {export_id} complete: {manifest['record_count']} records in {len(manifest['parts'])} parts")
+        return manifest_path
+
+    @classmethod
+    def run_local(cls, export_id: str, max_workers: int = 1) -> Dict[str, Any]:
+        """
+        Run outstanding shards in this process or a process pool, then write the manifest.
+
+        Args:
+            export_id: Planned export ID
+            max_workers: Worker processes (1 runs shards inline)
+
+        Returns:
+            Aggregated progress
+        """
+        indexes = cls.pending_shards(export_id)
+
+        if max_workers <= 1:
+            for index in indexes:
+                try:
+                    cls.export_shard(export_id, index)
+                except Exception:
+                    pass  # Recorded on the shard; retried on the next run
+        else:
+            from django.db import connections
+            connections.close_all()  # Forked workers must not share the parent's connections
+            with ProcessPoolExecutor(max_workers=max_workers) as pool:
+                futures = [pool.submit(_export_shard_worker, export_id, index) for index in indexes]
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        logger.error(f"Export {export_id} shard worker failed: {e}")
+
+        progress = cls.get_progress(export_id)
+        ExportProgress.update_progress(export_id, progress['exported_records'])
+        cls.write_manifest(export_id)
+        return cls.get_progress(export_id)
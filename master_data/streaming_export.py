@@ -5,34 +5,141 @@ import gzip
 import csv
 import json
 import logging
-from typing import Iterator, Dict, Any, List, Optional, IO
+import queue
+import tempfile
+import threading
+import zlib
+from itertools import islice
+from typing import Iterator, Dict, Any, List, Optional, IO, Tuple
 from io import BytesIO, StringIO
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist
 from django.http import StreamingHttpResponse
-from django.db import models
+from django.db import connections, models
+from django.db.models import Q
 from django.utils import timezone
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
 
+def estimate_row_count(queryset: models.QuerySet, exact: bool = False) -> int:
+    """
+    Estimate the number of rows a queryset returns.
+
+    On PostgreSQL the planner's row estimate is read from EXPLAIN, which is
+    instant where count() scans every matching row. Other databases, and
+    exact=True, use count().
+
+    Args:
+        queryset: Django queryset
+        exact: Run an exact count() instead of estimating
+
+    Returns:
+        Estimated (or exact) row count
+    """
+    if queryset.query.is_empty():
+        return 0
+
+    connection = connections[queryset.db]
+    if exact or connection.vendor != 'postgresql':
+        return queryset.count()
+
+    try:
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cursor.fetchone()[0]
+        plan = plan[0] if isinstance(plan, list) else plan
+        return int(plan['Plan']['Plan Rows'])
+    except EmptyResultSet:
+        return 0
+    except Exception as e:
+        logger.warning(f"Row estimate failed, counting instead: {e}")
+        return queryset.count()
+
+
+def gzip_stream(chunks: Iterator[bytes], level: int = 6) -> Iterator[bytes]:
+    """
+    Gzip a stream of byte chunks incrementally.
+
+    Compressed output is yielded as zlib produces it, without buffering
+    through an intermediate file object.
+
+    Args:
+        chunks: Uncompressed byte chunks
+        level: Compression level (1-9)
+
+    Yields:
+        Gzip-format byte chunks
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _QueueWriter:
+    """File-like object handing writes to a bounded queue, for streaming COPY output."""
+
+    def __init__(self, output: 'queue.Queue'):
+        self.output = output
+
+    def write(self, data) -> int:
+        self.output.put(bytes(data))
+        return len(data)
+
+
 class StreamingExporter:
     """
     Base class for streaming data exports with compression.
     Handles large datasets without loading everything into memory.
+
+    Records are read in one of two iteration modes:
+
+    - 'keyset' (default): pages of CHUNK_SIZE rows, each starting after the
+      last row of the previous page on the queryset's ordering plus the
+      primary key. Every page is an index range scan, so the cost is linear
+      in the export size, and rows are neither skipped nor repeated when
+      other rows are written during the export.
+    - 'cursor': one query streamed with QuerySet.iterator(), which uses a
+      server-side cursor on PostgreSQL. Use it for orderings keyset paging
+      cannot follow; it holds a snapshot for the whole export.
+
+    The total is the planner's row estimate unless exact_count is set.
     """
     
     CHUNK_SIZE = 1000  # Process records in chunks
     COMPRESSION_LEVEL = 6  # gzip compression level (1-9)
+    FILE_EXTENSION = ''
+    ITERATION_MODES = ('keyset', 'cursor')
+    LOG_INTERVAL = 10000
     
-    def __init__(self, queryset: models.QuerySet, fields: Optional[List[str]] = None):
+    def __init__(self, queryset: models.QuerySet, fields: Optional[List[str]] = None,
+                 iteration: Optional[str] = None, exact_count: bool = False):
         """
         Initialize streaming exporter.
         
         Args:
             queryset: Django queryset to export
             fields: Optional list of field names to export
+            iteration: 'keyset' or 'cursor' (default: EXPORT_ITERATION_MODE setting)
+            exact_count: Count matching rows exactly instead of estimating
         """
         self.queryset = queryset
         self.fields = fields
+        self.iteration = iteration or getattr(settings, 'EXPORT_ITERATION_MODE', 'keyset')
+        if self.iteration not in self.ITERATION_MODES:
+            raise ValueError(f"Unsupported iteration mode: {self.iteration}")
+        self.exact_count = exact_count
         self.total_records = 0
         self.exported_records = 0
     
@@ -45,6 +152,79 @@ class StreamingExporter:
         model = self.queryset.model
         return [f.name for f in model._meta.get_fields() if not f.is_relation]
     
+    def get_keyset_ordering(self) -> Optional[List[Tuple[str, bool]]]:
+        """
+        Get the (field, descending) columns keyset pages are ordered by.
+
+        The queryset's ordering is kept and the primary key appended as a
+        tiebreaker. Returns None when the ordering cannot be paged by keyset
+        (expressions, related lookups, random or nullable columns).
+        """
+        query = self.queryset.query
+        ordering = list(query.order_by) if query.order_by else (
+            list(self.queryset.model._meta.ordering) if query.default_ordering else []
+        )
+
+        opts = self.queryset.model._meta
+        columns = []
+        for item in ordering:
+            if not isinstance(item, str) or item == '?' or '__' in item.lstrip('-'):
+                return None
+            name = item.lstrip('-')
+            if name != 'pk':
+                try:
+                    field = opts.get_field(name)
+                except FieldDoesNotExist:
+                    return None
+                if field.null or not field.concrete:
+                    return None
+                if field.primary_key:
+                    name = 'pk'
+            columns.append((name, item.startswith('-')))
+            if name == 'pk':
+                return columns
+
+        columns.append(('pk', False))
+        return columns
+    
+    @staticmethod
+    def _keyset_filter(ordering: List[Tuple[str, bool]], last: Dict[str, Any]) -> Q:
+        """Rows strictly after the given row in keyset ordering."""
+        condition = Q()
+        for i, (name, descending) in enumerate(ordering):
+            step = Q(**{f"{name}__{'lt' if descending else 'gt'}": last[name]})
+            for previous, _ in ordering[:i]:
+                step &= Q(**{previous: last[previous]})
+            condition |= step
+
+        # Inclusive bound on the leading column keeps the page an index range scan
+        name, descending = ordering[0]
+        return Q(**{f"{name}__{'lte' if descending else 'gte'}": last[name]}) & condition
+    
+    def _iter_keyset(self, headers: List[str],
+                     ordering: List[Tuple[str, bool]]) -> Iterator[Dict[str, Any]]:
+        keys = [name for name, _ in ordering]
+        extra = [name for name in keys if name not in headers]
+        queryset = self.queryset.order_by(
+            *[f"-{name}" if descending else name for name, descending in ordering]
+        ).values(*headers, *extra)
+
+        last = None
+        while True:
+            page = queryset if last is None else queryset.filter(self._keyset_filter(ordering, last))
+            chunk = list(page[:self.CHUNK_SIZE])
+            if not chunk:
+                break
+
+            last = {name: chunk[-1][name] for name in keys}
+            for record in chunk:
+                for name in extra:
+                    del record[name]
+                yield record
+
+            if len(chunk) < self.CHUNK_SIZE:
+                break
+    
     def iter_records(self) -> Iterator[Dict[str, Any]]:
         """
         Iterate over records in chunks.
@@ -52,53 +232,180 @@ class StreamingExporter:
         Yields:
             Dictionary for each record
         """
-        self.total_records = self.queryset.count()
-        logger.info(f"Starting export of {self.total_records} records")
+        self.total_records = estimate_row_count(self.queryset, exact=self.exact_count)
+        logger.info(f"Starting {self.iteration} export of ~{self.total_records} records")
         
-        # Iterate in chunks to avoid memory issues
-        offset = 0
-        while True:
-            chunk = list(self.queryset[offset:offset + self.CHUNK_SIZE].values(*self.get_headers()))
-            
-            if not chunk:
-                break
-            
-            for record in chunk:
-                self.exported_records += 1
-                yield record
-            
-            offset += self.CHUNK_SIZE
+        headers = self.get_headers()
+        ordering = self.get_keyset_ordering() if self.iteration == 'keyset' else None
+        if self.iteration == 'keyset' and ordering is None:
+            logger.info("Ordering cannot be paged by keyset, streaming with a server-side cursor")
+        
+        if ordering is not None:
+            records = self._iter_keyset(headers, ordering)
+        else:
+            records = self.queryset.values(*headers).iterator(chunk_size=self.CHUNK_SIZE)
+        
+        for record in records:
+            self.exported_records += 1
+            yield record
             
-            if offset % 10000 == 0:
-                logger.info(f"Exported {offset} / {self.total_records} records")
+            if self.exported_records % self.LOG_INTERVAL == 0:
+                logger.info(f"Exported {self.exported_records} / ~{self.total_records} records")
         
         logger.info(f"Export complete: {self.exported_records} records")
     
     def export(self) -> bytes:
         """Export all data (for small datasets)."""
         raise NotImplementedError("Use streaming methods for large exports")
+    
+    def iter_file_chunks(self) -> Iterator[bytes]:
+        """Generate the bytes of the export file, as written to storage by background exports."""
+        raise NotImplementedError
 
 
 class CSVStreamingExporter(StreamingExporter):
-    """Streaming CSV exporter with gzip compression."""
+    """
+    Streaming CSV exporter with gzip compression.
+
+    Rows are written by csv.writer into a reused buffer and encoded once per
+    CHUNK_BYTES of text. With use_copy=True on PostgreSQL, rows come straight
+    from COPY ... TO STDOUT (FORMAT csv) without going through the ORM; values
+    then use PostgreSQL's text formatting (e.g. 't'/'f' for booleans).
+    """
     
-    def iter_csv_rows(self) -> Iterator[str]:
+    CHUNK_BYTES = 65536  # 64KB of CSV text per encoded chunk
+    FILE_EXTENSION = 'csv.gz'
+    COPY_QUEUE_SIZE = 64
+    
+    def __init__(self, queryset: models.QuerySet, fields: Optional[List[str]] = None,
+                 use_copy: bool = False, **kwargs):
         """
-        Generate CSV rows as strings.
+        Initialize CSV exporter.
+        
+        Args:
+            queryset: Django queryset to export
+            fields: Optional list of field names
+            use_copy: Stream rows with PostgreSQL COPY when the export is flat
+            **kwargs: Iteration options passed to StreamingExporter
+        """
+        super().__init__(queryset, fields, **kwargs)
+        self.use_copy = use_copy
+    
+    def _iter_row_values(self) -> Iterator[List[str]]:
+        # str() of every value, as rows have always been written (None exports as "None")
+        headers = self.get_headers()
+        return ([str(record.get(h, '')) for h in headers] for record in self.iter_records())
+    
+    def iter_csv_chunks(self) -> Iterator[bytes]:
+        """
+        Generate encoded CSV text in chunks of about CHUNK_BYTES.
         
         Yields:
-            CSV row strings
+            UTF-8 encoded CSV chunks
         """
-        # Write header
+        if self._can_copy():
+            yield from self.iter_copy_chunks()
+            return
+        
+        buffer = StringIO()
+        writer = csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator='\n')
+        writer.writerow(self.get_headers())
+        
+        rows = self._iter_row_values()
+        while True:
+            batch = list(islice(rows, self.CHUNK_SIZE))
+            if not batch:
+                break
+            writer.writerows(batch)
+            if buffer.tell() >= self.CHUNK_BYTES:
+                yield buffer.getvalue().encode('utf-8')
+                buffer.seek(0)
+                buffer.truncate()
+        
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+    
+    def _can_copy(self) -> bool:
+        """Whether COPY can produce this export: PostgreSQL and only local concrete columns."""
+        if not self.use_copy:
+            return False
+        connection = connections[self.queryset.db]
+        if connection.vendor != 'postgresql':
+            logger.info("COPY export requires PostgreSQL, using the ORM")
+            return False
+        opts = self.queryset.model._meta
+        for name in self.get_headers():
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                logger.info(f"COPY export cannot select {name}, using the ORM")
+                return False
+            if not field.concrete or field.many_to_many:
+                logger.info(f"COPY export cannot select {name}, using the ORM")
+                return False
+        return True
+    
+    def iter_copy_chunks(self) -> Iterator[bytes]:
+        """
+        Stream CSV straight from PostgreSQL with COPY ... TO STDOUT.
+        
+        COPY runs on a separate thread writing into a bounded queue, so the
+        response streams while the server produces rows.
+        
+        Yields:
+            UTF-8 encoded CSV chunks, header first
+        """
+        connection = connections[self.queryset.db]
         headers = self.get_headers()
-        yield ','.join(f'"{h}"' for h in headers) + '\n'
+        sql, params = self.queryset.values(*headers).query.sql_with_params()
         
-        # Write records
-        for record in self.iter_records():
-            row_values = [str(record.get(h, '')) for h in headers]
-            # Escape quotes and commas
-            escaped_values = [f'"{v.replace(chr(34), chr(34)+chr(34))}"' for v in row_values]
-            yield ','.join(escaped_values) + '\n'
+        buffer = StringIO()
+        csv.writer(buffer, quoting=csv.QUOTE_ALL, lineterminator='\n').writerow(headers)
+        yield buffer.getvalue().encode('utf-8')
+        
+        output: 'queue.Queue' = queue.Queue(maxsize=self.COPY_QUEUE_SIZE)
+        done = object()
+        errors = []
+        
+        def run_copy():
+            try:
+                with connection.cursor() as cursor:
+                    raw_cursor = cursor.cursor
+                    statement = raw_cursor.mogrify(sql, params).decode('utf-8')
+                    raw_cursor.copy_expert(
+                        f"COPY ({statement}) TO STDOUT WITH (FORMAT csv, FORCE_QUOTE *)",
+                        _QueueWriter(output)
+                    )
+                    self.exported_records = raw_cursor.rowcount
+            except Exception as e:
+                errors.append(e)
+            finally:
+                output.put(done)
+        
+        # The connection is shared with the copying thread; nothing else uses it until it finishes
+        connection.inc_thread_sharing()
+        thread = threading.Thread(target=run_copy, daemon=True)
+        thread.start()
+        finished = False
+        try:
+            while True:
+                data = output.get()
+                if data is done:
+                    finished = True
+                    break
+                yield data
+        finally:
+            if not finished:
+                # Client went away: cancel the COPY and unblock the writer
+                connection.connection.cancel()
+                while output.get() is not done:
+                    pass
+            thread.join()
+            connection.dec_thread_sharing()
+        
+        if errors:
+            raise errors[0]
+        logger.info(f"COPY export complete: {self.exported_records} records")
     
     def iter_compressed_chunks(self) -> Iterator[bytes]:
         """
@@ -107,26 +414,10 @@ class CSVStreamingExporter(StreamingExporter):
         Yields:
             Compressed byte chunks
         """
-        # Create gzip compressor
-        buffer = BytesIO()
-        with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=self.COMPRESSION_LEVEL) as gz:
-            for row in self.iter_csv_rows():
-                gz.write(row.encode('utf-8'))
-                
-                # Yield chunks periodically to stream data
-                if buffer.tell() > 65536:  # 64KB chunks
-                    gz.flush()
-                    buffer.seek(0)
-                    chunk = buffer.read()
-                    buffer.seek(0)
-                    buffer.truncate()
-                    yield chunk
-        
-        # Yield final chunk
-        buffer.seek(0)
-        final_chunk = buffer.read()
-        if final_chunk:
-            yield final_chunk
+        return gzip_stream(self.iter_csv_chunks(), self.COMPRESSION_LEVEL)
+    
+    def iter_file_chunks(self) -> Iterator[bytes]:
+        return self.iter_compressed_chunks()
     
     def get_streaming_response(self, filename: str = 'export.csv.gz') -> StreamingHttpResponse:
         """
@@ -151,6 +442,8 @@ class CSVStreamingExporter(StreamingExporter):
 class JSONStreamingExporter(StreamingExporter):
     """Streaming JSON exporter with gzip compression."""
     
+    FILE_EXTENSION = 'json.gz'
+    
     def iter_json_chunks(self) -> Iterator[str]:
         """
         Generate JSON chunks.
@@ -178,25 +471,13 @@ class JSONStreamingExporter(StreamingExporter):
         Yields:
             Compressed byte chunks
         """
-        buffer = BytesIO()
-        with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=self.COMPRESSION_LEVEL) as gz:
-            for chunk_str in self.iter_json_chunks():
-                gz.write(chunk_str.encode('utf-8'))
-                
-                # Yield chunks periodically
-                if buffer.tell() > 65536:  # 64KB chunks
-                    gz.flush()
-                    buffer.seek(0)
-                    chunk = buffer.read()
-                    buffer.seek(0)
-                    buffer.truncate()
-                    yield chunk
-        
-        # Yield final chunk
-        buffer.seek(0)
-        final_chunk = buffer.read()
-        if final_chunk:
-            yield final_chunk
+        return gzip_stream(
+            (chunk_str.encode('utf-8') for chunk_str in self.iter_json_chunks()),
+            self.COMPRESSION_LEVEL
+        )
+    
+    def iter_file_chunks(self) -> Iterator[bytes]:
+        return self.iter_compressed_chunks()
     
     def get_streaming_response(self, filename: str = 'export.json.gz') -> StreamingHttpResponse:
         """
@@ -224,8 +505,10 @@ class ExcelStreamingExporter(StreamingExporter):
     Note: Excel files are already compressed, so we use minimal additional compression.
     """
     
+    FILE_EXTENSION = 'xlsx.gz'
+    
     def __init__(self, queryset: models.QuerySet, fields: Optional[List[str]] = None,
-                 sheet_name: str = 'Export'):
+                 sheet_name: str = 'Export', **kwargs):
         """
         Initialize Excel exporter.
         
@@ -233,8 +516,9 @@ class ExcelStreamingExporter(StreamingExporter):
             queryset: Django queryset to export
             fields: Optional list of field names
             sheet_name: Name of the Excel sheet
+            **kwargs: Iteration options passed to StreamingExporter
         """
-        super().__init__(queryset, fields)
+        super().__init__(queryset, fields, **kwargs)
         self.sheet_name = sheet_name
     
     def iter_excel_chunks(self) -> Iterator[bytes]:
@@ -287,6 +571,9 @@ class ExcelStreamingExporter(StreamingExporter):
         buffer.seek(0)
         yield buffer.read()
     
+    def iter_file_chunks(self) -> Iterator[bytes]:
+        return self.iter_excel_chunks()
+    
     def get_streaming_response(self, filename: str = 'export.xlsx.gz') -> StreamingHttpResponse:
         """
         Get Django StreamingHttpResponse for Excel export.
@@ -307,12 +594,224 @@ class ExcelStreamingExporter(StreamingExporter):
         return response
 
 
+class _ChunkSink:
+    """Write-only file object collecting bytes until they are taken, so columnar writers can stream."""
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+class ColumnarStreamingExporter(StreamingExporter):
+    """
+    Streaming columnar exporter writing Parquet or Arrow IPC.
+
+    Query results are converted chunk by chunk into typed Arrow record
+    batches and written one row group (ROW_GROUP_SIZE rows) at a time, so
+    memory is bounded by a row group. Column types follow the model fields.
+    Fields with choices, fields listed in dictionary_fields, and string
+    columns whose first chunk has few distinct values are dictionary
+    encoded. Requires pyarrow.
+    """
+    
+    FILE_FORMATS = {
+        'parquet': ('parquet', 'application/vnd.apache.parquet'),
+        'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+    }
+    ROW_GROUP_SIZE = 100000
+    DICTIONARY_RATIO = 0.1  # Distinct/total values below which string columns are dictionary encoded
+    COMPRESSION = 'zstd'
+    
+    def __init__(self, queryset: models.QuerySet, fields: Optional[List[str]] = None,
+                 file_format: str = 'parquet', dictionary_fields: Optional[List[str]] = None,
+                 **kwargs):
+        """
+        Initialize columnar exporter.
+        
+        Args:
+            queryset: Django queryset to export
+            fields: Optional list of field names
+            file_format: 'parquet' or 'arrow' (Arrow IPC stream)
+            dictionary_fields: Fields to always dictionary encode
+            **kwargs: Iteration options passed to StreamingExporter
+        """
+        if not PYARROW_AVAILABLE:
+            raise ImportError("pyarrow is required for Parquet and Arrow exports")
+        if file_format not in self.FILE_FORMATS:
+            raise ValueError(f"Unsupported columnar format: {file_format}")
+        super().__init__(queryset, fields, **kwargs)
+        self.file_format = file_format
+        self.dictionary_fields = set(dictionary_fields or [])
+        self.FILE_EXTENSION = self.FILE_FORMATS[file_format][0]
+    
+    def _arrow_type(self, name: str) -> Tuple[Any, Optional[Any]]:
+        """
+        Get the Arrow type for a column and a converter for values Arrow cannot take as-is.
+        
+        Returns:
+            (Arrow type, converter or None)
+        """
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return pa.string(), lambda v: None if v is None else str(v)
+        
+        if getattr(field, 'target_field', None) is not None:
+            field = field.target_field
+        
+        if isinstance(field, (models.AutoField, models.BigAutoField, models.BigIntegerField)):
+            return pa.int64(), None
+        if isinstance(field, (models.SmallIntegerField, models.SmallAutoField)):
+            return pa.int16(), None
+        if isinstance(field, models.PositiveIntegerField):
+            return pa.int64(), None
+        if isinstance(field, models.IntegerField):
+            return pa.int32(), None
+        if isinstance(field, models.BooleanField):
+            return pa.bool_(), None
+        if isinstance(field, models.FloatField):
+            return pa.float64(), None
+        if isinstance(field, models.DecimalField):
+            if field.max_digits > 38:  # decimal128 precision limit
+                return pa.decimal256(field.max_digits, field.decimal_places), None
+            return pa.decimal128(field.max_digits, field.decimal_places), None
+        if isinstance(field, models.DateTimeField):
+            return pa.timestamp('us', tz='UTC'), None
+        if isinstance(field, models.DateField):
+            return pa.date32(), None
+        if isinstance(field, models.TimeField):
+            return pa.time64('us'), None
+        if isinstance(field, models.JSONField):
+            return pa.string(), lambda v: None if v is None else json.dumps(v, default=str)
+        if isinstance(field, (models.UUIDField, models.GenericIPAddressField)):
+            return pa.string(), lambda v: None if v is None else str(v)
+        return pa.string(), None
+    
+    def _build_schema(self, headers: List[str], first_chunk: List[Dict[str, Any]]):
+        """Build the Arrow schema, choosing dictionary encoding from field choices and the first chunk."""
+        opts = self.queryset.model._meta
+        arrow_fields = []
+        converters = {}
+        for name in headers:
+            arrow_type, converter = self._arrow_type(name)
+            if converter:
+                converters[name] = converter
+            
+            if pa.types.is_string(arrow_type):
+                try:
+                    has_choices = bool(opts.get_field(name).choices)
+                except FieldDoesNotExist:
+                    has_choices = False
+                distinct = len({record.get(name) for record in first_chunk})
+                if (name in self.dictionary_fields or has_choices
+                        or distinct <= max(1, len(first_chunk) * self.DICTIONARY_RATIO)):
+                    arrow_type = pa.dictionary(pa.int32(), pa.string())
+            
+            arrow_fields.append(pa.field(name, arrow_type))
+        return pa.schema(arrow_fields), converters
+    
+    def _record_batch(self, schema, converters: Dict[str, Any], chunk: List[Dict[str, Any]]):
+        """Convert a chunk of records into a typed record batch."""
+        columns = []
+        for arrow_field in schema:
+            values = [record.get(arrow_field.name) for record in chunk]
+            converter = converters.get(arrow_field.name)
+            if converter:
+                values = [converter(value) for value in values]
+            if pa.types.is_dictionary(arrow_field.type):
+                columns.append(pa.array(values, pa.string()).dictionary_encode())
+            else:
+                columns.append(pa.array(values, arrow_field.type))
+        return pa.RecordBatch.from_arrays(columns, schema=schema)
+    
+    def iter_file_chunks(self) -> Iterator[bytes]:
+        """
+        Generate the Parquet or Arrow IPC file, one row group at a time.
+        
+        Yields:
+            File byte chunks
+        """
+        headers = self.get_headers()
+        records = self.iter_records()
+        sink = _ChunkSink()
+        
+        first_chunk = list(islice(records, self.CHUNK_SIZE))
+        schema, converters = self._build_schema(headers, first_chunk)
+        
+        if self.file_format == 'parquet':
+            dictionary_columns = [f.name for f in schema if pa.types.is_dictionary(f.type)]
+            writer = pq.ParquetWriter(sink, schema, compression=self.COMPRESSION,
+                                      use_dictionary=dictionary_columns or False)
+            write = lambda batches: writer.write_table(
+                pa.Table.from_batches(batches, schema=schema), row_group_size=self.ROW_GROUP_SIZE
+            )
+        else:
+            writer = pa.ipc.new_stream(sink, schema,
+                                       options=pa.ipc.IpcWriteOptions(compression=self.COMPRESSION))
+            write = lambda batches: [writer.write_batch(batch) for batch in batches]
+        
+        batches = []
+        buffered = 0
+        chunk = first_chunk
+        while chunk:
+            batches.append(self._record_batch(schema, converters, chunk))
+            buffered += len(chunk)
+            if buffered >= self.ROW_GROUP_SIZE:
+                write(batches)
+                batches, buffered = [], 0
+                yield sink.take()
+            chunk = list(islice(records, self.CHUNK_SIZE))
+        
+        if batches:
+            write(batches)
+        writer.close()
+        yield sink.take()
+    
+    def get_streaming_response(self, filename: Optional[str] = None) -> StreamingHttpResponse:
+        """
+        Get Django StreamingHttpResponse for the columnar export.
+        
+        Args:
+            filename: Export filename
+            
+        Returns:
+            StreamingHttpResponse object
+        """
+        extension, content_type = self.FILE_FORMATS[self.file_format]
+        response = StreamingHttpResponse(self.iter_file_chunks(), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename or "export." + extension}"'
+        
+        return response
+
+
 class ExportManager:
     """
     Manages streaming exports with format selection and compression.
     """
     
-    SUPPORTED_FORMATS = ['csv', 'json', 'excel']
+    SUPPORTED_FORMATS = ['csv', 'json', 'excel', 'parquet', 'arrow']
+    PROGRESS_INTERVAL = 1000
     
     @classmethod
     def create_exporter(cls, format: str, queryset: models.QuerySet,
@@ -321,10 +820,10 @@ class ExportManager:
         Create appropriate exporter for format.
         
         Args:
-            format: Export format (csv, json, excel)
+            format: Export format (csv, json, excel, parquet, arrow)
             queryset: Django queryset to export
             fields: Optional list of fields
-            **kwargs: Additional exporter-specific arguments
+            **kwargs: Additional exporter-specific arguments (iteration, exact_count, ...)
             
         Returns:
             StreamingExporter instance
@@ -332,11 +831,13 @@ class ExportManager:
         format = format.lower()
         
         if format == 'csv':
-            return CSVStreamingExporter(queryset, fields)
+            return CSVStreamingExporter(queryset, fields, **kwargs)
         elif format == 'json':
-            return JSONStreamingExporter(queryset, fields)
+            return JSONStreamingExporter(queryset, fields, **kwargs)
         elif format == 'excel':
             return ExcelStreamingExporter(queryset, fields, **kwargs)
+        elif format in ('parquet', 'arrow'):
+            return ColumnarStreamingExporter(queryset, fields, file_format=format, **kwargs)
         else:
             raise ValueError(f"Unsupported format: {format}")
     
@@ -362,31 +863,75 @@ class ExportManager:
         
         if filename is None:
             timestamp = timezone.now().strftime('%Y%m%d_%H%M%S')
-            filename = f'export_{timestamp}.{format}.gz'
+            filename = f'export_{timestamp}.{exporter.FILE_EXTENSION}'
         
         logger.info(f"Starting {format} export: {filename}")
         
         return exporter.get_streaming_response(filename)
     
     @classmethod
-    def estimate_export_size(cls, queryset: models.QuerySet, format: str = 'csv') -> Dict[str, Any]:
+    def save_export(cls, exporter: StreamingExporter, file_path: str,
+                    progress_callback: Optional[Any] = None) -> str:
+        """
+        Write an export file to default storage.
+        
+        The file is spooled to a local temporary file first, so memory stays
+        bounded for any storage backend.
+        
+        Args:
+            exporter: Exporter producing the file
+            file_path: Storage path
+            progress_callback: Called with the exported record count every PROGRESS_INTERVAL records
+            
+        Returns:
+            Storage path the file was saved under
+        """
+        from django.core.files import File
+        from django.core.files.storage import default_storage
+        
+        reported = 0
+        with tempfile.TemporaryFile() as spool:
+            for chunk in exporter.iter_file_chunks():
+                spool.write(chunk)
+                if progress_callback and exporter.exported_records - reported >= cls.PROGRESS_INTERVAL:
+                    reported = exporter.exported_records
+                    progress_callback(reported)
+            spool.seek(0)
+            return default_storage.save(file_path, File(spool))
+    
+    @classmethod
+    def get_export_url(cls, file_path: str) -> str:
+        """Get the download URL of a saved export file."""
+        from django.core.files.storage import default_storage
+        
+        try:
+            return default_storage.url(file_path)
+        except NotImplementedError:
+            return file_path
+    
+    @classmethod
+    def estimate_export_size(cls, queryset: models.QuerySet, format: str = 'csv',
+                             exact_count: bool = False) -> Dict[str, Any]:
         """
         Estimate export file size.
         
         Args:
             queryset: Django queryset
             format: Export format
+            exact_count: Count records exactly instead of using the planner estimate
             
         Returns:
             Dictionary with size estimates
         """
-        record_count = queryset.count()
+        record_count = estimate_row_count(queryset, exact=exact_count)
         
         # Rough estimates per record (bytes)
         estimates = {
             'csv': 200,      # ~200 bytes per record in CSV
             'json': 300,     # ~300 bytes per record in JSON
             'excel': 250,    # ~250 bytes per record in Excel
+            'parquet': 120,  # ~120 bytes per record of typed columns
+            'arrow': 150,    # ~150 bytes per record of typed columns
         }
         
         uncompressed_size = record_count * estimates.get(format, 200)
@@ -413,7 +958,7 @@ class ExportProgress:
         
         Args:
             export_id: Unique export ID
-            queryset: Django queryset
+            queryset: Django queryset (None if the total is not known yet)
             format: Export format
             user_id: User ID initiating export
             
@@ -429,7 +974,7 @@ class ExportProgress:
             'user_id': user_id,
             'format': format,
             'status': 'running',
-            'total_records': queryset.count(),
+            'total_records': estimate_row_count(queryset) if queryset is not None else None,
             'exported_records': 0,
             'started_at': timezone.now().isoformat(),
             'completed_at': None,
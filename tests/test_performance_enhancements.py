@@ -231,6 +231,425 @@ class TestSearchOptimization(TestCase):
         assert len(cached['results']) == 10
         assert cached['window_start'] == 0
 
+    def test_search_cursor_round_trip(self):
+        """Test keyset cursors encode sort key, primary key and offset."""
+        from analytics.search_optimization import SearchCursor
+
+        created_at = timezone.now()
+        cursor = SearchCursor.encode(created_at, 'lead-42', 100)
+        position = SearchCursor.decode(cursor)
+
+        assert position['v'] == created_at.isoformat()
+        assert position['pk'] == 'lead-42'
+        assert position['o'] == 100
+
+        with pytest.raises(ValueError):
+            SearchCursor.decode('not-a-cursor')
+
+    def test_build_queryset_applies_filters(self):
+        """Test query params become indexed filters on the queryset."""
+        from analytics.search_optimization import SearchOptimizer
+        from crm.models import Lead
+
+        queryset = SearchOptimizer.build_queryset(
+            'lead', Lead,
+            {'filters': {'status': ['new', 'qualified'], 'lead_score': {'gte': 50}}, 'query': 'acme'}
+        )
+        sql = str(queryset.query)
+
+        assert '"status" IN' in sql
+        assert '"lead_score" >= 50' in sql
+        assert 'LIKE' in sql
+
+        with pytest.raises(ValueError):
+            SearchOptimizer.build_queryset('lead', Lead, {'filters': {'password__contains': 'x'}})
+
+    def test_keyset_filter_descending(self):
+        """Test keyset predicate selects rows after the cursor position."""
+        from analytics.search_optimization import SearchOptimizer
+
+        q = SearchOptimizer._keyset_filter('created_at', True, '2024-01-01', 10)
+
+        assert ('created_at__lt', '2024-01-01') in q.children
+        assert ('created_at', '2024-01-01') in q.children[1].children
+
+
+class TestIncrementalFacets(TestCase):
+    """Tests for incrementally maintained facet counters."""
+
+    def test_compute_deltas_moves_record_between_buckets(self):
+        """Test a changed value decrements the old bucket and increments the new."""
+        from analytics.facet_counters import FacetCounterMaintainer
+
+        deltas = FacetCounterMaintainer.compute_deltas(
+            'lead',
+            {'status': 'new', 'lead_score': 10},
+            {'status': 'qualified', 'lead_score': 60}
+        )
+
+        assert deltas['status'] == {'"new"': -1, '"qualified"': 1}
+        assert deltas['lead_score'] == {'0-25': -1, '51-75': 1}
+
+    def test_get_facet_from_counters(self):
+        """Test facets are served from reconciled counters plus deltas."""
+        from analytics.facet_counters import FacetCounterMaintainer, InMemoryFacetCounterBackend
+
+        backend = InMemoryFacetCounterBackend()
+        with patch('analytics.facet_counters._backend', backend):
+            assert FacetCounterMaintainer.get_facet('lead', 'status', 'company-123') is None
+
+            backend.replace('company-123', 'lead', {'status': {'"new"': 3}}, 3)
+            backend.apply_deltas('company-123', 'lead', {'status': {'"new"': -1, '"qualified"': 1}}, 0)
+
+            facet = FacetCounterMaintainer.get_facet('lead', 'status', 'company-123')
+
+        assert facet['buckets'] == [
+            {'key': 'new', 'doc_count': 2},
+            {'key': 'qualified', 'doc_count': 1},
+        ]
+        assert facet['_meta']['total_records'] == 3
+
+    def test_filtered_view_misses_are_warmed(self):
+        """Test a filtered facet miss is recorded and served from cache after warm-up."""
+        from analytics.search_optimization import FacetPrecomputer, SearchOptimizer
+        from crm.models import Lead
+
+        cache.clear()
+        filters = {'status': 'new'}
+        facets = SearchOptimizer.get_facets_for_entity('lead', 'company-123', filters)
+        assert facets['status']['_meta']['status'] == 'not_computed'
+        assert FacetPrecomputer.get_filtered_views('lead', 'company-123') == [filters]
+
+        computed = {'type': 'terms', 'field': 'status', 'buckets': [{'key': 'new', 'doc_count': 4}]}
+        with patch.object(FacetPrecomputer, 'precompute_facet', return_value=computed) as precompute:
+            cached = FacetPrecomputer.warm_filtered_views('lead', 'company-123', Lead)
+
+        assert cached == precompute.call_count == len(facets)
+        assert precompute.call_args[0][4:] == ('company-123', filters)
+        facets = SearchOptimizer.get_facets_for_entity('lead', 'company-123', filters)
+        assert facets['status'] == computed
+
+
+class TestSearchResultCache(TestCase):
+    """Tests for the hybrid search query and result cache."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_index_version_bump_invalidates_results(self):
+        """Test cached rankings are per variant and dropped on index version bumps."""
+        from analytics.search_cache import SearchCache
+
+        SearchCache.set_results('c1', 'Acme  Renewal', {'status': 'new'}, 'control', [{'id': 'a'}])
+
+        assert SearchCache.get_results('c1', 'acme renewal', {'status': 'new'}, 'control') == [{'id': 'a'}]
+        assert SearchCache.get_results('c1', 'acme renewal', {'status': 'new'}, 'vector_boosted') is None
+
+        SearchCache.bump_index_version('c1')
+        assert SearchCache.get_results('c1', 'acme renewal', {'status': 'new'}, 'control') is None
+
+        stats = SearchCache.get_stats(['control', 'vector_boosted'])
+        assert stats['control'] == {'hits': 1, 'misses': 1, 'hit_rate': 0.5}
+        assert stats['vector_boosted']['misses'] == 1
+
+    def test_search_reuses_cached_ranking(self):
+        """Test a repeated search skips retrieval and ranking."""
+        from analytics.hybrid_search_fusion import HybridSearchFusion
+
+        fusion = HybridSearchFusion()
+        fusion._embedder = Mock(name='embedder')
+        fusion._embedder.embed.return_value = [[0.0, 1.0]]
+        user, company = Mock(id='u1'), Mock(id='c1')
+
+        with patch('analytics.hybrid_search_fusion.event_bus'), \
+                patch.object(fusion, '_perform_control_search',
+                             wraps=fusion._perform_control_search) as retrieve:
+            first, _ = fusion.search('acme deal', user, company)
+            second, _ = fusion.search('ACME deal', user, company)
+
+        assert retrieve.call_count == 1
+        assert fusion._embedder.embed.call_count == 1
+        assert [r.id for r in second] == [r.id for r in first]
+
+
+class TestBM25Index(TestCase):
+    """Tests for the BM25 inverted index."""
+
+    def setUp(self):
+        from analytics.bm25_index import BM25Index
+        self.index = BM25Index.from_documents([
+            ('1', 'acme rockets enterprise deal'),
+            ('2', 'globex enterprise renewal'),
+            ('3', 'initech printers'),
+            ('4', 'acme acme anvils'),
+        ])
+
+    def test_search_matches_exhaustive_scores(self):
+        """Test MaxScore top-k agrees with scoring every document."""
+        results = self.index.search('acme enterprise', k=2)
+        scores = self.index.score_documents('acme enterprise', ['1', '2', '3', '4'])
+
+        expected = sorted(
+            [(doc_id, score) for doc_id, score in zip(['1', '2', '3', '4'], scores) if score > 0],
+            key=lambda pair: pair[1], reverse=True
+        )[:2]
+
+        assert [doc_id for doc_id, _ in results] == [doc_id for doc_id, _ in expected]
+        assert scores[2] == 0.0
+
+    def test_incremental_add_and_remove(self):
+        """Test documents can be re-indexed and removed."""
+        self.index.add_document('3', 'acme printers')
+        assert '3' in [doc_id for doc_id, _ in self.index.search('acme', k=10)]
+
+        self.index.remove_document('3')
+        self.index.remove_document('4')
+        assert [doc_id for doc_id, _ in self.index.search('acme', k=10)] == ['1']
+
+
+class TestScoreFusion(TestCase):
+    """Tests for vectorized hybrid ranking score fusion."""
+
+    def test_top_k_matches_stable_sort(self):
+        """Test top-k selection agrees with a full stable descending sort."""
+        import numpy as np
+        from analytics.score_fusion import fuse_scores, top_k_indices
+
+        bm25 = np.array([3.0, 1.0, 3.0, 0.0, 2.0, 3.0])
+        vector = np.array([0.2, 0.9, 0.2, 0.1, 0.5, 0.2])
+        fused = fuse_scores(bm25, vector, 'weighted_sum', 0.5)
+
+        expected = sorted(range(len(fused)), key=lambda i: fused[i], reverse=True)[:3]
+        assert top_k_indices(fused, 3).tolist() == expected
+
+    def test_batch_fusion_matches_single_queries(self):
+        """Test padded batch fusion agrees with fusing each query alone."""
+        import numpy as np
+        from analytics.score_fusion import fuse_batch, fuse_scores, pad_scores
+
+        bm25_rows = [[1.0, 4.0, 2.0], [0.5, 0.1]]
+        vector_rows = [[0.3, 0.1, 0.9], [0.2, 0.8]]
+        fused = fuse_batch(pad_scores(bm25_rows), pad_scores(vector_rows), [0.3], 'reciprocal_rank')
+
+        for row, (bm25, vector) in enumerate(zip(bm25_rows, vector_rows)):
+            single = fuse_scores(np.array(bm25), np.array(vector), 'reciprocal_rank', 0.3)
+            assert np.allclose(fused[0, row, :len(bm25)], single)
+        assert np.isnan(fused[0, 1, 2])
+
+    def test_grid_search_prefers_informative_signal(self):
+        """Test grid search weights the score that predicts relevance."""
+        import numpy as np
+        from analytics.score_fusion import grid_search_fusion
+
+        relevance = np.array([[3, 0, 1, 0], [0, 2, 0, 1]])
+        bm25 = relevance + 0.1
+        vector = np.array([[0.1, 0.9, 0.2, 0.8], [0.9, 0.1, 0.8, 0.2]])
+
+        result = grid_search_fusion(
+            bm25, vector, relevance,
+            {'alpha': [0.1, 0.9], 'fusion_method': ['weighted_sum']}, k=2
+        )
+        assert result['alpha'] == 0.9
+        assert result['ndcg@2'] == 1.0
+
+
+class TestStreamingAnomalyDetection(TestCase):
+    """Tests for online KPI anomaly detection."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_spike_in_seasonal_series_raises_alert(self):
+        """Test a spike is flagged while ordinary seasonal swings are not."""
+        import numpy as np
+        from analytics.streaming_anomaly import StreamingAnomalyDetector
+
+        rng = np.random.default_rng(0)
+        values = 100 + 10 * np.sin(2 * np.pi * np.arange(200) / 12) + rng.normal(0, 1, 200)
+        values[150] += 30
+
+        alerts = [
+            i for i, value in enumerate(values)
+            if StreamingAnomalyDetector.observe('series-1', value, i)['alert']
+        ]
+
+        assert alerts == [150]
+        assert StreamingAnomalyDetector.get_state('series-1').count == 200
+
+    def test_warm_start_matches_incremental_state(self):
+        """Test replaying history once gives the same state as observing point by point."""
+        from analytics.streaming_anomaly import StreamingAnomalyDetector
+
+        points = [(i, 50 + (i % 7) * 3 + (i % 3)) for i in range(60)]
+        for timestamp, value in points:
+            StreamingAnomalyDetector.observe('incremental', value, timestamp, {'seasonal_period': 7})
+        StreamingAnomalyDetector.warm_start('replayed', points, {'seasonal_period': 7})
+
+        incremental = StreamingAnomalyDetector.get_state('incremental')
+        replayed = StreamingAnomalyDetector.get_state('replayed')
+        assert replayed.level == incremental.level
+        assert replayed.ewma_var == incremental.ewma_var
+        assert replayed.seasonal == incremental.seasonal
+
+    def test_refit_is_queued_not_run_inline(self):
+        """Test observe queues one model refit per series instead of fitting on the write path."""
+        from analytics import streaming_anomaly
+        from analytics.streaming_anomaly import StreamingAnomalyDetector
+
+        with patch.object(streaming_anomaly, 'SKLEARN_AVAILABLE', True), \
+                patch.object(streaming_anomaly, 'IsolationForest', create=True) as forest, \
+                patch('analytics.tasks.refit_anomaly_model_task.delay') as delay:
+            for i in range(StreamingAnomalyDetector.FOREST_MIN_POINTS + 10):
+                StreamingAnomalyDetector.observe('queued', 100 + i % 5, i)
+
+            forest.assert_not_called()
+            delay.assert_called_once_with('queued', StreamingAnomalyDetector._config(None))
+
+            with patch.object(StreamingAnomalyDetector, 'save_model') as save_model:
+                assert StreamingAnomalyDetector.refit('queued')
+            save_model.assert_called_once_with(
+                'queued', forest.return_value.fit.return_value, StreamingAnomalyDetector.FOREST_MIN_POINTS + 10
+            )
+
+    def test_warm_start_scores_measurements_from_the_trigger_on(self):
+        """Test the measurement that queues a warm start, and later ones, are scored rather than replayed."""
+        import numpy as np
+        from datetime import date
+        from django.contrib.auth import get_user_model
+        from analytics.models import KPI, KPIMeasurement
+        from analytics.streaming_anomaly import StreamingAnomalyDetector, kpi_series_key, observe_kpi_measurement
+        from analytics.tasks import warm_start_kpi_series_task
+        from core.models import Company
+
+        company = Company.objects.create(name="Warm Start Co", code="warm-start-co")
+        owner = get_user_model().objects.create_user(
+            email="warm-start@example.com", first_name="Warm", last_name="Start", password="testpass123"
+        )
+        kpi = KPI.objects.create(company=company, owner=owner, name="Revenue", formula="sum(amount)")
+        series_key = kpi_series_key(company.id, kpi.id)
+
+        rng = np.random.default_rng(0)
+        values = 100 + 10 * np.sin(2 * np.pi * np.arange(50) / 12) + rng.normal(0, 1, 50)
+        values[48] += 40
+        measurements = []
+        for i, value in enumerate(values):
+            month = date(2020 + i // 12, i % 12 + 1, 1)
+            measurements.append(KPIMeasurement.objects.create(
+                company=company, kpi=kpi, period_start=month, period_end=month, value=round(float(value), 2)
+            ))
+        trigger, later = measurements[48], measurements[49]
+
+        with patch('analytics.tasks.warm_start_kpi_series_task.delay') as delay:
+            assert observe_kpi_measurement(trigger) is None
+            assert observe_kpi_measurement(later) is None
+        delay.assert_called_once_with(str(kpi.pk), trigger.period_end.isoformat())
+
+        result = warm_start_kpi_series_task(str(kpi.pk), trigger.period_end.isoformat())
+
+        assert result['points'] == 50
+        [alert] = StreamingAnomalyDetector.get_recent_alerts(company.id)
+        assert alert['measurement_id'] == str(trigger.pk)
+        assert observe_kpi_measurement(later) is None
+        assert StreamingAnomalyDetector.get_state(series_key).count == 50
+        assert StreamingAnomalyDetector.acquire_warm_start_lock(series_key)
+
+
+class TestBatchAnomalyScoring(TestCase):
+    """Tests for vectorized multi-series anomaly scoring."""
+
+    def test_vectorized_detectors_match_per_series(self):
+        """Test scoring a padded matrix gives the same flags as scoring each series alone."""
+        import numpy as np
+        from analytics.batch_anomaly import statistical_flags, seasonal_flags
+        from analytics.score_fusion import pad_scores
+
+        rng = np.random.default_rng(1)
+        series = [rng.normal(100, 5, length) for length in (40, 25, 60)]
+        series[0][10] += 40
+        series[2][50] -= 40
+        matrix = pad_scores(series)
+
+        for detector in (statistical_flags, seasonal_flags):
+            batched, _ = detector(matrix)
+            for row, values in enumerate(series):
+                alone, _ = detector(values[np.newaxis, :])
+                assert (batched[row, :len(values)] == alone[0]).all()
+                assert not batched[row, len(values):].any()
+
+    def test_scorer_reports_voted_anomalies(self):
+        """Test outliers are reported per series and short series are skipped."""
+        import numpy as np
+        from analytics.batch_anomaly import BatchAnomalyScorer
+
+        values = 100 + 10 * np.sin(2 * np.pi * np.arange(48) / 12)
+        values[30] += 60
+        series = {
+            'spiky': [{'timestamp': f'{2020 + i // 12}-{i % 12 + 1:02d}-01', 'value': v} for i, v in enumerate(values)],
+            'short': [{'timestamp': '2024-01-01', 'value': 1.0}] * 5,
+        }
+        config = {'methods': {'isolation_forest': False, 'holt_winters': False}}
+
+        results = {r['series_key']: r for r in BatchAnomalyScorer(config, chunk_size=1).score(series)}
+
+        assert results['short']['status'] == 'error'
+        assert [a['index'] for a in results['spiky']['anomalies']] == [30]
+        assert set(results['spiky']['anomalies'][0]['ensemble_votes']) == {'statistical', 'seasonal'}
+
+    def test_daemonic_process_scores_in_process(self):
+        """Test a Celery-style daemonic worker never starts a process pool."""
+        from analytics import batch_anomaly
+        from analytics.batch_anomaly import BatchAnomalyScorer
+
+        with patch.object(batch_anomaly, 'SKLEARN_AVAILABLE', True):
+            assert not BatchAnomalyScorer().uses_process_pool
+            assert BatchAnomalyScorer(max_workers=4).uses_process_pool
+            with patch('multiprocessing.current_process') as current_process:
+                current_process.return_value.daemon = True
+                assert not BatchAnomalyScorer(max_workers=4).uses_process_pool
+
+    def test_nightly_task_scores_kpi_series(self):
+        """Test the nightly task scores a tenant's KPI measurements and alerts on new anomalies once."""
+        import numpy as np
+        from datetime import date
+        from django.contrib.auth import get_user_model
+        from analytics.models import KPI, KPIMeasurement
+        from analytics.streaming_anomaly import StreamingAnomalyDetector, kpi_series_key
+        from analytics.tasks import score_kpi_anomalies_task
+        from core.models import Company
+
+        cache.clear()
+        company = Company.objects.create(name="Anomaly Co", code="anomaly-co")
+        owner = get_user_model().objects.create_user(
+            email="kpi-owner@example.com", first_name="KPI", last_name="Owner", password="testpass123"
+        )
+        spiky = KPI.objects.create(company=company, owner=owner, name="Revenue", formula="sum(amount)")
+        short = KPI.objects.create(company=company, owner=owner, name="Leads", formula="count(id)")
+
+        values = 100 + 10 * np.sin(2 * np.pi * np.arange(48) / 12)
+        values[30] += 60
+        for i, value in enumerate(values):
+            month = date(2020 + i // 12, i % 12 + 1, 1)
+            KPIMeasurement.objects.create(company=company, kpi=spiky, period_start=month,
+                                          period_end=month, value=round(float(value), 2))
+        KPIMeasurement.objects.create(company=company, kpi=short, period_start=date(2024, 1, 1),
+                                      period_end=date(2024, 1, 31), value=5)
+
+        spike = KPIMeasurement.objects.get(kpi=spiky, period_end=date(2022, 7, 1))
+
+        with patch('events.event_bus.event_bus.publish') as publish:
+            [summary] = score_kpi_anomalies_task(company_id=company.id)
+            [rerun] = score_kpi_anomalies_task(company_id=company.id)
+
+        assert summary['series_scored'] == 1
+        assert summary['series_skipped'] == 1
+        assert summary['anomalous_series'] == [kpi_series_key(company.id, spiky.id)]
+        assert summary['alerts'] == 1
+        assert rerun['alerts'] == 0
+        [alert] = StreamingAnomalyDetector.get_recent_alerts(company.id)
+        assert alert['measurement_id'] == str(spike.pk)
+        assert alert['kpi_name'] == "Revenue"
+        publish.assert_called_once_with('KPI_ANOMALY_DETECTED', alert, company_id=str(company.id), priority=1)
+
 
 class TestReportingOptimization(TestCase):
     """Tests for reporting query plan cache and materialized aggregates."""
@@ -291,6 +710,491 @@ class TestReportingOptimization(TestCase):
         assert cached['aggregate_name'] == 'leads_by_status'
         assert len(cached['data']) == 2
 
+    def test_planner_merges_aggregates_sharing_filters(self):
+        """Test aggregates sharing filters are planned as one query group."""
+        from analytics.reporting_optimization import ReportPlanner
+
+        plan = ReportPlanner.plan('lead', [
+            {'name': 'by_status', 'type': 'count', 'field': 'id', 'dimensions': ['status']},
+            {'name': 'score_by_status', 'type': 'avg', 'field': 'lead_score', 'dimensions': ['status']},
+            {'name': 'by_source', 'type': 'count', 'field': 'id', 'dimensions': ['source']},
+            {'name': 'unique_owners', 'type': 'approx_distinct', 'field': 'owner_id', 'dimensions': []},
+        ])
+
+        assert len(plan) == 2
+        assert [agg['name'] for agg in plan[0]['aggregates']] == ['by_status', 'score_by_status', 'by_source']
+        assert plan[0]['dimension_sets'] == [('status',), ('source',)]
+        assert plan[1]['mergeable'] is False
+
+    def test_builtin_deal_report_routes_to_pipeline_view(self):
+        """Test the built-in deal-by-stage aggregates are answered from mv_sales_pipeline."""
+        from analytics.reporting_optimization import ReportPlanner, ReportingPresets
+
+        aggregates = [agg for agg in ReportingPresets.DEAL_AGGREGATES if agg['dimensions'] == ['stage']
+                      and agg['type'] in ('count', 'sum')]
+        with patch('analytics.reporting_optimization.MaterializedViewManager.is_fresh', return_value=True):
+            plan = ReportPlanner.plan('deal', aggregates, {'status': 'open', 'is_active': True})
+
+        route = plan[0]['view_route']
+        assert route['view'] == 'mv_sales_pipeline'
+        sql, params = ReportPlanner._view_sql(route, plan[0], 'company-1')
+        assert sql.startswith('SELECT "stage_id" AS "stage", SUM("deals_count") AS "deals_by_stage_value", ')
+        assert sql.endswith('WHERE "company_id" = %s GROUP BY "stage_id"') and params == ('company-1',)
+
+    def test_grouping_sets_rewrite(self):
+        """Test a GROUP BY over all dimensions is rewritten into GROUPING SETS."""
+        from analytics.reporting_optimization import ReportPlanner
+        from crm.models import Lead
+
+        sql = ('SELECT "crm_lead"."status", "crm_lead"."source", COUNT("crm_lead"."id") AS "n" '
+               'FROM "crm_lead" WHERE "crm_lead"."company_id" = %s '
+               'GROUP BY "crm_lead"."status", "crm_lead"."source"')
+
+        rewritten = ReportPlanner.grouping_sets_sql(
+            sql, Lead, ['status', 'source'], [('status',), ('source',), ()]
+        )
+
+        assert rewritten.startswith('SELECT GROUPING("crm_lead"."status", "crm_lead"."source") AS "_grouping_id", ')
+        assert rewritten.endswith('GROUP BY GROUPING SETS (("crm_lead"."status"), ("crm_lead"."source"), ())')
+        assert ReportPlanner.grouping_sets_sql(sql, Lead, ['source', 'status'], [('status',)]) is None
+
+    def test_latency_tracker_prioritizes_slowest_reports(self):
+        """Test reports are ranked by their compute latency."""
+        from analytics.reporting_optimization import ReportLatencyTracker
+
+        def report(name):
+            return {'entity_type': 'lead', 'aggregates': [
+                {'name': name, 'type': 'count', 'field': 'id', 'dimensions': ['status']}
+            ]}
+
+        ReportLatencyTracker.record(report('fast'), 'company-123', 20.0, compute_ms=15.0)
+        ReportLatencyTracker.record(report('slow'), 'company-123', 900.0, compute_ms=850.0)
+        ReportLatencyTracker.record(report('slow'), 'company-123', 2.0)  # Cached run keeps compute EWMA
+
+        slowest = ReportLatencyTracker.get_slowest('lead')
+
+        assert [s['report_config']['aggregates'][0]['name'] for s in slowest] == ['slow', 'fast']
+        assert slowest[0]['count'] == 2
+        assert slowest[0]['compute_ewma_ms'] == 850.0
+
+
+class TestMaterializedViews(TestCase):
+    """Tests for change-driven materialized view refresh scheduling."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        from analytics.materialized_views import MaterializedViewManager
+        self.manager = MaterializedViewManager
+        cache.clear()
+
+    def test_change_threshold_triggers_refresh(self):
+        """Test a view becomes due once enough source rows change."""
+        with patch('analytics.materialized_views.time.time', return_value=1000.0):
+            self.manager.mark_refreshed('mv_sales_pipeline')
+        self.manager.record_changes('deals.Deal', self.manager.CHANGE_THRESHOLD - 1)
+
+        with patch('analytics.materialized_views.time.time', return_value=1000.0 + self.manager.MIN_INTERVAL):
+            assert not self.manager.is_due('mv_sales_pipeline')
+            self.manager.record_changes('deals.Deal')
+            assert self.manager.is_due('mv_sales_pipeline')
+
+    def test_staleness_is_bounded(self):
+        """Test a changed view is refreshed once it exceeds the staleness bound, and not before."""
+        with patch('analytics.materialized_views.time.time', return_value=1000.0):
+            self.manager.mark_refreshed('mv_lead_conversion_stats')
+        self.manager.record_changes('crm.Lead')
+
+        with patch('analytics.materialized_views.time.time', return_value=1030.0):
+            assert not self.manager.is_due('mv_lead_conversion_stats')  # Within MIN_INTERVAL
+            assert self.manager.is_fresh('mv_lead_conversion_stats')
+            assert not self.manager.is_fresh('mv_lead_conversion_stats', max_staleness=10)
+
+        with patch('analytics.materialized_views.time.time', return_value=1000.0 + self.manager.MAX_STALENESS):
+            staleness = self.manager.get_staleness('mv_lead_conversion_stats')
+            assert staleness['pending_changes'] == 1
+            assert self.manager.is_due('mv_lead_conversion_stats')
+            assert not self.manager.is_fresh('mv_lead_conversion_stats', max_staleness=60)
+
+    def test_unchanged_view_is_never_due(self):
+        """Test views without pending changes are not refreshed however old they are."""
+        with patch('analytics.materialized_views.time.time', return_value=1000.0):
+            self.manager.mark_refreshed('mv_account_stats')
+
+        with patch('analytics.materialized_views.time.time', return_value=1000.0 + 10 * self.manager.MAX_STALENESS):
+            assert not self.manager.is_due('mv_account_stats')
+            assert self.manager.is_fresh('mv_account_stats')
+
+    def test_refresh_is_concurrent_unless_unpopulated(self):
+        """Test the refresh mode follows pg_matviews.ispopulated, not the cached refresh state."""
+        cursor = MagicMock()
+        connection = MagicMock(vendor='postgresql')
+        connection.cursor.return_value.__enter__.return_value = cursor
+        connection.ops.quote_name = lambda name: f'"{name}"'
+
+        with patch('analytics.materialized_views.connection', connection):
+            for populated, statement in ((False, 'REFRESH MATERIALIZED VIEW "mv_sales_pipeline"'),
+                                         (True, 'REFRESH MATERIALIZED VIEW CONCURRENTLY "mv_sales_pipeline"')):
+                cache.clear()  # No cached refresh state either way
+                cursor.reset_mock()
+                cursor.fetchone.return_value = (populated,)
+
+                result = self.manager.refresh_view('mv_sales_pipeline')
+
+                assert result['concurrently'] is populated
+                assert cursor.execute.call_args_list[0].args[0].startswith('SELECT ispopulated FROM pg_matviews')
+                assert cursor.execute.call_args_list[-1].args == (statement,)
+
+
+class TestKPIRollups(TestCase):
+    """Tests for hourly/daily/monthly analytics rollups."""
+
+    def setUp(self):
+        """Set up test fixtures."""
+        from analytics.kpi_rollups import InMemoryRollupStore, RollupManager
+        from analytics.aggregate_state import AggregateCell, PartialAggregate
+        self.manager = RollupManager(store=InMemoryRollupStore())
+        self.source = 'analytics.KPIMeasurement'
+        self.today = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+        def cell(bucket, value, kpi_id=1):
+            return AggregateCell(f'{self.source}:day', bucket, {'kpi_id': kpi_id},
+                                 PartialAggregate.from_metrics({'value': value}))
+        self.cell = cell
+
+    def test_rebucket_merges_into_coarser_buckets(self):
+        """Test day cells merge into month and quarter buckets across dimensions."""
+        from analytics.kpi_rollups import rebucket, truncate
+        first = self.today.replace(year=2024, month=2, day=1)
+        cells = [self.cell(first, 5.0), self.cell(first.replace(day=20), 7.0, kpi_id=2),
+                 self.cell(first.replace(month=4), 1.0)]
+
+        months = rebucket(cells, 'month', ['kpi_id'])
+        assert len(months) == 3
+
+        quarters = rebucket(cells, 'quarter', [])
+        assert [cell.time_bucket for cell in quarters] == [truncate(first, 'quarter'), first.replace(month=4)]
+        assert quarters[0].partial.sums['value'] == 12.0
+        assert quarters[0].partial.maxs['value'] == 7.0
+        assert quarters[0].partial.record_count == 2
+
+    def test_rebuild_replaces_buckets_at_every_resolution(self):
+        """Test rebuilds write day and month rollups and clear buckets whose rows are gone."""
+        month_start = self.today.replace(day=1)
+        with patch.object(self.manager, '_aggregate_source',
+                          return_value=[self.cell(month_start, 3.0), self.cell(month_start, 4.0, kpi_id=2)]):
+            written = self.manager.rebuild(self.source, 'c1', month_start, month_start + timedelta(days=1))
+        assert written == {'day': 2, 'month': 2}  # DateField source: no hourly rollup
+
+        with patch.object(self.manager, '_aggregate_source', return_value=[self.cell(month_start, 3.0)]):
+            self.manager.rebuild(self.source, 'c1', month_start, month_start + timedelta(days=1))
+        months = self.manager.store.read(self.source, 'c1', 'month')
+        assert [cell.dimensions for cell in months] == [{'kpi_id': 1}]
+
+    def test_query_routes_to_coarsest_covering_rollup(self):
+        """Test queries use month rollups when they tile the resolution, days otherwise, raw past retention."""
+        month_start = self.today.replace(day=1)
+        with patch.object(self.manager, '_aggregate_source', return_value=[self.cell(month_start, 2.0)]):
+            self.manager.rebuild(self.source, 'c1', month_start - timedelta(days=7))  # Week bounds start earlier
+        end = month_start + timedelta(days=40)
+
+        result = self.manager.query(self.source, 'c1', month_start, end, resolution='quarter')
+        assert result['source'] == 'rollup:month'
+        assert result['rows'][0]['sums'] == {'value': 2.0}
+
+        assert self.manager.query(self.source, 'c1', month_start, end, resolution='week')['source'] == 'rollup:day'
+
+        with patch('analytics.kpi_rollups.get_retention', return_value={'raw': None, 'day': 30, 'month': None}), \
+                patch.object(self.manager, '_aggregate_source', return_value=[]) as aggregate:
+            old = self.today - timedelta(days=400)
+            assert self.manager.query(self.source, 'c1', old, end, resolution='week')['source'] == 'raw'
+            assert aggregate.called
+
+    def test_query_falls_back_to_raw_outside_built_coverage(self):
+        """Test ranges rollups were never built for are answered from raw rows."""
+        from analytics.kpi_rollups import next_bucket
+        month_start = self.today.replace(day=1, month=6, year=2024)
+        with patch.object(self.manager, '_aggregate_source', return_value=[self.cell(month_start, 2.0)]):
+            self.manager.rebuild(self.source, 'c1', month_start, month_start + timedelta(days=1))
+
+        with patch.object(self.manager, '_aggregate_source', return_value=[]) as aggregate:
+            built = self.manager.query(self.source, 'c1', month_start, next_bucket(month_start, 'month'), 'month')
+            wider = self.manager.query(self.source, 'c1', month_start, month_start + timedelta(days=45), 'month')
+            other_tenant = self.manager.query(self.source, 'c2', month_start, month_start + timedelta(days=1))
+
+        assert built['source'] == 'rollup:month'
+        assert wider['source'] == 'raw' and other_tenant['source'] == 'raw'
+        assert aggregate.call_count == 2
+
+    def test_dirty_months_survive_concurrent_marks(self):
+        """Test every marked month is rebuilt once, and a month re-marked during its rebuild stays dirty."""
+        june, july = self.today.replace(year=2024, month=6, day=1), self.today.replace(year=2024, month=7, day=1)
+        from analytics.kpi_rollups import RollupManager
+        writer_a, writer_b = RollupManager(store=self.manager.store), RollupManager(store=self.manager.store)
+        writer_a.mark_dirty(self.source, 'c1', june.replace(day=5))
+        writer_b.mark_dirty(self.source, 'c1', july, june.replace(day=9))
+
+        def rebuild(model_label, company_id, start, end):
+            if start == june:
+                writer_a.mark_dirty(model_label, company_id, june.replace(day=20))  # Write lands mid-rebuild
+            return {'day': 1}
+
+        with patch.object(self.manager, 'rebuild', side_effect=rebuild):
+            results = self.manager.refresh_dirty()
+
+        assert [r['month'] for r in results] == [june.isoformat(), july.isoformat()]
+        assert self.manager.store.pop_dirty() == [(self.source, 'c1', june)]
+
+
+class TestIncrementalAggregateState(TestCase):
+    """Tests for shared, mergeable incremental aggregate state."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        from analytics.aggregate_state import InMemoryAggregateStateBackend, PartialAggregate
+        self.backend = InMemoryAggregateStateBackend()
+        self.partial_class = PartialAggregate
+        self.bucket = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    def test_partial_aggregate_merge(self):
+        """Test merging partial aggregates combines sum/count/min/max."""
+        merged = self.partial_class.from_metrics({'amount': 10.0})
+        merged.merge(self.partial_class.from_metrics({'amount': 2.0}))
+        merged.merge(self.partial_class.from_metrics({'amount': 30.0}))
+        
+        assert merged.record_count == 3
+        assert merged.sums['amount'] == 42.0
+        assert merged.mins['amount'] == 2.0
+        assert merged.maxs['amount'] == 30.0
+        assert merged.averages()['amount'] == 14.0
+    
+    def test_partial_aggregate_serialization(self):
+        """Test partial aggregates round-trip through dictionaries."""
+        partial = self.partial_class.from_metrics({'amount': 5.0}, record_count=2)
+        restored = self.partial_class.from_dict(partial.to_dict())
+        
+        assert restored == partial
+    
+    def test_deltas_merge_into_shared_cells(self):
+        """Test deltas from different writers merge into one cell."""
+        dimensions = {'stage': 'won'}
+        
+        self.backend.apply_delta('agg-1', self.bucket, dimensions,
+                                 self.partial_class.from_metrics({'amount': 10.0}))
+        version = self.backend.get_version('agg-1')
+        self.backend.apply_delta('agg-1', self.bucket, dimensions,
+                                 self.partial_class.from_metrics({'amount': 5.0}))
+        
+        cells = self.backend.read_cells('agg-1')
+        
+        assert len(cells) == 1
+        assert cells[0].partial.record_count == 2
+        assert cells[0].partial.sums['amount'] == 15.0
+        assert self.backend.get_version('agg-1') != version
+    
+    def test_report_reads_state_written_by_other_worker(self):
+        """Test reports see aggregate updates made by another instance."""
+        from analytics.incremental_aggregates import IncrementalAggregates
+        
+        company = Mock(id='company-123')
+        user = Mock(id='user-123')
+        
+        with patch('analytics.incremental_aggregates.event_bus'):
+            worker_a = IncrementalAggregates(state_backend=self.backend)
+            worker_b = IncrementalAggregates(state_backend=self.backend)
+            
+            definition = worker_a.create_aggregate_definition(
+                'deals_by_stage', 'Deals by stage', 'deal', ['stage'], ['amount'],
+                'day', company, user
+            )
+            worker_b.update_aggregate_data_batch(definition.id, [
+                {'stage': 'won', 'amount': 100, 'created_at': self.bucket},
+                {'stage': 'lost', 'amount': 50, 'created_at': self.bucket},
+            ], company)
+            
+            report = worker_a.generate_report('pipeline', {}, company, user)
+        
+        aggregate = report.result_data['aggregates'][0]
+        assert aggregate['total_records'] == 2
+        assert aggregate['metric_totals']['amount'] == 150.0
+    
+    def test_report_cache_key_reads_versions_in_one_call(self):
+        """Test a report reads every aggregate's state version in one backend call."""
+        from analytics.aggregate_state import PostgresAggregateStateBackend
+        from analytics.incremental_aggregates import IncrementalAggregates
+        
+        company = Mock(id='company-123')
+        user = Mock(id='user-123')
+        
+        with patch('analytics.incremental_aggregates.event_bus'):
+            aggregates = IncrementalAggregates(state_backend=self.backend)
+            for name in ('deals_by_stage', 'deals_by_owner', 'deals_by_source'):
+                aggregates.create_aggregate_definition(name, name, 'deal', ['stage'], ['amount'], 'day', company, user)
+            with patch.object(self.backend, 'get_version') as get_version, \
+                    patch.object(self.backend, 'get_versions', wraps=self.backend.get_versions) as get_versions:
+                aggregates.generate_report('pipeline', {}, company, user)
+                aggregates.generate_report('pipeline', {}, company, user)
+        
+        assert not get_version.called
+        assert get_versions.call_count == 2 and len(get_versions.call_args[0][0]) == 3
+        
+        cursor = MagicMock()
+        cursor.fetchall.return_value = [('agg-1', 4)]
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value = cursor
+        with patch('django.db.connection', connection):
+            versions = PostgresAggregateStateBackend().get_versions(['agg-1', 'agg-2'])
+        
+        assert cursor.execute.call_count == 1 and 'ANY(%s)' in cursor.execute.call_args[0][0]
+        assert versions == {'agg-1': '4', 'agg-2': '0'}
+    
+    def test_postgres_version_is_bumped_in_the_write_transaction(self):
+        """Test the PostgreSQL version counter is incremented with each write, not read from NOW()."""
+        from analytics.aggregate_state import PostgresAggregateStateBackend
+        
+        backend = PostgresAggregateStateBackend()
+        cursor = MagicMock()
+        cursor.fetchone.return_value = (7,)
+        connection = MagicMock()
+        connection.cursor.return_value.__enter__.return_value = cursor
+        
+        with patch('django.db.connection', connection), patch('django.db.transaction.atomic') as atomic:
+            backend.apply_delta('agg-1', self.bucket, {'stage': 'won'},
+                                self.partial_class.from_metrics({'amount': 5.0}))
+            version = backend.get_version('agg-1')
+        
+        statements = [c[0][0] for c in cursor.execute.call_args_list]
+        assert atomic.called
+        assert 'version = v.version + 1' in statements[-2]
+        assert 'updated_at' not in statements[-1] and version == '7'
+
+
+class TestApproximateSketches(TestCase):
+    """Tests for HyperLogLog and t-digest aggregate sketches."""
+    
+    def test_hyperloglog_distinct_count(self):
+        """Test HyperLogLog estimates distinct values within error bounds."""
+        from analytics.sketches import HyperLogLog
+        
+        sketch = HyperLogLog()
+        for i in range(20000):
+            sketch.add(f"account-{i % 5000}")
+        
+        assert abs(sketch.count() - 5000) / 5000 < 0.05
+    
+    def test_hyperloglog_merge_and_serialization(self):
+        """Test merged HyperLogLog sketches count the union."""
+        from analytics.sketches import HyperLogLog
+        
+        first = HyperLogLog()
+        first.update(range(0, 3000))
+        second = HyperLogLog()
+        second.update(range(2000, 5000))
+        
+        merged = HyperLogLog.from_dict(first.to_dict()).merge(second)
+        
+        assert abs(merged.count() - 5000) / 5000 < 0.05
+    
+    def test_tdigest_quantiles(self):
+        """Test t-digest quantiles across merged digests."""
+        from analytics.sketches import TDigest
+        
+        first = TDigest()
+        first.update(range(0, 5000))
+        second = TDigest()
+        second.update(range(5000, 10000))
+        
+        merged = TDigest.from_bytes(first.to_bytes()).merge(second)
+        
+        assert abs(merged.quantile(0.5) - 5000) < 100
+        assert abs(merged.quantile(0.95) - 9500) < 100
+        assert merged.count() == 10000
+    
+    def test_merge_sketch_aggregates(self):
+        """Test sketch aggregate results merge across time buckets."""
+        from analytics.reporting_optimization import MaterializedAggregateManager
+        from analytics.sketches import HyperLogLog
+        
+        def bucket_result(values):
+            sketch = HyperLogLog()
+            sketch.update(values)
+            return {
+                'aggregate_name': 'unique_accounts',
+                'aggregate_type': 'approx_distinct',
+                'field': 'account_id',
+                'dimensions': ['stage'],
+                'data': [MaterializedAggregateManager._sketch_row(
+                    'unique_accounts', ['stage'], ('won',), sketch
+                )],
+            }
+        
+        merged = MaterializedAggregateManager.merge_sketch_aggregates([
+            bucket_result(range(0, 100)),
+            bucket_result(range(50, 150)),
+        ])
+        
+        assert len(merged['data']) == 1
+        assert abs(merged['data'][0]['unique_accounts_value'] - 150) <= 3
+
+
+class TestDashboardMetrics(TestCase):
+    """Tests for single-pass dashboard metrics."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_one_query_per_section(self):
+        """Test each dashboard section is a single conditional aggregate."""
+        from core.dashboard_metrics import DashboardMetricsEngine, DASHBOARD_MODELS
+
+        definitions = DashboardMetricsEngine.get_metric_definitions(timezone.now())
+
+        assert set(definitions) == set(DASHBOARD_MODELS)
+        assert 'overdue' in definitions['tasks']
+        assert 'total_value' in definitions['deals']
+
+    @patch('core.dashboard_metrics.DashboardMetricsEngine.compute_metrics')
+    def test_cached_until_company_invalidated(self, mock_compute):
+        """Test cached payloads are reused until the company version changes."""
+        from core.dashboard_metrics import DashboardMetricsEngine
+
+        mock_compute.return_value = {'leads': {'total': 1}}
+
+        DashboardMetricsEngine.get_dashboard_metrics('company-1')
+        DashboardMetricsEngine.get_dashboard_metrics('company-1')
+        assert mock_compute.call_count == 1
+
+        DashboardMetricsEngine.invalidate_company('company-1')
+        DashboardMetricsEngine.get_dashboard_metrics('company-1')
+        assert mock_compute.call_count == 2
+
+    def test_signal_invalidation_waits_for_commit(self):
+        """Test a saved record only bumps the company version once its transaction commits."""
+        from django.db import transaction
+        from core.dashboard_metrics import DashboardMetricsEngine, invalidate_dashboard_metrics
+
+        version_key = DashboardMetricsEngine.get_version_key('company-1')
+        cache.set(version_key, 1, None)
+
+        with transaction.atomic():
+            with self.captureOnCommitCallbacks() as callbacks:
+                invalidate_dashboard_metrics(None, MagicMock(company_id='company-1'))
+            assert cache.get(version_key) == 1
+
+        assert len(callbacks) == 1
+        callbacks[0]()
+        assert cache.get(version_key) != 1
+
+    @patch('core.dashboard_metrics.DashboardMetricsEngine.compute_section', return_value={'total': 0})
+    def test_sections_run_serially_on_request_connection(self, mock_section):
+        """Test a cache miss runs every section in the calling thread by default."""
+        from core.dashboard_metrics import DashboardMetricsEngine, DASHBOARD_MODELS
+
+        with patch('core.dashboard_metrics.ThreadPoolExecutor') as pool:
+            metrics = DashboardMetricsEngine.compute_metrics('company-1')
+
+        assert not pool.called
+        assert set(metrics) == set(DASHBOARD_MODELS)
+
 
 class TestStreamingExport(TestCase):
     """Tests for streaming export with compression."""
@@ -337,8 +1241,707 @@ class TestStreamingExport(TestCase):
         assert 'record_count' in estimate
         assert 'uncompressed_size_mb' in estimate
         assert 'compressed_size_mb' in estimate
+    
+    def test_keyset_ordering_appends_primary_key(self):
+        """Test keyset pages follow the queryset ordering with the primary key as tiebreaker."""
+        from master_data.streaming_export import StreamingExporter
+        from crm.models import Lead
+        
+        exporter = StreamingExporter(Lead.objects.order_by('-created_at'), fields=['id'])
+        assert exporter.get_keyset_ordering() == [('created_at', True), ('pk', False)]
+        
+        exporter = StreamingExporter(Lead.objects.order_by('id'), fields=['id'])
+        assert exporter.get_keyset_ordering() == [('pk', False)]
+        
+        # Random and related orderings cannot be paged by keyset
+        assert StreamingExporter(Lead.objects.order_by('?')).get_keyset_ordering() is None
+        assert StreamingExporter(Lead.objects.order_by('company__name')).get_keyset_ordering() is None
+    
+    def test_keyset_filter_selects_rows_after_last(self):
+        """Test the keyset filter matches rows strictly after the last exported row."""
+        from django.db.models import Q
+        from master_data.streaming_export import StreamingExporter
+        
+        ordering = [('created_at', True), ('pk', False)]
+        condition = StreamingExporter._keyset_filter(ordering, {'created_at': 5, 'pk': 9})
+        
+        expected = Q(created_at__lte=5) & (Q(created_at__lt=5) | (Q(pk__gt=9) & Q(created_at=5)))
+        assert str(condition) == str(expected)
+    
+    def test_csv_chunks_quote_and_compress(self):
+        """Test CSV chunks are quoted by csv.writer and gzip-stream back to the same text."""
+        import csv
+        import gzip
+        from io import StringIO
+        from master_data.streaming_export import CSVStreamingExporter, gzip_stream
+        from django.contrib.auth import get_user_model
+        
+        records = [{'id': i, 'name': f'Smith "Jr", {i}\nsecond line'} for i in range(2500)]
+        exporter = CSVStreamingExporter(get_user_model().objects.none(), fields=['id', 'name'])
+        
+        with patch.object(exporter, 'iter_records', return_value=iter(records)):
+            text = b''.join(exporter.iter_csv_chunks()).decode('utf-8')
+        
+        rows = list(csv.reader(StringIO(text)))
+        assert rows[0] == ['id', 'name']
+        assert rows[1:] == [[str(r['id']), r['name']] for r in records]
+        assert text.startswith('"id","name"\n')
+        
+        compressed = b''.join(gzip_stream(iter([text[:100].encode(), text[100:].encode()])))
+        assert gzip.decompress(compressed).decode('utf-8') == text
+    
+    def test_csv_values_keep_str_rendering(self):
+        """Test values are written as str() renders them, as before csv.writer, including None."""
+        from master_data.streaming_export import CSVStreamingExporter
+        from django.contrib.auth import get_user_model
+        
+        records = [{'id': 1, 'name': None, 'active': True, 'score': 1.5}, {'id': 2}]
+        exporter = CSVStreamingExporter(get_user_model().objects.none(), fields=['id', 'name', 'active', 'score'])
+        
+        with patch.object(exporter, 'iter_records', return_value=iter(records)):
+            text = b''.join(exporter.iter_csv_chunks()).decode('utf-8')
+        
+        assert text == '"id","name","active","score"\n"1","None","True","1.5"\n"2","","",""\n'
+    
+    def test_copy_export_streams_copy_output(self):
+        """Test the COPY path writes the header, then COPY's output as the copying thread produces it."""
+        from master_data.streaming_export import CSVStreamingExporter
+        from crm.models import Lead
+        
+        def copy_expert(statement, writer):
+            assert statement.startswith('COPY (SELECT') and 'FORCE_QUOTE *' in statement
+            for i in range(200):
+                writer.write(f'"{i}","lead{i}@example.com"\n'.encode('utf-8'))
+        
+        connection = MagicMock(vendor='postgresql')
+        raw_cursor = connection.cursor.return_value.__enter__.return_value.cursor
+        raw_cursor.mogrify.side_effect = lambda sql, params: (sql % tuple(repr(p) for p in params)).encode('utf-8')
+        raw_cursor.copy_expert.side_effect = copy_expert
+        raw_cursor.rowcount = 200
+        exporter = CSVStreamingExporter(Lead.objects.filter(status='new'), fields=['id', 'email'], use_copy=True)
+        
+        with patch('master_data.streaming_export.connections') as connections:
+            connections.__getitem__.return_value = connection
+            chunks = list(exporter.iter_csv_chunks())
+        
+        assert chunks[0] == b'"id","email"\n'
+        assert b''.join(chunks[1:]).decode('utf-8').splitlines()[199] == '"199","lead199@example.com"'
+        assert exporter.exported_records == 200
+        connection.inc_thread_sharing.assert_called_once_with()
+        connection.dec_thread_sharing.assert_called_once_with()
+    
+    def test_copy_export_requires_postgresql(self):
+        """Test the COPY passthrough is only used on PostgreSQL for local columns."""
+        from master_data.streaming_export import CSVStreamingExporter
+        from crm.models import Lead
+        
+        exporter = CSVStreamingExporter(Lead.objects.none(), fields=['id', 'email'], use_copy=True)
+        
+        with patch('master_data.streaming_export.connections') as connections:
+            connections.__getitem__.return_value.vendor = 'sqlite'
+            assert not exporter._can_copy()
+            
+            connections.__getitem__.return_value.vendor = 'postgresql'
+            assert exporter._can_copy()
+            
+            exporter.fields = ['id', 'company__name']
+            assert not exporter._can_copy()
+    
+    def test_columnar_export_round_trip(self):
+        """Test Parquet exports are typed and dictionary encode low-cardinality columns."""
+        import io
+        pq = pytest.importorskip('pyarrow.parquet')
+        from master_data.streaming_export import ExportManager
+        from crm.models import Lead
+        
+        records = [{'lead_score': i, 'status': ['new', 'qualified'][i % 2], 'email': f'lead{i}@example.com'}
+                   for i in range(2500)]
+        exporter = ExportManager.create_exporter('parquet', Lead.objects.none(),
+                                                 fields=['lead_score', 'status', 'email'])
+        exporter.ROW_GROUP_SIZE = 1000
+        
+        with patch.object(exporter, 'iter_records', return_value=iter(records)):
+            data = b''.join(exporter.iter_file_chunks())
+        
+        parquet_file = pq.ParquetFile(io.BytesIO(data))
+        schema = parquet_file.schema_arrow
+        assert parquet_file.metadata.num_row_groups == 3
+        assert str(schema.field('lead_score').type) == 'int32'
+        assert str(schema.field('status').type).startswith('dictionary')
+        assert str(schema.field('email').type) == 'string'
+        assert parquet_file.read().to_pylist() == records
+    
+    def test_columnar_decimal_types_fit_precision(self):
+        """Test decimals wider than 38 digits use decimal256 (runs without pyarrow installed)."""
+        from django.db import models
+        from master_data import streaming_export
+        from master_data.streaming_export import ColumnarStreamingExporter
+        from analytics.models import KPIMeasurement
+        
+        with patch.object(streaming_export, 'PYARROW_AVAILABLE', True), \
+                patch.object(streaming_export, 'pa', create=True) as pa:
+            exporter = ColumnarStreamingExporter(KPIMeasurement.objects.none(), fields=['value'])
+            
+            assert exporter._arrow_type('value') == (pa.decimal128.return_value, None)
+            pa.decimal128.assert_called_once_with(15, 2)
+            
+            with patch.object(KPIMeasurement._meta, 'get_field',
+                              return_value=models.DecimalField(max_digits=50, decimal_places=10)):
+                assert exporter._arrow_type('value') == (pa.decimal256.return_value, None)
+            pa.decimal256.assert_called_once_with(50, 10)
+    
+    def test_invalid_iteration_mode(self):
+        """Test unknown iteration modes are rejected."""
+        from master_data.streaming_export import ExportManager
+        from django.contrib.auth import get_user_model
+        
+        with pytest.raises(ValueError):
+            ExportManager.create_exporter('csv', get_user_model().objects.none(), iteration='offset')
+
+
+class TestShardedExport(TestCase):
+    """Tests for parallel sharded exports with resumable checkpoints."""
+    
+    def setUp(self):
+        """Set up test fixtures."""
+        from master_data.sharded_export import ShardedExport
+        self.sharded = ShardedExport
+        cache.clear()
+    
+    def test_split_keyspace_into_ranges(self):
+        """Test primary keys are split into contiguous ranges of the target size by the database."""
+        from core.models import Company
+        
+        Company.objects.bulk_create([Company(name=f'Shard {i}', code=f'shard-{i}') for i in range(23)])
+        queryset = Company.objects.filter(code__startswith='shard-')
+        keys = [str(pk) for pk in queryset.order_by('pk').values_list('pk', flat=True)]
+        
+        shards = self.sharded.split_keyspace(queryset, rows_per_shard=10)
+        
+        assert [(s['pk_gte'], s['pk_lt'], s['row_count']) for s in shards] == [
+            (None, keys[10], 10), (keys[10], keys[20], 10), (keys[20], None, 3)
+        ]
+    
+    def test_resume_skips_completed_shards(self):
+        """Test only failed shards re-run and progress aggregates across shards."""
+        shards = [{'index': i, 'pk_gte': None, 'pk_lt': None, 'row_count': 10} for i in range(3)]
+        exporter = Mock(FILE_EXTENSION='csv.gz', exported_records=10)
+        
+        with patch.object(self.sharded, 'split_keyspace', return_value=shards), \
+                patch.object(self.sharded, 'get_queryset'), \
+                patch.object(self.sharded, '_describe_file', return_value=(100, 'abc')), \
+                patch('master_data.sharded_export.ExportManager') as manager:
+            manager.create_exporter.return_value = exporter
+            manager.save_export.side_effect = ['part-0', IOError('disk full'), 'part-2', 'part-1']
+            
+            self.sharded.plan('export-1', {'app': 'crm', 'model': 'Lead'}, 'csv')
+            progress = self.sharded.run_local('export-1')
+            assert progress['shards_by_status'] == {'completed': 2, 'failed': 1}
+            assert progress['exported_records'] == 20
+            assert self.sharded.pending_shards('export-1') == [1]
+            
+            with patch.object(self.sharded, 'write_manifest') as write_manifest:
+                progress = self.sharded.run_local('export-1')
+            assert progress['is_complete'] and progress['exported_records'] == 30
+            assert manager.save_export.call_count == 4
+            assert write_manifest.called
+            assert [s['attempts'] for s in self.sharded.get_shards('export-1')] == [1, 2, 1]
+    
+    def test_shard_is_claimed_by_one_worker(self):
+        """Test a running shard cannot be claimed again until its heartbeat goes stale."""
+        from master_data.models import ExportShard
+        shards = [{'index': 0, 'pk_gte': None, 'pk_lt': None, 'row_count': 10}]
+        
+        with patch.object(self.sharded, 'split_keyspace', return_value=shards), \
+                patch.object(self.sharded, 'get_queryset'):
+            self.sharded.plan('export-2', {'app': 'crm', 'model': 'Lead'}, 'csv')
+        
+        assert self.sharded.claim_shard('export-2', 0)
+        assert not self.sharded.claim_shard('export-2', 0)
+        with patch('master_data.sharded_export.ExportManager') as manager:
+            assert self.sharded.export_shard('export-2', 0)['status'] == 'running'
+            assert not manager.save_export.called
+        
+        ExportShard.objects.filter(job__export_id='export-2').update(
+            updated_at=timezone.now() - self.sharded.STALE_AFTER - timedelta(seconds=1)
+        )
+        assert self.sharded.claim_shard('export-2', 0)
+        assert self.sharded.get_shards('export-2')[0]['attempts'] == 2
+
 
 
+class TestImportPipeline(TestCase):
+    """Tests for the streaming, chunked data import pipeline."""
+    
+    def test_csv_rows_stream_from_binary_upload(self):
+        """Test CSV uploads are parsed lazily and the BOM is skipped."""
+        import io
+        from data_import.pipeline import iter_csv_rows
+        
+        upload = io.BytesIO('\ufeffEmail,Name\na@x.io,"Smith, Ann"\nb@x.io,Bo\n'.encode('utf-8'))
+        rows = iter_csv_rows(upload)
+        
+        assert next(rows) == {'Email': 'a@x.io', 'Name': 'Smith, Ann'}
+        assert list(rows) == [{'Email': 'b@x.io', 'Name': 'Bo'}]
+        assert not upload.closed
+    
+    def test_compiled_template_maps_transforms_and_validates(self):
+        """Test mappings, transformation chains and validation rules are applied per row."""
+        from data_import.pipeline import CompiledTemplate
+        
+        template = Mock(
+            field_mappings={'E-mail': 'email', 'Revenue': 'annual_revenue', 'Stage': 'status', 'Unused': ''},
+            transformations={
+                'email': ['strip', 'email'],
+                'annual_revenue': 'decimal',
+                'status': {'type': 'map', 'values': {'Open': 'new'}},
+            },
+            validation_rules={'email': {'required': True, 'type': 'email'}, 'annual_revenue': {'min': 0}},
+        )
+        compiled = CompiledTemplate(template)
+        
+        data, errors = compiled.process({'E-mail': ' Ann@X.io ', 'Revenue': '1,250.50', 'Stage': 'open'})
+        assert data == {'email': 'ann@x.io', 'annual_revenue': '1250.50', 'status': 'new'}
+        assert errors == []
+        
+        data, errors = compiled.process({'E-mail': 'nope', 'Revenue': 'lots'})
+        assert errors == ["annual_revenue has an invalid value: 'lots'", 'email is not a valid email']
+    
+    def test_match_key_index_finds_normalized_duplicates(self):
+        """Test hashed match keys ignore case and whitespace and return every matching record."""
+        import uuid
+        from data_import.duplicate_matching import MatchKeyIndex, match_key
+        
+        queryset = MagicMock()
+        queryset.order_by.return_value.values_list.return_value.iterator.return_value = iter([
+            (1, 'Ann@X.io ', 'Acme'), (2, 'bo@x.io', 'Acme'), (3, 'ann@x.io', ' acme'), (4, '', 'Acme'),
+        ])
+        index = MatchKeyIndex.build(queryset, ['email', 'company_name'])
+        
+        assert len(index) == 3
+        assert match_key(['', 'Acme']) is None
+        assert index.lookup([
+            match_key(['ANN@x.io', 'ACME']), match_key(['cy@x.io', 'Acme']), None, match_key(['bo@x.io', 'acme'])
+        ]) == [[1, 3], [], [], [2]]
+        
+        uuid_pk = uuid.uuid4()
+        queryset.order_by.return_value.values_list.return_value.iterator.return_value = iter([
+            (uuid_pk, 'ann@x.io', 'Acme'),
+        ])
+        index = MatchKeyIndex.build(queryset, ['email', 'company_name'])
+        assert index.lookup([match_key(['ann@x.io', 'acme'])]) == [[uuid_pk]]
+    
+    def test_repeated_rows_in_file_are_flagged(self):
+        """Test rows repeating an earlier row of the file, in or across chunks, are skipped as duplicates."""
+        import io
+        from django.contrib.auth import get_user_model
+        from core.models import Company
+        from crm.models import Lead
+        from data_import.models import DuplicateMatch, ImportJob, ImportTemplate, StagedRecord
+        from data_import.pipeline import ImportPipeline
+        
+        company = Company.objects.create(name="Dupe Co", code="dupe-co")
+        user = get_user_model().objects.create_user(
+            email="dupes@example.com", first_name="Du", last_name="Pes", password="testpass123"
+        )
+        template = ImportTemplate.objects.create(
+            company=company, created_by=user, name="Leads", template_type='leads',
+            field_mappings={'Email': 'email', 'First': 'first_name'}, duplicate_detection_enabled=True,
+            duplicate_fields=['email'], batch_size=3
+        )
+        existing = Lead.objects.create(company=company, email='old@x.io', first_name='Old')
+        content = b'Email,First\na@x.io,Ann\nA@X.io ,Ann2\nb@x.io,Bo\nb@x.io,Bo2\nold@x.io,Old2\nc@x.io,Cy\n'
+        job = ImportJob.objects.create(company=company, created_by=user, template=template, file_name='leads.csv',
+                                       file_path='imports/leads.csv', file_size=len(content), file_type='csv')
+        
+        ImportPipeline(job, io.BytesIO(content)).run()
+        
+        flagged = StagedRecord.objects.filter(job=job, is_duplicate=True).order_by('row_number')
+        assert [(r.row_number, r.duplicate_matches) for r in flagged] == [(2, []), (4, []), (5, [existing.pk])]
+        assert list(DuplicateMatch.objects.filter(job=job).values_list('object_id', flat=True)) == [existing.pk]
+        assert sorted(Lead.objects.filter(company=company).values_list('first_name', flat=True)) == [
+            'Ann', 'Bo', 'Cy', 'Old2'
+        ]
+    
+    def test_rerun_restages_without_reimporting(self):
+        """Test rerunning a job restages its rows and keeps rows an earlier run imported."""
+        import io
+        from django.contrib.auth import get_user_model
+        from core.models import Company
+        from crm.models import Lead
+        from data_import.models import ImportJob, ImportTemplate, StagedRecord
+        from data_import.pipeline import ImportPipeline
+        
+        company = Company.objects.create(name="Import Co", code="import-co")
+        user = get_user_model().objects.create_user(
+            email="importer@example.com", first_name="Im", last_name="Porter", password="testpass123"
+        )
+        template = ImportTemplate.objects.create(
+            company=company, created_by=user, name="Leads", template_type='leads',
+            field_mappings={'Email': 'email', 'First': 'first_name'}, duplicate_detection_enabled=False,
+            batch_size=2
+        )
+        content = b'Email,First\na@x.io,Ann\nb@x.io,Bo\nc@x.io,Cy\n'
+        job = ImportJob.objects.create(company=company, created_by=user, template=template, file_name='leads.csv',
+                                       file_path='imports/leads.csv', file_size=len(content), file_type='csv')
+        
+        with patch.object(ImportPipeline, 'commit', side_effect=RuntimeError('worker lost')):
+            with pytest.raises(RuntimeError):
+                ImportPipeline(job, io.BytesIO(content)).run()
+        StagedRecord.objects.filter(job=job, row_number=1).update(import_status='imported')
+        Lead.objects.create(company=company, email='a@x.io', first_name='Ann')  # Row 1 was written before the failure
+        
+        ImportPipeline(job, io.BytesIO(content)).run()
+        ImportPipeline(job, io.BytesIO(content)).run()
+        
+        job.refresh_from_db()
+        assert sorted(Lead.objects.filter(company=company).values_list('email', flat=True)) == ['a@x.io', 'b@x.io', 'c@x.io']
+        assert StagedRecord.objects.filter(job=job).count() == 3
+        assert (job.status, job.valid_rows, job.imported_rows) == ('completed', 3, 3)
+    
+    def test_commit_updates_derived_data_without_signals(self):
+        """Test bulk-loaded rows reach the view counters, facet counters, BM25 index and rollup marks."""
+        import io
+        from django.contrib.auth import get_user_model
+        from analytics.bm25_index import BM25Index
+        from analytics.facet_counters import get_facet_counter_backend
+        from analytics.kpi_rollups import ROLLUP_SOURCES, RollupManager
+        from analytics.materialized_views import MaterializedViewManager
+        from core.models import Company
+        from crm.models import Lead
+        from data_import.models import ImportJob, ImportTemplate
+        from data_import.pipeline import ImportPipeline
+        
+        company = Company.objects.create(name="Hook Co", code="hook-co")
+        user = get_user_model().objects.create_user(
+            email="hooks@example.com", first_name="Ho", last_name="Oks", password="testpass123"
+        )
+        template = ImportTemplate.objects.create(
+            company=company, created_by=user, name="Leads", template_type='leads',
+            field_mappings={'Email': 'email', 'First': 'first_name', 'Title': 'title'},
+            duplicate_detection_enabled=False, batch_size=2
+        )
+        content = b'Email,First,Title\na@x.io,Ann,Zymurgist\nb@x.io,Bo,Buyer\nc@x.io,Cy,Buyer\n'
+        job = ImportJob.objects.create(company=company, created_by=user, template=template, file_name='leads.csv',
+                                       file_path='imports/leads.csv', file_size=len(content), file_type='csv')
+        changes = MaterializedViewManager._change_count('mv_lead_conversion_stats')
+        rollup_source = {'time_field': 'created_at', 'dimensions': [], 'metrics': []}
+        
+        with patch.dict(ROLLUP_SOURCES, {'crm.Lead': rollup_source}), \
+                patch.object(RollupManager, 'mark_dirty') as mark_dirty:
+            with self.captureOnCommitCallbacks(execute=True):
+                ImportPipeline(job, io.BytesIO(content)).run()
+        
+        assert MaterializedViewManager._change_count('mv_lead_conversion_stats') == changes + 3
+        assert get_facet_counter_backend().get_meta(str(company.pk), 'lead')['total'] == 3
+        assert [doc_id for doc_id, _ in BM25Index.for_tenant(company.pk, 'lead').search('zymurgist')] == [
+            str(Lead.objects.get(company=company, email='a@x.io').pk)
+        ]
+        assert mark_dirty.call_count == 2
+        assert mark_dirty.call_args_list[0].args[:2] == ('crm.Lead', company.pk)
+    
+    def test_copy_loader_merges_with_one_statement(self):
+        """Test COPY rows keep bulk_create defaults and the merge preserves created_at and tenancy."""
+        from crm.models import Lead
+        from data_import.copy_loader import CopyLoader
+        
+        loader = CopyLoader(Lead)
+        loader.connection = MagicMock()
+        loader.connection.ops.quote_name = lambda name: f'"{name}"'
+        loader.connection.vendor = 'postgresql'
+        cursor = loader.connection.cursor.return_value.__enter__.return_value
+        cursor.rowcount = 2
+        
+        new = Lead(company_id=1, email='a"b@x.io')
+        existing = Lead(id=7, company_id=1, first_name='Ann')
+        existing._state.adding = False
+        
+        line = loader._serialize(new)
+        assert line.startswith(',')  # NULL id is drawn from the sequence
+        assert '"a""b@x.io"' in line and '"new"' in line and new.created_at is not None
+        
+        assert loader.load([new, existing, existing], {'first_name'}) == 2
+        merge = cursor.execute.call_args_list[1][0][0]
+        assert 'ON CONFLICT ("id") DO UPDATE SET "first_name" = EXCLUDED."first_name", ' \
+               '"updated_at" = EXCLUDED."updated_at" WHERE "crm_lead"."company_id" = EXCLUDED."company_id"' in merge
+        copied = cursor.cursor.copy_expert.call_args[0][1].getvalue()
+        assert len(copied.splitlines()) == 2
+        
+        with patch('data_import.copy_loader.connections') as connections:
+            connections.__getitem__.return_value.vendor = 'postgresql'
+            assert CopyLoader.can_load(Lead, 50000)
+            assert not CopyLoader.can_load(Lead, 10)
+            connections.__getitem__.return_value.vendor = 'sqlite'
+            assert not CopyLoader.can_load(Lead, 50000)
+
+
+class TestParallelBackup(TestCase):
+    """Tests for parallel, incremental backups and selective restore."""
+    
+    def test_incremental_media_backup_and_selective_restore(self):
+        """Test unchanged media files are not copied again and restores can select files."""
+        import os
+        import shutil
+        import tempfile
+        from django.test import override_settings
+        from core.backup_recovery import BackupManager, RecoveryManager
+        
+        with tempfile.TemporaryDirectory() as path:
+            media_root = os.path.join(path, 'media')
+            os.makedirs(os.path.join(media_root, 'docs'))
+            for name, content in [('a.txt', 'alpha'), ('b.txt', 'beta'), ('c.txt', 'gamma')]:
+                with open(os.path.join(media_root, 'docs', name), 'w') as f:
+                    f.write(content)
+            manager = BackupManager(backup_dir=os.path.join(path, 'backups'), parallel_jobs=2)
+            
+            with override_settings(MEDIA_ROOT=media_root):
+                first = manager.create_parallel_backup('first', components=['media'])
+                with open(os.path.join(media_root, 'docs', 'b.txt'), 'w') as f:
+                    f.write('beta, edited')
+                with open(os.path.join(media_root, 'docs', 'd.txt'), 'w') as f:
+                    f.write('alpha')
+                second = manager.create_parallel_backup('second', components=['media'])
+            
+            with open(os.path.join(second, 'manifest.json')) as f:
+                manifest = json.load(f)
+            media = manifest['components']['media']
+            assert manifest['format_version'] == 2
+            assert (media['file_count'], media['changed_files'], media['stored_objects']) == (4, 2, 1)
+            assert media['files']['docs/a.txt']['sha256'] == media['files']['docs/d.txt']['sha256']
+            
+            restored_root = os.path.join(path, 'restored')
+            with override_settings(MEDIA_ROOT=restored_root):
+                RecoveryManager(manager.backup_dir).restore_parallel_backup(second, paths=['docs/b*'])
+            assert os.listdir(os.path.join(restored_root, 'docs')) == ['b.txt']
+            with open(os.path.join(restored_root, 'docs', 'b.txt')) as f:
+                assert f.read() == 'beta, edited'
+            
+            manager.OBJECT_PRUNE_GRACE_SECONDS = -1
+            assert manager.prune_media_objects() == 0
+            shutil.rmtree(first)
+            assert manager.prune_media_objects() == 1
+    
+    def test_postgresql_dump_is_parallel_directory_format(self):
+        """Test pg_dump writes a compressed directory-format dump with parallel workers."""
+        import tempfile
+        from core.backup_recovery import BackupManager
+        
+        with tempfile.TemporaryDirectory() as path:
+            manager = BackupManager(backup_dir=path, parallel_jobs=6, compression_level=3)
+            cmd = manager.postgresql_dump_command({'NAME': 'crm', 'HOST': 'db'}, '/backups/b1/database')
+        
+        assert cmd[cmd.index('-j') + 1] == '6' and cmd[cmd.index('-Z') + 1] == '3'
+        assert '-Fd' in cmd and cmd[-1] == '/backups/b1/database'
+    
+    def test_tenant_models_in_dependency_order(self):
+        """Test tenant models follow the models they reference and self-references are deferred."""
+        from core.tenant_backup import tenant_models, dependency_order
+        
+        ordered, deferred = dependency_order(tenant_models())
+        labels = [model._meta.label for model, _ in ordered]
+        
+        assert labels.index('crm.Account') < labels.index('crm.Contact')
+        assert labels.index('activities.Activity') < labels.index('activities.Activity_tags')
+        assert deferred['crm.Account'] == ['parent_account']
+        assert dict(tenant_models())[ordered[labels.index('activities.Activity_tags')][0]] == 'activity__company_id'
+    
+    def test_tenant_restore_remaps_foreign_keys(self):
+        """Test restored rows get new keys, tenant references are remapped and the company is replaced."""
+        import itertools
+        import uuid
+        from crm.models import Account, Contact
+        from core.tenant_backup import TenantBackupManager
+        
+        new_ids = itertools.count(100)
+        
+        def bulk_create(objects, batch_size=None):
+            for obj in objects:
+                obj.pk = next(new_ids)
+            return objects
+        
+        company_id = uuid.uuid4()
+        manager = TenantBackupManager(chunk_size=2)
+        pk_maps, pending = {}, []
+        with patch.object(Account._base_manager, 'bulk_create', side_effect=bulk_create), \
+                patch.object(Contact._base_manager, 'bulk_create', side_effect=bulk_create) as contacts:
+            manager.restore_model(Account, iter([
+                {'id': 1, 'company_id': 'old', 'name': 'Parent', 'parent_account_id': None},
+                {'id': 2, 'company_id': 'old', 'name': 'Child', 'parent_account_id': 1},
+                {'id': 3, 'company_id': 'old', 'name': 'Other', 'parent_account_id': None},
+            ]), company_id, {'parent_account'}, pk_maps, pending)
+            manager.restore_model(Contact, iter([
+                {'id': 9, 'company_id': 'old', 'first_name': 'Ann', 'account_id': 2,
+                 'created_at': '2020-01-02T03:04:05.123456+00:00'},
+            ]), company_id, {'reports_to'}, pk_maps, pending)
+        
+        assert pk_maps['crm.Account'] == {1: 100, 2: 101, 3: 102}
+        contact = contacts.call_args[0][0][0]
+        assert (contact.pk, contact.account_id, contact.company_id) == (103, 101, company_id)
+        assert contact.created_at.microsecond == 123456
+        assert [(label, old, value) for _, _, label, old, _, value in pending] == [('crm.Account', 2, 1)]
+    
+    def test_tenant_restore_remaps_generic_foreign_keys(self):
+        """Test a restored generic foreign key resolves to the restored copy of its object."""
+        import os
+        import tempfile
+        from django.contrib.auth import get_user_model
+        from django.contrib.contenttypes.models import ContentType
+        from core.models import Company
+        from core.tenant_backup import TenantBackupManager
+        from crm.models import Lead
+        from data_import.models import DuplicateMatch, ImportJob, ImportTemplate, StagedRecord
+        
+        company = Company.objects.create(name="Source Co", code="source-co")
+        target = Company.objects.create(name="Target Co", code="target-co")
+        user = get_user_model().objects.create_user(
+            email="backup@example.com", first_name="Back", last_name="Up", password="testpass123"
+        )
+        template = ImportTemplate.objects.create(company=company, created_by=user, name="Leads",
+                                                 template_type='leads')
+        job = ImportJob.objects.create(company=company, created_by=user, template=template, file_name='leads.csv',
+                                       file_path='imports/leads.csv', file_size=1, file_type='csv')
+        record = StagedRecord.objects.create(company=company, job=job, row_number=1, raw_data={}, processed_data={})
+        lead = Lead.objects.create(company=company, email='ann@x.io', first_name='Ann')
+        DuplicateMatch.objects.create(company=company, job=job, staged_record=record,
+                                      content_type=ContentType.objects.get_for_model(Lead), object_id=lead.pk,
+                                      similarity_score=1.0, match_algorithm='hashed')
+        
+        models = [(model, 'company_id') for model in (Lead, ImportTemplate, ImportJob, StagedRecord, DuplicateMatch)]
+        with tempfile.TemporaryDirectory() as path, patch('core.tenant_backup.tenant_models', return_value=models):
+            manager = TenantBackupManager(path)
+            backup_path = manager.export(company.pk)
+            restored = manager.restore(backup_path, company_id=target.pk)
+            
+            # Leads restored after the matches: the object_id is filled in once they exist
+            with open(os.path.join(backup_path, 'manifest.json')) as f:
+                manifest = json.load(f)
+            manifest['models'].sort(key=lambda entry: entry['model'] == 'crm.Lead')
+            with open(os.path.join(backup_path, 'manifest.json'), 'w') as f:
+                json.dump(manifest, f)
+            late = Company.objects.create(name="Late Co", code="late-co")
+            manager.restore(backup_path, company_id=late.pk)
+        
+        assert restored['data_import.DuplicateMatch'] == 1
+        for restored_company in (target, late):
+            match = DuplicateMatch.objects.get(company=restored_company)
+            assert match.matched_object == Lead.objects.get(company=restored_company)
+            assert match.object_id != lead.pk
+    
+    def test_multipart_cloud_transfer_round_trip(self):
+        """Test large backups move in verified parts and a corrupted part fails the download."""
+        import os
+        import tempfile
+        from django.test import override_settings
+        from core.backup_recovery import CloudBackupManager
+        from core.cloud_transfer import TransferError
+        
+        with tempfile.TemporaryDirectory() as path:
+            archive = os.path.join(path, 'backup.tar.gz')
+            with open(archive, 'wb') as f:
+                f.write(os.urandom(10000))
+            with override_settings(CLOUD_BACKUP_MULTIPART_THRESHOLD=1, CLOUD_BACKUP_PART_SIZE=3000):
+                cloud = CloudBackupManager('filesystem', os.path.join(path, 'store'))
+            cloud.transfer.RETRY_BACKOFF_SECONDS = 0
+            
+            cloud.upload_backup(archive, 'daily/backup.tar.gz')
+            assert [b['key'] for b in cloud.list_cloud_backups()] == ['daily/backup.tar.gz']
+            cloud.download_backup('daily/backup.tar.gz', os.path.join(path, 'copy.tar.gz'))
+            with open(archive, 'rb') as original, open(os.path.join(path, 'copy.tar.gz'), 'rb') as copy:
+                assert original.read() == copy.read()
+            assert not os.path.exists(archive + '.upload.json')
+            
+            with open(os.path.join(path, 'store', 'daily', 'backup.tar.gz'), 'r+b') as f:
+                f.seek(6500)
+                f.write(b'corrupt')
+            with self.assertRaises(TransferError):
+                cloud.download_backup('daily/backup.tar.gz', os.path.join(path, 'bad.tar.gz'))
+            assert not os.path.exists(os.path.join(path, 'bad.tar.gz'))
+    
+    def test_cloud_upload_includes_referenced_media_objects(self):
+        """Test a parallel backup uploads with its media objects and known content is never copied again."""
+        import builtins
+        import os
+        import tempfile
+        from django.test import override_settings
+        from core.backup_recovery import BackupManager, CloudBackupManager
+        
+        with tempfile.TemporaryDirectory() as path:
+            media_root = os.path.join(path, 'media')
+            os.makedirs(media_root)
+            for name, content in [('a.txt', 'alpha'), ('b.txt', 'beta')]:
+                with open(os.path.join(media_root, name), 'w') as f:
+                    f.write(content)
+            manager = BackupManager(backup_dir=os.path.join(path, 'backups'), parallel_jobs=1)
+            
+            with override_settings(MEDIA_ROOT=media_root), \
+                    patch('core.backup_recovery.connections') as connections:
+                first = manager.create_parallel_backup('first', components=['media'])
+            connections.close_all.assert_called_once_with()
+            
+            with open(os.path.join(media_root, 'c.txt'), 'w') as f:
+                f.write('alpha')
+            with patch.object(builtins, 'open', wraps=builtins.open) as opened:
+                assert manager.store_media_object(os.path.join(media_root, 'c.txt'))[1] == 0
+            assert [call.args[1] for call in opened.call_args_list] == ['rb']
+            
+            cloud = CloudBackupManager('filesystem', os.path.join(path, 'store'))
+            assert cloud.upload_backup(first, 'daily/first') == 'daily/first'
+            keys = sorted(b['key'] for b in cloud.list_cloud_backups())
+            objects = [key for key in keys if key.startswith('daily/objects/')]
+            assert len(objects) == 2 and 'daily/first/manifest.json' in keys
+            
+            with patch.object(cloud, 'upload_backup', wraps=cloud.upload_backup) as upload:
+                cloud.upload_backup_directory(first, 'daily/again')
+            assert [call.args[1] for call in upload.call_args_list] == ['daily/again/manifest.json']
+    
+    def test_multipart_upload_resumes_after_failed_part(self):
+        """Test a failed upload resumes by sending only the parts the store is missing."""
+        import os
+        import tempfile
+        from core.cloud_transfer import FilesystemTransferAdapter, MultipartTransfer, TransferError
+        
+        with tempfile.TemporaryDirectory() as path:
+            archive = os.path.join(path, 'backup.tar.gz')
+            with open(archive, 'wb') as f:
+                f.write(os.urandom(10000))
+            adapter = FilesystemTransferAdapter(os.path.join(path, 'store'))
+            transfer = MultipartTransfer(adapter, part_size=2000, max_workers=2)
+            transfer.RETRY_BACKOFF_SECONDS = 0
+            upload_part = adapter.upload_part
+            
+            def fail_part_3(key, upload_id, number, data, checksum):
+                if number == 3:
+                    raise ConnectionError('connection reset')
+                return upload_part(key, upload_id, number, data, checksum)
+            
+            with patch.object(adapter, 'upload_part', side_effect=fail_part_3):
+                with self.assertRaises(TransferError):
+                    transfer.upload(archive, 'backup.tar.gz')
+            assert os.path.exists(archive + '.upload.json')
+            
+            with patch.object(adapter, 'upload_part', side_effect=upload_part) as resumed:
+                manifest = transfer.upload(archive, 'backup.tar.gz')
+            assert [c[0][2] for c in resumed.call_args_list] == [3]
+            assert len(manifest['checksums']) == 5
+            with open(archive, 'rb') as f:
+                assert adapter.get_object('backup.tar.gz') == f.read()
+    
+    def test_bandwidth_throttle_is_shared(self):
+        """Test the throttle spaces transfers to the configured rate."""
+        from core.cloud_transfer import BandwidthThrottle
+        
+        now = [0.0]
+        waits = []
+        throttle = BandwidthThrottle(1000, clock=lambda: now[0], sleep=waits.append)
+        
+        throttle.consume(500)
+        throttle.consume(1000)
+        now[0] = 1.0
+        throttle.consume(100)
+        
+        assert waits == [0.5, 0.5]
+        assert BandwidthThrottle(None).consume(10 ** 9) == 0
+
 class TestVectorSearch(TestCase):
     """Tests for vector search with fallback."""
     
@@ -349,6 +1952,114 @@ class TestVectorSearch(TestCase):
         backend = FallbackSearchBackend()
         assert backend.health_check() is True
     
+    def test_local_index_exact_and_ivf_search(self):
+        """Test local kNN matches brute force and honours metadata filters."""
+        import numpy as np
+        from analytics.local_vector_index import LocalVectorIndex
+        
+        rng = np.random.default_rng(0)
+        vectors = rng.standard_normal((600, 16)).astype(np.float32)
+        index = LocalVectorIndex(16, exact_threshold=200)
+        index.add_batch(
+            (str(i), vector, {'company_id': 'a' if i % 2 else 'b'})
+            for i, vector in enumerate(vectors)
+        )
+        assert index.is_trained
+        
+        query = rng.standard_normal(16)
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        expected = [str(i) for i in np.argsort(-(normalized @ query))[:5]]
+        assert [hit['id'] for hit in index.search(query, 5, exact=True)] == expected
+        assert [hit['id'] for hit in index.search(query, 5, nprobe=1000)] == expected
+        
+        filtered = index.search(query, 5, filters={'company_id': 'b'})
+        assert filtered and all(int(hit['id']) % 2 == 0 for hit in filtered)
+    
+    def test_local_index_persists_to_disk(self):
+        """Test vectors and metadata survive reopening the index."""
+        import tempfile
+        from analytics.vector_search import FallbackSearchBackend
+        
+        with tempfile.TemporaryDirectory() as path:
+            backend = FallbackSearchBackend(dimension=4, path=path)
+            assert backend.bulk_index([
+                {'id': 'doc1', 'vector': [1, 0, 0, 0], 'metadata': {'type': 'lead'}},
+                {'id': 'doc2', 'vector': [0, 1, 0, 0], 'metadata': {'type': 'deal'}},
+            ])
+            
+            reopened = FallbackSearchBackend(dimension=4, path=path)
+            results = reopened.search([0.9, 0.1, 0, 0], k=1)
+            assert results[0]['id'] == 'doc1'
+            assert results[0]['metadata'] == {'type': 'lead'}
+            
+            backend.delete_document('doc1')
+            assert [hit['id'] for hit in reopened.search([1, 0, 0, 0], k=2)] == ['doc2']
+    
+    def test_local_index_single_writes_append_to_journal(self):
+        """Test single-document writes append to the journal instead of rewriting the manifest."""
+        import os
+        import tempfile
+        from analytics.local_vector_index import LocalVectorIndex
+        
+        with tempfile.TemporaryDirectory() as path:
+            writer = LocalVectorIndex(4, path=path)
+            writer.add('doc0', [1, 0, 0, 0])
+            reader = LocalVectorIndex(4, path=path)
+            manifest_mtime = os.stat(os.path.join(path, 'manifest.json')).st_mtime_ns
+            
+            with writer.batch():
+                for i in range(1, 20):
+                    writer.add(f'doc{i}', [0, 1, 0, i], {'n': i})
+            writer.remove(['doc0'])
+            
+            assert os.stat(os.path.join(path, 'manifest.json')).st_mtime_ns == manifest_mtime
+            with open(os.path.join(path, 'journal.ndjson')) as f:
+                assert len(f.readlines()) == 1 + 19 + 1
+            assert reader.search([0, 1, 0, 5], k=1, filters={'n': 5})[0]['id'] == 'doc5'
+            assert len(reader) == len(LocalVectorIndex(4, path=path)) == 19
+    
+    def test_indexing_pipeline_skips_unchanged_and_retries(self):
+        """Test only changed documents are re-embedded and failed batches are retried."""
+        from analytics.vector_indexing import VectorIndexingPipeline
+        
+        manager = Mock(dimension=32)
+        manager.bulk_index.side_effect = [False, True, True]
+        pipeline = VectorIndexingPipeline(manager=manager)
+        pipeline.RETRY_BACKOFF_SECONDS = 0
+        
+        documents = [
+            {'id': f'lead:{i}', 'text': f'acme lead {i}', 'metadata': {'company_id': 'c1'}}
+            for i in range(3)
+        ]
+        assert pipeline.index_documents(documents) == 3
+        assert manager.bulk_index.call_count == 2
+        assert len(manager.bulk_index.call_args[0][0][0]['vector']) == 32
+        
+        documents[1]['text'] = 'globex lead'
+        assert pipeline.index_documents(documents) == 1
+        assert manager.bulk_index.call_args[0][0][0]['id'] == 'lead:1'
+    
+    def test_opensearch_bulk_index_sends_batches(self):
+        """Test OpenSearch bulk indexing sends one _bulk request per batch and reports item errors."""
+        from analytics.vector_search import OpenSearchKNNBackend
+        
+        backend = OpenSearchKNNBackend('localhost', 9200, 'crm_vectors', dimension=2)
+        backend.WRITE_BATCH_SIZE = 2
+        backend.client = Mock()
+        backend.client.bulk.return_value = {'errors': False, 'items': []}
+        documents = [{'id': f'lead:{i}', 'vector': [1.0, 0.0], 'metadata': {'i': i}} for i in range(3)]
+        
+        assert backend.bulk_index(documents) is True
+        assert backend.client.bulk.call_count == 2
+        assert backend.client.bulk.call_args_list[0][1]['body'][0] == {
+            'index': {'_index': 'crm_vectors', '_id': 'lead:0'}
+        }
+        
+        backend.client.bulk.return_value = {
+            'errors': True, 'items': [{'index': {'_id': 'lead:0', 'error': {'type': 'mapper_parsing_exception'}}}]
+        }
+        assert backend.bulk_index(documents) is False
+    
     def test_vector_dimension_validation(self):
         """Test vector dimension validation."""
         from analytics.vector_search import PgVectorBackend